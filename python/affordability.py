@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+Inverse of the debt-ratio assessment: the largest principal that keeps the debt
+ratio (total monthly payment incl. insurance / monthly income) under a target.
+
+Every answer is computed for a whole (incomes x rates) grid at once. Annuity
+payments are linear in the principal, so the maximum follows directly from the
+schedule of a unit loan; bullet and modular schedules (fixed repayment amounts)
+are solved with a vectorized bisection on top of the batch engine.
+"""
+import numpy as np
+
+from batch_engine import premie_schema, simuleer_leningen_batch
+from calculation_functions import START_JAAR_KALENDER
+from cancellation import checkpoint
+from multi_client_calculation import DEBT_RATIO_GOOD
+
+# Upper bound of the search; larger answers are reported as unbounded
+MAX_HOOFDSOM = 1e8
+BISECTIE_TOLERANTIE = 0.01  # euro
+BISECTIE_MAX_ITERATIES = 100
+EENHEID_HOOFDSOM = 1e6
+
+DEBT_RATIO_BASES = ("first", "max")
+
+
+def _schuldratios(betalingen, inkomens, basis):
+    """Debt ratio (percent) per loan from (loans x months) payments, on the first or the worst month."""
+    maandbedrag = betalingen[:, 0] if basis == "first" else betalingen.max(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(inkomens > 0, maandbedrag / inkomens * 100, np.inf)
+
+
+def _max_annuiteit(inkomens, rentevoeten, doel, looptijd_jaren, uitstel_maanden, premie, basis):
+    """
+    Closed form for annuities: every month's payment is ``c_m * P + premie_m``, so
+    ``P = min_m (doel * inkomen - premie_m) / c_m``. Without deferral and on the first
+    month this is the familiar ``P = (doel * inkomen - premie_1) / pmt(r, n, 1)``.
+    """
+    # Payment per euro borrowed; simulated on a large principal so the 1-cent balance rounding is negligible
+    eenheid = simuleer_leningen_batch(EENHEID_HOOFDSOM, rentevoeten, looptijd_jaren, 'annuity',
+                                      uitstel_maanden=uitstel_maanden)["paymentExcludingInsurance"] / EENHEID_HOOFDSOM
+    if basis == "first":
+        eenheid, premie = eenheid[:, :1], premie[:1]
+    ruimte = doel / 100 * inkomens[:, None] - premie[None, :]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        per_maand = np.where(eenheid > 0, ruimte / eenheid, np.where(ruimte >= 0, np.inf, -np.inf))
+    return np.clip(per_maand.min(axis=1), 0, None)
+
+
+def _max_schema(inkomens, rentevoeten, doel, looptijd_jaren, loan_type, aflossings_schema,
+                start_jaar_kalender, dekking_pct, basis):
+    """Vectorized bisection on the principal for bullet/modular loans; returns (principal, iterations)."""
+    def schuldratio(hoofdsom):
+        batch = simuleer_leningen_batch(hoofdsom, rentevoeten, looptijd_jaren, loan_type, aflossings_schema,
+                                        start_jaar_kalender=start_jaar_kalender,
+                                        schuldsaldo_dekking_pct=dekking_pct)
+        return _schuldratios(batch["totalMonthlyPayment"], inkomens, basis)
+
+    laag = np.zeros(len(inkomens))
+    haalbaar = schuldratio(laag) <= doel
+    # Bracket: grow the upper bound until it breaks the target (or hits MAX_HOOFDSOM)
+    hoog = np.where(haalbaar, np.maximum(inkomens, 1.0) * looptijd_jaren * 12, 0.0)
+    while True:
+        te_laag = haalbaar & (hoog < MAX_HOOFDSOM) & (schuldratio(hoog) <= doel)
+        if not te_laag.any():
+            break
+        hoog = np.where(te_laag, np.minimum(hoog * 2, MAX_HOOFDSOM), hoog)
+
+    iteraties = 0
+    while iteraties < BISECTIE_MAX_ITERATIES and np.any(hoog - laag > BISECTIE_TOLERANTIE):
+        checkpoint()
+        midden = (laag + hoog) / 2
+        ok = schuldratio(midden) <= doel
+        laag = np.where(ok, midden, laag)
+        hoog = np.where(ok, hoog, midden)
+        iteraties += 1
+    # Principals that still meet the target at MAX_HOOFDSOM stay at the bound
+    return np.where(haalbaar & (schuldratio(hoog) <= doel), hoog, laag), iteraties
+
+
+def bereken_max_lening(
+    inkomens,
+    jaarlijkse_rentevoeten,
+    looptijd_jaren,
+    loan_type='annuity',
+    doel_schuldratio=DEBT_RATIO_GOOD,
+    aflossings_schema=None,
+    uitstel_maanden=0,
+    start_jaar_kalender=START_JAAR_KALENDER,
+    schuldsaldo_dekking_pct=1.0,
+    basis="first",
+):
+    """
+    Maximum principal per (income, rate) pair that keeps the debt ratio at or below ``doel_schuldratio``.
+
+    ``basis`` selects the month the ratio is judged on: ``"first"`` (as the debt-ratio
+    assessment does) or ``"max"`` (the most expensive month of the term, including
+    balloon repayments of bullet/modular loans). Returns a dict of (incomes x rates)
+    arrays: ``maxPrincipal``, ``firstMonthlyPayment``, ``maxMonthlyPayment``,
+    ``debtRatio`` (at the maximum, on the chosen basis) and ``bounded`` (False where
+    the search stopped at ``MAX_HOOFDSOM``), plus the number of bisection ``iterations``.
+    """
+    if basis not in DEBT_RATIO_BASES:
+        raise ValueError(f"basis must be one of {DEBT_RATIO_BASES}")
+    inkomens = np.atleast_1d(np.asarray(inkomens, dtype=float))
+    rentevoeten = np.atleast_1d(np.asarray(jaarlijkse_rentevoeten, dtype=float))
+    # Flatten the grid so the engines see one vector of loans
+    inkomen_grid, rente_grid = (a.ravel() for a in np.meshgrid(inkomens, rentevoeten, indexing="ij"))
+
+    iteraties = 0
+    if loan_type == 'annuity':
+        premie = premie_schema(looptijd_jaren, start_jaar_kalender, loan_type, schuldsaldo_dekking_pct)
+        hoofdsom = _max_annuiteit(inkomen_grid, rente_grid, doel_schuldratio, looptijd_jaren,
+                                  uitstel_maanden, premie, basis)
+    else:
+        hoofdsom, iteraties = _max_schema(inkomen_grid, rente_grid, doel_schuldratio, looptijd_jaren, loan_type,
+                                          aflossings_schema, start_jaar_kalender, schuldsaldo_dekking_pct, basis)
+    begrensd = hoofdsom < MAX_HOOFDSOM
+    hoofdsom = np.minimum(hoofdsom, MAX_HOOFDSOM)
+
+    batch = simuleer_leningen_batch(hoofdsom, rente_grid, looptijd_jaren, loan_type, aflossings_schema,
+                                    uitstel_maanden=uitstel_maanden, start_jaar_kalender=start_jaar_kalender,
+                                    schuldsaldo_dekking_pct=schuldsaldo_dekking_pct)
+    betalingen = batch["totalMonthlyPayment"]
+    vorm = (len(inkomens), len(rentevoeten))
+    return {
+        "maxPrincipal": hoofdsom.reshape(vorm),
+        "firstMonthlyPayment": betalingen[:, 0].reshape(vorm),
+        "maxMonthlyPayment": betalingen.max(axis=1).reshape(vorm),
+        "debtRatio": _schuldratios(betalingen, inkomen_grid, basis).reshape(vorm),
+        "bounded": begrensd.reshape(vorm),
+        "iterations": iteraties,
+    }
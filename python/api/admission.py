@@ -0,0 +1,173 @@
+import asyncio
+import bisect
+import itertools
+import time
+from collections import defaultdict
+
+from fastapi import Request
+from fastapi.responses import JSONResponse
+
+from .monitoring import route_label
+from config import settings, PriorityClass
+from metrics import (
+    ADMISSION_IN_FLIGHT,
+    ADMISSION_LIMIT,
+    ADMISSION_QUEUE_DEPTH,
+    ADMISSION_REJECTED,
+    ADMISSION_WAIT,
+)
+
+# Lower rank is admitted first
+PRIORITY_RANK = {PriorityClass.INTERACTIVE: 0, PriorityClass.STANDARD: 1, PriorityClass.BATCH: 2}
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, route, reason):
+        super().__init__(f"{route}: {reason}")
+        self.route = route
+        self.reason = reason
+
+
+class _Waiter:
+    def __init__(self, route, rank, seq, future):
+        self.route = route
+        self.rank = rank
+        self.seq = seq
+        self.future = future
+
+    def __lt__(self, other):
+        return (self.rank, self.seq) < (other.rank, other.seq)
+
+
+class AdmissionController:
+    """
+    Per-route concurrency limits on top of a shared capacity, with a bounded priority queue.
+
+    A request starts when its route is under its limit and a slot of the shared
+    capacity is free; ``reserved_interactive`` slots are only usable by interactive
+    routes, so batch work can never occupy every slot. Waiting requests are admitted
+    by priority class, then arrival order. A full queue or a wait longer than
+    ``queue_timeout`` raises ``AdmissionRejected``. All state lives on the event loop,
+    so no locking is needed.
+    """
+
+    def __init__(self, limits, classes, capacity, reserved_interactive=0, queue_size=16, queue_timeout=10.0):
+        self.limits = dict(limits)
+        self.classes = {route: PriorityClass(cls) for route, cls in classes.items()}
+        self.capacity = capacity
+        self.reserved_interactive = min(reserved_interactive, max(capacity - 1, 0))
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.in_flight = defaultdict(int)
+        self.total_in_flight = 0
+        self._waiters = []
+        self._seq = itertools.count()
+        for route, limit in self.limits.items():
+            ADMISSION_LIMIT.set(limit, route=route, priority=self.priority(route).value)
+
+    @classmethod
+    def from_settings(cls, config):
+        return cls(
+            config.admission_limits,
+            config.admission_classes,
+            config.admission_capacity,
+            reserved_interactive=config.admission_reserved_interactive,
+            queue_size=config.admission_queue_size,
+            queue_timeout=config.admission_queue_timeout_ms / 1000,
+        )
+
+    def controls(self, route):
+        return route in self.limits
+
+    def priority(self, route):
+        return self.classes.get(route, PriorityClass.STANDARD)
+
+    def _can_start(self, route):
+        if self.in_flight[route] >= self.limits[route]:
+            return False
+        usable = self.capacity
+        if self.priority(route) != PriorityClass.INTERACTIVE:
+            usable -= self.reserved_interactive
+        return self.total_in_flight < usable
+
+    def _start(self, route):
+        self.in_flight[route] += 1
+        self.total_in_flight += 1
+        ADMISSION_IN_FLIGHT.set(self.in_flight[route], route=route)
+
+    def _queued(self, route):
+        return sum(1 for waiter in self._waiters if waiter.route == route)
+
+    def _remove(self, waiter):
+        if waiter in self._waiters:
+            self._waiters.remove(waiter)
+            ADMISSION_QUEUE_DEPTH.set(self._queued(waiter.route), route=waiter.route)
+
+    def _dispatch(self):
+        # Highest priority first; a waiter held back by its own route limit does not block others
+        for waiter in list(self._waiters):
+            if not waiter.future.done() and self._can_start(waiter.route):
+                self._waiters.remove(waiter)
+                ADMISSION_QUEUE_DEPTH.set(self._queued(waiter.route), route=waiter.route)
+                self._start(waiter.route)
+                waiter.future.set_result(None)
+
+    async def acquire(self, route):
+        rank = PRIORITY_RANK[self.priority(route)]
+        # Start right away unless an equal or higher priority request is already waiting for a slot
+        if self._can_start(route) and not any(
+            waiter.rank <= rank and self._can_start(waiter.route) for waiter in self._waiters
+        ):
+            self._start(route)
+            return
+        if self._queued(route) >= self.queue_size:
+            ADMISSION_REJECTED.inc(route=route, reason="queue_full")
+            raise AdmissionRejected(route, "queue_full")
+
+        waiter = _Waiter(route, rank, next(self._seq), asyncio.get_running_loop().create_future())
+        bisect.insort(self._waiters, waiter)
+        ADMISSION_QUEUE_DEPTH.set(self._queued(route), route=route)
+        start = time.perf_counter()
+        try:
+            await asyncio.wait({waiter.future}, timeout=self.queue_timeout)
+        except asyncio.CancelledError:
+            self._remove(waiter)
+            if waiter.future.done():
+                self.release(route)
+            else:
+                waiter.future.cancel()
+            raise
+        if not waiter.future.done():
+            self._remove(waiter)
+            waiter.future.cancel()
+            ADMISSION_REJECTED.inc(route=route, reason="timeout")
+            raise AdmissionRejected(route, "timeout")
+        ADMISSION_WAIT.observe(time.perf_counter() - start, route=route)
+
+    def release(self, route):
+        self.in_flight[route] -= 1
+        self.total_in_flight -= 1
+        ADMISSION_IN_FLIGHT.set(self.in_flight[route], route=route)
+        self._dispatch()
+
+
+admission = AdmissionController.from_settings(settings)
+
+
+async def admission_middleware(request: Request, call_next):
+    """Apply the admission limits to the configured calculation routes; others pass straight through."""
+    route = route_label(request)
+    if not admission.controls(route):
+        return await call_next(request)
+    try:
+        await admission.acquire(route)
+    except AdmissionRejected as e:
+        return JSONResponse(
+            status_code=503,
+            content={"detail": f"Server busy ({e.reason}), retry later"},
+            headers={"Retry-After": str(settings.admission_retry_after_s)},
+        )
+    try:
+        return await call_next(request)
+    finally:
+        admission.release(route)
@@ -0,0 +1,105 @@
+from fastapi import APIRouter, HTTPException, Request
+from typing import List, Optional
+from pydantic import BaseModel
+
+from .main import LoanType, ModularLoanSchedule, run_calculation
+from .multi_client_loan import ClientSummary
+from affordability import bereken_max_lening, MAX_HOOFDSOM
+from multi_client_calculation import DEBT_RATIO_GOOD, beoordeel_schuldratio
+from profiling import stage
+
+router = APIRouter()
+
+
+class MaxAffordableLoanRequest(BaseModel):
+    loanType: LoanType
+    # Annual interest rates in percent; one column of the answer table per rate
+    interestRates: List[float]
+    termYears: int
+    # Monthly incomes; one row of the answer table per income. Defaults to the client summary income
+    monthlyIncomes: Optional[List[float]] = None
+    clientSummary: Optional[ClientSummary] = None
+    # Maximum debt ratio in percent
+    targetDebtRatio: float = DEBT_RATIO_GOOD
+    # Judge the debt ratio on the first month ("first") or the most expensive month ("max")
+    debtRatioBasis: str = "first"
+    ownContribution: float = 0
+    delayMonths: Optional[int] = 0
+    startYear: Optional[int] = 2025
+    insuranceCoveragePct: Optional[float] = 1.0
+    # Fixed repayments for modular loans; bullet loans without a schedule repay everything at the end
+    modularSchedule: Optional[ModularLoanSchedule] = None
+
+
+@router.post("/max-affordable-loan")
+async def max_affordable_loan(request: MaxAffordableLoanRequest, http_request: Request):
+    """
+    Largest principal and purchase price that keep the debt ratio under ``targetDebtRatio``,
+    for every combination of ``monthlyIncomes`` and ``interestRates``.
+    """
+    return await run_calculation(http_request, max_affordable_loan_result, request)
+
+
+def max_affordable_loan_result(request: MaxAffordableLoanRequest):
+    if request.monthlyIncomes:
+        incomes = request.monthlyIncomes
+    elif request.clientSummary is not None:
+        incomes = [request.clientSummary.totalMonthlyIncome]
+    else:
+        raise HTTPException(status_code=400, detail="Provide monthlyIncomes or a clientSummary")
+    if not request.interestRates:
+        raise HTTPException(status_code=400, detail="Provide at least one interest rate")
+
+    loan_type = request.loanType.value
+    schedule_tuples = None
+    if request.modularSchedule and loan_type in ["bullet", "modular"]:
+        schedule_tuples = [(item.month, item.amount) for item in request.modularSchedule.schedule]
+    if loan_type == "modular" and not schedule_tuples:
+        raise HTTPException(status_code=400, detail="Modular loan schedule required for modular loans")
+
+    try:
+        with stage("affordability_solve"):
+            result = bereken_max_lening(
+                incomes,
+                [rate / 100 for rate in request.interestRates],  # Convert from percentage to decimal
+                request.termYears,
+                loan_type=loan_type,
+                doel_schuldratio=request.targetDebtRatio,
+                aflossings_schema=schedule_tuples,
+                uitstel_maanden=request.delayMonths,
+                start_jaar_kalender=request.startYear,
+                schuldsaldo_dekking_pct=request.insuranceCoveragePct,
+                basis=request.debtRatioBasis,
+            )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    with stage("serialization"):
+        table = []
+        for i, income in enumerate(incomes):
+            row = []
+            for j, rate in enumerate(request.interestRates):
+                principal = float(result["maxPrincipal"][i, j])
+                affordable = principal > 0
+                debt_ratio = float(result["debtRatio"][i, j])
+                row.append({
+                    "monthlyIncome": income,
+                    "interestRate": rate,
+                    "maxPrincipal": round(principal, 2),
+                    "maxPurchasePrice": round(principal + request.ownContribution, 2) if affordable else None,
+                    "firstMonthlyPayment": round(float(result["firstMonthlyPayment"][i, j]), 2),
+                    "maxMonthlyPayment": round(float(result["maxMonthlyPayment"][i, j]), 2),
+                    "debtRatio": round(debt_ratio, 2) if affordable else None,
+                    "debtRatioAssessment": beoordeel_schuldratio(debt_ratio) if affordable else None,
+                    "bounded": bool(result["bounded"][i, j]),
+                })
+            table.append(row)
+
+    return {
+        "monthlyIncomes": incomes,
+        "interestRates": request.interestRates,
+        "targetDebtRatio": request.targetDebtRatio,
+        "debtRatioBasis": request.debtRatioBasis,
+        "maxSearchedPrincipal": MAX_HOOFDSOM,
+        "results": table,
+    }
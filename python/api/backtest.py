@@ -0,0 +1,134 @@
+import os
+from typing import List, Optional
+
+import numpy as np
+from fastapi import APIRouter, HTTPException, Request
+
+from .main import ComparisonRequest, batch_loan_inputs, reject_insurance_simulations, rounded, run_calculation
+from backtest import SYNTHETISCHE_RENDEMENTEN, backtest_vergelijking, laad_rendementen
+from compare_many import start_investering
+from config import settings
+from profiling import stage
+
+router = APIRouter()
+
+SYNTHETIC_WARNING = ("Synthetic demonstration returns (data/index_returns.csv), not historical index data; "
+                     "do not use for advice")
+
+
+class BacktestRequest(ComparisonRequest):
+    # Monthly index returns in percent, oldest first; defaults to the CSV at LOANLOGIC_BACKTEST_RETURNS_PATH
+    returns: Optional[List[float]] = None
+    # Without returns, replay the bundled synthetic series instead (demonstrations and tests only)
+    syntheticReturns: bool = False
+    # Month (YYYY-MM) of the first entry of returns, used to label the windows
+    firstMonth: Optional[str] = None
+    percentiles: List[float] = [5, 25, 50, 75, 95]
+    # One row per window (start month, net worth, coverage)
+    includeWindows: bool = False
+
+
+def month_labels(first_month, count):
+    year, month = (int(part) for part in first_month.split("-"))
+    months = year * 12 + month - 1 + np.arange(count)
+    return [f"{m // 12:04d}-{m % 12 + 1:02d}" for m in months]
+
+
+def distribution(values, percentiles):
+    return {"mean": rounded(values.mean()), "min": rounded(values.min()), "max": rounded(values.max()),
+            **{f"p{p:g}": rounded(v) for p, v in zip(percentiles, np.percentile(values, percentiles))}}
+
+
+@router.post("/backtest")
+async def backtest(request: BacktestRequest, http_request: Request):
+    """
+    Replay the compare-loans investment of the payment difference over a series of monthly index
+    returns (the request's, the configured CSV, or with ``syntheticReturns`` the bundled synthetic
+    series), from every possible start month: the distribution of end-of-term net worth, the
+    worst window and whether each window covered the bullet repayment.
+    """
+    return await run_calculation(http_request, backtest_result, request)
+
+
+def backtest_result(request: BacktestRequest):
+    reject_insurance_simulations(request)
+    if request.returns is not None:
+        returns = np.array(request.returns, dtype=float) / 100  # Convert from percentage to decimal
+        try:
+            labels = month_labels(request.firstMonth, len(returns)) if request.firstMonth else None
+        except ValueError:
+            raise HTTPException(status_code=400, detail="firstMonth must be YYYY-MM")
+        source, synthetic = "request", False
+    else:
+        path = SYNTHETISCHE_RENDEMENTEN if request.syntheticReturns else settings.backtest_returns_path
+        if not path or not os.path.exists(path):
+            raise HTTPException(status_code=400, detail="Provide returns or set syntheticReturns; "
+                                                        "no return series is configured")
+        try:
+            labels, returns = laad_rendementen(path)
+        except (KeyError, ValueError) as e:
+            raise HTTPException(status_code=400, detail=f"Cannot read the return series: {e}")
+        labels = list(labels)
+        source, synthetic = os.path.basename(path), request.syntheticReturns
+
+    investment = request.investmentParams
+    start_capital = (investment.startCapital or 0) if investment else 0
+    # Explicit capitals of 0 fall back to the start capital, as in /api/compare-loans
+    start_reference = start_investering(start_capital, request.referenceOwnContribution,
+                                        (investment.refInvestCapital or None) if investment else None)
+    start_alternative = start_investering(start_capital, request.alternativeOwnContribution,
+                                          (investment.altInvestCapital or None) if investment else None)
+    try:
+        with stage("backtest"):
+            result = backtest_vergelijking(
+                batch_loan_inputs(request.referenceLoan),
+                batch_loan_inputs(request.alternativeLoan, request.modularSchedule),
+                returns,
+                start_referentie=start_reference,
+                start_alternatief=start_alternative,
+            )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    with stage("serialization"):
+        months = result["maanden"]
+        net_worth = result["netto_vermogen"]
+        windows = len(net_worth)
+        percentiles = sorted(request.percentiles)
+
+        def window(i):
+            return {
+                "start": labels[i] if labels else i,
+                "end": labels[i + months - 1] if labels else i + months - 1,
+                "netWorthEndOfTerm": rounded(net_worth[i]),
+                "advantageOverReference": rounded(result["voordeel"][i]),
+                "annualizedReturn": rounded(result["jaarrendement"][i] * 100, 4),  # Convert to percentage
+                "coveredRepayment": bool(result["gedekt"][i]),
+                "shortfall": rounded(result["tekort"][i]),
+            }
+
+        # Net worth at every year end over all windows
+        remaining = result["alternatief"]["remainingPrincipal"][0, 11:months:12]
+        yearly = result["investering"][:, 11::12] - remaining[None, :]
+        bands = np.percentile(yearly, percentiles, axis=0)
+        response = {
+            "source": source,
+            "synthetic": synthetic,
+            "termMonths": months,
+            "windows": windows,
+            "startInvestment": rounded(start_alternative),
+            "netWorthEndOfTerm": distribution(net_worth, percentiles),
+            "advantageOverReference": distribution(result["voordeel"], percentiles),
+            "coverageRate": rounded(result["gedekt"].mean(), 4),
+            "worstWindow": window(int(np.argmin(net_worth))),
+            "bestWindow": window(int(np.argmax(net_worth))),
+            "annualNetWorthBands": [
+                {"year": year + 1, **{f"p{p:g}": rounded(bands[j, year]) for j, p in enumerate(percentiles)}}
+                for year in range(yearly.shape[1])
+            ],
+        }
+        if synthetic:
+            response["warning"] = SYNTHETIC_WARNING
+        if request.includeWindows:
+            response["windowResults"] = [window(i) for i in range(windows)]
+    return response
@@ -0,0 +1,101 @@
+import time
+
+from fastapi import APIRouter, HTTPException, Request
+from typing import List, Optional
+from pydantic import BaseModel
+import numpy as np
+
+from .main import LoanParameters, LoanType, ModularLoanSchedule, reject_insurance_simulations, run_calculation
+from batch_engine import simuleer_leningen_batch
+from break_even import bereken_break_even_oppervlak
+from calculation_functions import INVESTMENT_BALANCE
+from profiling import stage
+
+router = APIRouter()
+
+
+class BreakEvenSurfaceRequest(BaseModel):
+    referenceLoan: LoanParameters
+    alternativeLoanType: LoanType = LoanType.BULLET
+    # Grid axes of the alternative loan; rates in percent
+    alternativeInterestRates: List[float]
+    alternativeTermYears: List[int]
+    alternativeOwnContributions: List[float]
+    # Repayments of a modular alternative (shared by every grid point)
+    modularSchedule: Optional[ModularLoanSchedule] = None
+    # Repayments of a modular reference loan; a bullet reference without one repays at the end of its term
+    referenceSchedule: Optional[ModularLoanSchedule] = None
+    startCapital: Optional[float] = INVESTMENT_BALANCE
+    # Overrides startCapital - own contribution as the alternative's initial investment
+    altInvestCapital: Optional[float] = None
+
+
+@router.post("/break-even-surface")
+async def break_even_surface(request: BreakEvenSurfaceRequest, http_request: Request):
+    """
+    Minimum annual investment return (percent) that lets the alternative loan's investment
+    reach its principal at the end of its term, as ``minimumRequiredGrowthRate`` on
+    /api/compare-loans, for every alternative rate x term x own contribution.
+    ``surface[i][j][k]`` belongs to rate i, term j and own contribution k; ``None`` where
+    no return between -46% and +214% a year suffices (the search interval of the
+    single-comparison solver).
+    """
+    return await run_calculation(http_request, break_even_surface_result, request)
+
+
+def break_even_surface_result(request: BreakEvenSurfaceRequest):
+    ref = request.referenceLoan
+    reject_insurance_simulations(ref)
+    if not (request.alternativeInterestRates and request.alternativeTermYears and request.alternativeOwnContributions):
+        raise HTTPException(status_code=400, detail="Every grid axis needs at least one value")
+    alt_type = request.alternativeLoanType.value
+    schedule_tuples = None
+    if request.modularSchedule and alt_type in ["bullet", "modular"]:
+        schedule_tuples = [(item.month, item.amount) for item in request.modularSchedule.schedule]
+    if alt_type == "modular" and not schedule_tuples:
+        raise HTTPException(status_code=400, detail="Modular loan schedule required for modular loans")
+    ref_schedule = None
+    if ref.loanType != LoanType.ANNUITY and request.referenceSchedule:
+        ref_schedule = [(item.month, item.amount) for item in request.referenceSchedule.schedule]
+    if ref.loanType == LoanType.MODULAR and not ref_schedule:
+        raise HTTPException(status_code=400, detail="referenceSchedule required for a modular reference loan")
+
+    try:
+        start = time.perf_counter()
+        with stage("reference_loan"):
+            reference = simuleer_leningen_batch(
+                max(ref.purchasePrice - ref.ownContribution, 0), ref.interestRate / 100, ref.termYears,
+                ref.loanType.value, ref_schedule, uitstel_maanden=ref.delayMonths,
+                start_jaar_kalender=ref.startYear, schuldsaldo_dekking_pct=ref.insuranceCoveragePct,
+            )
+        with stage("min_growth_solve"):
+            surface = bereken_break_even_oppervlak(
+                reference["totalMonthlyPayment"][0],
+                ref.purchasePrice,
+                [rate / 100 for rate in request.alternativeInterestRates],  # Convert from percentage to decimal
+                request.alternativeTermYears,
+                request.alternativeOwnContributions,
+                alt_loan_type=alt_type,
+                aflossings_schema=schedule_tuples,
+                start_kapitaal_totaal=request.startCapital or 0,
+                invest_kapitaal_alternatief=request.altInvestCapital,
+                start_jaar_kalender=ref.startYear,
+                schuldsaldo_dekking_pct=ref.insuranceCoveragePct,
+            )
+        solve_ms = (time.perf_counter() - start) * 1000
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    with stage("serialization"):
+        rates = np.round(surface["annualRate"] * 100, 4)
+        grid = np.where(surface["converged"], rates, None).tolist()
+    return {
+        "alternativeInterestRates": request.alternativeInterestRates,
+        "alternativeTermYears": request.alternativeTermYears,
+        "alternativeOwnContributions": request.alternativeOwnContributions,
+        "minimumRequiredGrowthRate": grid,
+        "solvedCount": int(surface["converged"].sum()),
+        "problemCount": int(surface["converged"].size),
+        "maxIterations": int(surface["iterations"].max(initial=0)),
+        "solveTimeMs": round(solve_ms, 3),
+    }
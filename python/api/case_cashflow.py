@@ -0,0 +1,145 @@
+from fastapi import APIRouter, HTTPException, Request
+from typing import Dict, List, Optional
+from pydantic import BaseModel
+
+from .main import LoanParameters, ModularLoanSchedule, batch_loan_inputs, run_calculation
+from case_cashflow import CASHFLOW_COLUMNS, bereken_case_kasstroom
+from profiling import stage
+
+router = APIRouter()
+
+
+class CaseCashflowLoan(BaseModel):
+    id: Optional[str] = None
+    # Case the loan belongs to; loans of linked cases are reported per case
+    caseId: Optional[str] = None
+    params: LoanParameters
+    modularSchedule: Optional[ModularLoanSchedule] = None
+    clientIds: List[str] = []
+    # Share of the loan per client in percent; defaults to an even split over clientIds
+    clientSharesPct: Optional[Dict[str, float]] = None
+
+
+class CaseCashflowRequest(BaseModel):
+    loans: List[CaseCashflowLoan]
+    # Clients to report on; loans without clients are split evenly over them
+    clientIds: Optional[List[str]] = None
+    includeMonthlyData: bool = True
+
+
+def loan_inputs(loan: CaseCashflowLoan):
+    try:
+        return batch_loan_inputs(loan.params, loan.modularSchedule)
+    except HTTPException as e:
+        # Name the loan: a case has several
+        if loan.id:
+            e.detail = f"Loan {loan.id}: {e.detail}"
+        raise
+
+
+def series(values, decimals=2):
+    return [round(float(v), decimals) for v in values]
+
+
+def annual_rows(annual, index=None):
+    pick = (lambda column: annual[column]) if index is None else (lambda column: annual[column][index])
+    return [
+        {"calendarYear": int(year), **{column: round(float(pick(column)[i]), 2) for column in CASHFLOW_COLUMNS}}
+        for i, year in enumerate(annual["jaar"])
+    ]
+
+
+@router.post("/case-cashflow")
+async def case_cashflow(request: CaseCashflowRequest, http_request: Request):
+    """
+    Household cash flow of all loans of a case (and linked cases) on one calendar-month axis:
+    total payment, interest, insurance and remaining debt per month and per year, the
+    peak-payment month, and per-client and per-case totals.
+    """
+    return await run_calculation(http_request, case_cashflow_result, request)
+
+
+def case_cashflow_result(request: CaseCashflowRequest):
+    if not request.loans:
+        raise HTTPException(status_code=400, detail="Provide at least one loan")
+    inputs = [loan_inputs(loan) for loan in request.loans]
+    client_shares = [
+        loan.clientSharesPct or {client_id: 1.0 for client_id in loan.clientIds}
+        for loan in request.loans
+    ]
+    has_clients = bool(request.clientIds) or any(client_shares)
+    case_ids = [loan.caseId for loan in request.loans] if any(loan.caseId for loan in request.loans) else None
+
+    try:
+        with stage("amortization"):
+            result = bereken_case_kasstroom(
+                inputs,
+                klant_aandelen=client_shares if has_clients else None,
+                klant_ids=request.clientIds,
+                case_ids=case_ids,
+            )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    with stage("serialization"):
+        cashflow = result["kasstroom"]
+        total = result["totaal"]
+        peak = result["piek"]
+        loans = []
+        for i, loan in enumerate(request.loans):
+            start, end = int(cashflow["start_index"][i]), int(cashflow["eind_index"][i])
+            loans.append({
+                "id": loan.id,
+                "caseId": loan.caseId,
+                "startMonthIndex": start,
+                "endMonthIndex": end - 1,
+                "totalPayment": round(float(cashflow["totalMonthlyPayment"][i].sum()), 2),
+                "totalInterest": round(float(cashflow["interest"][i].sum()), 2),
+                "totalInsurance": round(float(cashflow["insurancePremium"][i].sum()), 2),
+            })
+        household_total = float(total["totalMonthlyPayment"].sum())
+        response = {
+            "startYear": int(cashflow["start_jaar"]),
+            "months": len(cashflow["kalender_jaar"]),
+            "annualData": annual_rows(result["jaarlijks"]),
+            "peakPayment": {
+                "monthIndex": peak["index"],
+                "calendarYear": peak["kalender_jaar"],
+                "calendarMonth": peak["kalender_maand"],
+                "totalMonthlyPayment": round(peak["bedrag"], 2),
+                "activeLoans": int(result["actieve_leningen"][peak["index"]]),
+            },
+            "totals": {
+                "totalPayment": round(household_total, 2),
+                "totalInterest": round(float(total["interest"].sum()), 2),
+                "totalInsurance": round(float(total["insurancePremium"].sum()), 2),
+                "totalPrincipal": round(float(total["principalPayment"].sum()), 2),
+                "maxDebt": round(float(total["remainingPrincipal"].max()), 2),
+            },
+            "loans": loans,
+        }
+        if request.includeMonthlyData:
+            response["monthlyData"] = {
+                "calendarYear": cashflow["kalender_jaar"].tolist(),
+                "calendarMonth": cashflow["kalender_maand"].tolist(),
+                "activeLoans": result["actieve_leningen"].tolist(),
+                **{column: series(total[column]) for column in CASHFLOW_COLUMNS},
+            }
+        for key, label, field in (("klanten", "perClient", "clientId"), ("cases", "perCase", "caseId")):
+            if key not in result:
+                continue
+            group = result[key]
+            rows = []
+            for i, group_id in enumerate(group["ids"]):
+                payments = group["reeksen"]["totalMonthlyPayment"][i]
+                group_total = float(payments.sum())
+                rows.append({
+                    field: group_id,
+                    "totalPayment": round(group_total, 2),
+                    "sharePct": round(group_total / household_total * 100, 2) if household_total else 0.0,
+                    "peakMonthlyPayment": round(float(payments.max()), 2),
+                    "loanSharesPct": series(group["aandelen"][i] * 100),
+                    "annualData": annual_rows(group["jaarlijks"], i),
+                })
+            response[label] = rows
+    return response
@@ -0,0 +1,231 @@
+from typing import List, Optional
+
+import numpy as np
+from fastapi import APIRouter, HTTPException, Request
+from pydantic import BaseModel
+
+from .main import InvestmentParameters, LoanParameters, ModularLoanSchedule, batch_loan_inputs, rounded, run_calculation
+from compare_many import RANGSCHIKKING, jaarlijkse_verschillen, start_investering, vergelijk_alternatieven
+from profiling import stage
+
+router = APIRouter()
+
+
+class CompareManyAlternative(BaseModel):
+    id: Optional[str] = None
+    loan: LoanParameters
+    modularSchedule: Optional[ModularLoanSchedule] = None
+    # Own contribution for the investment start capital; defaults to the loan's ownContribution
+    ownContribution: Optional[float] = None
+    # Overrides investmentParams.altInvestCapital for this alternative
+    investCapital: Optional[float] = None
+
+
+class PortfolioAsset(BaseModel):
+    name: str
+    annualReturn: float
+    # Target share of the portfolio; normalized over all assets
+    weight: float
+    # Running cost per year (e.g. fund fees), in percent of the holding
+    annualCost: float = 0
+    # Tax on positive returns, in percent
+    taxRate: float = 0
+
+
+class PortfolioParameters(BaseModel):
+    assets: List[PortfolioAsset]
+    # Back to the target weights every this many months; 0 never rebalances
+    rebalanceMonths: int = 12
+    # Asset names to sell first when the payment difference is negative; defaults to the order of assets
+    withdrawalOrder: Optional[List[str]] = None
+
+
+class CompareManyRequest(BaseModel):
+    referenceLoan: LoanParameters
+    referenceOwnContribution: float
+    alternatives: List[CompareManyAlternative]
+    investmentParams: Optional[InvestmentParameters] = None
+    # netWorthEndOfTerm, totalCostDifference, totalLoanCosts or minimumRequiredGrowthRate;
+    # defaults to netWorthEndOfTerm with investmentParams, else totalCostDifference
+    rankBy: Optional[str] = None
+    # Monthly investment path and annual differences per alternative
+    includeDetail: bool = False
+    # Invest the payment difference in several assets instead of at investmentParams.annualGrowthRate
+    portfolio: Optional[PortfolioParameters] = None
+
+
+def loan_summary(schedule, index, months):
+    payments = schedule["totalMonthlyPayment"][index, :months]
+    interest = schedule["cumulativeInterestPaid"][index, months - 1]
+    insurance = schedule["cumulativeInsurancePaid"][index, months - 1]
+    return {
+        "firstMonthlyPayment": rounded(payments[0]),
+        "maxMonthlyPayment": rounded(payments.max()),
+        "medianMonthlyPayment": rounded(np.median(payments)),
+        "totalInterestPaid": rounded(interest),
+        "totalInsurancePaid": rounded(insurance),
+        "totalLoanCosts": rounded(interest + insurance),
+    }
+
+
+def rank(rows, criterion):
+    """Rank rows in place by ``criterion``; rows without a value come last, ties keep input order."""
+    higher_first = RANGSCHIKKING[criterion]
+    order = sorted(
+        range(len(rows)),
+        key=lambda i: (rows[i][criterion] is None,
+                       0 if rows[i][criterion] is None else (-rows[i][criterion] if higher_first else rows[i][criterion])),
+    )
+    for position, i in enumerate(order, start=1):
+        rows[i]["rank"] = position
+    return [rows[i] for i in order]
+
+
+def portfolio_inputs(portfolio: PortfolioParameters):
+    if not portfolio.assets:
+        raise HTTPException(status_code=400, detail="Provide at least one portfolio asset")
+    names = [asset.name for asset in portfolio.assets]
+    if len(set(names)) != len(names):
+        raise HTTPException(status_code=400, detail="Portfolio asset names must be unique")
+    order = portfolio.withdrawalOrder or names
+    if sorted(order) != sorted(names):
+        raise HTTPException(status_code=400, detail="withdrawalOrder must list every portfolio asset once")
+    if portfolio.rebalanceMonths < 0:
+        raise HTTPException(status_code=400, detail="rebalanceMonths cannot be negative")
+    # Convert from percentages to decimals
+    return {
+        "rendementen": [(1 + asset.annualReturn / 100) ** (1 / 12) - 1 for asset in portfolio.assets],
+        "gewichten": [asset.weight for asset in portfolio.assets],
+        "kosten": [asset.annualCost / 100 for asset in portfolio.assets],
+        "belasting": [asset.taxRate / 100 for asset in portfolio.assets],
+        "herbalanceer_maanden": portfolio.rebalanceMonths,
+        "opname_volgorde": [names.index(name) for name in order],
+    }
+
+
+@router.post("/compare-many")
+async def compare_many(request: CompareManyRequest, http_request: Request):
+    """
+    Compare one reference loan with many alternatives in one request: the reference is
+    computed once and all alternatives are evaluated together (costs, investment paths,
+    net worth and minimum required growth rate). Returns the alternatives ranked by ``rankBy``.
+    """
+    return await run_calculation(http_request, compare_many_result, request)
+
+
+def compare_many_result(request: CompareManyRequest):
+    if not request.alternatives:
+        raise HTTPException(status_code=400, detail="Provide at least one alternative")
+    investment = request.investmentParams
+    rank_by = request.rankBy or ("netWorthEndOfTerm" if investment else "totalCostDifference")
+    if rank_by not in RANGSCHIKKING:
+        raise HTTPException(status_code=400, detail=f"Unknown rankBy '{rank_by}'; use one of {list(RANGSCHIKKING)}")
+    if rank_by in ("netWorthEndOfTerm", "minimumRequiredGrowthRate") and not investment:
+        raise HTTPException(status_code=400, detail=f"rankBy '{rank_by}' requires investmentParams")
+    if request.portfolio and not investment:
+        raise HTTPException(status_code=400, detail="portfolio requires investmentParams")
+
+    reference = batch_loan_inputs(request.referenceLoan)
+    alternatives = [batch_loan_inputs(alternative.loan, alternative.modularSchedule) for alternative in request.alternatives]
+
+    kwargs = {}
+    if investment:
+        start_capital = investment.startCapital or 0
+        annual_growth_rate = investment.annualGrowthRate or 0
+        # Explicit capitals of 0 fall back to the start capital, as in /api/compare-loans
+        kwargs = dict(
+            maandgroei=(1 + annual_growth_rate / 100) ** (1 / 12) - 1,
+            start_referentie=start_investering(start_capital, request.referenceOwnContribution,
+                                               investment.refInvestCapital or None),
+            start_alternatieven=[
+                start_investering(
+                    start_capital,
+                    alternative.ownContribution if alternative.ownContribution is not None else alternative.loan.ownContribution,
+                    alternative.investCapital if alternative.investCapital is not None else (investment.altInvestCapital or None),
+                )
+                for alternative in request.alternatives
+            ],
+            # Target of the min-growth solve: the alternative's principal, as in /api/compare-loans
+            doelbedragen=[alternative.loan.principal for alternative in request.alternatives],
+        )
+        if request.portfolio:
+            kwargs["portefeuille"] = portfolio_inputs(request.portfolio)
+
+    try:
+        with stage("batch_comparison"):
+            result = vergelijk_alternatieven(reference, alternatives, **kwargs)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    with stage("serialization"):
+        reference_schedule = result["referentie"]
+        alternative_schedule = result["alternatieven"]
+        months = alternative_schedule["maanden"]
+        rows = []
+        for i, alternative in enumerate(request.alternatives):
+            row = {
+                "id": alternative.id if alternative.id is not None else str(i),
+                "rank": None,
+                "loanType": alternative.loan.loanType.value,
+                "interestRate": alternative.loan.interestRate,
+                "termYears": alternative.loan.termYears,
+                **loan_summary(alternative_schedule, i, int(months[i])),
+                "totalCostDifference": rounded(result["kostenverschil"][i]),
+                "netWorthEndOfTerm": None,
+                "minimumRequiredGrowthRate": None,
+                "startInvestment": None,
+            }
+            if investment:
+                row.update(
+                    netWorthEndOfTerm=rounded(result["netto_vermogen"][i]),
+                    minimumRequiredGrowthRate=rounded(result["min_groei"][i] * 100, 4),  # Convert to percentage
+                    startInvestment=rounded(result["start_investering"][i]),
+                )
+            if request.portfolio:
+                last = int(months[i]) - 1
+                row.update(
+                    assetBalancesEndOfTerm={asset.name: rounded(result["posities"][i, a, last])
+                                            for a, asset in enumerate(request.portfolio.assets)},
+                    # Negative payment differences the holdings could not cover
+                    investmentShortfall=rounded(result["tekort"][i, :last + 1].sum()),
+                )
+            rows.append(row)
+
+        response = {
+            "reference": loan_summary(reference_schedule, 0, int(reference_schedule["maanden"][0])),
+            "rankBy": rank_by,
+            "ranking": rank(list(rows), rank_by),
+        }
+        if request.includeDetail:
+            years = int(max(months.max(), reference_schedule["maanden"][0]) // 12)
+            differences = jaarlijkse_verschillen(reference_schedule, alternative_schedule, years)
+            details = []
+            for i, row in enumerate(rows):
+                term = int(months[i])
+                detail = {
+                    "id": row["id"],
+                    "annualDifferences": [
+                        {"year": year + 1, **{column: rounded(values[i, year]) for column, values in differences.items()}}
+                        for year in range(years)
+                    ],
+                    "monthlyData": {
+                        "month": list(range(1, term + 1)),
+                        "totalMonthlyPayment": [rounded(v) for v in alternative_schedule["totalMonthlyPayment"][i, :term]],
+                        "remainingPrincipal": [rounded(v) for v in alternative_schedule["remainingPrincipal"][i, :term]],
+                    },
+                }
+                if investment:
+                    balance = result["investering"][i, :term]
+                    detail["monthlyData"].update(
+                        monthlyContribution=[rounded(v) for v in result["bijdragen"][i, :term]],
+                        investmentBalance=[rounded(v) for v in balance],
+                        netWorth=[rounded(v) for v in balance - alternative_schedule["remainingPrincipal"][i, :term]],
+                    )
+                if request.portfolio:
+                    detail["monthlyData"]["assetBalances"] = {
+                        asset.name: [rounded(v) for v in result["posities"][i, a, :term]]
+                        for a, asset in enumerate(request.portfolio.assets)
+                    }
+                details.append(detail)
+            response["alternatives"] = details
+    return response
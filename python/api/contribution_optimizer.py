@@ -0,0 +1,145 @@
+from typing import List, Optional
+
+from fastapi import APIRouter, HTTPException, Request
+from pydantic import BaseModel
+
+from .main import InvestmentParameters, LoanParameters, LoanType, batch_loan_inputs, rounded, run_calculation
+from calculation_functions import INVESTMENT_BALANCE
+from config import settings
+from contribution_optimizer import NETTO_VERMOGEN, TOTALE_KOSTEN, optimaliseer_eigen_inbreng
+from multi_client_calculation import DEBT_RATIO_MODERATE
+from profiling import stage
+
+router = APIRouter()
+
+OBJECTIVES = {"netWorthEndOfTerm": NETTO_VERMOGEN, "totalLoanCosts": TOTALE_KOSTEN}
+
+
+class LoanProduct(BaseModel):
+    id: Optional[str] = None
+    loanType: LoanType
+    termYears: int
+    # Defaults to the loan's interest rate
+    interestRate: Optional[float] = None
+
+
+class OwnContributionRequest(BaseModel):
+    # Purchase price, rate, start year and insurance of the loan; principal and ownContribution follow the search
+    loan: LoanParameters
+    # Products to search over; defaults to the loan's own type and term
+    products: List[LoanProduct] = []
+    # The candidates invest their payment difference with this loan (defaults to the loan as given)
+    referenceLoan: Optional[LoanParameters] = None
+    investmentParams: Optional[InvestmentParameters] = None
+    objective: Optional[str] = None
+    minOwnContribution: float = 0
+    # Defaults to investmentParams.startCapital (INVESTMENT_BALANCE without it), at most the purchase price
+    maxOwnContribution: Optional[float] = None
+    # Enables the debt-ratio constraint on the highest monthly payment
+    monthlyIncome: Optional[float] = None
+    maxDebtRatio: float = DEBT_RATIO_MODERATE
+    gridPoints: int = 21
+    refinements: int = 3
+    # Stop refining once the grid step is below this amount (euro)
+    tolerance: float = 100
+    # Return every evaluated candidate next to the optimum
+    includeFrontier: bool = True
+
+
+@router.post("/optimize-own-contribution")
+async def optimize_own_contribution(request: OwnContributionRequest, http_request: Request):
+    """
+    Split the available capital between own contribution and investment (optionally across loan
+    types and terms) to maximize net worth at the end of the term or minimize the loan costs,
+    within a debt-ratio limit. Candidates are evaluated in batches on a coarse-to-fine grid.
+    """
+    return await run_calculation(http_request, optimize_own_contribution_result, request)
+
+
+def optimize_own_contribution_result(request: OwnContributionRequest):
+    investment = request.investmentParams
+    objective = request.objective or ("netWorthEndOfTerm" if investment else "totalLoanCosts")
+    if objective not in OBJECTIVES:
+        raise HTTPException(status_code=400, detail=f"Unknown objective '{objective}'; use one of {list(OBJECTIVES)}")
+    if objective == "netWorthEndOfTerm" and not investment:
+        raise HTTPException(status_code=400, detail="objective 'netWorthEndOfTerm' requires investmentParams")
+    products = request.products or [LoanProduct(loanType=request.loan.loanType, termYears=request.loan.termYears)]
+    if any(product.loanType == LoanType.MODULAR for product in products):
+        raise HTTPException(status_code=400, detail="Modular loans cannot follow a changing principal; use annuity or bullet")
+    if len(products) * request.gridPoints > settings.optimizer_max_candidates:
+        raise HTTPException(status_code=400,
+                            detail=f"At most {settings.optimizer_max_candidates} products x gridPoints per request")
+
+    loan = batch_loan_inputs(request.loan)
+    candidates = []
+    for product in products:
+        candidate = dict(loan, loan_type=product.loanType.value, looptijd_jaren=product.termYears,
+                         # A bullet without a schedule repays whatever principal the candidate borrows
+                         aflossings_schema=None,
+                         uitstel_maanden=loan["uitstel_maanden"] if product.loanType == LoanType.ANNUITY else 0)
+        if product.interestRate is not None:
+            candidate["jaarlijkse_rentevoet"] = product.interestRate / 100  # Convert from percentage to decimal
+        del candidate["hoofdsom"]
+        candidates.append(candidate)
+    reference = batch_loan_inputs(request.referenceLoan or request.loan)
+    # Capital to split between the purchase and the investment, as in simuleer_met_investering
+    start_capital = investment.startCapital if investment and investment.startCapital is not None else INVESTMENT_BALANCE
+    monthly_growth = None
+    if investment:
+        monthly_growth = (1 + (investment.annualGrowthRate or 0) / 100) ** (1 / 12) - 1
+
+    try:
+        with stage("optimization"):
+            result = optimaliseer_eigen_inbreng(
+                reference,
+                candidates,
+                request.loan.purchasePrice,
+                start_capital,
+                inbreng_min=request.minOwnContribution,
+                inbreng_max=request.maxOwnContribution,
+                maandgroei=monthly_growth,
+                doel=OBJECTIVES[objective],
+                maandinkomen=request.monthlyIncome,
+                max_schuldratio=request.maxDebtRatio,
+                rasterpunten=request.gridPoints,
+                verfijningen=request.refinements,
+                tolerantie=request.tolerance,
+            )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    with stage("serialization"):
+        evaluations = result["evaluaties"]
+        ids = [product.id or f"{product.loanType.value}-{product.termYears}" for product in products]
+
+        def row(i):
+            p = int(evaluations["product"][i])
+            return {
+                "product": ids[p],
+                "loanType": products[p].loanType.value,
+                "termYears": products[p].termYears,
+                "round": int(evaluations["ronde"][i]),
+                "ownContribution": rounded(evaluations["eigen_inbreng"][i]),
+                "principal": rounded(evaluations["hoofdsom"][i]),
+                "startInvestment": rounded(evaluations["start_investering"][i]),
+                "totalLoanCosts": rounded(evaluations["totale_kosten"][i]),
+                "maxMonthlyPayment": rounded(evaluations["max_betaling"][i]),
+                "debtRatio": rounded(evaluations["schuldratio"][i]),
+                "feasible": bool(evaluations["haalbaar"][i]),
+                "netWorthEndOfTerm": rounded(evaluations["netto_vermogen"][i]) if investment else None,
+                "minimumRequiredGrowthRate": rounded(evaluations["min_groei"][i] * 100, 4)  # Convert to percentage
+                if investment else None,
+            }
+
+        response = {
+            "objective": objective,
+            "optimum": row(result["optimum"]) if result["optimum"] >= 0 else None,
+            "bestPerProduct": [row(i) if i >= 0 else {"product": ids[p], "feasible": False}
+                               for p, i in enumerate(result["beste"])],
+            "evaluations": len(evaluations["product"]),
+        }
+        if request.includeFrontier:
+            order = sorted(range(len(evaluations["product"])),
+                           key=lambda i: (evaluations["product"][i], evaluations["eigen_inbreng"][i]))
+            response["frontier"] = [row(i) for i in order]
+    return response
@@ -0,0 +1,197 @@
+import cProfile
+import functools
+import logging
+import random
+import threading
+import time
+
+from fastapi import HTTPException, Request
+from fastapi.responses import FileResponse, PlainTextResponse
+from fastapi.routing import APIRouter
+
+from config import settings, CpuProfiler, MemoryProfilingMode
+from profiling import (
+    MEMORY_PROFILES,
+    CpuProfileSession,
+    CpuProfileStore,
+    cpu_profile_session,
+    load_sampling_profiler,
+    profile_memory,
+    pyinstrument_to_collapsed,
+    stop_cpu_profiler,
+)
+
+logger = logging.getLogger("loanlogic.profiling")
+
+router = APIRouter()
+
+MEMORY_PROFILE_HEADER = "x-memory-profile"
+TRUTHY_HEADER_VALUES = ("1", "true", "yes", "on")
+# Downloading profiles or scraping metrics should not produce (and rotate away) profiles itself
+UNPROFILED_PATH_PREFIXES = ("/debug", "/metrics")
+
+MEMORY_PROFILES.resize(settings.memory_profile_history)
+
+cpu_profile_store = CpuProfileStore(settings.cpu_profile_dir, max_files=settings.cpu_profile_max_files)
+# A thread can only run one profiler at a time; overlapping requests are simply not profiled
+_cpu_profile_lock = threading.Lock()
+
+
+def memory_profiling_requested(request: Request) -> bool:
+    mode = settings.memory_profiling
+    if mode == MemoryProfilingMode.ALWAYS:
+        return True
+    if mode == MemoryProfilingMode.HEADER:
+        return request.headers.get(MEMORY_PROFILE_HEADER, "").lower() in TRUTHY_HEADER_VALUES
+    return False
+
+
+async def memory_profile_middleware(request: Request, call_next):
+    """Trace allocations per calculation stage for requests that opt in (header or global config)."""
+    if not memory_profiling_requested(request):
+        return await call_next(request)
+
+    start = time.perf_counter()
+    with profile_memory(
+        f"{request.method} {request.url.path}",
+        top_n=settings.memory_profile_top_n,
+        frames=settings.memory_profile_frames,
+    ) as profile:
+        response = await call_next(request)
+    profile.metadata["status"] = response.status_code
+
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    if elapsed_ms >= settings.slow_request_ms:
+        logger.warning("Slow request %s took %.0f ms (memory profile %s): %s",
+                       profile.name, elapsed_ms, profile.id, profile.summary())
+
+    response.headers["X-Memory-Profile-Id"] = profile.id
+    response.headers["X-Memory-Peak-Bytes"] = str(profile.peak_bytes)
+    return response
+
+
+def _without_allocations(profile):
+    data = profile.to_dict()
+    data["stages"] = [{k: v for k, v in s.items() if k != "topAllocations"} for s in data["stages"]]
+    return data
+
+
+@router.get("/memory-profiles")
+async def list_memory_profiles(limit: int = 20):
+    """Most recent memory profiles (newest first) without allocation details."""
+    return [_without_allocations(profile) for profile in MEMORY_PROFILES.list()[:limit]]
+
+
+@router.get("/memory-profiles/{profile_id}")
+async def get_memory_profile(profile_id: str):
+    profile = MEMORY_PROFILES.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail=f"Memory profile {profile_id} not found")
+    return profile.to_dict()
+
+
+@router.delete("/memory-profiles")
+async def clear_memory_profiles():
+    MEMORY_PROFILES.clear()
+    return {"success": True}
+
+
+def _start_cpu_profiler(async_mode="enabled"):
+    """Start and return ``(name, profiler)`` in the calling thread according to ``settings.cpu_profiler``."""
+    if settings.cpu_profiler in (CpuProfiler.AUTO, CpuProfiler.PYINSTRUMENT):
+        sampling_profiler = load_sampling_profiler()
+        if sampling_profiler is not None:
+            profiler = sampling_profiler(async_mode=async_mode)
+            profiler.start()
+            return "pyinstrument", profiler
+        if settings.cpu_profiler == CpuProfiler.PYINSTRUMENT:
+            logger.warning("pyinstrument is not installed; falling back to cProfile")
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return "cprofile", profiler
+
+
+async def cpu_profile_middleware(request: Request, call_next):
+    """
+    Profile a sample of requests and every request slower than ``cpu_profile_slow_ms``.
+
+    Only installed when ``LOANLOGIC_CPU_PROFILING`` is enabled. The profiler of the
+    event-loop thread also sees work of requests running concurrently on the loop;
+    the calculations of this request are traced by a profiler in the calculation
+    thread (see ``CpuProfileSession``) and merged into the same profile.
+    """
+    if request.url.path.startswith(UNPROFILED_PATH_PREFIXES):
+        return await call_next(request)
+    sampled = settings.cpu_profile_sample_rate > 0 and random.random() < settings.cpu_profile_sample_rate
+    if not sampled and settings.cpu_profile_slow_ms <= 0:
+        return await call_next(request)
+    if not _cpu_profile_lock.acquire(blocking=False):
+        return await call_next(request)
+
+    try:
+        start = time.perf_counter()
+        profiler_name, profiler = _start_cpu_profiler()
+        session = CpuProfileSession(functools.partial(_start_cpu_profiler, async_mode="disabled"))
+        try:
+            with cpu_profile_session(session):
+                response = await call_next(request)
+        finally:
+            session.add(profiler_name, stop_cpu_profiler(profiler_name, profiler))
+        elapsed_ms = (time.perf_counter() - start) * 1000
+    finally:
+        _cpu_profile_lock.release()
+
+    slow = 0 < settings.cpu_profile_slow_ms <= elapsed_ms
+    if not (sampled or slow):
+        return response
+
+    metadata = {
+        "method": request.method,
+        "path": request.url.path,
+        "status": response.status_code,
+        "durationMs": round(elapsed_ms, 3),
+        "reason": "slow" if slow else "sampled",
+        "createdAt": time.time(),
+    }
+    profiles = [profile for _, profile in session.profiles]
+    if profiler_name == "cprofile":
+        profile_id = cpu_profile_store.save_cprofile(profiles, metadata)
+    else:
+        stacks = [line for profile in profiles for line in pyinstrument_to_collapsed(profile).splitlines() if line]
+        profile_id = cpu_profile_store.save_collapsed("\n".join(stacks) + "\n", metadata, profiler_name)
+    if slow:
+        logger.warning("Slow request %s %s took %.0f ms (CPU profile %s)",
+                       request.method, request.url.path, elapsed_ms, profile_id)
+    response.headers["X-Cpu-Profile-Id"] = profile_id
+    return response
+
+
+@router.get("/cpu-profiles")
+async def list_cpu_profiles(limit: int = 50):
+    """Stored CPU profiles (newest first)."""
+    return cpu_profile_store.list()[:limit]
+
+
+@router.get("/cpu-profiles/{profile_id}")
+async def download_cpu_profile(profile_id: str, format: str = "collapsed"):
+    """
+    Download a CPU profile as ``pstats`` (binary, for ``python -m pstats`` or snakeviz),
+    ``collapsed`` (for flamegraph.pl / speedscope) or ``text`` (top functions by cumulative time).
+    """
+    try:
+        metadata = cpu_profile_store.metadata(profile_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if metadata is None:
+        raise HTTPException(status_code=404, detail=f"CPU profile {profile_id} not found")
+    if format not in metadata.get("formats", []):
+        raise HTTPException(status_code=400,
+                            detail=f"Format '{format}' not available for this profile; use one of {metadata.get('formats')}")
+
+    if format == "pstats":
+        return FileResponse(cpu_profile_store.pstats_path(profile_id), media_type="application/octet-stream",
+                            filename=f"{profile_id}.prof")
+    if format == "text":
+        return PlainTextResponse(cpu_profile_store.text(profile_id))
+    return PlainTextResponse(cpu_profile_store.collapsed(profile_id),
+                             headers={"Content-Disposition": f'attachment; filename="{profile_id}.collapsed"'})
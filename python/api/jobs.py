@@ -0,0 +1,162 @@
+from collections import namedtuple
+from typing import Any, Dict, List, Optional
+
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel, ValidationError
+
+from .main import ComparisonRequest, LoanParameters, ModularLoanSchedule
+from .multi_client_loan import MultiClientLoanRequest
+from .affordability import MaxAffordableLoanRequest
+from .break_even import BreakEvenSurfaceRequest
+from .case_cashflow import CaseCashflowRequest
+from .compare_many import CompareManyRequest
+from .prepayment import PrepaymentRequest
+from .variable_rate import VariableRateLoanRequest
+from .sensitivity import SensitivityRequest
+from .contribution_optimizer import OwnContributionRequest
+from .backtest import BacktestRequest
+from config import settings
+from jobs import COMPLETED, JobManager, JobQueueFull, JobStore
+
+router = APIRouter()
+
+
+class CalculateLoanJobInput(BaseModel):
+    # Same body as POST /api/calculate-loan
+    params: LoanParameters
+    modular_schedule: Optional[ModularLoanSchedule] = None
+
+
+# model: validates one input; target: "module:function" run in the worker; arguments: input -> call arguments
+JobKind = namedtuple("JobKind", ["model", "target", "arguments"])
+
+JOB_KINDS = {
+    "calculate-loan": JobKind(CalculateLoanJobInput, "api.main:calculate_loan_result",
+                              lambda item: (item.params, item.modular_schedule)),
+    "compare-loans": JobKind(ComparisonRequest, "api.main:compare_loans_result", lambda item: (item,)),
+    "calculate-multi-client-loan": JobKind(MultiClientLoanRequest,
+                                           "api.multi_client_loan:calculate_multi_client_loan_result",
+                                           lambda item: (item,)),
+    "max-affordable-loan": JobKind(MaxAffordableLoanRequest, "api.affordability:max_affordable_loan_result",
+                                   lambda item: (item,)),
+    "break-even-surface": JobKind(BreakEvenSurfaceRequest, "api.break_even:break_even_surface_result",
+                                  lambda item: (item,)),
+    "case-cashflow": JobKind(CaseCashflowRequest, "api.case_cashflow:case_cashflow_result", lambda item: (item,)),
+    "compare-many": JobKind(CompareManyRequest, "api.compare_many:compare_many_result", lambda item: (item,)),
+    "prepayment-strategies": JobKind(PrepaymentRequest, "api.prepayment:prepayment_strategies_result",
+                                     lambda item: (item,)),
+    "variable-rate-loan": JobKind(VariableRateLoanRequest, "api.variable_rate:variable_rate_loan_result",
+                                  lambda item: (item,)),
+    "sensitivity": JobKind(SensitivityRequest, "api.sensitivity:sensitivity_result", lambda item: (item,)),
+    "optimize-own-contribution": JobKind(OwnContributionRequest,
+                                         "api.contribution_optimizer:optimize_own_contribution_result",
+                                         lambda item: (item,)),
+    "backtest": JobKind(BacktestRequest, "api.backtest:backtest_result", lambda item: (item,)),
+}
+
+
+class JobRequest(BaseModel):
+    kind: str
+    # Request bodies of the endpoint named by ``kind``; the job returns one result per input
+    inputs: List[Dict[str, Any]]
+
+
+_manager = None
+
+
+def job_manager():
+    # Created on first use: worker processes import this module and must not recover/purge the store
+    global _manager
+    if _manager is None:
+        _manager = JobManager(
+            JobStore(settings.job_dir),
+            workers=settings.job_workers,
+            retention_seconds=settings.job_retention_hours * 3600,
+            max_queued=settings.job_queue_size,
+        )
+    return _manager
+
+
+def with_progress(record):
+    total = record["total"]
+    return dict(record, progress=round(record["completed"] / total, 4) if total else 1.0)
+
+
+def get_record(job_id: str):
+    try:
+        record = job_manager().get(job_id)
+    except ValueError:
+        record = None
+    if record is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return record
+
+
+@router.post("/jobs", status_code=202)
+async def submit_job(request: JobRequest):
+    """
+    Queue a list of calculations of one kind (``calculate-loan``, ``compare-loans``,
+    ``calculate-multi-client-loan``, ``max-affordable-loan``, ``break-even-surface``,
+    ``case-cashflow``, ``compare-many``, ``prepayment-strategies``, ``variable-rate-loan``,
+    ``sensitivity``, ``optimize-own-contribution``, ``backtest``) to run in a background worker process. Poll ``GET /api/jobs/{id}`` for progress and fetch
+    ``GET /api/jobs/{id}/result`` once the state is ``completed``.
+    """
+    kind = JOB_KINDS.get(request.kind)
+    if kind is None:
+        raise HTTPException(status_code=400, detail=f"Unknown job kind '{request.kind}'; use one of {list(JOB_KINDS)}")
+    if not request.inputs:
+        raise HTTPException(status_code=400, detail="A job needs at least one input")
+    if len(request.inputs) > settings.job_max_items:
+        raise HTTPException(status_code=400, detail=f"A job accepts at most {settings.job_max_items} inputs")
+
+    items = []
+    for index, payload in enumerate(request.inputs):
+        try:
+            items.append(kind.arguments(kind.model.model_validate(payload)))
+        except ValidationError as e:
+            raise HTTPException(status_code=422, detail={"input": index, "errors": e.errors(include_url=False)})
+
+    try:
+        record = job_manager().submit(request.kind, kind.target, items)
+    except JobQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(settings.admission_retry_after_s)})
+    return with_progress(record)
+
+
+@router.get("/jobs")
+async def list_jobs(limit: int = 50):
+    """Known jobs (newest first)."""
+    return [with_progress(record) for record in job_manager().list()[:limit]]
+
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    return with_progress(get_record(job_id))
+
+
+@router.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str):
+    """One entry per input: ``{"result": ...}`` or ``{"error": {"statusCode", "detail"}}``."""
+    record = get_record(job_id)
+    if record["state"] != COMPLETED:
+        raise HTTPException(status_code=409, detail=f"Job {job_id} is {record['state']}")
+    results = job_manager().result(job_id)
+    if results is None:
+        raise HTTPException(status_code=404, detail=f"Result of job {job_id} is no longer available")
+    return {"id": job_id, "kind": record["kind"], "results": results}
+
+
+@router.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    """Cancel a queued job, or stop a running one at its next checkpoint."""
+    get_record(job_id)
+    return with_progress(job_manager().cancel(job_id))
+
+
+@router.delete("/jobs/{job_id}")
+async def delete_job(job_id: str):
+    """Delete a finished job and its result."""
+    get_record(job_id)
+    if not job_manager().delete(job_id):
+        raise HTTPException(status_code=409, detail=f"Job {job_id} is still active; cancel it first")
+    return {"deleted": job_id}
@@ -0,0 +1,217 @@
+import asyncio
+import copy
+import json
+
+import numpy as np
+from fastapi import WebSocket, WebSocketDisconnect
+from fastapi.routing import APIRouter
+
+from .main import ComparisonRequest, LoanParameters, ModularLoanSchedule
+from .scenarios import comparison_graph, loan_inputs, scenario_inputs
+from cancellation import run_cancellable
+from config import settings
+from metrics import LIVE_PATCHES, LIVE_RECALCULATIONS, LIVE_SESSIONS
+
+router = APIRouter()
+
+SESSION_MODES = ("loan", "comparison")
+
+
+def merge_patch(target, patch):
+    """JSON merge patch (RFC 7386): nested dicts are merged, ``None`` deletes a key."""
+    for key, value in patch.items():
+        if value is None:
+            target.pop(key, None)
+        elif isinstance(value, dict) and isinstance(target.get(key), dict):
+            merge_patch(target[key], value)
+        else:
+            target[key] = copy.deepcopy(value)
+    return target
+
+
+def changed_values(previous, current):
+    """Nested dict with only the entries of ``current`` that differ from ``previous``."""
+    changed = {}
+    for key, value in current.items():
+        old = previous.get(key) if isinstance(previous, dict) else None
+        if isinstance(value, dict):
+            nested = changed_values(old if isinstance(old, dict) else {}, value)
+            if nested:
+                changed[key] = nested
+        elif value != old:
+            changed[key] = value
+    return changed
+
+
+def downsample(monthly_data, fields, max_points):
+    """Evenly spaced months (always including the first and last) of the selected fields."""
+    if not monthly_data:
+        return {"month": [], **{field: [] for field in fields}}
+    indices = np.unique(np.linspace(0, len(monthly_data) - 1, min(max_points, len(monthly_data))).round().astype(int))
+    rows = [monthly_data[i] for i in indices]
+    return {field: [row.get(field) for row in rows] for field in ("month", *fields)}
+
+
+class LiveSession:
+    """
+    Parameters of one live session; every patch bumps ``version`` so stale results can be dropped.
+    A re-init continues from the previous session's version, so versions never repeat on a connection.
+    """
+
+    def __init__(self, mode, request, series=None, version=0):
+        if mode not in SESSION_MODES:
+            raise ValueError(f"mode must be one of {SESSION_MODES}")
+        self.mode = mode
+        self.request = copy.deepcopy(request)
+        self.series = series
+        self.version = version
+        self.sent_statistics = {}
+        self.sent_series = {}
+
+    def apply_patch(self, patch):
+        merge_patch(self.request, patch)
+        self.version += 1
+
+    def calculate(self, request):
+        """Evaluate ``request`` on the shared scenario graph; returns (statistics, series sources, graph result)."""
+        if self.mode == "loan":
+            params = LoanParameters.model_validate(request.get("params", {}))
+            schedule = request.get("modularSchedule")
+            schedule = ModularLoanSchedule.model_validate(schedule) if schedule else None
+            result = comparison_graph.evaluate({"reference": loan_inputs(params, schedule)}, ["reference_result"])
+            loan = result["reference_result"]
+            return {"statistics": loan["statistics"]}, {"monthlyData": loan["monthlyData"]}, result
+
+        comparison = ComparisonRequest.model_validate(request)
+        targets = None if comparison.investmentParams else ["reference_result", "alternative_result"]
+        result = comparison_graph.evaluate(scenario_inputs(comparison), targets)
+        statistics = {
+            "referenceLoan": result["reference_result"]["statistics"],
+            "alternativeLoan": result["alternative_result"]["statistics"],
+        }
+        series = {
+            "referenceLoan": result["reference_result"]["monthlyData"],
+            "alternativeLoan": result["alternative_result"]["monthlyData"],
+        }
+        if comparison.investmentParams:
+            min_growth_rate = result["min_growth"]
+            statistics["minimumRequiredGrowthRate"] = min_growth_rate * 100 if min_growth_rate is not None else None
+            statistics["comparisonStats"] = result["statistics"]
+            series["investmentSimulation"] = result["investment_result"]
+        return statistics, series, result
+
+    def update_message(self, statistics, sources, result):
+        """Message with the statistics (and downsampled series) that changed since the last push."""
+        message = {
+            "type": "result",
+            "version": self.version,
+            "statistics": changed_values(self.sent_statistics, statistics),
+            "recomputed": result.recomputed,
+        }
+        self.sent_statistics = copy.deepcopy(statistics)
+        if self.series:
+            fields = self.series.get("fields") or ["totalMonthlyPayment", "remainingPrincipal"]
+            max_points = self.series.get("maxPoints") or settings.live_series_points
+            series = {}
+            for name, monthly_data in sources.items():
+                points = downsample(monthly_data, fields, max_points)
+                if self.sent_series.get(name) != points:
+                    series[name] = self.sent_series[name] = points
+            message["series"] = series
+        return message
+
+
+@router.websocket("/live")
+async def live_calculations(websocket: WebSocket):
+    """
+    Live recalculation channel. The client sends ``{"type": "init", "mode": "loan" | "comparison",
+    "request": {...}, "series": {"maxPoints": 60, "fields": [...]}}`` followed by any number of
+    ``{"type": "patch", "patch": {...}}`` (JSON merge patches of the request). After a short debounce
+    the server recalculates the latest parameters only and pushes ``{"type": "result", ...}`` with
+    the statistics that changed. A new patch (or init) cancels the running calculation, and closing
+    the connection cancels it as well.
+    """
+    await websocket.accept()
+    LIVE_SESSIONS.inc()
+    session = None
+    calculation = None
+    pending = asyncio.Event()
+
+    def cancel_calculation():
+        if calculation is not None and not calculation.done():
+            calculation.cancel()
+
+    async def send(message):
+        """False when the client left; the receive loop then ends the session."""
+        try:
+            await websocket.send_json(message)
+        except WebSocketDisconnect:
+            return False
+        return True
+
+    async def recalculate():
+        nonlocal calculation
+        while True:
+            await pending.wait()
+            # Debounce: let a burst of slider patches settle and compute only the last one
+            await asyncio.sleep(settings.live_debounce_ms / 1000)
+            pending.clear()
+            version, request = session.version, copy.deepcopy(session.request)
+            calculation = asyncio.ensure_future(
+                run_cancellable(None, session.calculate, request, endpoint="live_session"))
+            try:
+                statistics, sources, result = await calculation
+            except asyncio.CancelledError:
+                if asyncio.current_task().cancelling():
+                    raise
+                # Cancelled by a newer patch; its recalculation is already pending
+                LIVE_RECALCULATIONS.inc(result="superseded")
+                continue
+            except Exception as e:
+                LIVE_RECALCULATIONS.inc(result="error")
+                if not await send({"type": "error", "version": version, "detail": str(e)}):
+                    return
+                continue
+            if version != session.version:
+                # A newer patch arrived while calculating; its recalculation is already pending
+                LIVE_RECALCULATIONS.inc(result="superseded")
+                continue
+            LIVE_RECALCULATIONS.inc(result="sent")
+            if not await send(session.update_message(statistics, sources, result)):
+                return
+
+    worker = asyncio.create_task(recalculate())
+    try:
+        while True:
+            try:
+                message = json.loads(await websocket.receive_text())
+            except json.JSONDecodeError as e:
+                await websocket.send_json({"type": "error", "detail": f"Invalid JSON: {e}"})
+                continue
+            kind = message.get("type") if isinstance(message, dict) else None
+            if kind == "init":
+                try:
+                    session = LiveSession(message.get("mode", "loan"), message.get("request") or {},
+                                          message.get("series"), version=0 if session is None else session.version + 1)
+                except ValueError as e:
+                    await websocket.send_json({"type": "error", "detail": str(e)})
+                    continue
+                cancel_calculation()
+                pending.set()
+            elif kind == "patch" and session is not None:
+                LIVE_PATCHES.inc()
+                session.apply_patch(message.get("patch") or {})
+                cancel_calculation()
+                pending.set()
+            elif kind == "close":
+                break
+            else:
+                await websocket.send_json({"type": "error", "detail": f"Unexpected message type {kind!r}"})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        # Cancelling the worker also cancels the calculation it awaits
+        worker.cancel()
+        LIVE_SESSIONS.dec()
+    if websocket.client_state.name == "CONNECTED":
+        await websocket.close()
@@ -1,4 +1,10 @@
-from fastapi import FastAPI, HTTPException
+import asyncio
+import logging
+import math
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from typing import Dict, List, Tuple, Optional, Union, Any
 from pydantic import BaseModel, Field
@@ -19,9 +25,30 @@ from calculation_functions import (
     simuleer_met_investering,
     bereken_min_groei_voor_betaling
 )
+from batch_engine import lening_invoer
+from cancellation import run_cancellable, ComputationCancelled, CLIENT_CLOSED_REQUEST, CALCULATION_EXECUTOR
+from config import settings, MemoryProfilingMode
+from life_insurance import pas_premies_toe, simulatie_premies
+from metrics import record_loan
+from profiling import stage
+from warmup import warm_up
+
+logger = logging.getLogger("loanlogic.startup")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Workers are scaled up and down: pay for first-call costs before the first request
+    if settings.warmup_on_startup:
+        started = time.perf_counter()
+        steps = await asyncio.get_running_loop().run_in_executor(
+            CALCULATION_EXECUTOR, warm_up, settings.warmup_min_growth_solve)
+        logger.info("Warm-up finished in %.0f ms (%s)", (time.perf_counter() - started) * 1000,
+                    ", ".join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in steps.items()))
+    yield
 
 app = FastAPI(title="LoanLogic API", 
-              description="API for loan calculations and simulations")
+              description="API for loan calculations and simulations",
+              lifespan=lifespan)
 
 # Configure CORS - IMPORTANT: Make sure this is before any routes
 app.add_middleware(
@@ -48,7 +75,32 @@ class ModularLoanScheduleItem(BaseModel):
 class ModularLoanSchedule(BaseModel):
     schedule: List[ModularLoanScheduleItem]
 
+class InsuredClient(BaseModel):
+    age: int
+    smoker: Optional[bool] = False
+    height: Optional[float] = None  # in cm
+    weight: Optional[float] = None  # in kg
+    gender: Optional[str] = None
+
+class LifeInsuranceParameters(BaseModel):
+    # Covered fraction of the loan (0-1), as stored by the front end
+    coveragePercentage: float = 1.0
+    paymentType: str = "DISTRIBUTED"
+    basedOnRemainingCapital: bool = True
+    # Loan the simulation insures; matched against LoanParameters.id when both are set
+    loanId: Optional[str] = None
+    mortalityTable: Optional[str] = None
+
+class InsuranceSimulation(BaseModel):
+    """An InsuranceSimulation of the case, passed inline (no database access)."""
+    id: str
+    type: str = "LIFE"
+    clientId: Optional[str] = None
+    client: Optional[InsuredClient] = None
+    parameters: LifeInsuranceParameters
+
 class LoanParameters(BaseModel):
+    id: Optional[str] = None
     loanType: LoanType
     principal: float
     interestRate: float
@@ -59,6 +111,8 @@ class LoanParameters(BaseModel):
     startYear: Optional[int] = 2025
     insuranceCoveragePct: Optional[float] = 1.0
     insuranceSimulationIds: Optional[List[str]] = None
+    # Life-insurance simulations priced instead of the premium table (selected by insuranceSimulationIds when given)
+    insuranceSimulations: Optional[List[InsuranceSimulation]] = None
 
 class InvestmentParameters(BaseModel):
     startCapital: Optional[float] = None
@@ -75,6 +129,8 @@ class ComparisonRequest(BaseModel):
     modularSchedule: Optional[ModularLoanSchedule] = None
     refInsuranceSimulationIds: Optional[List[str]] = None
     altInsuranceSimulationIds: Optional[List[str]] = None
+    # Simulations of the case for both loans; the Ids above pick the ones per loan
+    insuranceSimulations: Optional[List[InsuranceSimulation]] = None
 
 # Helper functions to transform data
 def transform_monthly_data(df: pd.DataFrame) -> List[Dict[str, Any]]:
@@ -115,6 +171,9 @@ def transform_monthly_data(df: pd.DataFrame) -> List[Dict[str, Any]]:
         if "netWorth" in row:
             data["netWorth"] = float(row["netWorth"])
         
+        if "debtRatio" in row:
+            data["debtRatio"] = float(row["debtRatio"])
+        
         result.append(data)
     
     return result
@@ -192,17 +251,118 @@ def transform_statistics(stats: Dict[str, Any]) -> Dict[str, Any]:
     if "clientCount" in stats:
         result["clientCount"] = stats["clientCount"]
     
+    if "maxDebtRatio" in stats:
+        result["maxDebtRatio"] = stats["maxDebtRatio"]
+    
+    if "perClient" in stats:
+        result["perClient"] = stats["perClient"]
+    
     return result
 
+def resolve_insurance_simulations(params: LoanParameters) -> List[InsuranceSimulation]:
+    """Life-insurance simulations that apply to this loan: those named by insuranceSimulationIds, else all of them."""
+    simulations = params.insuranceSimulations or []
+    if simulations and params.insuranceSimulationIds:
+        by_id = {simulation.id: simulation for simulation in simulations}
+        unknown = [sim_id for sim_id in params.insuranceSimulationIds if sim_id not in by_id]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown insurance simulations: {unknown}")
+        simulations = [by_id[sim_id] for sim_id in params.insuranceSimulationIds]
+    return [
+        simulation for simulation in simulations
+        if simulation.type == "LIFE"
+        and (simulation.parameters.loanId is None or params.id is None or simulation.parameters.loanId == params.id)
+    ]
+
+def life_insurance_premiums(params: LoanParameters, simulations: List[InsuranceSimulation], df: pd.DataFrame) -> np.ndarray:
+    """Monthly premiums (simulations x months) of the loan schedule ``df``, priced per insured client."""
+    for simulation in simulations:
+        if simulation.client is None:
+            raise HTTPException(status_code=400, detail=f"Insurance simulation {simulation.id} needs the insured client's age")
+    try:
+        return simulatie_premies([simulation.model_dump(mode="json") for simulation in simulations], df,
+                                 params.purchasePrice - params.ownContribution)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def assign_insurance_simulations(request: ComparisonRequest):
+    """Hand the comparison's simulations and per-loan simulation ids to its two loans (in place)."""
+    if request.refInsuranceSimulationIds:
+        request.referenceLoan.insuranceSimulationIds = request.refInsuranceSimulationIds
+    if request.altInsuranceSimulationIds:
+        request.alternativeLoan.insuranceSimulationIds = request.altInsuranceSimulationIds
+    if request.insuranceSimulations:
+        for loan in (request.referenceLoan, request.alternativeLoan):
+            if loan.insuranceSimulations is None:
+                loan.insuranceSimulations = request.insuranceSimulations
+
+def reject_insurance_simulations(*holders):
+    """
+    Batch endpoints price insurance from the premium table only; refuse inline simulations
+    (on a loan or a comparison) instead of silently ignoring them.
+    """
+    if any(holder is not None and holder.insuranceSimulations for holder in holders):
+        raise HTTPException(
+            status_code=400,
+            detail="insuranceSimulations are supported by /api/calculate-loan, /api/compare-loans, "
+                   "/api/scenarios/compare-loans and /api/calculate-multi-client-loan only",
+        )
+
+def insurance_summary(params: LoanParameters, simulations: List[InsuranceSimulation], premiums: np.ndarray) -> Dict[str, Any]:
+    principal = params.purchasePrice - params.ownContribution
+    per_client: Dict[str, float] = {}
+    rows = []
+    for simulation, row in zip(simulations, premiums):
+        total = float(row.sum())
+        if simulation.clientId is not None:
+            per_client[simulation.clientId] = per_client.get(simulation.clientId, 0.0) + total
+        rows.append({
+            "id": simulation.id,
+            "clientId": simulation.clientId,
+            "paymentType": simulation.parameters.paymentType,
+            "coverageAmount": principal * simulation.parameters.coveragePercentage,
+            "firstPremium": float(row[0]),
+            "totalPremium": total,
+        })
+    return {"simulations": rows, "perClient": per_client}
+
 # API endpoints
 @app.get("/")
 async def root():
     return {"message": "LoanLogic API is running. Visit /docs for API documentation."}
 
+async def run_calculation(http_request: Request, fn, *args, **kwargs):
+    """
+    Run a synchronous calculation in the calculation pool and abort it when the client disconnects.
+    An aborted request gets an empty 499 response (the client is gone and will not read it).
+    """
+    try:
+        return await run_cancellable(http_request, fn, *args, **kwargs)
+    except ComputationCancelled:
+        return Response(status_code=CLIENT_CLOSED_REQUEST)
+
+def batch_loan_inputs(params: LoanParameters, modular_schedule: Optional[ModularLoanSchedule] = None):
+    """Keyword arguments of the batch engine for one loan (see ``batch_engine.lening_invoer``); 400 on invalid input."""
+    reject_insurance_simulations(params)
+    schedule = [(item.month, item.amount) for item in modular_schedule.schedule] if modular_schedule else None
+    try:
+        return lening_invoer(params.model_dump(exclude={"insuranceSimulations"}), schedule)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def rounded(value, decimals=2):
+    """Round for a JSON response; NaN and infinity become None."""
+    value = float(value)
+    return round(value, decimals) if math.isfinite(value) else None
+
 @app.post("/api/calculate-loan")
-async def calculate_loan(params: LoanParameters, modular_schedule: Optional[ModularLoanSchedule] = None):
+async def calculate_loan(params: LoanParameters, http_request: Request, modular_schedule: Optional[ModularLoanSchedule] = None):
+    return await run_calculation(http_request, calculate_loan_result, params, modular_schedule)
+
+def calculate_loan_result(params: LoanParameters, modular_schedule: Optional[ModularLoanSchedule] = None):
     try:
         loan_type = params.loanType.value  # Convert enum to string
+        record_loan(loan_type, params.termYears)
        
         # Convert modular schedule to the format expected by the calculation function
         schedule_tuples = []
@@ -211,16 +371,17 @@ async def calculate_loan(params: LoanParameters, modular_schedule: Optional[Modu
         
         # Call the appropriate calculation function based on loan type
         if loan_type == "annuity":
-            result_df = simuleer_klassieke_lening(
-                eigen_inbreng=params.ownContribution,
-                jaarlijkse_rentevoet=params.interestRate / 100,  # Convert from percentage to decimal
-                looptijd_jaren=params.termYears,
-                aankoopprijs=params.purchasePrice,
-                uitstel_maanden=params.delayMonths,
-                start_jaar_kalender=params.startYear,
-                schuldsaldo_dekking_pct=params.insuranceCoveragePct,
-                loan_type=loan_type
-            )
+            with stage("amortization"):
+                result_df = simuleer_klassieke_lening(
+                    eigen_inbreng=params.ownContribution,
+                    jaarlijkse_rentevoet=params.interestRate / 100,  # Convert from percentage to decimal
+                    looptijd_jaren=params.termYears,
+                    aankoopprijs=params.purchasePrice,
+                    uitstel_maanden=params.delayMonths,
+                    start_jaar_kalender=params.startYear,
+                    schuldsaldo_dekking_pct=params.insuranceCoveragePct,
+                    loan_type=loan_type
+                )
         else:  # bullet or modular
             if not schedule_tuples:
                 # For bullet loans, create a schedule with a single payment at the end
@@ -233,16 +394,17 @@ async def calculate_loan(params: LoanParameters, modular_schedule: Optional[Modu
                         detail="Modular loan schedule required for modular loans"
                     )
             
-            result_df = simuleer_modulaire_lening(
-                eigen_inbreng=params.ownContribution,
-                jaarlijkse_rentevoet=params.interestRate / 100,  # Convert from percentage to decimal
-                looptijd_jaren=params.termYears,
-                aflossings_schema=schedule_tuples,
-                aankoopprijs=params.purchasePrice,
-                start_jaar_kalender=params.startYear,
-                schuldsaldo_dekking_pct=params.insuranceCoveragePct,
-                loan_type=loan_type
-            )
+            with stage("amortization"):
+                result_df = simuleer_modulaire_lening(
+                    eigen_inbreng=params.ownContribution,
+                    jaarlijkse_rentevoet=params.interestRate / 100,  # Convert from percentage to decimal
+                    looptijd_jaren=params.termYears,
+                    aflossings_schema=schedule_tuples,
+                    aankoopprijs=params.purchasePrice,
+                    start_jaar_kalender=params.startYear,
+                    schuldsaldo_dekking_pct=params.insuranceCoveragePct,
+                    loan_type=loan_type
+                )
         
         # Handle empty result
         if result_df.empty:
@@ -252,42 +414,50 @@ async def calculate_loan(params: LoanParameters, modular_schedule: Optional[Modu
                 "statistics": transform_statistics(bereken_statistieken(pd.DataFrame(), hoofdsom=(params.purchasePrice - params.ownContribution)))
             }
             
-        # Process insurance simulation IDs if provided
-        insurance_simulation_info = []
-        if params.insuranceSimulationIds and len(params.insuranceSimulationIds) > 0:
-            # For now, we'll just add a note about insurance simulations being used
-            # In a complete implementation, we would:
-            # 1. Fetch insurance simulations from database
-            # 2. Calculate insurance premiums based on simulation parameters
-            # 3. Apply those premiums to the result_df data
-            
-            # Add insurance simulation IDs to the result
-            insurance_simulation_info = params.insuranceSimulationIds
+        # Insurance simulations passed inline replace the table premiums with premiums priced per insured client
+        insurance_simulation_info = params.insuranceSimulationIds or []
+        insurance = None
+        simulations = resolve_insurance_simulations(params)
+        if simulations:
+            with stage("life_insurance"):
+                premiums = life_insurance_premiums(params, simulations, result_df)
+                result_df = pas_premies_toe(result_df, premiums.sum(axis=0))
+                insurance = insurance_summary(params, simulations, premiums)
         
         # Generate annual data
-        annual_data = aggregeer_jaarlijks(result_df)
+        with stage("annual_aggregation"):
+            annual_data = aggregeer_jaarlijks(result_df)
 
         # Calculate statistics
-        statistics = bereken_statistieken(result_df, hoofdsom=(params.purchasePrice - params.ownContribution))
+        with stage("statistics"):
+            statistics = bereken_statistieken(result_df, hoofdsom=(params.purchasePrice - params.ownContribution))
         
         # Transform data to the expected API response format
-        response = {
-            "monthlyData": transform_monthly_data(result_df),
-            "annualData": transform_annual_data(annual_data),
-            "statistics": transform_statistics(statistics)
-        }
+        with stage("serialization"):
+            response = {
+                "monthlyData": transform_monthly_data(result_df),
+                "annualData": transform_annual_data(annual_data),
+                "statistics": transform_statistics(statistics)
+            }
         
         # Add insurance simulation info if provided
         if insurance_simulation_info:
             response["insuranceSimulationIds"] = insurance_simulation_info
+        if insurance:
+            response["insurance"] = insurance
             
         return response
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/compare-loans")
-async def compare_loans(request: ComparisonRequest):
+async def compare_loans(request: ComparisonRequest, http_request: Request):
+    return await run_calculation(http_request, compare_loans_result, request)
+
+def compare_loans_result(request: ComparisonRequest):
     try:
         # Create ModularLoanSchedule with a single payment for bullet loans
         if request.alternativeLoan.loanType == LoanType.BULLET and not request.modularSchedule:
@@ -297,18 +467,16 @@ async def compare_loans(request: ComparisonRequest):
                 schedule=[ModularLoanScheduleItem(month=last_month, amount=request.alternativeLoan.principal)]
             )
         
-        # Set insurance simulation IDs for the reference and alternative loans if provided
-        if request.refInsuranceSimulationIds:
-            request.referenceLoan.insuranceSimulationIds = request.refInsuranceSimulationIds
-            
-        if request.altInsuranceSimulationIds:
-            request.alternativeLoan.insuranceSimulationIds = request.altInsuranceSimulationIds
+        # Set insurance simulations and their IDs for the reference and alternative loans if provided
+        assign_insurance_simulations(request)
         
         # Calculate reference loan
-        ref_loan_result = await calculate_loan(request.referenceLoan)
+        with stage("reference_loan"):
+            ref_loan_result = calculate_loan_result(request.referenceLoan)
 
         # Calculate alternative loan
-        alt_loan_result = await calculate_loan(request.alternativeLoan, request.modularSchedule)
+        with stage("alternative_loan"):
+            alt_loan_result = calculate_loan_result(request.alternativeLoan, request.modularSchedule)
 
         # If investment parameters are provided, calculate investment simulation
         if request.investmentParams:
@@ -322,28 +490,30 @@ async def compare_loans(request: ComparisonRequest):
             monthly_growth_rate = (1 + annual_growth_rate / 100) ** (1/12) - 1
             
             # Run investment simulation
-            investment_df, start_inv_alt, ref_invest_df, start_inv_ref = simuleer_met_investering(
-                df_referentie=ref_df,
-                df_alternatief=alt_df,
-                eigen_inbreng_referentie=request.referenceOwnContribution,
-                eigen_inbreng_alternatief=request.alternativeOwnContribution,
-                start_kapitaal_totaal=start_capital,
-                maandelijkse_groei_investering=monthly_growth_rate,
-                invest_kapitaal_referentie=request.investmentParams.refInvestCapital or None,
-                invest_kapitaal_alternatief=request.investmentParams.altInvestCapital or None
-            )
+            with stage("investment_simulation"):
+                investment_df, start_inv_alt, ref_invest_df, start_inv_ref = simuleer_met_investering(
+                    df_referentie=ref_df,
+                    df_alternatief=alt_df,
+                    eigen_inbreng_referentie=request.referenceOwnContribution,
+                    eigen_inbreng_alternatief=request.alternativeOwnContribution,
+                    start_kapitaal_totaal=start_capital,
+                    maandelijkse_groei_investering=monthly_growth_rate,
+                    invest_kapitaal_referentie=request.investmentParams.refInvestCapital or None,
+                    invest_kapitaal_alternatief=request.investmentParams.altInvestCapital or None
+                )
             
             # Calculate minimum required growth rate
             alt_principal = request.alternativeLoan.principal
             alt_term_months = request.alternativeLoan.termYears * 12
             
            
-            min_growth_rate= bereken_min_groei_voor_betaling(
-                df_combined=investment_df,
-                payment_maand=alt_term_months,
-                payment_bedrag=alt_principal,
-                start_investering=start_inv_alt
-            )
+            with stage("min_growth_solve"):
+                min_growth_rate= bereken_min_groei_voor_betaling(
+                    df_combined=investment_df,
+                    payment_maand=alt_term_months,
+                    payment_bedrag=alt_principal,
+                    start_investering=start_inv_alt
+                )
             
             # Calculate comparison statistics
             ref_total_costs = ref_loan_result["statistics"]["totalLoanCosts"]
@@ -354,11 +524,14 @@ async def compare_loans(request: ComparisonRequest):
             if not investment_df.empty and "netWorth" in investment_df.columns:
                 net_worth_end_of_term = investment_df["netWorth"].iloc[-1]
             
+            with stage("serialization"):
+                investment_simulation = transform_monthly_data(investment_df)
+
             # Return complete comparison result
             return {
                 "referenceLoan": ref_loan_result,
                 "alternativeLoan": alt_loan_result,
-                "investmentSimulation": transform_monthly_data(investment_df),
+                "investmentSimulation": investment_simulation,
                 "minimumRequiredGrowthRate": min_growth_rate * 100 if min_growth_rate is not None else None,  # Convert to percentage
                 "comparisonStats": {
                     "totalCostDifference": total_cost_difference,
@@ -372,6 +545,8 @@ async def compare_loans(request: ComparisonRequest):
                 "alternativeLoan": alt_loan_result
             }
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -387,6 +562,48 @@ if __name__ == "__main__":
 
 # Import routers - Must be after FastAPI initialization
 from .multi_client_loan import router as multi_client_router
+from .affordability import router as affordability_router
+from .break_even import router as break_even_router
+from .scenarios import router as scenarios_router
+from .live import router as live_router
+from .case_cashflow import router as case_cashflow_router
+from .compare_many import router as compare_many_router
+from .prepayment import router as prepayment_router
+from .variable_rate import router as variable_rate_router
+from .sensitivity import router as sensitivity_router
+from .contribution_optimizer import router as contribution_optimizer_router
+from .backtest import router as backtest_router
+from .jobs import router as jobs_router
+from .monitoring import router as monitoring_router, metrics_middleware
+from .admission import admission_middleware
+from .debug import router as debug_router, memory_profile_middleware, cpu_profile_middleware
 
 # Include routers
-app.include_router(multi_client_router, prefix="/api")
\ No newline at end of file
+app.include_router(multi_client_router, prefix="/api")
+app.include_router(affordability_router, prefix="/api")
+app.include_router(break_even_router, prefix="/api")
+app.include_router(scenarios_router, prefix="/api")
+app.include_router(live_router, prefix="/api")
+app.include_router(case_cashflow_router, prefix="/api")
+app.include_router(compare_many_router, prefix="/api")
+app.include_router(prepayment_router, prefix="/api")
+app.include_router(variable_rate_router, prefix="/api")
+app.include_router(sensitivity_router, prefix="/api")
+app.include_router(contribution_optimizer_router, prefix="/api")
+app.include_router(backtest_router, prefix="/api")
+app.include_router(jobs_router, prefix="/api")
+app.include_router(monitoring_router)
+if settings.debug_endpoints:
+    app.include_router(debug_router, prefix="/debug")
+
+# Per-endpoint concurrency limits with a bounded priority queue; inside the metrics middleware so 503s are counted
+if settings.admission_control:
+    app.middleware("http")(admission_middleware)
+# Request metrics (latency, in-flight, payload sizes) exposed on /metrics
+app.middleware("http")(metrics_middleware)
+# Opt-in tracemalloc profiling per calculation stage (X-Memory-Profile header or always); not installed when off
+if settings.memory_profiling != MemoryProfilingMode.OFF:
+    app.middleware("http")(memory_profile_middleware)
+# Sampling / slow-request CPU profiler; not installed at all unless enabled
+if settings.cpu_profiling:
+    app.middleware("http")(cpu_profile_middleware)
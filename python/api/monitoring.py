@@ -0,0 +1,58 @@
+import time
+
+from fastapi import Request, Response
+from fastapi.routing import APIRouter
+from starlette.routing import Match
+
+from metrics import (
+    CONTENT_TYPE_LATEST,
+    HTTP_REQUEST_DURATION,
+    HTTP_REQUESTS_IN_PROGRESS,
+    HTTP_REQUEST_SIZE,
+    HTTP_RESPONSE_SIZE,
+    render_latest,
+)
+
+router = APIRouter()
+
+# Requests that match no route are grouped under a single label to keep cardinality bounded
+UNMATCHED_ROUTE = "unmatched"
+
+
+def route_label(request: Request) -> str:
+    """Return the route template (e.g. ``/api/cases/{id}``) that will handle the request."""
+    for route in request.app.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return getattr(route, "path", UNMATCHED_ROUTE)
+    return UNMATCHED_ROUTE
+
+
+def _content_length(headers) -> int:
+    try:
+        return int(headers.get("content-length", 0))
+    except ValueError:
+        return 0
+
+
+async def metrics_middleware(request: Request, call_next):
+    """Record latency, in-flight requests and payload sizes for every HTTP request."""
+    method = request.method
+    route = route_label(request)
+    HTTP_REQUESTS_IN_PROGRESS.inc(method=method, route=route)
+    HTTP_REQUEST_SIZE.observe(_content_length(request.headers), method=method, route=route)
+    start = time.perf_counter()
+    status = "500"
+    try:
+        response = await call_next(request)
+        status = str(response.status_code)
+        HTTP_RESPONSE_SIZE.observe(_content_length(response.headers), method=method, route=route)
+        return response
+    finally:
+        HTTP_REQUEST_DURATION.observe(time.perf_counter() - start, method=method, route=route, status=status)
+        HTTP_REQUESTS_IN_PROGRESS.dec(method=method, route=route)
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics_endpoint():
+    return Response(content=render_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -1,22 +1,29 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 from typing import Dict, List, Optional, Any
 from pydantic import BaseModel
+import numpy as np
 import pandas as pd
 
 from .main import (
     LoanParameters, 
     ModularLoanSchedule,
+    insurance_summary,
+    life_insurance_premiums,
+    resolve_insurance_simulations,
+    run_calculation,
     transform_monthly_data,
     transform_annual_data,
     transform_statistics
 )
 
 from multi_client_calculation import (
-    simuleer_klassieke_lening_multi_client,
-    simuleer_modulaire_lening_multi_client,
+    simuleer_lening_multi_client,
+    verdeel_lening_over_clients,
     bereken_statistieken_multi_client,
     aggregeer_jaarlijks
 )
+from metrics import record_loan
+from profiling import stage
 
 router = APIRouter()
 
@@ -29,19 +36,49 @@ class ClientSummary(BaseModel):
     individualCount: int
     companyCount: int
 
+class ClientLoanShare(BaseModel):
+    clientId: str
+    monthlyIncome: float = 0
+    # Insurance coverage for this client (defaults to params.insuranceCoveragePct)
+    insuranceCoveragePct: Optional[float] = None
+    # Share of the loan payment carried by this client, in percent (defaults to the income share);
+    # set for every client or for none, adding up to 100
+    paymentSharePct: Optional[float] = None
+
 class MultiClientLoanRequest(BaseModel):
     params: LoanParameters
     clientIds: List[str]
     clientSummary: ClientSummary
     modularSchedule: Optional[ModularLoanSchedule] = None
     insuranceSimulationIds: Optional[List[str]] = None
+    # Per-client coverage, income and payment share; without it the summary income is split evenly
+    clients: Optional[List[ClientLoanShare]] = None
+    # Include the (clients x months) premium, payment and debt-ratio series in the response
+    includeClientSeries: bool = False
+
+def client_series(matrices, client_ids) -> Dict[str, Any]:
+    """Per-client monthly series as nested lists (one row per client)."""
+    def rows(matrix):
+        return [[None if np.isnan(v) else float(v) for v in row] for row in matrix]
+    return {
+        "clientIds": client_ids,
+        "insurancePremium": matrices["insurancePremium"].tolist(),
+        "paymentShare": matrices["paymentShare"].tolist(),
+        "totalPayment": matrices["totalPayment"].tolist(),
+        "cumulativeInsurancePaid": matrices["cumulativeInsurancePaid"].tolist(),
+        "debtRatio": rows(matrices["debtRatio"]),
+    }
 
 @router.post("/calculate-multi-client-loan")
-async def calculate_multi_client_loan(request: MultiClientLoanRequest):
+async def calculate_multi_client_loan(request: MultiClientLoanRequest, http_request: Request):
+    return await run_calculation(http_request, calculate_multi_client_loan_result, request)
+
+def calculate_multi_client_loan_result(request: MultiClientLoanRequest):
     try:
         params = request.params
         client_summary = request.clientSummary
         loan_type = params.loanType.value  # Convert enum to string
+        record_loan(loan_type, params.termYears)
         
         # Set insurance simulation IDs if provided
         if request.insuranceSimulationIds:
@@ -49,51 +86,63 @@ async def calculate_multi_client_loan(request: MultiClientLoanRequest):
         
         # Use client summary for calculations
         monthly_income = client_summary.totalMonthlyIncome
+        client_count = client_summary.clientCount
+
+        # Per-client vectors; None lets the engine derive them from the summary
+        coverage_per_client = income_per_client = share_per_client = None
+        client_ids = request.clientIds
+        if request.clients:
+            client_ids = [client.clientId for client in request.clients]
+            client_count = len(request.clients)
+            coverage_per_client = [
+                params.insuranceCoveragePct if client.insuranceCoveragePct is None else client.insuranceCoveragePct
+                for client in request.clients
+            ]
+            income_per_client = [client.monthlyIncome for client in request.clients]
+            monthly_income = sum(income_per_client)
+            shares = [client.paymentSharePct for client in request.clients]
+            if any(share is not None for share in shares):
+                if any(share is None or share < 0 for share in shares):
+                    raise HTTPException(status_code=400,
+                                        detail="paymentSharePct must be given for every client or for none, and cannot be negative")
+                if abs(sum(shares) - 100) > 0.01:
+                    raise HTTPException(status_code=400,
+                                        detail=f"paymentSharePct must add up to 100, got {sum(shares):g}")
+                share_per_client = shares
         
         # Convert modular schedule to the format expected by the calculation function
         schedule_tuples = []
         if request.modularSchedule and loan_type in ["bullet", "modular"]:
             schedule_tuples = [(item.month, item.amount) for item in request.modularSchedule.schedule]
         
-        # Call the appropriate calculation function based on loan type, incorporating client info
-        if loan_type == "annuity":
-            result_df = simuleer_klassieke_lening_multi_client(
+        if loan_type != "annuity" and not schedule_tuples:
+            # For bullet loans, create a schedule with a single payment at the end
+            if loan_type == "bullet":
+                last_month = params.termYears * 12
+                schedule_tuples = [(last_month, params.principal)]
+            else:
+                raise HTTPException(
+                    status_code=400,
+                    detail="Modular loan schedule required for modular loans"
+                )
+
+        # One schedule at 100% coverage, split over the clients in a single vectorized pass
+        with stage("amortization"):
+            result_df, matrices = simuleer_lening_multi_client(
                 eigen_inbreng=params.ownContribution,
                 jaarlijkse_rentevoet=params.interestRate / 100,  # Convert from percentage to decimal
                 looptijd_jaren=params.termYears,
                 aankoopprijs=params.purchasePrice,
-                uitstel_maanden=params.delayMonths,
-                start_jaar_kalender=params.startYear,
-                schuldsaldo_dekking_pct=params.insuranceCoveragePct,
                 loan_type=loan_type,
-                # Add client-specific parameters
-                monthly_income=monthly_income,
-                client_count=client_summary.clientCount
-            )
-        else:  # bullet or modular
-            if not schedule_tuples:
-                # For bullet loans, create a schedule with a single payment at the end
-                if loan_type == "bullet":
-                    last_month = params.termYears * 12
-                    schedule_tuples = [(last_month, params.principal)]
-                else:
-                    raise HTTPException(
-                        status_code=400,
-                        detail="Modular loan schedule required for modular loans"
-                    )
-            
-            result_df = simuleer_modulaire_lening_multi_client(
-                eigen_inbreng=params.ownContribution,
-                jaarlijkse_rentevoet=params.interestRate / 100,  # Convert from percentage to decimal
-                looptijd_jaren=params.termYears,
                 aflossings_schema=schedule_tuples,
-                aankoopprijs=params.purchasePrice,
+                uitstel_maanden=params.delayMonths,
                 start_jaar_kalender=params.startYear,
                 schuldsaldo_dekking_pct=params.insuranceCoveragePct,
-                loan_type=loan_type,
-                # Add client-specific parameters
                 monthly_income=monthly_income,
-                client_count=client_summary.clientCount
+                client_count=client_count,
+                dekking_per_client=coverage_per_client,
+                inkomen_per_client=income_per_client,
+                aandeel_per_client=share_per_client
             )
         
         # Handle empty result
@@ -103,45 +152,68 @@ async def calculate_multi_client_loan(request: MultiClientLoanRequest):
                 "annualData": [],
                 "statistics": transform_statistics(bereken_statistieken_multi_client(pd.DataFrame(), hoofdsom=(params.purchasePrice - params.ownContribution)))
             }
+
+        # Life-insurance simulations are priced per insured client and replace that client's table premiums
+        insurance = None
+        simulations = resolve_insurance_simulations(params)
+        if simulations:
+            if len(client_ids) != len(matrices["coveragePct"]):
+                raise HTTPException(status_code=400, detail="clientIds must list every client to apply insurance simulations")
+            unmatched = [simulation.id for simulation in simulations if simulation.clientId not in client_ids]
+            if unmatched:
+                raise HTTPException(status_code=400, detail=f"Insurance simulations without a client of this loan: {unmatched}")
+            with stage("life_insurance"):
+                premiums = life_insurance_premiums(params, simulations, result_df)
+                # Clients without a simulation keep their table premiums
+                client_premiums = matrices["insurancePremium"].copy()
+                insured = {client_ids.index(simulation.clientId) for simulation in simulations}
+                client_premiums[list(insured)] = 0
+                for simulation, row in zip(simulations, premiums):
+                    client_premiums[client_ids.index(simulation.clientId)] += row
+                result_df, matrices = verdeel_lening_over_clients(
+                    result_df, matrices["coveragePct"], matrices["monthlyIncome"], matrices["paymentSharePct"],
+                    premies_per_client=client_premiums
+                )
+                insurance = insurance_summary(params, simulations, premiums)
         
         # Generate annual data
-        annual_data = aggregeer_jaarlijks(result_df)
+        with stage("annual_aggregation"):
+            annual_data = aggregeer_jaarlijks(result_df)
 
-        # Calculate statistics with multi-client support
-        statistics = bereken_statistieken_multi_client(
-            result_df, 
-            hoofdsom=(params.purchasePrice - params.ownContribution),
-            monthly_income=monthly_income,
-            client_count=client_summary.clientCount
-        )
-        
-        # Calculate debt ratio based on total monthly income
-        if monthly_income > 0:
-            first_payment = result_df.iloc[0]["totalMonthlyPayment"] if not result_df.empty else 0
-            debt_ratio = (first_payment / monthly_income) * 100
-            statistics["debtRatio"] = debt_ratio
-            
-            # Debt ratio assessment
-            if debt_ratio <= 33:
-                statistics["debtRatioAssessment"] = "good"
-            elif debt_ratio <= 43:
-                statistics["debtRatioAssessment"] = "moderate"
-            else:
-                statistics["debtRatioAssessment"] = "high"
+        # Calculate statistics with multi-client support (household and per-client debt ratios)
+        with stage("statistics"):
+            statistics = bereken_statistieken_multi_client(
+                result_df, 
+                hoofdsom=(params.purchasePrice - params.ownContribution),
+                monthly_income=monthly_income,
+                client_count=client_count,
+                matrices=matrices,
+                client_ids=client_ids
+            )
         
         # Transform data to the expected API response format
-        return {
-            "monthlyData": transform_monthly_data(result_df),
-            "annualData": transform_annual_data(annual_data),
-            "statistics": transform_statistics(statistics),
-            "clientSummary": {
-                "clientCount": client_summary.clientCount,
-                "individualCount": client_summary.individualCount,
-                "companyCount": client_summary.companyCount,
-                "totalMonthlyIncome": client_summary.totalMonthlyIncome,
-                "netWorth": client_summary.netWorth
+        with stage("serialization"):
+            monthly_data = transform_monthly_data(result_df)
+            annual_data = transform_annual_data(annual_data)
+            response = {
+                "monthlyData": monthly_data,
+                "annualData": annual_data,
+                "statistics": transform_statistics(statistics),
+                "clientSummary": {
+                    "clientCount": client_summary.clientCount,
+                    "individualCount": client_summary.individualCount,
+                    "companyCount": client_summary.companyCount,
+                    "totalMonthlyIncome": client_summary.totalMonthlyIncome,
+                    "netWorth": client_summary.netWorth
+                }
             }
-        }
+            if request.includeClientSeries:
+                response["clientSeries"] = client_series(matrices, client_ids)
+            if insurance:
+                response["insurance"] = insurance
+        return response
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,202 @@
+from typing import List, Optional
+
+import numpy as np
+from fastapi import APIRouter, HTTPException, Request
+from pydantic import BaseModel
+
+from .main import LoanParameters, ModularLoanSchedule, ModularLoanScheduleItem, batch_loan_inputs, rounded, run_calculation
+from config import settings
+from prepayment import (
+    HERBEREKENING,
+    LOOPTIJD,
+    extra_betalingen_raster,
+    simuleer_vervroegde_aflossingen,
+    vergelijk_met_beleggen,
+)
+from profiling import stage
+
+router = APIRouter()
+
+MODES = {"reduceTerm": LOOPTIJD, "recast": HERBEREKENING}
+RANK_CRITERIA = ("netWorthImpact", "netSaving", "interestSaved")
+
+
+class RecurringExtraPayment(BaseModel):
+    amount: float
+    startMonth: int = 1
+    # Defaults to the end of the term
+    endMonth: Optional[int] = None
+    everyMonths: int = 1
+
+
+class PrepaymentStrategy(BaseModel):
+    id: Optional[str] = None
+    lumpSums: List[ModularLoanScheduleItem] = []
+    recurring: Optional[RecurringExtraPayment] = None
+
+
+class PrepaymentRequest(BaseModel):
+    loan: LoanParameters
+    modularSchedule: Optional[ModularLoanSchedule] = None
+    # Grid of single lump sums: every month x amount
+    lumpSumMonths: List[int] = []
+    lumpSumAmounts: List[float] = []
+    # Added to every grid strategy (or the only grid strategy when there are no lump sums)
+    recurring: Optional[RecurringExtraPayment] = None
+    # Explicit strategies, evaluated next to the grid
+    strategies: List[PrepaymentStrategy] = []
+    # reduceTerm keeps the payment and shortens the loan; recast keeps the term and lowers the payment
+    modes: List[str] = ["reduceTerm", "recast"]
+    # Penalty in months of interest on prepayments above the penalty-free allowance
+    penaltyMonthsInterest: float = 3
+    # Share of the original principal (percent) that may be prepaid per loan year without penalty
+    penaltyFreePctPerYear: float = 0
+    # Annual return (percent) of investing the same cash instead; enables netWorthImpact
+    annualGrowthRate: Optional[float] = None
+    rankBy: Optional[str] = None
+    # Number of ranked strategies returned
+    top: int = 20
+
+
+def periodic(recurring: Optional[RecurringExtraPayment]):
+    if recurring is None:
+        return None
+    return {"bedrag": recurring.amount, "start_maand": recurring.startMonth,
+            "eind_maand": recurring.endMonth, "interval": recurring.everyMonths}
+
+
+@router.post("/prepayment-strategies")
+async def prepayment_strategies(request: PrepaymentRequest, http_request: Request):
+    """
+    Evaluate families of extra-payment plans on one loan, e.g. every lump-sum month x amount,
+    in term-reduction and recast mode: interest saved, penalties, payoff month and the
+    net-worth impact against investing the same cash.
+    """
+    return await run_calculation(http_request, prepayment_strategies_result, request)
+
+
+def prepayment_strategies_result(request: PrepaymentRequest):
+    unknown = [mode for mode in request.modes if mode not in MODES]
+    if unknown or not request.modes:
+        raise HTTPException(status_code=400, detail=f"Unknown modes {unknown}; use {list(MODES)}")
+    rank_by = request.rankBy or ("netWorthImpact" if request.annualGrowthRate is not None else "netSaving")
+    if rank_by not in RANK_CRITERIA:
+        raise HTTPException(status_code=400, detail=f"Unknown rankBy '{rank_by}'; use one of {list(RANK_CRITERIA)}")
+    if rank_by == "netWorthImpact" and request.annualGrowthRate is None:
+        raise HTTPException(status_code=400, detail="rankBy 'netWorthImpact' requires annualGrowthRate")
+
+    loan = batch_loan_inputs(request.loan, request.modularSchedule)
+    months = loan["looptijd_jaren"] * 12
+    has_grid = bool(request.lumpSumMonths and request.lumpSumAmounts)
+    grid_extra, grid_combinations = extra_betalingen_raster(
+        months, request.lumpSumMonths, request.lumpSumAmounts, periodic(request.recurring))
+    if not has_grid and request.recurring is None:
+        grid_extra, grid_combinations = grid_extra[:0], []
+    extra_rows = [grid_extra]
+    for strategy in request.strategies:
+        extra, _ = extra_betalingen_raster(months, periodiek=periodic(strategy.recurring))
+        for item in strategy.lumpSums:
+            if 1 <= item.month <= months:
+                extra[0, item.month - 1] += item.amount
+        extra_rows.append(extra)
+    extra = np.concatenate(extra_rows)
+    if len(extra) == 0:
+        raise HTTPException(status_code=400, detail="Provide lumpSumMonths and lumpSumAmounts, recurring or strategies")
+    if len(extra) * len(request.modes) > settings.prepayment_max_strategies:
+        raise HTTPException(status_code=400, detail=f"At most {settings.prepayment_max_strategies} strategies x modes per request")
+
+    options = dict(
+        loan_type=loan["loan_type"],
+        aflossings_schema=loan["aflossings_schema"],
+        uitstel_maanden=loan["uitstel_maanden"],
+        start_jaar_kalender=loan["start_jaar_kalender"],
+        schuldsaldo_dekking_pct=loan["schuldsaldo_dekking_pct"],
+        boete_maanden=request.penaltyMonthsInterest,
+        boetevrij_pct_per_jaar=request.penaltyFreePctPerYear / 100,
+    )
+    monthly_growth = None
+    if request.annualGrowthRate is not None:
+        monthly_growth = (1 + request.annualGrowthRate / 100) ** (1 / 12) - 1
+    try:
+        with stage("amortization"):
+            base = simuleer_vervroegde_aflossingen(loan["hoofdsom"], loan["jaarlijkse_rentevoet"], loan["looptijd_jaren"],
+                                                   np.zeros((1, months)), **options)
+            results = {
+                mode: simuleer_vervroegde_aflossingen(loan["hoofdsom"], loan["jaarlijkse_rentevoet"],
+                                                      loan["looptijd_jaren"], extra, modus=MODES[mode], **options)
+                for mode in request.modes
+            }
+        comparisons = {}
+        if monthly_growth is not None:
+            with stage("investment_simulation"):
+                comparisons = {mode: vergelijk_met_beleggen(base, result, monthly_growth) for mode, result in results.items()}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    with stage("serialization"):
+        base_interest = base["interest"].sum()
+        base_insurance = base["insurancePremium"].sum()
+        ids = [f"m{month}-{amount:g}" if month is not None else "recurring" for month, amount in grid_combinations]
+        ids += [strategy.id or f"strategy{i}" for i, strategy in enumerate(request.strategies)]
+        grid_size = len(grid_combinations)
+
+        rows = []
+        metrics = {}
+        for mode, result in results.items():
+            interest_saved = base_interest - result["interest"].sum(axis=1)
+            insurance_saved = base_insurance - result["insurancePremium"].sum(axis=1)
+            penalties = result["penalty"].sum(axis=1)
+            net_saving = interest_saved + insurance_saved - penalties
+            impact = comparisons[mode]["vermogenseffect"] if mode in comparisons else None
+            # Month index right after the first extra payment (past the term when there is none)
+            paid = result["extraPayment"] > 0
+            after_first = np.where(paid.any(axis=1), np.argmax(paid, axis=1) + 1, months)
+            metrics[mode] = {"interestSaved": interest_saved, "netSaving": net_saving,
+                             "payoffMonth": result["aflossingsmaand"], "netWorthImpact": impact}
+            for i in range(len(extra)):
+                rows.append({
+                    "id": ids[i],
+                    "mode": mode,
+                    "lumpSumMonth": grid_combinations[i][0] if i < grid_size else None,
+                    "lumpSumAmount": grid_combinations[i][1] if i < grid_size and grid_combinations[i][0] is not None else None,
+                    "totalExtraPayments": rounded(result["extraPayment"][i].sum()),
+                    "penalties": rounded(penalties[i]),
+                    "interestSaved": rounded(interest_saved[i]),
+                    "insuranceSaved": rounded(insurance_saved[i]),
+                    "netSaving": rounded(net_saving[i]),
+                    "payoffMonth": int(result["aflossingsmaand"][i]),
+                    "monthsSaved": int(months - result["aflossingsmaand"][i]),
+                    "paymentAfterFirstPrepayment": rounded(result["totalMonthlyPayment"][i, after_first[i]])
+                    if after_first[i] < result["aflossingsmaand"][i] else None,
+                    "netWorthImpact": rounded(impact[i]) if impact is not None else None,
+                    "breakEvenGrowthRate": rounded(comparisons[mode]["break_even_groei"][i] * 100, 4)
+                    if mode in comparisons else None,  # Convert to percentage
+                })
+
+        ranked = sorted(rows, key=lambda row: -row[rank_by])
+        response = {
+            "baseline": {
+                "totalInterest": rounded(base_interest),
+                "totalInsurance": rounded(base_insurance),
+                "firstMonthlyPayment": rounded(base["totalMonthlyPayment"][0, 0]),
+                "payoffMonth": int(base["aflossingsmaand"][0]),
+            },
+            "rankBy": rank_by,
+            "strategyCount": len(rows),
+            "strategies": ranked[:max(request.top, 0)],
+        }
+        if has_grid:
+            shape = (len(request.lumpSumMonths), len(request.lumpSumAmounts))
+            response["grid"] = {
+                "months": request.lumpSumMonths,
+                "amounts": request.lumpSumAmounts,
+                "modes": {
+                    mode: {
+                        name: (values[:grid_size].reshape(shape).tolist() if name == "payoffMonth"
+                               else [[rounded(v) for v in row] for row in values[:grid_size].reshape(shape)])
+                        for name, values in mode_metrics.items() if values is not None
+                    }
+                    for mode, mode_metrics in metrics.items()
+                },
+            }
+    return response
@@ -0,0 +1,94 @@
+from functools import partial
+
+from fastapi import APIRouter, HTTPException, Request
+
+from .main import (
+    ComparisonRequest,
+    LoanParameters,
+    ModularLoanSchedule,
+    assign_insurance_simulations,
+    insurance_summary,
+    resolve_insurance_simulations,
+    run_calculation,
+    transform_monthly_data,
+    transform_annual_data,
+    transform_statistics,
+)
+from config import settings
+from scenario_graph import build_comparison_graph, loan_result
+
+router = APIRouter()
+
+comparison_graph = build_comparison_graph(
+    partial(loan_result, transform_monthly=transform_monthly_data, transform_annual=transform_annual_data,
+            transform_stats=transform_statistics),
+    transform_monthly_data,
+    cache_size=settings.scenario_cache_size,
+)
+
+
+def loan_inputs(params: LoanParameters, modular_schedule: ModularLoanSchedule = None):
+    inputs = params.model_dump(mode="json", exclude={"insuranceSimulationIds", "insuranceSimulations"})
+    # The simulations that apply to this loan, priced by the life-insurance node
+    inputs["lifeInsurance"] = [simulation.model_dump(mode="json") for simulation in resolve_insurance_simulations(params)]
+    for simulation in inputs["lifeInsurance"]:
+        if simulation["client"] is None:
+            raise HTTPException(status_code=400, detail=f"Insurance simulation {simulation['id']} needs the insured client's age")
+    inputs["schedule"] = None
+    if modular_schedule and params.loanType.value in ["bullet", "modular"]:
+        inputs["schedule"] = [[item.month, item.amount] for item in modular_schedule.schedule]
+    return inputs
+
+
+def scenario_inputs(request: ComparisonRequest):
+    assign_insurance_simulations(request)
+    investment = request.investmentParams.model_dump(mode="json") if request.investmentParams else {}
+    investment.update(
+        referenceOwnContribution=request.referenceOwnContribution,
+        alternativeOwnContribution=request.alternativeOwnContribution,
+    )
+    return {
+        "reference": loan_inputs(request.referenceLoan),
+        "alternative": loan_inputs(request.alternativeLoan, request.modularSchedule),
+        "investment": investment,
+    }
+
+
+@router.post("/scenarios/compare-loans")
+async def compare_loans_incremental(request: ComparisonRequest, http_request: Request):
+    """
+    Same result as /api/compare-loans, computed on the memoized scenario graph.
+    ``graph.recomputed`` / ``graph.reused`` list the nodes that were (not) recalculated.
+    """
+    return await run_calculation(http_request, compare_loans_incremental_result, request)
+
+
+def compare_loans_incremental_result(request: ComparisonRequest):
+    targets = None if request.investmentParams else ["reference_result", "alternative_result"]
+    try:
+        result = comparison_graph.evaluate(scenario_inputs(request), targets)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    response = {
+        "referenceLoan": result["reference_result"],
+        "alternativeLoan": result["alternative_result"],
+    }
+    if request.investmentParams:
+        min_growth_rate = result["min_growth"]
+        response.update(
+            investmentSimulation=result["investment_result"],
+            minimumRequiredGrowthRate=min_growth_rate * 100 if min_growth_rate is not None else None,
+            comparisonStats=result["statistics"],
+        )
+    for key, prefix, loan in (("referenceLoan", "reference", request.referenceLoan),
+                              ("alternativeLoan", "alternative", request.alternativeLoan)):
+        premiums = result.values.get(f"{prefix}_life_insurance")
+        if premiums is not None:
+            response[key] = {**response[key], "insurance": insurance_summary(loan, resolve_insurance_simulations(loan), premiums)}
+    if request.refInsuranceSimulationIds:
+        response["referenceLoan"] = {**response["referenceLoan"], "insuranceSimulationIds": request.refInsuranceSimulationIds}
+    if request.altInsuranceSimulationIds:
+        response["alternativeLoan"] = {**response["alternativeLoan"], "insuranceSimulationIds": request.altInsuranceSimulationIds}
+    response["graph"] = {"recomputed": result.recomputed, "reused": result.reused}
+    return response
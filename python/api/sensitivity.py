@@ -0,0 +1,102 @@
+from typing import Dict, Optional
+
+from fastapi import APIRouter, HTTPException, Request
+from pydantic import BaseModel
+
+from .main import InvestmentParameters, LoanParameters, ModularLoanSchedule, batch_loan_inputs, rounded, run_calculation
+from profiling import stage
+from sensitivity import ANALYTISCH, CENTRALE_DIFFERENTIE, EIGEN_INBRENG, GROEI, RENTE, bereken_gevoeligheden
+
+router = APIRouter()
+
+# Request parameter -> engine parameter and the factor from the request unit to the engine unit
+PARAMETERS = {
+    "interestRate": (RENTE, 0.01),  # percentage points -> decimal
+    "growthRate": (GROEI, 0.01),
+    "ownContribution": (EIGEN_INBRENG, 1.0),  # euro
+}
+METHODS = {ANALYTISCH: "analytic", CENTRALE_DIFFERENTIE: "centralDifference"}
+# Metrics reported in percent
+PERCENT_METRICS = ("minimumRequiredGrowthRate",)
+
+
+class SensitivityRequest(BaseModel):
+    loan: LoanParameters
+    modularSchedule: Optional[ModularLoanSchedule] = None
+    # Adds the comparison results (cost difference; net worth with investmentParams), as in /api/compare-loans
+    referenceLoan: Optional[LoanParameters] = None
+    investmentParams: Optional[InvestmentParameters] = None
+    # Bump per parameter: interestRate and growthRate in percentage points, ownContribution in euro.
+    # interestRate moves the loan and the reference together; growthRate needs investmentParams
+    bumps: Dict[str, float] = {"interestRate": 0.1, "growthRate": 0.1, "ownContribution": 1000}
+    secondOrder: bool = False
+
+
+@router.post("/sensitivity")
+async def sensitivity(request: SensitivityRequest, http_request: Request):
+    """
+    First-order (and optionally second-order) sensitivities of the loan statistics and comparison
+    results to the interest rate, growth rate and own contribution. All bumped scenarios are
+    evaluated in one batch; annuity and bullet interest totals use analytic derivatives.
+    """
+    return await run_calculation(http_request, sensitivity_result, request)
+
+
+def sensitivity_result(request: SensitivityRequest):
+    unknown = [name for name in request.bumps if name not in PARAMETERS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown bumps {unknown}; use {list(PARAMETERS)}")
+    if request.investmentParams and not request.referenceLoan:
+        raise HTTPException(status_code=400, detail="investmentParams requires referenceLoan")
+    bumps = {name: bump for name, bump in request.bumps.items()
+             if name != "growthRate" or request.investmentParams}
+    if not bumps:
+        raise HTTPException(status_code=400, detail="No parameters to bump")
+
+    loan = batch_loan_inputs(request.loan, request.modularSchedule)
+    reference = batch_loan_inputs(request.referenceLoan) if request.referenceLoan else None
+    investment = None
+    if request.investmentParams:
+        params = request.investmentParams
+        investment = {
+            "jaarlijkse_groei": (params.annualGrowthRate or 0) / 100,  # Convert from percentage to decimal
+            "start_kapitaal": params.startCapital or 0,
+            "eigen_inbreng": request.loan.ownContribution,
+            # Explicit capitals of 0 fall back to the start capital, as in /api/compare-loans
+            "invest_kapitaal": params.altInvestCapital or None,
+            "doelbedrag": request.loan.principal,
+        }
+    steps = {PARAMETERS[name][0]: bump * PARAMETERS[name][1] for name, bump in bumps.items()}
+
+    try:
+        with stage("sensitivity"):
+            result = bereken_gevoeligheden(loan, steps, reference, investment, tweede_orde=request.secondOrder)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    with stage("serialization"):
+        def scale(metric):
+            return 100 if metric in PERCENT_METRICS else 1
+
+        sensitivities = {}
+        for name, bump in bumps.items():
+            parameter, unit = PARAMETERS[name]
+            sensitivities[name] = {}
+            for metric, derivative in result["eerste_orde"][parameter].items():
+                # Derivative per request unit (percentage point or euro)
+                per_unit = derivative * unit * scale(metric)
+                entry = {
+                    "perUnit": rounded(per_unit, 6),
+                    "perBump": rounded(per_unit * bump, 4),
+                    "method": METHODS[result["methode"][parameter][metric]],
+                }
+                if request.secondOrder:
+                    entry["secondOrder"] = rounded(result["tweede_orde"][parameter][metric] * unit ** 2 * scale(metric), 6)
+                sensitivities[name][metric] = entry
+        return {
+            "base": {metric: rounded(value * scale(metric), 4 if metric in PERCENT_METRICS else 2)
+                     for metric, value in result["basis"].items()},
+            "bumps": bumps,
+            "scenarioCount": result["scenarios"],
+            "sensitivities": sensitivities,
+        }
@@ -0,0 +1,139 @@
+from typing import List, Optional
+
+import numpy as np
+from fastapi import APIRouter, HTTPException, Request
+from pydantic import BaseModel
+
+from .main import LoanParameters, ModularLoanSchedule, batch_loan_inputs, rounded, run_calculation
+from config import settings
+from profiling import stage
+from variable_rate import MAX_VERMENIGVULDIGING, herzieningsdata, reset_maanden, simuleer_variabele_leningen
+
+router = APIRouter()
+
+
+class RateRevision(BaseModel):
+    # Years of the first fixed period / the next period / every later period, e.g. "10/5/5"
+    formula: str = "10/5/5"
+    # Largest rise and fall against the initial rate, in percentage points
+    capUp: Optional[float] = None
+    capDown: Optional[float] = None
+    # A revised rate never exceeds this multiple of the initial rate (Belgian law: 2)
+    maxMultiple: Optional[float] = MAX_VERMENIGVULDIGING
+
+
+class VariableRateLoanRequest(BaseModel):
+    # interestRate is the initial rate
+    params: LoanParameters
+    modularSchedule: Optional[ModularLoanSchedule] = None
+    revision: RateRevision = RateRevision()
+    # Reference index per loan year in percent, one path per scenario (entry 0 at signing)
+    indexPaths: Optional[List[List[float]]] = None
+    # Or the rate of every segment in percent, one path per scenario; overrides indexPaths
+    ratePaths: Optional[List[List[float]]] = None
+    scenarioIds: Optional[List[str]] = None
+    percentiles: List[float] = [10, 50, 90]
+    includeMonthlyData: bool = False
+
+
+@router.post("/variable-rate-loan")
+async def variable_rate_loan(request: VariableRateLoanRequest, http_request: Request):
+    """
+    Variable-rate loan under a revision formula for a batch of rate scenarios: the payment is
+    re-derived from the remaining balance and term at every reset. Returns per-scenario totals
+    and percentile bands of the annual payments over all scenarios.
+    """
+    return await run_calculation(http_request, variable_rate_loan_result, request)
+
+
+def variable_rate_loan_result(request: VariableRateLoanRequest):
+    loan = batch_loan_inputs(request.params, request.modularSchedule)
+    revision = request.revision
+    initial_rate = loan["jaarlijkse_rentevoet"]
+    try:
+        starts = reset_maanden(revision.formula, loan["looptijd_jaren"])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if request.ratePaths:
+        if any(len(path) != len(starts) for path in request.ratePaths):
+            raise HTTPException(status_code=400, detail=f"Each rate path needs {len(starts)} rates, one per segment")
+        rates = np.array(request.ratePaths, dtype=float) / 100  # Convert from percentage to decimal
+    elif request.indexPaths:
+        if any(len(path) == 0 for path in request.indexPaths):
+            raise HTTPException(status_code=400, detail="Index paths cannot be empty")
+        width = max(len(path) for path in request.indexPaths)
+        # Ragged paths carry their last value forward
+        index = np.array([path + path[-1:] * (width - len(path)) for path in request.indexPaths], dtype=float) / 100
+        rates = herzieningsdata(
+            initial_rate,
+            starts,
+            index,
+            plafond_stijging=revision.capUp / 100 if revision.capUp is not None else None,
+            plafond_daling=revision.capDown / 100 if revision.capDown is not None else None,
+            max_vermenigvuldiging=revision.maxMultiple,
+        )
+    else:
+        rates = np.full((1, len(starts)), initial_rate)
+    if len(rates) > settings.variable_rate_max_scenarios:
+        raise HTTPException(status_code=400, detail=f"At most {settings.variable_rate_max_scenarios} scenarios per request")
+    ids = request.scenarioIds or [str(i) for i in range(len(rates))]
+    if len(ids) != len(rates):
+        raise HTTPException(status_code=400, detail="scenarioIds must have one id per scenario")
+
+    try:
+        with stage("amortization"):
+            result = simuleer_variabele_leningen(
+                loan["hoofdsom"],
+                rates,
+                loan["looptijd_jaren"],
+                starts,
+                loan_type=loan["loan_type"],
+                aflossings_schema=loan["aflossings_schema"],
+                uitstel_maanden=loan["uitstel_maanden"],
+                start_jaar_kalender=loan["start_jaar_kalender"],
+                schuldsaldo_dekking_pct=loan["schuldsaldo_dekking_pct"],
+            )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    with stage("serialization"):
+        payments = result["totalMonthlyPayment"]
+        interest = result["cumulativeInterestPaid"][:, -1]
+        insurance = result["cumulativeInsurancePaid"][:, -1]
+        scenarios = [
+            {
+                "id": ids[i],
+                "segmentRates": [rounded(rate * 100, 4) for rate in rates[i]],  # Convert to percentage
+                "firstMonthlyPayment": rounded(payments[i, 0]),
+                "maxMonthlyPayment": rounded(payments[i].max()),
+                "totalInterestPaid": rounded(interest[i]),
+                "totalLoanCosts": rounded(interest[i] + insurance[i]),
+            }
+            for i in range(len(rates))
+        ]
+        annual_payments = payments.reshape(len(rates), -1, 12).sum(axis=2)
+        percentiles = sorted(request.percentiles)
+        bands = np.percentile(annual_payments, percentiles, axis=0)
+        response = {
+            "resetMonths": (starts + 1).tolist(),
+            "scenarios": scenarios,
+            "totalInterestPercentiles": {
+                f"p{p:g}": rounded(value) for p, value in zip(percentiles, np.percentile(interest, percentiles))
+            },
+            "annualPaymentBands": [
+                {"year": year + 1, **{f"p{p:g}": rounded(bands[j, year]) for j, p in enumerate(percentiles)}}
+                for year in range(annual_payments.shape[1])
+            ],
+        }
+        if request.includeMonthlyData:
+            response["monthlyData"] = [
+                {
+                    "id": ids[i],
+                    "interestRate": [rounded(v * 100, 4) for v in result["interestRate"][i]],
+                    **{column: [rounded(v) for v in result[column][i]]
+                       for column in ("totalMonthlyPayment", "interest", "principalPayment", "remainingPrincipal")},
+                }
+                for i in range(len(rates))
+            ]
+    return response
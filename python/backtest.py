@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+Historical backtest of investing the payment difference: instead of a fixed annual
+growth (``JAARLIJKSE_GROEI_INVESTERING``) the investment earns the actual monthly
+index returns, replayed from every possible start month.
+
+For a term of ``T`` months and ``N`` monthly returns there are ``N - T + 1`` rolling
+windows. They are a ``sliding_window_view`` of the return series (a strided view, no
+copies), and the contributions are broadcast over the windows, so the investment
+paths of all windows come out of one ``investeringspaden`` recursion over months.
+The loans themselves do not depend on the returns and are simulated once.
+
+Return files are CSV with a ``month`` column (``YYYY-MM``) and either ``return`` (the
+monthly total return as a decimal, 0.012 = 1.2%) or ``index`` (index levels; the
+returns are the changes between consecutive months).
+"""
+import csv
+import os
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from batch_engine import simuleer_leningen_gegroepeerd
+from compare_many import _opvullen, investeringspaden
+
+# Seeded demonstration series written by data/generate_index_returns.py; not historical data
+SYNTHETISCHE_RENDEMENTEN = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "index_returns.csv")
+
+
+def laad_rendementen(pad):
+    """Months (``YYYY-MM`` strings) and monthly returns from a CSV file, sorted by month."""
+    with open(pad, newline="", encoding="utf-8-sig") as f:
+        rijen = sorted(csv.DictReader(f), key=lambda rij: rij["month"])
+    if not rijen:
+        raise ValueError(f"Geen rendementen in '{pad}'.")
+    maanden = np.array([rij["month"] for rij in rijen])
+    if "return" in rijen[0]:
+        return maanden, np.array([float(rij["return"]) for rij in rijen])
+    if "index" in rijen[0]:
+        niveaus = np.array([float(rij["index"]) for rij in rijen])
+        # The first level only serves as the base of the second month's return
+        return maanden[1:], niveaus[1:] / niveaus[:-1] - 1
+    raise ValueError(f"'{pad}' heeft een kolom 'return' of 'index' nodig.")
+
+
+def rollende_vensters(rendementen, lengte):
+    """(windows x ``lengte``) strided view of every run of ``lengte`` consecutive returns."""
+    rendementen = np.asarray(rendementen, dtype=float)
+    if lengte > len(rendementen):
+        raise ValueError(f"Te weinig rendementen ({len(rendementen)}) voor een looptijd van {lengte} maanden.")
+    return sliding_window_view(rendementen, lengte)
+
+
+def backtest_vergelijking(referentie, alternatief, rendementen, start_referentie=0.0, start_alternatief=0.0):
+    """
+    Replay ``simuleer_met_investering`` for ``alternatief`` against ``referentie`` (loan dicts
+    with the keyword arguments of ``simuleer_leningen_batch``) over every window of
+    ``rendementen``.
+
+    The alternative invests ``start_alternatief`` plus its monthly saving against the
+    reference, floored at zero; the reference invests ``start_referentie``. Both are
+    compared at the end of the alternative's term. ``gedekt`` says whether the
+    investment covered the last month's payment difference, which for a bullet holds the
+    principal repayment, before the floor; ``tekort`` is the uncovered amount. Returns
+    per-window arrays (``investering`` is windows x months) and the loan schedules.
+    """
+    ref = simuleer_leningen_gegroepeerd([referentie])
+    alt = simuleer_leningen_gegroepeerd([alternatief])
+    maanden = int(alt["maanden"][0])
+    vensters = rollende_vensters(rendementen, maanden)
+    n = len(vensters)
+
+    ref_betaling = _opvullen(ref["totalMonthlyPayment"], maanden)[0, :maanden]
+    bijdragen = ref_betaling - alt["totalMonthlyPayment"][0, :maanden]
+    paden = investeringspaden(np.full(n, float(start_alternatief)), np.broadcast_to(bijdragen, (n, maanden)), vensters)
+
+    # Balance in the last month before the floor: the path before it, grown, plus the last difference
+    voor_laatste = paden[:, -2] if maanden > 1 else np.full(n, float(start_alternatief))
+    onbegrensd = voor_laatste * (1 + vensters[:, -1]) + bijdragen[-1]
+
+    # Window growth of the reference's capital from prefix sums of log returns
+    log_groei = np.concatenate([[0.0], np.cumsum(np.log1p(np.asarray(rendementen, dtype=float)))])
+    venster_groei = np.exp(log_groei[maanden:maanden + n] - log_groei[:n])
+    ref_restschuld = _opvullen(ref["remainingPrincipal"], maanden)[0, maanden - 1]
+    netto_vermogen = paden[:, -1] - alt["remainingPrincipal"][0, maanden - 1]
+    referentie_vermogen = float(start_referentie) * venster_groei - ref_restschuld
+    return {
+        "maanden": maanden,
+        "bijdragen": bijdragen,
+        "investering": paden,
+        "netto_vermogen": netto_vermogen,
+        "referentie_netto_vermogen": referentie_vermogen,
+        "voordeel": netto_vermogen - referentie_vermogen,
+        "gedekt": onbegrensd >= 0,
+        "tekort": np.maximum(-onbegrensd, 0.0),
+        "jaarrendement": venster_groei ** (12 / maanden) - 1,
+        "alternatief": alt,
+    }
@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+"""
+Vectorized loan schedules for many loans at once.
+
+``simuleer_leningen_batch`` produces the same schedule as ``simuleer_klassieke_lening`` /
+``simuleer_modulaire_lening`` for a whole vector of principals and interest rates
+sharing one term, without a Python loop over months: the remaining balance of an
+annuity and of a repayment schedule both have a closed form. Every output column
+is a (loans x months) array, using the canonical column names of the scalar engine.
+"""
+import numpy as np
+import pandas as pd
+
+from calculation_functions import START_JAAR_KALENDER, schat_schuldsaldo_premie
+from cancellation import checkpoint
+
+SCHEDULE_COLUMNS = (
+    "paymentExcludingInsurance",
+    "interest",
+    "principalPayment",
+    "insurancePremium",
+    "totalMonthlyPayment",
+    "remainingPrincipal",
+    "cumulativePrincipalPaid",
+    "cumulativeInterestPaid",
+    "cumulativeInsurancePaid",
+)
+
+
+def premie_schema(looptijd_jaren, start_jaar_kalender=START_JAAR_KALENDER, loan_type='annuity', dekking_pct=1.0):
+    """Monthly insurance premium per month of the term (the yearly premium spread over 12 months)."""
+    jaarpremies = np.array([
+        schat_schuldsaldo_premie(jaar, start_jaar_kalender, loan_type, dekking_pct)
+        for jaar in range(1, looptijd_jaren + 1)
+    ], dtype=float)
+    return np.repeat(jaarpremies / 12, 12)
+
+
+def _vectoren(hoofdsom, jaarlijkse_rentevoet):
+    hoofdsom, rentevoet = np.broadcast_arrays(
+        np.atleast_1d(np.asarray(hoofdsom, dtype=float)),
+        np.atleast_1d(np.asarray(jaarlijkse_rentevoet, dtype=float)),
+    )
+    return hoofdsom.ravel(), rentevoet.ravel()
+
+
+def _annuiteit_saldi(hoofdsom, maandrente, totaal_maanden, uitstel_maanden):
+    """Remaining balance after every month of an annuity with interest-only deferral."""
+    afbetalings_maanden = totaal_maanden - uitstel_maanden
+    r = maandrente[:, None]
+    p = hoofdsom[:, None]
+    # Number of annuity payments made at the end of each month (0 during the deferral)
+    k = np.clip(np.arange(1, totaal_maanden + 1) - uitstel_maanden, 0, None)[None, :]
+
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        groei_n = (1 + r) ** afbetalings_maanden
+        vaste_betaling = np.where(r > 0, p * r * groei_n / (groei_n - 1), p / afbetalings_maanden)
+        groei_k = (1 + r) ** k
+        saldo = np.where(r > 0, p * groei_k - vaste_betaling * (groei_k - 1) / r, p - vaste_betaling * k)
+    return np.clip(saldo, 0, None)
+
+
+def _schema_saldi(hoofdsom, totaal_maanden, aflossings_schema):
+    """Remaining balance after every month of a repayment schedule (``None`` = bullet at the end)."""
+    p = hoofdsom[:, None]
+    if aflossings_schema is None:
+        cumulatief_schema = np.zeros((len(hoofdsom), totaal_maanden))
+        cumulatief_schema[:, -1] = hoofdsom
+    else:
+        aflossingen = np.zeros(totaal_maanden)
+        for maand, bedrag in aflossings_schema:
+            if 1 <= maand <= totaal_maanden:
+                aflossingen[maand - 1] += bedrag
+        cumulatief_schema = np.cumsum(aflossingen)[None, :]
+    # Repayments are capped at the outstanding balance, so the balance never goes below zero
+    return np.clip(p - cumulatief_schema, 0, None)
+
+
+def simuleer_leningen_batch(
+    hoofdsom,
+    jaarlijkse_rentevoet,
+    looptijd_jaren,
+    loan_type='annuity',
+    aflossings_schema=None,
+    uitstel_maanden=0,
+    start_jaar_kalender=START_JAAR_KALENDER,
+    schuldsaldo_dekking_pct=1.0,
+):
+    """
+    Simulate a batch of loans with a shared term and return a dict of (loans x months) arrays.
+
+    ``hoofdsom`` and ``jaarlijkse_rentevoet`` are broadcast against each other (scalars or
+    1-D arrays). Annuities use ``uitstel_maanden`` of interest-only deferral; bullet and
+    modular loans repay according to ``aflossings_schema`` (``[(maand, bedrag), ...]``,
+    shared by all loans), and a bullet loan without a schedule repays its full principal
+    in the last month. The dict also holds ``month`` and ``year`` (1-D, length months).
+    """
+    hoofdsom, rentevoet = _vectoren(hoofdsom, jaarlijkse_rentevoet)
+    maandrente = rentevoet / 12
+    totaal_maanden = looptijd_jaren * 12
+    if totaal_maanden <= 0:
+        raise ValueError("Looptijd moet minstens één jaar zijn.")
+
+    if loan_type == 'annuity':
+        if totaal_maanden - uitstel_maanden <= 0:
+            raise ValueError("Looptijd moet langer zijn dan de uitstelperiode.")
+        saldo_na = _annuiteit_saldi(hoofdsom, maandrente, totaal_maanden, uitstel_maanden)
+        # Rounding residue of the last annuity payment is repaid in the last month
+        saldo_na[:, -1] = 0
+    else:
+        if loan_type == 'modular' and aflossings_schema is None:
+            raise ValueError("Modular loans need a repayment schedule")
+        saldo_na = _schema_saldi(hoofdsom, totaal_maanden, aflossings_schema)
+    saldo_na[saldo_na < 0.01] = 0
+
+    saldo_voor = np.concatenate([hoofdsom[:, None], saldo_na[:, :-1]], axis=1)
+    rente = saldo_voor * maandrente[:, None]
+    kapitaal = saldo_voor - saldo_na
+    betaling_excl = rente + kapitaal
+
+    premie = np.broadcast_to(
+        premie_schema(looptijd_jaren, start_jaar_kalender, loan_type, schuldsaldo_dekking_pct)[None, :],
+        saldo_na.shape,
+    )
+    maanden = np.arange(1, totaal_maanden + 1)
+    return {
+        "month": maanden,
+        "year": (maanden - 1) // 12 + 1,
+        "paymentExcludingInsurance": betaling_excl,
+        "interest": rente,
+        "principalPayment": kapitaal,
+        "insurancePremium": premie,
+        "totalMonthlyPayment": betaling_excl + premie,
+        "remainingPrincipal": saldo_na,
+        "cumulativePrincipalPaid": np.cumsum(kapitaal, axis=1),
+        "cumulativeInterestPaid": np.cumsum(rente, axis=1),
+        "cumulativeInsurancePaid": np.cumsum(premie, axis=1),
+    }
+
+
+def lening_invoer(lening, aflossings_schema=None):
+    """
+    Loan dict for ``simuleer_leningen_gegroepeerd`` from a loan with the API's
+    ``LoanParameters`` fields (a dict, e.g. an export record or ``model_dump()``).
+
+    The principal is the purchase price minus the own contribution. ``aflossings_schema``
+    only applies to bullet and modular loans; a bullet without one repays ``principal``
+    in its last month, as ``/api/compare-loans`` does, and a modular loan needs one.
+    """
+    loan_type = getattr(lening["loanType"], "value", lening["loanType"])
+    looptijd_jaren = int(lening["termYears"])
+    schema = list(aflossings_schema) if aflossings_schema and loan_type in ("bullet", "modular") else None
+    if not schema:
+        if loan_type == "bullet":
+            schema = [(looptijd_jaren * 12, lening["principal"])]
+        elif loan_type == "modular":
+            raise ValueError("Modular loan schedule required for modular loans")
+    dekking = lening.get("insuranceCoveragePct")
+    return {
+        "hoofdsom": max(lening["purchasePrice"] - lening["ownContribution"], 0),
+        "jaarlijkse_rentevoet": lening["interestRate"] / 100,  # Percent in the API
+        "looptijd_jaren": looptijd_jaren,
+        "loan_type": loan_type,
+        "aflossings_schema": schema,
+        "uitstel_maanden": (lening.get("delayMonths") or 0) if loan_type == "annuity" else 0,
+        "start_jaar_kalender": lening.get("startYear") or START_JAAR_KALENDER,
+        "schuldsaldo_dekking_pct": 1.0 if dekking is None else dekking,
+    }
+
+
+def groep_sleutel(lening):
+    """
+    Key of the loans that can share one ``simuleer_leningen_batch`` call: everything but
+    principal and interest rate. Order: type, term, schedule, deferral, start year, coverage.
+    """
+    schema = lening.get("aflossings_schema")
+    dekking = lening.get("schuldsaldo_dekking_pct")
+    return (
+        lening.get("loan_type", "annuity"),
+        int(lening["looptijd_jaren"]),
+        tuple(sorted((int(m), float(b)) for m, b in schema)) if schema else None,
+        int(lening.get("uitstel_maanden") or 0),
+        int(lening.get("start_jaar_kalender") or START_JAAR_KALENDER),
+        1.0 if dekking is None else float(dekking),
+    )
+
+
+def simuleer_leningen_gegroepeerd(leningen):
+    """
+    Simulate loans with different terms and schedules on one loan-month axis.
+
+    Every loan is a dict with the keyword arguments of ``simuleer_leningen_batch``; loans
+    with the same ``groep_sleutel`` share one batch call. Returns ``maanden`` (term in
+    months per loan) and a (loans x longest term) array per ``SCHEDULE_COLUMNS`` entry.
+    Past a loan's term flows and the balance are zero and cumulative columns keep their
+    final value.
+    """
+    if not leningen:
+        raise ValueError("Geen leningen om te simuleren.")
+    sleutels = [groep_sleutel(lening) for lening in leningen]
+    maanden = np.array([sleutel[1] * 12 for sleutel in sleutels])
+    resultaat = {kolom: np.zeros((len(leningen), int(maanden.max()))) for kolom in SCHEDULE_COLUMNS}
+    groepen = {}
+    for i, sleutel in enumerate(sleutels):
+        groepen.setdefault(sleutel, []).append(i)
+
+    for sleutel, indices in groepen.items():
+        checkpoint()
+        loan_type, looptijd_jaren, schema, uitstel_maanden, jaar, dekking = sleutel
+        batch = simuleer_leningen_batch(
+            [leningen[i]["hoofdsom"] for i in indices],
+            [leningen[i]["jaarlijkse_rentevoet"] for i in indices],
+            looptijd_jaren,
+            loan_type=loan_type,
+            aflossings_schema=list(schema) if schema else None,
+            uitstel_maanden=uitstel_maanden,
+            start_jaar_kalender=jaar,
+            schuldsaldo_dekking_pct=dekking,
+        )
+        indices = np.array(indices)
+        einde = looptijd_jaren * 12
+        for kolom in SCHEDULE_COLUMNS:
+            resultaat[kolom][indices, :einde] = batch[kolom]
+            if kolom.startswith("cumulative"):
+                resultaat[kolom][indices, einde:] = batch[kolom][:, -1:]
+    resultaat["maanden"] = maanden
+    return resultaat
+
+
+def batch_naar_dataframe(batch, index):
+    """Monthly DataFrame of one loan in a batch, in the format of the scalar simulation functions."""
+    data = {"month": batch["month"], "year": batch["year"]}
+    for kolom in SCHEDULE_COLUMNS:
+        data[kolom] = batch[kolom][index]
+    return pd.DataFrame(data)
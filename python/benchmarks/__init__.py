@@ -0,0 +1 @@
+# Performance tooling for the calculation engine and the API (run from the python/ directory)
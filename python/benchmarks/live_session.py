@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+CPU cost of one interactive slider drag: POST-per-change versus the live WebSocket.
+
+Replays the same drag (``--steps`` changes of the alternative's growth rate and
+interest rate, ``--interval-ms`` apart) against an in-process app, once as a
+POST to /api/compare-loans per change and once as patches on /api/live, and
+reports the process CPU time of each. Both run in the same process, so the
+numbers include the test client; the relative difference is what matters.
+
+Usage (from the python/ directory):
+
+    python -m benchmarks.live_session --steps 40 --interval-ms 15
+"""
+import argparse
+import copy
+import json
+import os
+import sys
+import time
+
+PYTHON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PYTHON_DIR not in sys.path:
+    sys.path.insert(0, PYTHON_DIR)
+
+from fastapi.testclient import TestClient
+
+from api.main import app
+
+BASE_REQUEST = {
+    "referenceLoan": {"loanType": "annuity", "principal": 725000, "interestRate": 3.5, "termYears": 25,
+                      "ownContribution": 100000, "purchasePrice": 825000},
+    "alternativeLoan": {"loanType": "bullet", "principal": 725000, "interestRate": 3.8, "termYears": 25,
+                        "ownContribution": 100000, "purchasePrice": 825000},
+    "referenceOwnContribution": 100000,
+    "alternativeOwnContribution": 100000,
+    "investmentParams": {"startCapital": 150000, "annualGrowthRate": 6.0},
+}
+
+
+def drag_patches(steps):
+    """A slider drag: mostly growth-rate moves, with an interest-rate move every fifth step."""
+    patches = []
+    for i in range(steps):
+        if i % 5 == 4:
+            patches.append({"alternativeLoan": {"interestRate": round(3.8 + 0.01 * i, 3)}})
+        else:
+            patches.append({"investmentParams": {"annualGrowthRate": round(6.0 + 0.05 * i, 3)}})
+    return patches
+
+
+def run_post_per_change(client, patches, interval):
+    request = copy.deepcopy(BASE_REQUEST)
+    start = time.process_time()
+    client.post("/api/compare-loans", json=request)
+    for patch in patches:
+        time.sleep(interval)
+        for section, values in patch.items():
+            request[section].update(values)
+        client.post("/api/compare-loans", json=request).raise_for_status()
+    return time.process_time() - start, len(patches) + 1
+
+
+def run_live_session(client, patches, interval):
+    start = time.process_time()
+    results = 0
+    with client.websocket_connect("/api/live") as websocket:
+        websocket.send_json({"type": "init", "mode": "comparison", "request": BASE_REQUEST,
+                             "series": {"maxPoints": 60}})
+        websocket.receive_json()
+        results += 1
+        for patch in patches:
+            time.sleep(interval)
+            websocket.send_json({"type": "patch", "patch": patch})
+        # The last patch always produces a result; earlier ones may have been debounced or superseded
+        while True:
+            message = websocket.receive_json()
+            results += 1
+            if message.get("version") == len(patches):
+                break
+        websocket.send_json({"type": "close"})
+    return time.process_time() - start, results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare CPU per interactive session: POST per change vs live WebSocket")
+    parser.add_argument("--steps", type=int, default=40, help="Number of slider changes")
+    parser.add_argument("--interval-ms", type=float, default=15.0, help="Time between changes")
+    parser.add_argument("--output", default=None, help="Optional JSON file for the results")
+    args = parser.parse_args(argv)
+
+    patches = drag_patches(args.steps)
+    interval = args.interval_ms / 1000
+    client = TestClient(app)
+    post_cpu, post_results = run_post_per_change(client, patches, interval)
+    live_cpu, live_results = run_live_session(client, patches, interval)
+
+    results = {
+        "steps": args.steps,
+        "intervalMs": args.interval_ms,
+        "postPerChange": {"cpuSeconds": round(post_cpu, 4), "calculations": post_results},
+        "liveSession": {"cpuSeconds": round(live_cpu, 4), "resultsPushed": live_results},
+        "cpuReductionPct": round((1 - live_cpu / post_cpu) * 100, 1) if post_cpu else None,
+    }
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
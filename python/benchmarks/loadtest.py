@@ -0,0 +1,383 @@
+# -*- coding: utf-8 -*-
+"""
+Local concurrent load-testing harness for the LoanLogic API.
+
+Starts ``uvicorn api.main:app`` on a free local port (or targets ``--url``),
+replays a seeded, realistic mix of calculate-loan, compare-loans (with and
+without ``investmentParams``) and multi-client requests at a configurable
+concurrency and rate, and reports throughput, p50/p95/p99 latency, error rate
+and server RSS over time. Only the standard library is used on the client
+side, so it runs fully offline.
+
+Usage (from the python/ directory):
+
+    python -m benchmarks.loadtest --concurrency 8 --duration 30
+    python -m benchmarks.loadtest --workers 4 --rate 20 --duration 60 --output load.json
+    python -m benchmarks.loadtest --server-env LOANLOGIC_SOME_SETTING=value
+
+With ``--rate`` the load is open-loop: request *i* is scheduled at ``i / rate``
+seconds and its latency is measured from that scheduled time, so a stalled
+server is not hidden by the client waiting politely (coordinated omission).
+Without ``--rate`` every worker sends its next request as soon as the previous
+one returns (closed-loop, maximum throughput).
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlsplit
+
+PYTHON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PYTHON_DIR not in sys.path:
+    sys.path.insert(0, PYTHON_DIR)
+
+import numpy as np
+
+from metrics import read_rss_bytes
+
+# (scenario name, weight) — roughly the traffic mix seen from the frontend
+DEFAULT_MIX = (
+    ("calculate-loan", 40),
+    ("compare-loans", 20),
+    ("compare-loans-investment", 25),
+    ("calculate-multi-client-loan", 15),
+)
+TERMS_YEARS = (10, 20, 25, 30, 40)
+PURCHASE_PRICE = 825000
+
+
+def _loan_params(rng, loan_type=None):
+    own_contribution = rng.choice((50000, 100000, 150000, 200000))
+    return {
+        "loanType": loan_type or rng.choice(("annuity", "annuity", "bullet")),
+        "principal": PURCHASE_PRICE - own_contribution,
+        "interestRate": round(rng.uniform(2.5, 4.5), 2),
+        "termYears": rng.choice(TERMS_YEARS),
+        "ownContribution": own_contribution,
+        "purchasePrice": PURCHASE_PRICE,
+        "startYear": 2025,
+        "insuranceCoveragePct": rng.choice((0.5, 1.0)),
+    }
+
+
+def build_request(scenario, rng):
+    """Return ``(path, body)`` for one request of the given scenario."""
+    if scenario == "calculate-loan":
+        return "/api/calculate-loan", {"params": _loan_params(rng)}
+
+    if scenario in ("compare-loans", "compare-loans-investment"):
+        reference = _loan_params(rng, "annuity")
+        alternative = _loan_params(rng, "bullet")
+        alternative["termYears"] = reference["termYears"]
+        body = {
+            "referenceLoan": reference,
+            "alternativeLoan": alternative,
+            "referenceOwnContribution": reference["ownContribution"],
+            "alternativeOwnContribution": alternative["ownContribution"],
+        }
+        if scenario == "compare-loans-investment":
+            body["investmentParams"] = {
+                "startCapital": rng.choice((120000, 200000)),
+                "annualGrowthRate": rng.choice((4.0, 6.0, 8.0)),
+            }
+        return "/api/compare-loans", body
+
+    if scenario == "calculate-multi-client-loan":
+        client_count = rng.choice((1, 2, 2, 3))
+        income = rng.choice((3500, 5000, 7500, 10000))
+        return "/api/calculate-multi-client-loan", {
+            "params": _loan_params(rng),
+            "clientIds": [f"client-{i}" for i in range(client_count)],
+            "clientSummary": {
+                "totalCurrentCapital": 150000,
+                "totalCurrentDebt": 0,
+                "totalMonthlyIncome": income,
+                "netWorth": 150000,
+                "clientCount": client_count,
+                "individualCount": client_count,
+                "companyCount": 0,
+            },
+        }
+
+    raise ValueError(f"Unknown scenario: {scenario}")
+
+
+def build_plan(total_requests, mix, seed):
+    """Pre-generate the full request sequence so runs with the same seed are identical."""
+    rng = random.Random(seed)
+    names = [name for name, _ in mix]
+    weights = [weight for _, weight in mix]
+    plan = []
+    for _ in range(total_requests):
+        scenario = rng.choices(names, weights)[0]
+        path, body = build_request(scenario, rng)
+        plan.append((scenario, path, json.dumps(body).encode()))
+    return plan
+
+
+def parse_mix(text):
+    """Parse ``name=weight,name=weight`` into a mix tuple."""
+    mix = []
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        mix.append((name.strip(), float(weight or 1)))
+    known = {name for name, _ in DEFAULT_MIX}
+    unknown = [name for name, _ in mix if name not in known]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"Unknown scenarios {unknown}; choose from {sorted(known)}")
+    return tuple(mix)
+
+
+def _free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _process_tree(pid):
+    """Return ``pid`` plus all descendant pids (uvicorn workers are child processes)."""
+    pids, stack = [], [pid]
+    while stack:
+        current = stack.pop()
+        pids.append(current)
+        try:
+            for task in os.listdir(f"/proc/{current}/task"):
+                with open(f"/proc/{current}/task/{task}/children") as f:
+                    stack.extend(int(child) for child in f.read().split())
+        except OSError:
+            continue
+    return pids
+
+
+def server_rss_bytes(pid):
+    total = 0
+    for child in _process_tree(pid):
+        rss = read_rss_bytes(child)
+        if rss is not None:
+            total += rss
+    return total
+
+
+class Server:
+    """Context manager that runs uvicorn in a subprocess and waits until it answers."""
+
+    def __init__(self, workers=1, port=None, extra_env=None, startup_timeout=60):
+        self.workers = workers
+        self.port = port or _free_port()
+        self.extra_env = extra_env or {}
+        self.startup_timeout = startup_timeout
+        self.process = None
+        self.log = None
+
+    @property
+    def host(self):
+        return "127.0.0.1"
+
+    def __enter__(self):
+        env = dict(os.environ, **self.extra_env)
+        command = [
+            sys.executable, "-m", "uvicorn", "api.main:app",
+            "--host", self.host, "--port", str(self.port),
+            "--workers", str(self.workers), "--log-level", "warning",
+        ]
+        # Server output goes to a file: a pipe nobody reads would block the server once full
+        self.log = tempfile.TemporaryFile()
+        self.process = subprocess.Popen(command, cwd=PYTHON_DIR, env=env,
+                                        stdout=self.log, stderr=subprocess.STDOUT)
+        deadline = time.monotonic() + self.startup_timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                self.log.seek(0)
+                raise RuntimeError(f"uvicorn exited early:\n{self.log.read().decode(errors='replace')[-4000:]}")
+            try:
+                connection = http.client.HTTPConnection(self.host, self.port, timeout=2)
+                connection.request("GET", "/")
+                if connection.getresponse().status == 200:
+                    connection.close()
+                    return self
+            except OSError:
+                time.sleep(0.2)
+        self.__exit__(None, None, None)
+        raise RuntimeError(f"uvicorn did not start within {self.startup_timeout}s")
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        if self.log:
+            self.log.close()
+        return False
+
+
+def _worker(host, port, plan, next_index, lock, start, rate, deadline, results, timeout):
+    connection = http.client.HTTPConnection(host, port, timeout=timeout)
+    while True:
+        with lock:
+            index = next_index[0]
+            next_index[0] += 1
+        if index >= len(plan):
+            break
+        scheduled = start + index / rate if rate else time.perf_counter()
+        if deadline and scheduled > deadline:
+            break
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        scenario, path, body = plan[index]
+        status = 0
+        try:
+            connection.request("POST", path, body=body, headers={"Content-Type": "application/json"})
+            response = connection.getresponse()
+            response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            connection = http.client.HTTPConnection(host, port, timeout=timeout)
+        finished = time.perf_counter()
+        results.append((scenario, status, finished - scheduled, finished - start))
+    connection.close()
+
+
+def _sample_rss(pid, interval, stop, samples, start):
+    while not stop.is_set():
+        samples.append((time.perf_counter() - start, server_rss_bytes(pid)))
+        stop.wait(interval)
+
+
+def summarize_latencies(latencies):
+    if not latencies:
+        return {"count": 0}
+    values = np.asarray(latencies) * 1000
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        "count": int(values.size),
+        "meanMs": float(values.mean()),
+        "p50Ms": float(p50),
+        "p95Ms": float(p95),
+        "p99Ms": float(p99),
+        "maxMs": float(values.max()),
+    }
+
+
+def run_load(host, port, plan, concurrency, rate=None, duration=None, server_pid=None,
+             rss_interval=1.0, timeout=120):
+    """Replay ``plan`` against ``host:port`` and return a report dictionary."""
+    results, rss_samples = [], []
+    lock, next_index = threading.Lock(), [0]
+    stop = threading.Event()
+    start = time.perf_counter()
+    deadline = start + duration if duration else None
+
+    sampler = None
+    if server_pid:
+        sampler = threading.Thread(target=_sample_rss, args=(server_pid, rss_interval, stop, rss_samples, start),
+                                   daemon=True)
+        sampler.start()
+
+    threads = [
+        threading.Thread(target=_worker, args=(host, port, plan, next_index, lock, start, rate, deadline,
+                                               results, timeout), daemon=True)
+        for _ in range(concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    stop.set()
+    if sampler:
+        sampler.join()
+
+    errors = [r for r in results if not 200 <= r[1] < 300]
+    per_scenario = {}
+    for scenario in sorted({r[0] for r in results}):
+        rows = [r for r in results if r[0] == scenario]
+        per_scenario[scenario] = dict(
+            summarize_latencies([r[2] for r in rows]),
+            errors=sum(1 for r in rows if not 200 <= r[1] < 300),
+        )
+    return {
+        "requests": len(results),
+        "durationSeconds": elapsed,
+        "throughputRps": len(results) / elapsed if elapsed > 0 else 0.0,
+        "errorRate": len(errors) / len(results) if results else 0.0,
+        "statusCounts": {str(s): sum(1 for r in results if r[1] == s) for s in sorted({r[1] for r in results})},
+        "latency": summarize_latencies([r[2] for r in results]),
+        "scenarios": per_scenario,
+        "serverRss": [{"t": round(t, 2), "bytes": b} for t, b in rss_samples],
+    }
+
+
+def print_report(report, settings):
+    latency = report["latency"]
+    print(f"\nLoad test: {settings}")
+    print(f"requests={report['requests']}  duration={report['durationSeconds']:.1f}s  "
+          f"throughput={report['throughputRps']:.1f} req/s  errors={report['errorRate'] * 100:.2f}%")
+    if latency.get("count"):
+        print(f"latency ms: p50={latency['p50Ms']:.1f}  p95={latency['p95Ms']:.1f}  "
+              f"p99={latency['p99Ms']:.1f}  max={latency['maxMs']:.1f}")
+    print(f"\n{'scenario':<30} {'count':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for name, stats in report["scenarios"].items():
+        print(f"{name:<30} {stats['count']:>6} {stats['p50Ms']:>9.1f} {stats['p95Ms']:>9.1f} "
+              f"{stats['p99Ms']:>9.1f} {stats['errors']:>7}")
+    if report["serverRss"]:
+        print("\nserver RSS (MB) over time:")
+        step = max(1, len(report["serverRss"]) // 20)
+        for sample in report["serverRss"][::step]:
+            print(f"  t={sample['t']:7.1f}s  {sample['bytes'] / 2**20:8.1f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Concurrent load test against a local LoanLogic API")
+    parser.add_argument("--url", default=None, help="Target an already running server (http://host:port)")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes to start")
+    parser.add_argument("--server-env", action="append", default=[], metavar="KEY=VALUE",
+                        help="Environment variable for the started server (repeatable)")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent client connections")
+    parser.add_argument("--rate", type=float, default=None, help="Target requests/second (open-loop)")
+    parser.add_argument("--duration", type=float, default=30.0, help="Maximum run time in seconds")
+    parser.add_argument("--requests", type=int, default=None, help="Total requests (default: enough for duration)")
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX, help="e.g. calculate-loan=3,compare-loans=1")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--rss-interval", type=float, default=1.0)
+    parser.add_argument("--output", default=None, help="Write the JSON report to this path")
+    args = parser.parse_args(argv)
+
+    total = args.requests or int((args.rate or 200) * args.duration) + args.concurrency
+    plan = build_plan(total, args.mix, args.seed)
+    settings = {
+        "workers": args.workers, "concurrency": args.concurrency, "rate": args.rate,
+        "duration": args.duration, "seed": args.seed, "serverEnv": args.server_env,
+        "mix": dict(args.mix),
+    }
+
+    if args.url:
+        target = urlsplit(args.url)
+        report = run_load(target.hostname, target.port or 80, plan, args.concurrency, args.rate, args.duration)
+    else:
+        extra_env = dict(item.split("=", 1) for item in args.server_env)
+        with Server(workers=args.workers, extra_env=extra_env) as server:
+            report = run_load(server.host, server.port, plan, args.concurrency, args.rate, args.duration,
+                              server_pid=server.process.pid, rss_interval=args.rss_interval)
+
+    report["settings"] = settings
+    print_report(report, settings)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.output}")
+    return 1 if report["errorRate"] > 0 else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,319 @@
+# -*- coding: utf-8 -*-
+"""
+In-process performance benchmarks for the calculation engine and the API.
+
+Every benchmark runs without a live server: engine functions are called directly
+and endpoints go through FastAPI's TestClient. Results are written as JSON together
+with machine metadata and compared against a baseline recorded on the same machine
+(``--update-baseline``; it is not committed, since timings only compare on one
+machine); any benchmark whose best-of-N time is slower than ``--threshold`` times its
+baseline makes the run exit with status 1, and so does a missing baseline unless
+``--no-compare`` is given: a run that cannot compare must not pass as one without
+regressions. The minimum is compared rather than the median because it is the
+statistic least affected by noise from other processes.
+
+Usage (from the python/ directory):
+
+    python -m benchmarks.run_benchmarks                    # run + compare to baseline
+    python -m benchmarks.run_benchmarks --filter klassieke # subset
+    python -m benchmarks.run_benchmarks --update-baseline  # store a new baseline
+    python -m benchmarks.run_benchmarks --no-compare       # only time, without a baseline
+"""
+import argparse
+import contextlib
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+PYTHON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PYTHON_DIR not in sys.path:
+    sys.path.insert(0, PYTHON_DIR)
+
+import numpy as np
+import pandas as pd
+
+from calculation_functions import (
+    simuleer_klassieke_lening,
+    simuleer_modulaire_lening,
+    simuleer_met_investering,
+    bereken_min_groei_voor_betaling,
+    aggregeer_jaarlijks,
+    bereken_statistieken,
+    AANKOOPPRIJS_WONING,
+    INVESTMENT_BALANCE,
+    MAANDELIJKSE_GROEI_INVESTERING,
+)
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(BENCHMARK_DIR, "baseline.json")
+DEFAULT_OUTPUT = os.path.join(BENCHMARK_DIR, "results", "latest.json")
+DEFAULT_THRESHOLD = 1.50  # 50% slower than baseline counts as a regression
+
+TERMS_YEARS = (10, 25, 30, 40)
+SCHEDULE_SIZES = (1, 12, 500)
+EIGEN_INBRENG = 100000
+RENTEVOET = 0.035
+RENTEVOET_ALTERNATIEF = 0.03
+HOOFDSOM = AANKOOPPRIJS_WONING - EIGEN_INBRENG
+
+
+def maak_aflossings_schema(looptijd_jaren, aantal_items, hoofdsom=HOOFDSOM):
+    """Spread ``aantal_items`` equal repayments evenly over the term (last one at the final month)."""
+    totaal_maanden = looptijd_jaren * 12
+    bedrag = hoofdsom / aantal_items
+    return [(totaal_maanden - (i * totaal_maanden) // aantal_items, bedrag) for i in range(aantal_items)]
+
+
+def _klassiek(looptijd_jaren):
+    return simuleer_klassieke_lening(EIGEN_INBRENG, RENTEVOET, looptijd_jaren)
+
+
+def _bullet(looptijd_jaren):
+    return simuleer_modulaire_lening(
+        EIGEN_INBRENG, RENTEVOET_ALTERNATIEF, looptijd_jaren, maak_aflossings_schema(looptijd_jaren, 1)
+    )
+
+
+def _investering(looptijd_jaren):
+    return simuleer_met_investering(
+        _klassiek(looptijd_jaren), _bullet(looptijd_jaren), EIGEN_INBRENG, EIGEN_INBRENG,
+        start_kapitaal_totaal=INVESTMENT_BALANCE,
+        maandelijkse_groei_investering=MAANDELIJKSE_GROEI_INVESTERING,
+    )
+
+
+def _api_payload(loan_type, looptijd_jaren, rentevoet_pct):
+    return {
+        "loanType": loan_type,
+        "principal": HOOFDSOM,
+        "interestRate": rentevoet_pct,
+        "termYears": looptijd_jaren,
+        "ownContribution": EIGEN_INBRENG,
+        "purchasePrice": AANKOOPPRIJS_WONING,
+    }
+
+
+def build_benchmarks():
+    """Return a list of ``(name, callable)`` pairs; setup work happens here, not in the timed call."""
+    from api.main import transform_monthly_data, transform_annual_data, transform_statistics
+
+    benchmarks = []
+    for jaren in TERMS_YEARS:
+        benchmarks.append((f"engine.simuleer_klassieke_lening[{jaren}y]", lambda j=jaren: _klassiek(j)))
+
+        for aantal in SCHEDULE_SIZES:
+            schema = maak_aflossings_schema(jaren, aantal)
+            benchmarks.append((
+                f"engine.simuleer_modulaire_lening[{jaren}y,{aantal}items]",
+                lambda j=jaren, s=schema: simuleer_modulaire_lening(EIGEN_INBRENG, RENTEVOET_ALTERNATIEF, j, s),
+            ))
+
+        df_ref, df_alt = _klassiek(jaren), _bullet(jaren)
+        benchmarks.append((
+            f"engine.simuleer_met_investering[{jaren}y]",
+            lambda r=df_ref, a=df_alt: simuleer_met_investering(
+                r.copy(), a.copy(), EIGEN_INBRENG, EIGEN_INBRENG, start_kapitaal_totaal=INVESTMENT_BALANCE
+            ),
+        ))
+
+        df_combined, start_inv_alt, _, _ = _investering(jaren)
+        benchmarks.append((
+            f"engine.bereken_min_groei_voor_betaling[{jaren}y]",
+            lambda d=df_combined, j=jaren, s=start_inv_alt: bereken_min_groei_voor_betaling(d, j * 12, HOOFDSOM, s),
+        ))
+
+        benchmarks.append((f"engine.aggregeer_jaarlijks[{jaren}y]", lambda d=df_ref: aggregeer_jaarlijks(d)))
+        benchmarks.append((
+            f"engine.bereken_statistieken[{jaren}y]",
+            lambda d=df_combined: bereken_statistieken(d, d, hoofdsom=HOOFDSOM),
+        ))
+
+        df_annual = aggregeer_jaarlijks(df_ref)
+        stats = bereken_statistieken(df_combined, df_combined, hoofdsom=HOOFDSOM)
+        benchmarks.append((f"transform.monthly_data[{jaren}y]", lambda d=df_combined: transform_monthly_data(d)))
+        benchmarks.append((f"transform.annual_data[{jaren}y]", lambda d=df_annual: transform_annual_data(d)))
+        benchmarks.append((f"transform.statistics[{jaren}y]", lambda s=stats: transform_statistics(s)))
+
+    benchmarks.extend(build_api_benchmarks())
+    return benchmarks
+
+
+def build_api_benchmarks():
+    from fastapi.testclient import TestClient
+    from api.main import app
+
+    client = TestClient(app)
+
+    def post(path, body):
+        response = client.post(path, json=body)
+        if response.status_code != 200:
+            raise RuntimeError(f"{path} returned {response.status_code}: {response.text[:200]}")
+        return response
+
+    benchmarks = []
+    for jaren in TERMS_YEARS:
+        annuity = _api_payload("annuity", jaren, RENTEVOET * 100)
+        bullet = _api_payload("bullet", jaren, RENTEVOET_ALTERNATIEF * 100)
+        benchmarks.append((
+            f"api.calculate_loan.annuity[{jaren}y]",
+            lambda b={"params": annuity}: post("/api/calculate-loan", b),
+        ))
+        comparison = {
+            "referenceLoan": annuity,
+            "alternativeLoan": bullet,
+            "referenceOwnContribution": EIGEN_INBRENG,
+            "alternativeOwnContribution": EIGEN_INBRENG,
+            "investmentParams": {"startCapital": INVESTMENT_BALANCE, "annualGrowthRate": 8.0},
+        }
+        benchmarks.append((
+            f"api.compare_loans.investment[{jaren}y]",
+            lambda b=comparison: post("/api/compare-loans", b),
+        ))
+    return benchmarks
+
+
+def time_callable(fn, repeat, min_time=0.05):
+    """
+    Time ``fn`` and return per-call statistics in seconds.
+
+    Calls are batched so that one sample takes at least ``min_time`` seconds,
+    which keeps timer resolution out of the results for sub-millisecond functions.
+    """
+    fn()  # warm-up (imports, caches, lazy allocations)
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time or number >= 10000:
+            break
+        number *= 2 if elapsed == 0 else max(2, int(min_time / elapsed) + 1)
+
+    samples = [elapsed / number]
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - start) / number)
+    return {
+        "min": min(samples),
+        "median": statistics.median(samples),
+        "mean": statistics.fmean(samples),
+        "stdev": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        "repeat": repeat,
+        "number": number,
+    }
+
+
+def machine_metadata():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=PYTHON_DIR, capture_output=True, text=True, timeout=10
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    import fastapi
+    import scipy
+    return {
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "gitCommit": commit,
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpuCount": os.cpu_count(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "scipy": scipy.__version__,
+        "fastapi": fastapi.__version__,
+    }
+
+
+def compare_to_baseline(results, baseline, threshold):
+    """Return ``(rows, regressions)`` comparing best-of-N times of shared benchmark names."""
+    rows, regressions = [], []
+    for name, current in results.items():
+        reference = baseline.get("results", {}).get(name)
+        if reference is None:
+            rows.append((name, current["min"], None, None))
+            continue
+        ratio = current["min"] / reference["min"] if reference["min"] > 0 else float("inf")
+        rows.append((name, current["min"], reference["min"], ratio))
+        if ratio > threshold:
+            regressions.append((name, ratio))
+    return rows, regressions
+
+
+def _format_ms(seconds):
+    return "-" if seconds is None else f"{seconds * 1000:10.3f}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run LoanLogic performance benchmarks")
+    parser.add_argument("--filter", default=None, help="Only run benchmarks whose name contains this substring")
+    parser.add_argument("--repeat", type=int, default=7, help="Timed samples per benchmark")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="Where to write the JSON results")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Fail when the best time exceeds the baseline best time times this factor")
+    parser.add_argument("--update-baseline", action="store_true", help="Write the results to the baseline file")
+    parser.add_argument("--no-compare", action="store_true", help="Skip the baseline comparison")
+    args = parser.parse_args(argv)
+
+    results = {}
+    # The engine prints debug output; keep it out of the terminal but inside the timing
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        benchmarks = build_benchmarks()
+        for name, fn in benchmarks:
+            if args.filter and args.filter not in name:
+                continue
+            results[name] = time_callable(fn, args.repeat)
+            print(f"{name:<60} {results[name]['min'] * 1000:10.3f} ms", file=sys.stderr)
+
+    report = {"metadata": machine_metadata(), "results": results}
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print(f"\nResults written to {args.output}")
+
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print(f"Baseline updated: {args.baseline}")
+        return 0
+
+    if args.no_compare:
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"FAILED: no baseline at {args.baseline}; record one on this machine with --update-baseline, "
+              f"or pass --no-compare to only time")
+        return 1
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    rows, regressions = compare_to_baseline(results, baseline, args.threshold)
+    print(f"\n{'benchmark':<60} {'current ms':>10} {'baseline ms':>11} {'ratio':>7}")
+    for name, current, reference, ratio in rows:
+        ratio_text = "    new" if ratio is None else f"{ratio:7.2f}"
+        flag = "  REGRESSION" if ratio is not None and ratio > args.threshold else ""
+        print(f"{name:<60} {_format_ms(current)} {_format_ms(reference):>11} {ratio_text}{flag}")
+
+    if regressions:
+        print(f"\nFAILED: {len(regressions)} benchmark(s) slower than {args.threshold:.2f}x baseline "
+              f"(baseline recorded on {baseline.get('metadata', {}).get('platform', 'unknown')})")
+        for name, ratio in regressions:
+            print(f"  {name}: {ratio:.2f}x")
+        return 1
+    print(f"\nOK: no benchmark slower than {args.threshold:.2f}x baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
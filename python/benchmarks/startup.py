@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""
+Cold-start cost of an API worker.
+
+Imports ``api.main`` in a fresh interpreter under ``python -X importtime`` and
+reports the cumulative import time, the most expensive modules and whether any of
+the lazily imported libraries (``LAZY_MODULES``) were loaded anyway. A bare import of
+the heavy dependencies (``DEPENDENCIES``) is timed the same way; the difference is the
+API's own import cost. A last fresh interpreter times ``warmup.warm_up``, which must
+leave SciPy unloaded as well. The imports are repeated ``--repeat`` times
+and the best run counts, as in ``run_benchmarks``: the first run after a code change
+also pays for writing bytecode caches.
+
+The run exits with status 1 when the import exceeds ``--budget-ms`` (default
+``IMPORT_BUDGET_MS``), its own cost exceeds ``--own-budget-ms`` (default
+``OWN_IMPORT_BUDGET_MS``) or it loads a lazy module. ``test_startup.py`` enforces the
+lazy modules and the own-cost budget: measured against the dependencies in the same
+run, it holds on slow machines too (``LOANLOGIC_TEST_OWN_IMPORT_BUDGET_MS`` overrides it).
+
+Usage (from the python/ directory):
+
+    python -m benchmarks.startup
+    python -m benchmarks.startup --repeat 5 --top 25 --budget-ms 1000
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+
+PYTHON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_BUDGET_MS = 1500
+# Import time of api.main beyond that of its heavy dependencies alone
+OWN_IMPORT_BUDGET_MS = 500
+DEPENDENCIES = ("fastapi", "pandas")
+# Only needed by some calculations; importing them at start-up is a regression
+LAZY_MODULES = ("scipy", "numpy_financial")
+# Lazy modules the warm-up must not load either; numpy_financial takes under a millisecond
+# once NumPy is loaded, and every annuity needs it
+WARMUP_LAZY_MODULES = ("scipy",)
+
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def parse_importtime(stderr):
+    """``{module: {"self_ms", "cumulative_ms", "depth"}}`` from ``-X importtime`` output."""
+    modules = {}
+    for line in stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            own, cumulative, indent, name = match.groups()
+            modules[name] = {"self_ms": int(own) / 1000, "cumulative_ms": int(cumulative) / 1000,
+                             "depth": (len(indent) - 1) // 2}
+    return modules
+
+
+def measure_import(module="api.main", python=sys.executable):
+    """Import ``module`` in a fresh interpreter; returns its cumulative import time and every module loaded."""
+    completed = subprocess.run(
+        [python, "-X", "importtime", "-c", f"import {module}"],
+        cwd=PYTHON_DIR, capture_output=True, text=True, check=True,
+    )
+    modules = parse_importtime(completed.stderr)
+    return {
+        "module": module,
+        "import_ms": modules[module]["cumulative_ms"],
+        "lazy_modules_loaded": sorted({name.split(".")[0] for name in modules} & set(LAZY_MODULES)),
+        "modules": modules,
+    }
+
+
+def measure_dependencies(modules=DEPENDENCIES, python=sys.executable):
+    """Cumulative import time (ms) of ``modules`` alone, in a fresh interpreter."""
+    completed = subprocess.run(
+        [python, "-X", "importtime", "-c", "import " + ", ".join(modules)],
+        cwd=PYTHON_DIR, capture_output=True, text=True, check=True,
+    )
+    found = parse_importtime(completed.stderr)
+    return sum(found[name]["cumulative_ms"] for name in modules)
+
+
+def measure_warmup(python=sys.executable):
+    """Seconds per warm-up step and the lazy modules it loaded, in a fresh interpreter that has imported the API."""
+    script = ("import json, sys, api.main, warmup; steps = warmup.warm_up(); "
+              "print(json.dumps({'steps': steps, 'lazy': sorted({m.split('.')[0] for m in sys.modules})}))")
+    completed = subprocess.run([python, "-c", script], cwd=PYTHON_DIR, capture_output=True, text=True, check=True)
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    return result["steps"], sorted(set(result["lazy"]) & set(WARMUP_LAZY_MODULES))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="api.main")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--top", type=int, default=15, help="most expensive top-level imports to list")
+    parser.add_argument("--budget-ms", type=float, default=IMPORT_BUDGET_MS)
+    parser.add_argument("--own-budget-ms", type=float, default=OWN_IMPORT_BUDGET_MS)
+    parser.add_argument("--no-warmup", action="store_true", help="skip timing the warm-up")
+    args = parser.parse_args(argv)
+
+    runs = [measure_import(args.module) for _ in range(max(args.repeat, 1))]
+    best = min(runs, key=lambda run: run["import_ms"])
+    print(f"import {args.module}: best {best['import_ms']:.0f} ms of "
+          f"{[round(run['import_ms']) for run in runs]} (budget {args.budget_ms:.0f} ms)")
+    dependencies_ms = min(measure_dependencies() for _ in range(max(args.repeat, 1)))
+    own_ms = best["import_ms"] - dependencies_ms
+    print(f"own import: {own_ms:.0f} ms beyond {' + '.join(DEPENDENCIES)} ({dependencies_ms:.0f} ms), "
+          f"budget {args.own_budget_ms:.0f} ms")
+
+    # Direct imports of the measured module and of the interpreter, by cumulative time
+    top_level = [(name, values) for name, values in best["modules"].items() if values["depth"] <= 1 and name != args.module]
+    for name, values in sorted(top_level, key=lambda item: -item[1]["cumulative_ms"])[:args.top]:
+        print(f"  {values['cumulative_ms']:8.1f} ms  {name}")
+
+    warmup_lazy = []
+    if not args.no_warmup:
+        steps, warmup_lazy = measure_warmup()
+        print(f"warm-up: {sum(steps.values()) * 1000:.0f} ms")
+        for name, seconds in steps.items():
+            print(f"  {seconds * 1000:8.1f} ms  {name}")
+
+    failed = False
+    if best["lazy_modules_loaded"]:
+        print(f"FAIL: {args.module} imports {best['lazy_modules_loaded']} at start-up")
+        failed = True
+    if warmup_lazy:
+        print(f"FAIL: the warm-up imports {warmup_lazy}")
+        failed = True
+    if best["import_ms"] > args.budget_ms:
+        print(f"FAIL: import takes {best['import_ms']:.0f} ms, budget {args.budget_ms:.0f} ms")
+        failed = True
+    if own_ms > args.own_budget_ms:
+        print(f"FAIL: own import takes {own_ms:.0f} ms, budget {args.own_budget_ms:.0f} ms")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+"""
+Batched break-even growth rates: the minimum investment return for many
+(contribution stream, target) problems at once.
+
+``los_min_groei_batch`` is the vectorized counterpart of
+``bereken_min_groei_voor_betaling``: every problem gets its own safeguarded
+Newton iteration (falling back to bisection inside the bracket), and problems
+drop out of the work set as soon as they converge, so the cost grows linearly
+with the number of problems. ``bereken_break_even_oppervlak`` builds the problems
+for a grid of alternative-loan rate x term x own contribution.
+"""
+import numpy as np
+
+from batch_engine import simuleer_leningen_batch
+from calculation_functions import INVESTMENT_BALANCE, START_JAAR_KALENDER
+from cancellation import checkpoint
+from metrics import MIN_GROWTH_SOLVER_ITERATIONS, MIN_GROWTH_SOLVER_FAILURES
+
+# Same monthly search interval as bereken_min_groei_voor_betaling (-5% .. +10% per month)
+ONDERGRENS_MAANDGROEI = -0.05
+BOVENGRENS_MAANDGROEI = 0.10
+XTOL = 1e-9
+MAX_ITERATIES = 100
+
+
+def _eindwaarde(maandgroei, start_investering, bijdragen, betaal_maanden):
+    """Investment value at the payment month and its derivative to the monthly rate, per problem."""
+    groei = 1 + maandgroei
+    # Contribution i (month i + 1) grows for (payment month - i - 1) months; later months do not count
+    perioden = betaal_maanden[:, None] - np.arange(1, bijdragen.shape[1] + 1)[None, :]
+    telt = perioden >= 0
+    perioden = np.where(telt, perioden, 0)
+    factoren = np.where(telt, groei[:, None] ** perioden, 0.0)
+    afgeleiden = np.where(telt & (perioden > 0), perioden * groei[:, None] ** (perioden - 1), 0.0)
+
+    groei_start = groei ** betaal_maanden
+    fv = start_investering * groei_start + (bijdragen * factoren).sum(axis=1)
+    dfv = (start_investering * betaal_maanden * groei ** (betaal_maanden - 1)
+           + (bijdragen * afgeleiden).sum(axis=1))
+    return fv, dfv
+
+
+def los_min_groei_batch(
+    start_investering,
+    bijdragen,
+    betaal_maanden,
+    doelbedragen,
+    ondergrens=ONDERGRENS_MAANDGROEI,
+    bovengrens=BOVENGRENS_MAANDGROEI,
+    xtol=XTOL,
+    max_iteraties=MAX_ITERATIES,
+):
+    """
+    Minimum monthly growth per problem so that the investment reaches its target at the payment month.
+
+    ``bijdragen`` is a (problems x months) matrix of monthly contributions (month 1 in
+    column 0), ``start_investering``, ``betaal_maanden`` and ``doelbedragen`` have one
+    entry per problem. Returns a dict of per-problem arrays: ``annualRate`` and
+    ``monthlyRate`` (NaN when the target cannot be bracketed in the search interval or
+    the iteration did not converge), ``converged`` and ``iterations``.
+    """
+    bijdragen = np.atleast_2d(np.asarray(bijdragen, dtype=float))
+    n = bijdragen.shape[0]
+    start_investering = np.broadcast_to(np.asarray(start_investering, dtype=float), (n,))
+    betaal_maanden = np.broadcast_to(np.asarray(betaal_maanden, dtype=int), (n,))
+    doelbedragen = np.broadcast_to(np.asarray(doelbedragen, dtype=float), (n,))
+
+    def doelfunctie(idx, maandgroei):
+        fv, dfv = _eindwaarde(maandgroei, start_investering[idx], bijdragen[idx], betaal_maanden[idx])
+        return fv - doelbedragen[idx], dfv
+
+    alle = np.arange(n)
+    laag = np.full(n, float(ondergrens))
+    hoog = np.full(n, float(bovengrens))
+    f_laag, _ = doelfunctie(alle, laag)
+    f_hoog, _ = doelfunctie(alle, hoog)
+    gebracketed = np.sign(f_laag) != np.sign(f_hoog)
+
+    x = np.clip(np.zeros(n), laag, hoog)
+    geconvergeerd = np.zeros(n, dtype=bool)
+    iteraties = np.zeros(n, dtype=int)
+    # Exact roots on the interval bounds need no iteration
+    geconvergeerd |= f_laag == 0
+    x = np.where(f_laag == 0, laag, x)
+    geconvergeerd |= (f_hoog == 0) & ~geconvergeerd
+    x = np.where((f_hoog == 0) & (f_laag != 0), hoog, x)
+
+    actief = np.flatnonzero(gebracketed & ~geconvergeerd)
+    while actief.size and iteraties[actief].max() < max_iteraties:
+        checkpoint()
+        xa = x[actief]
+        f, df = doelfunctie(actief, xa)
+        iteraties[actief] += 1
+
+        # Shrink the bracket around the root
+        zelfde_als_laag = np.sign(f) == np.sign(f_laag[actief])
+        laag[actief] = np.where(zelfde_als_laag, xa, laag[actief])
+        f_laag[actief] = np.where(zelfde_als_laag, f, f_laag[actief])
+        hoog[actief] = np.where(zelfde_als_laag, hoog[actief], xa)
+
+        # Newton step, replaced by bisection when it leaves the bracket
+        with np.errstate(divide="ignore", invalid="ignore"):
+            newton = xa - f / df
+        binnen = np.isfinite(newton) & (newton > laag[actief]) & (newton < hoog[actief])
+        nieuw = np.where(binnen, newton, (laag[actief] + hoog[actief]) / 2)
+
+        klaar = (f == 0) | (np.abs(nieuw - xa) < xtol) | (hoog[actief] - laag[actief] < xtol)
+        x[actief] = np.where(f == 0, xa, nieuw)
+        geconvergeerd[actief] = klaar
+        actief = actief[~klaar]
+
+    opgelost = gebracketed & geconvergeerd
+    maandgroei = np.where(opgelost, x, np.nan)
+    return {
+        "monthlyRate": maandgroei,
+        "annualRate": (1 + maandgroei) ** 12 - 1,
+        "converged": opgelost,
+        "iterations": iteraties,
+    }
+
+
+def bereken_break_even_oppervlak(
+    referentie_betalingen,
+    aankoopprijs,
+    alt_rentevoeten,
+    alt_looptijden_jaren,
+    alt_eigen_inbrengen,
+    alt_loan_type='bullet',
+    aflossings_schema=None,
+    start_kapitaal_totaal=INVESTMENT_BALANCE,
+    invest_kapitaal_alternatief=None,
+    start_jaar_kalender=START_JAAR_KALENDER,
+    schuldsaldo_dekking_pct=1.0,
+):
+    """
+    Minimum annual investment return for every alternative loan in a rate x term x own-contribution grid.
+
+    As in ``simuleer_met_investering`` the alternative invests its start capital (total
+    capital minus own contribution, or ``invest_kapitaal_alternatief``) plus the monthly
+    payment difference with ``referentie_betalingen`` (total monthly payments of the
+    reference loan), the alternative's final repayment included. As in
+    ``bereken_min_groei_voor_betaling`` on ``/api/compare-loans`` and in
+    ``compare_many.vergelijk_alternatieven``, the target at the end of the term is the
+    alternative's principal. Returns a dict with ``annualRate``, ``converged`` and
+    ``iterations`` arrays of shape (rates, terms, contributions).
+    """
+    referentie_betalingen = np.asarray(referentie_betalingen, dtype=float)
+    rentevoeten = np.atleast_1d(np.asarray(alt_rentevoeten, dtype=float))
+    looptijden = [int(jaren) for jaren in np.atleast_1d(alt_looptijden_jaren)]
+    inbrengen = np.atleast_1d(np.asarray(alt_eigen_inbrengen, dtype=float))
+    max_maanden = max(max(looptijden) * 12, len(referentie_betalingen))
+    referentie = np.zeros(max_maanden)
+    referentie[:len(referentie_betalingen)] = referentie_betalingen
+
+    n_r, n_t, n_c = len(rentevoeten), len(looptijden), len(inbrengen)
+    bijdragen = np.zeros((n_r, n_t, n_c, max_maanden))
+    doelen = np.zeros((n_r, n_t, n_c))
+    betaal_maanden = np.zeros((n_r, n_t, n_c), dtype=int)
+    rente_grid, inbreng_grid = (a.ravel() for a in np.meshgrid(rentevoeten, inbrengen, indexing="ij"))
+    hoofdsommen = np.clip(aankoopprijs - inbreng_grid, 0, None)
+
+    for t, jaren in enumerate(looptijden):
+        maanden = jaren * 12
+        batch = simuleer_leningen_batch(
+            hoofdsommen, rente_grid, jaren, alt_loan_type, aflossings_schema,
+            start_jaar_kalender=start_jaar_kalender, schuldsaldo_dekking_pct=schuldsaldo_dekking_pct,
+        )
+        verschil = np.tile(referentie, (len(rente_grid), 1))
+        verschil[:, :maanden] -= batch["totalMonthlyPayment"]
+        bijdragen[:, t] = verschil.reshape(n_r, n_c, max_maanden)
+        doelen[:, t] = hoofdsommen.reshape(n_r, n_c)
+        betaal_maanden[:, t] = maanden
+
+    if invest_kapitaal_alternatief is not None:
+        start = np.full((n_r, n_t, n_c), float(invest_kapitaal_alternatief))
+    else:
+        start = np.broadcast_to(np.clip(start_kapitaal_totaal - inbrengen, 0, None), (n_r, n_t, n_c))
+
+    resultaat = los_min_groei_batch(
+        start.ravel(), bijdragen.reshape(-1, max_maanden), betaal_maanden.ravel(), doelen.ravel()
+    )
+    MIN_GROWTH_SOLVER_ITERATIONS.observe(int(resultaat["iterations"].max(initial=0)), method="batch_newton")
+    mislukt = int((~resultaat["converged"]).sum())
+    if mislukt:
+        MIN_GROWTH_SOLVER_FAILURES.inc(mislukt, method="batch_newton")
+
+    vorm = (n_r, n_t, n_c)
+    return {
+        "annualRate": resultaat["annualRate"].reshape(vorm),
+        "converged": resultaat["converged"].reshape(vorm),
+        "iterations": resultaat["iterations"].reshape(vorm),
+    }
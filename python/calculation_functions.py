@@ -1,9 +1,12 @@
 # -*- coding: utf-8 -*-
-# Stap 1: Imports (voeg scipy toe)
+# Stap 1: Imports
+# scipy (root finding) en numpy_financial worden pas geladen in de functies die ze gebruiken:
+# scipy.optimize alleen al kost honderden milliseconden bij het opstarten van de API.
 import numpy as np
 import pandas as pd
-import numpy_financial as npf
-from scipy import optimize # Voor root finding
+
+from cancellation import checkpoint
+from metrics import MIN_GROWTH_SOLVER_ITERATIONS, MIN_GROWTH_SOLVER_FAILURES
 
 
 
@@ -83,6 +86,7 @@ def simuleer_klassieke_lening(
     huidige_jaarlijkse_ssv = 0
 
     if maandelijkse_rentevoet > 0:
+         import numpy_financial as npf
          vaste_betaling = npf.pmt(maandelijkse_rentevoet, afbetalings_maanden, -hoofdsom) # pmt verwacht negatieve pv
     else:
          vaste_betaling = hoofdsom / afbetalings_maanden if afbetalings_maanden > 0 else 0
@@ -92,6 +96,7 @@ def simuleer_klassieke_lening(
 
         # Haal SSV premie op aan het begin van elk *simulatie* jaar
         if (maand - 1) % 12 == 0:
+             checkpoint() # Stop hier als de berekening geannuleerd is (client weg)
              huidige_jaarlijkse_ssv = schat_schuldsaldo_premie( # Deze wordt nu correct binnen de loop aangeroepen
                  simulatie_jaar, start_jaar_kalender, loan_type, schuldsaldo_dekking_pct
              )
@@ -171,6 +176,7 @@ def simuleer_modulaire_lening(
 
         # Haal SSV premie op aan het begin van elk *simulatie* jaar
         if (maand - 1) % 12 == 0:
+             checkpoint() # Stop hier als de berekening geannuleerd is (client weg)
              huidige_jaarlijkse_ssv = schat_schuldsaldo_premie( # Deze wordt nu correct binnen de loop aangeroepen
                  simulatie_jaar, start_jaar_kalender, loan_type, schuldsaldo_dekking_pct
              )
@@ -241,11 +247,11 @@ def vergelijk_jaarlijks(df_jaarlijks_ref, df_jaarlijks_alt, naam_ref, naam_alt):
         return pd.DataFrame()
 
     # Zorg dat beide dataframes dezelfde jaren hebben voor vergelijking
-    merged_df = pd.merge(df_jaarlijks_ref, df_jaarlijks_alt, on='Jaar', suffixes=(f'_{naam_ref}', f'_{naam_alt}'), how='outer')
+    merged_df = pd.merge(df_jaarlijks_ref, df_jaarlijks_alt, on='year', suffixes=(f'_{naam_ref}', f'_{naam_alt}'), how='outer')
     merged_df = merged_df.fillna(0) # Vul ontbrekende jaren met 0
 
     vergelijk_df = pd.DataFrame()
-    vergelijk_df['year'] = merged_df['month']
+    vergelijk_df['year'] = merged_df['year']
 
     # Bereken verschillen (Alternatief - Referentie)
     cols_to_compare = ['annualInterest', 'annualPrincipal', 'annualInsurance',
@@ -268,6 +274,7 @@ def bereken_min_groei_voor_betaling(
     start_investering # Initieel geïnvesteerd kapitaal
     ):
     """Berekent de minimaal benodigde jaarlijkse groei om een betaling te halen."""
+    from scipy import optimize # Voor root finding; pas hier geladen (zie imports)
     if df_combined.empty or 'monthlyContribution' not in df_combined.columns:
         print("Kan minimale groei niet berekenen: investeringsdata ontbreekt.")
         return None
@@ -277,6 +284,7 @@ def bereken_min_groei_voor_betaling(
     # De start_investering is het bedrag *voor* maand 1.
     # Functie die de eindwaarde berekent gegeven een *maandelijkse* groei rate 'r'
     def calculate_future_value(monthly_rate):
+        checkpoint() # Elke solver-evaluatie is een annuleringspunt
         r = monthly_rate
         if r <= -1: # Voorkom delen door nul of negatieve basis
             print(f"DEBUG: Ongeldige maandelijkse groei rate r={r}")
@@ -315,7 +323,10 @@ def bereken_min_groei_voor_betaling(
 
         # Controleer of de functie van teken wisselt in dit interval
         if np.sign(val_low) != np.sign(val_high):
-             monthly_rate_solution = optimize.brentq(target_function, -0.05, 0.10, xtol=1e-6, rtol=1e-6)
+             monthly_rate_solution, solver_info = optimize.brentq(
+                 target_function, -0.05, 0.10, xtol=1e-6, rtol=1e-6, full_output=True
+             )
+             MIN_GROWTH_SOLVER_ITERATIONS.observe(solver_info.iterations, method="brentq")
              # Converteer naar jaarlijkse rate
              annual_rate_solution = (1 + monthly_rate_solution)**12 - 1
              return annual_rate_solution
@@ -328,18 +339,22 @@ def bereken_min_groei_voor_betaling(
              # Probeer fsolve met een startpunt (bv 0)
              try:
                  monthly_rate_solution, info, ier, msg = optimize.fsolve(target_function, x0=0.0, full_output=True)
+                 MIN_GROWTH_SOLVER_ITERATIONS.observe(info.get("nfev", 0), method="fsolve")
                  if ier == 1: # Oplossing gevonden
                       annual_rate_solution = (1 + monthly_rate_solution[0])**12 - 1
                       return annual_rate_solution
                  else:
                       print(f"fsolve faalde ook: {msg}")
+                      MIN_GROWTH_SOLVER_FAILURES.inc(method="fsolve")
                       return None
              except Exception as e:
                  print(f"Fout tijdens fsolve: {e}")
+                 MIN_GROWTH_SOLVER_FAILURES.inc(method="fsolve")
                  return None
 
     except Exception as e:
         print(f"Fout tijdens zoeken naar minimale groei: {e}")
+        MIN_GROWTH_SOLVER_FAILURES.inc(method="brentq")
         return None
 
 
@@ -399,6 +414,8 @@ def simuleer_met_investering(
     huidige_investering_saldo_ref = start_investering_ref
     cumulatieve_investering_bijdrage_ref = start_investering_ref
     for maand in range(1, max_maand + 1):
+        if (maand - 1) % 12 == 0:
+            checkpoint()
         huidige_investering_saldo_ref *= (1 + maandelijkse_groei_investering)
         # Referentie: geen verschil in uitgaven, dus geen maandelijkse bijdrage/onttrekking
         investering_data_ref.append({
@@ -414,6 +431,8 @@ def simuleer_met_investering(
     huidige_investering_saldo_alt = start_investering_alt
     cumulatieve_investering_bijdrage_alt = start_investering_alt
     for maand in range(1, max_maand + 1):
+        if (maand - 1) % 12 == 0:
+            checkpoint()
         huidige_investering_saldo_alt *= (1 + maandelijkse_groei_investering)
         # Alternatief: verschil in maandlasten t.o.v. referentie wordt toegevoegd/onttrokken
         uitgave_ref = ref_uitgaven.get(maand, 0)
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+Cooperative cancellation of calculations.
+
+API handlers run calculations through ``run_cancellable``: the work is submitted
+to ``CALCULATION_EXECUTOR`` while the event loop waits for a client disconnect.
+When the client goes away the future is cancelled (if it has not started yet)
+and the computation's ``CancellationToken`` is set; the engine calls
+``checkpoint()`` at cheap, regular points (once per simulated year, per solver
+iteration, between graph nodes), which raises ``ComputationCancelled`` so the
+worker thread is freed instead of finishing work nobody will read.
+"""
+import asyncio
+import contextvars
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from config import settings
+from metrics import COMPUTATIONS_ABORTED
+from profiling import active_cpu_profile
+
+# Status code used by nginx for "client closed request"; never seen by the client itself
+CLIENT_CLOSED_REQUEST = 499
+
+CALCULATION_EXECUTOR = ThreadPoolExecutor(max_workers=settings.calculation_threads,
+                                          thread_name_prefix="loanlogic-calc")
+
+_current_token = contextvars.ContextVar("loanlogic_cancellation_token", default=None)
+
+
+class ComputationCancelled(BaseException):
+    """
+    Raised at a checkpoint of a cancelled computation.
+
+    Derives from BaseException (like ``asyncio.CancelledError``) so that the broad
+    ``except Exception`` fallbacks in the engine do not swallow it.
+    """
+
+
+class CancellationToken:
+    def __init__(self):
+        self._event = threading.Event()
+        self.reason = None
+
+    def cancel(self, reason="cancelled"):
+        self.reason = reason
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise ComputationCancelled(self.reason)
+
+
+@contextmanager
+def cancellation_scope(token):
+    """Make ``token`` the one checked by ``checkpoint()`` in this context."""
+    reset = _current_token.set(token)
+    try:
+        yield token
+    finally:
+        _current_token.reset(reset)
+
+
+def checkpoint():
+    """Raise ``ComputationCancelled`` if the current computation was cancelled; no-op otherwise."""
+    token = _current_token.get()
+    if token is not None and token.cancelled:
+        raise ComputationCancelled(token.reason)
+
+
+def _run_with_token(token, fn, args, kwargs):
+    with cancellation_scope(token):
+        token.raise_if_cancelled()
+        return fn(*args, **kwargs)
+
+
+async def wait_for_disconnect(request):
+    """Return once the ASGI server reports that the client of ``request`` disconnected."""
+    while True:
+        message = await request.receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+async def run_cancellable(request, fn, *args, endpoint=None, executor=None, **kwargs):
+    """
+    Run ``fn(*args, **kwargs)`` in the calculation pool and cancel it when the client disconnects
+    or the awaiting task is cancelled.
+
+    The caller's context (profiling stages, tokens) is copied into the worker thread,
+    and a CPU-profiled request also gets a profiler in that thread.
+    Must be called after the request body has been read (FastAPI has done so for body
+    parameters). Without a ``request`` (e.g. WebSocket sessions, which watch their own
+    connection) only cancelling the awaiting task aborts the computation. Raises
+    ``ComputationCancelled`` after a disconnect; every aborted computation is counted
+    in ``loanlogic_computations_aborted_total``.
+    """
+    endpoint = endpoint or getattr(fn, "__name__", "unknown")
+    session = active_cpu_profile()
+    if session is not None:
+        # The request's own profiler only sees the event-loop thread
+        fn = functools.partial(session.run, fn)
+    token = CancellationToken()
+    context = contextvars.copy_context()
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(
+        executor or CALCULATION_EXECUTOR,
+        functools.partial(context.run, _run_with_token, token, fn, args, kwargs),
+    )
+    disconnected = asyncio.ensure_future(wait_for_disconnect(request)) if request is not None else None
+    try:
+        await asyncio.wait({future} if disconnected is None else {future, disconnected},
+                           return_when=asyncio.FIRST_COMPLETED)
+    except asyncio.CancelledError:
+        # The handler task itself was cancelled (e.g. server shutdown, a superseded live calculation)
+        token.cancel("request cancelled")
+        future.cancel()
+        COMPUTATIONS_ABORTED.inc(endpoint=endpoint, reason="request_cancelled")
+        raise
+    finally:
+        if disconnected is not None and not disconnected.done():
+            disconnected.cancel()
+
+    if future.done():
+        return future.result()
+    token.cancel("client disconnected")
+    future.cancel()
+    COMPUTATIONS_ABORTED.inc(endpoint=endpoint, reason="client_disconnected")
+    raise ComputationCancelled("client disconnected")
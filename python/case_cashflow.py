@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""
+Household cash flow of all loans of a case on one calendar-month axis.
+
+Loans are simulated by ``simuleer_leningen_gegroepeerd`` (one ``simuleer_leningen_batch``
+call per group of loans that share type, term, schedule, deferral, start year and
+insurance coverage). Every loan starts in January of its start year, so the loans of
+one start year are placed on the shared axis with a single offset slice; household,
+per-client and per-case series are then matrix products
+of the aligned (loans x calendar months) arrays with share matrices, without
+merging DataFrames.
+"""
+import numpy as np
+
+from batch_engine import groep_sleutel, simuleer_leningen_gegroepeerd
+
+CASHFLOW_COLUMNS = (
+    "totalMonthlyPayment",
+    "paymentExcludingInsurance",
+    "interest",
+    "principalPayment",
+    "insurancePremium",
+    "remainingPrincipal",
+)
+
+
+def aandelen_matrix(leningen_aandelen, sleutels):
+    """
+    (keys x loans) matrix of the fraction of every loan carried per key.
+
+    ``leningen_aandelen`` holds one ``{key: share}`` dict per loan; shares are
+    normalised per loan, so they may be given in percent. A loan without shares is
+    split evenly over all ``sleutels``.
+    """
+    index = {sleutel: i for i, sleutel in enumerate(sleutels)}
+    matrix = np.zeros((len(sleutels), len(leningen_aandelen)))
+    for j, aandelen in enumerate(leningen_aandelen):
+        aandelen = {k: v for k, v in (aandelen or {}).items() if k in index and v > 0}
+        if not aandelen:
+            if sleutels:
+                matrix[:, j] = 1 / len(sleutels)
+            continue
+        totaal = sum(aandelen.values())
+        for sleutel, aandeel in aandelen.items():
+            matrix[index[sleutel], j] = aandeel / totaal
+    return matrix
+
+
+def simuleer_case_kasstroom(leningen):
+    """
+    Simulate all ``leningen`` and align them on a calendar-month axis.
+
+    Every loan is a dict with the keyword arguments of ``simuleer_leningen_batch``
+    (``hoofdsom``, ``jaarlijkse_rentevoet``, ``looptijd_jaren``, ``loan_type``,
+    ``aflossings_schema``, ``uitstel_maanden``, ``start_jaar_kalender``,
+    ``schuldsaldo_dekking_pct``). Returns ``start_jaar`` (calendar year of axis
+    month 0), ``kalender_jaar`` / ``kalender_maand`` per axis month, ``start_index``
+    and ``eind_index`` per loan, and a (loans x months) array per ``CASHFLOW_COLUMNS``
+    entry, zero outside each loan's term.
+    """
+    if not leningen:
+        raise ValueError("Geen leningen om te simuleren.")
+    sleutels = [groep_sleutel(lening) for lening in leningen]
+    start_jaar = min(sleutel[4] for sleutel in sleutels)
+    start_index = np.array([(sleutel[4] - start_jaar) * 12 for sleutel in sleutels])
+    eind_index = start_index + np.array([sleutel[1] * 12 for sleutel in sleutels])
+    totaal_maanden = int(eind_index.max())
+
+    batch = simuleer_leningen_gegroepeerd(leningen)
+    uitgelijnd = {kolom: np.zeros((len(leningen), totaal_maanden)) for kolom in CASHFLOW_COLUMNS}
+    for begin in np.unique(start_index):
+        # Loans starting in the same month share one slice per column; past a term the flows are zero
+        indices = np.flatnonzero(start_index == begin)
+        lengte = min(batch["maanden"].max(), totaal_maanden - begin)
+        for kolom in CASHFLOW_COLUMNS:
+            uitgelijnd[kolom][indices, begin:begin + lengte] = batch[kolom][indices, :lengte]
+
+    maanden = np.arange(totaal_maanden)
+    return dict(
+        uitgelijnd,
+        start_jaar=start_jaar,
+        kalender_jaar=start_jaar + maanden // 12,
+        kalender_maand=maanden % 12 + 1,
+        start_index=start_index,
+        eind_index=eind_index,
+    )
+
+
+def jaarlijks(reeksen, kalender_jaar):
+    """Per-calendar-year aggregation of (rows x months) series: sums for flows, year-end value for the balance."""
+    jaren, eerste = np.unique(kalender_jaar, return_index=True)
+    resultaat = {"jaar": jaren}
+    for kolom, reeks in reeksen.items():
+        if kolom == "remainingPrincipal":
+            laatste = np.append(eerste[1:], len(kalender_jaar)) - 1
+            resultaat[kolom] = reeks[..., laatste]
+        else:
+            resultaat[kolom] = np.add.reduceat(reeks, eerste, axis=-1)
+    return resultaat
+
+
+def bereken_case_kasstroom(leningen, klant_aandelen=None, klant_ids=None, case_ids=None):
+    """
+    Household cash flow of a case: monthly and annual totals, the peak-payment month and per-client / per-case shares.
+
+    ``klant_aandelen`` holds per loan a ``{client_id: share}`` dict (see ``aandelen_matrix``),
+    ``klant_ids`` the clients to report on (default: every client in the shares) and
+    ``case_ids`` the case of every loan (for linked cases).
+    """
+    kasstroom = simuleer_case_kasstroom(leningen)
+    uitgelijnd = {kolom: kasstroom[kolom] for kolom in CASHFLOW_COLUMNS}
+    totaal = {kolom: reeks.sum(axis=0) for kolom, reeks in uitgelijnd.items()}
+    maanden = np.arange(len(kasstroom["kalender_jaar"]))
+    actief = ((maanden[None, :] >= kasstroom["start_index"][:, None])
+              & (maanden[None, :] < kasstroom["eind_index"][:, None])).sum(axis=0)
+
+    piek = int(np.argmax(totaal["totalMonthlyPayment"]))
+    resultaat = {
+        "kasstroom": kasstroom,
+        "totaal": totaal,
+        "actieve_leningen": actief,
+        "jaarlijks": jaarlijks(totaal, kasstroom["kalender_jaar"]),
+        "piek": {
+            "index": piek,
+            "kalender_jaar": int(kasstroom["kalender_jaar"][piek]),
+            "kalender_maand": int(kasstroom["kalender_maand"][piek]),
+            "bedrag": float(totaal["totalMonthlyPayment"][piek]),
+        },
+    }
+
+    groeperingen = {}
+    if klant_aandelen is not None or klant_ids:
+        klant_aandelen = klant_aandelen or [None] * len(leningen)
+        if not klant_ids:
+            klant_ids = list(dict.fromkeys(k for aandelen in klant_aandelen for k in (aandelen or {})))
+        groeperingen["klanten"] = (klant_ids, aandelen_matrix(klant_aandelen, klant_ids))
+    if case_ids is not None:
+        cases = list(dict.fromkeys(case_ids))
+        groeperingen["cases"] = (cases, aandelen_matrix([{c: 1.0} for c in case_ids], cases))
+
+    for naam, (sleutels, matrix) in groeperingen.items():
+        # (keys x loans) @ (loans x months)
+        reeksen = {kolom: matrix @ reeks for kolom, reeks in uitgelijnd.items()}
+        resultaat[naam] = {
+            "ids": sleutels,
+            "aandelen": matrix,
+            "reeksen": reeksen,
+            "jaarlijks": jaarlijks(reeksen, kasstroom["kalender_jaar"]),
+        }
+    return resultaat
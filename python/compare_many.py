@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+One reference loan against many alternatives in a single pass.
+
+The reference is simulated once; all alternatives go through
+``simuleer_leningen_gegroepeerd`` (one batch call per group of alternatives that
+share type, term and schedule) and land on a shared loan-month axis. Investment
+paths follow ``simuleer_met_investering`` (the alternative invests the payment
+difference with the reference each month, floored at zero) as one recursion over
+months on an (alternatives,) vector, the minimum required growth rates come from
+``los_min_groei_batch`` and annual differences are reshapes of the monthly arrays.
+With a ``portefeuille`` the payment difference goes into a mix of assets instead
+(``portfolio.simuleer_portefeuille``).
+"""
+import numpy as np
+
+from batch_engine import simuleer_leningen_gegroepeerd
+from break_even import los_min_groei_batch
+from cancellation import checkpoint
+from portfolio import simuleer_portefeuille
+
+JAARLIJKSE_KOLOMMEN = {
+    "annualInterest": "interest",
+    "annualPrincipal": "principalPayment",
+    "annualInsurance": "insurancePremium",
+    "annualTotalPayment": "totalMonthlyPayment",
+}
+
+# Ranking criteria and whether a higher value ranks first
+RANGSCHIKKING = {
+    "netWorthEndOfTerm": True,
+    "totalCostDifference": True,
+    "totalLoanCosts": False,
+    "minimumRequiredGrowthRate": False,
+}
+
+
+def start_investering(start_kapitaal, eigen_inbreng, invest_kapitaal=None):
+    """Capital invested before month 1, as in ``simuleer_met_investering`` (never below 0 unless given explicitly)."""
+    if invest_kapitaal is not None:
+        return invest_kapitaal
+    return max(start_kapitaal - (eigen_inbreng or 0), 0)
+
+
+def _opvullen(reeks, maanden):
+    """Pad a (rows x months) array with zero months up to ``maanden``."""
+    if reeks.shape[1] >= maanden:
+        return reeks
+    return np.pad(reeks, ((0, 0), (0, maanden - reeks.shape[1])))
+
+
+def investeringspaden(start_bedragen, bijdragen, maandgroei, ondergrens=0.0):
+    """
+    Investment balance per alternative and month: grow by ``maandgroei``, add the
+    month's contribution, floor at ``ondergrens`` (``None``: no floor, a negative
+    balance is a shortfall). ``bijdragen`` is (alternatives x months); ``maandgroei`` is
+    a scalar, one rate per alternative or an (alternatives x months) matrix of returns.
+    """
+    saldo = np.asarray(start_bedragen, dtype=float).copy()
+    maandgroei = np.asarray(maandgroei, dtype=float)
+    paden = np.empty(bijdragen.shape)
+    for maand in range(bijdragen.shape[1]):
+        if maand % 12 == 0:
+            checkpoint()
+        groei = maandgroei[:, maand] if maandgroei.ndim == 2 else maandgroei
+        saldo = saldo * (1 + groei) + bijdragen[:, maand]
+        if ondergrens is not None:
+            saldo = np.maximum(saldo, ondergrens)
+        paden[:, maand] = saldo
+    return paden
+
+
+def jaarlijkse_verschillen(referentie, alternatieven, jaren):
+    """
+    Per-year difference (alternative - reference) of the annual sums and the year-end
+    balance, for every alternative: a dict of (alternatives x ``jaren``) arrays with the
+    column names of ``vergelijk_jaarlijks`` (without the ``Verschil_`` prefix).
+    """
+    maanden = jaren * 12
+
+    def per_jaar(reeksen):
+        return _opvullen(reeksen, maanden).reshape(len(reeksen), jaren, 12)
+
+    verschillen = {}
+    for naam, kolom in JAARLIJKSE_KOLOMMEN.items():
+        verschillen[naam] = per_jaar(alternatieven[kolom]).sum(axis=2) - per_jaar(referentie[kolom]).sum(axis=2)
+    verschillen["remainingPrincipalYearEnd"] = (
+        per_jaar(alternatieven["remainingPrincipal"])[:, :, -1] - per_jaar(referentie["remainingPrincipal"])[:, :, -1]
+    )
+    return verschillen
+
+
+def vergelijk_alternatieven(
+    referentie,
+    alternatieven,
+    maandgroei=None,
+    start_referentie=0.0,
+    start_alternatieven=None,
+    doelbedragen=None,
+    portefeuille=None,
+):
+    """
+    Compare ``referentie`` with every entry of ``alternatieven`` (loan dicts with the
+    keyword arguments of ``simuleer_leningen_batch``).
+
+    Without ``maandgroei`` only the loan costs are compared. With it, each alternative
+    invests ``start_alternatieven[i]`` plus its monthly saving against the reference,
+    and its break-even growth rate is solved against ``doelbedragen[i]`` (default: its
+    principal) at the end of its term. Returns the reference and aligned alternative
+    schedules, ``totale_kosten`` (interest + insurance) and ``kostenverschil`` (reference
+    - alternative) per alternative, and with investment ``investering`` (the paths),
+    ``netto_vermogen`` and ``min_groei`` (annual rate, NaN when not bracketed).
+
+    ``portefeuille`` (keyword arguments of ``simuleer_portefeuille`` besides the start
+    amounts and contributions) invests in several assets instead of at ``maandgroei``,
+    which then only serves the break-even solve; it adds ``posities`` and ``tekort``.
+    """
+    if not alternatieven:
+        raise ValueError("Geen alternatieven om te vergelijken.")
+    ref_batch = simuleer_leningen_gegroepeerd([referentie])
+    alt = simuleer_leningen_gegroepeerd(alternatieven)
+    alt_maanden = alt["maanden"]
+    n = len(alternatieven)
+    laatste = alt_maanden - 1
+    rijen = np.arange(n)
+
+    ref_kosten = float(ref_batch["cumulativeInterestPaid"][0, -1] + ref_batch["cumulativeInsurancePaid"][0, -1])
+    alt_kosten = alt["cumulativeInterestPaid"][rijen, laatste] + alt["cumulativeInsurancePaid"][rijen, laatste]
+    resultaat = {
+        "referentie": ref_batch,
+        "alternatieven": alt,
+        "referentie_kosten": ref_kosten,
+        "totale_kosten": alt_kosten,
+        "kostenverschil": ref_kosten - alt_kosten,
+    }
+    if maandgroei is None and portefeuille is None:
+        return resultaat
+
+    # Contribution = reference payment - alternative payment, on the alternatives' month axis
+    horizon = alt["totalMonthlyPayment"].shape[1]
+    ref_betaling = _opvullen(ref_batch["totalMonthlyPayment"], horizon)[:, :horizon]
+    bijdragen = ref_betaling - alt["totalMonthlyPayment"]
+    # Months past an alternative's term are not part of its comparison
+    bijdragen[np.arange(horizon)[None, :] >= alt_maanden[:, None]] = 0
+
+    start_alternatieven = np.broadcast_to(np.asarray(start_alternatieven if start_alternatieven is not None else 0.0,
+                                                     dtype=float), (n,))
+    if portefeuille is None:
+        paden = investeringspaden(start_alternatieven, bijdragen, maandgroei)
+        referentie_pad = float(start_referentie) * (1 + maandgroei) ** np.arange(1, horizon + 1)
+    else:
+        portefeuille_pad = simuleer_portefeuille(start_alternatieven, bijdragen, **portefeuille)
+        paden = portefeuille_pad["saldo"]
+        referentie_pad = simuleer_portefeuille(float(start_referentie), np.zeros((1, horizon)), **portefeuille)["saldo"][0]
+        resultaat.update(posities=portefeuille_pad["posities"], tekort=portefeuille_pad["tekort"])
+    if doelbedragen is None:
+        doelbedragen = [lening["hoofdsom"] for lening in alternatieven]
+    checkpoint()
+    oplossing = los_min_groei_batch(start_alternatieven, bijdragen, alt_maanden, doelbedragen)
+
+    resultaat.update(
+        bijdragen=bijdragen,
+        start_investering=start_alternatieven,
+        investering=paden,
+        referentie_investering=referentie_pad,
+        netto_vermogen=paden[rijen, laatste] - alt["remainingPrincipal"][rijen, laatste],
+        min_groei=oplossing["annualRate"],
+    )
+    return resultaat
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""
+Runtime configuration for the API and the offline tools.
+
+All settings can be overridden with ``LOANLOGIC_<NAME>`` environment variables,
+e.g. ``LOANLOGIC_SLOW_REQUEST_MS=500``. Values are read once at import time;
+tests and tools may assign to ``settings`` attributes directly.
+"""
+import json
+import os
+import typing
+from enum import Enum
+from typing import Dict
+
+from pydantic import BaseModel
+
+ENV_PREFIX = "LOANLOGIC_"
+
+
+class MemoryProfilingMode(str, Enum):
+    OFF = "off"        # never trace allocations
+    HEADER = "header"  # trace requests that send ``X-Memory-Profile: 1``
+    ALWAYS = "always"  # trace every request (slow; for local investigations only)
+
+
+class CpuProfiler(str, Enum):
+    AUTO = "auto"                # pyinstrument when installed, otherwise cProfile
+    CPROFILE = "cprofile"
+    PYINSTRUMENT = "pyinstrument"
+
+
+class PriorityClass(str, Enum):
+    INTERACTIVE = "interactive"  # cheap single-loan calculations; may use the reserved slots
+    STANDARD = "standard"
+    BATCH = "batch"              # sweeps, surfaces, simulations; admitted last
+
+
+DEFAULT_ADMISSION_LIMITS = {
+    "/api/calculate-loan": 8,
+    "/api/calculate-multi-client-loan": 4,
+    "/api/max-affordable-loan": 2,
+    "/api/compare-loans": 2,
+    "/api/scenarios/compare-loans": 2,
+    "/api/break-even-surface": 1,
+    "/api/case-cashflow": 4,
+    "/api/compare-many": 2,
+    "/api/prepayment-strategies": 1,
+    "/api/variable-rate-loan": 2,
+    "/api/sensitivity": 4,
+    "/api/optimize-own-contribution": 2,
+    "/api/backtest": 2,
+}
+DEFAULT_ADMISSION_CLASSES = {
+    "/api/calculate-loan": PriorityClass.INTERACTIVE,
+    "/api/calculate-multi-client-loan": PriorityClass.INTERACTIVE,
+    "/api/max-affordable-loan": PriorityClass.STANDARD,
+    "/api/compare-loans": PriorityClass.STANDARD,
+    "/api/scenarios/compare-loans": PriorityClass.STANDARD,
+    "/api/break-even-surface": PriorityClass.BATCH,
+    "/api/case-cashflow": PriorityClass.STANDARD,
+    "/api/compare-many": PriorityClass.STANDARD,
+    "/api/prepayment-strategies": PriorityClass.BATCH,
+    "/api/variable-rate-loan": PriorityClass.STANDARD,
+    "/api/sensitivity": PriorityClass.STANDARD,
+    "/api/optimize-own-contribution": PriorityClass.STANDARD,
+    "/api/backtest": PriorityClass.STANDARD,
+}
+
+
+class Settings(BaseModel):
+    # Expose /debug/* endpoints (profiles, internals); off in production
+    debug_endpoints: bool = False
+    # Requests slower than this are logged together with their profiling data
+    slow_request_ms: float = 1000.0
+
+    # Off by default: with "header" any client could make the server trace its requests
+    memory_profiling: MemoryProfilingMode = MemoryProfilingMode.OFF
+    # Allocation sites reported per calculation stage
+    memory_profile_top_n: int = 10
+    # Stack frames stored per allocation by tracemalloc (1 = group by line)
+    memory_profile_frames: int = 1
+    # Number of recent memory profiles kept for /debug/memory-profiles
+    memory_profile_history: int = 50
+
+    # CPU profiling middleware; when off it is not installed at all
+    cpu_profiling: bool = False
+    # Fraction of requests that are always profiled and stored (0.0 - 1.0)
+    cpu_profile_sample_rate: float = 0.0
+    # Store the profile of any request slower than this. A positive value means every request is
+    # profiled and fast profiles are discarded; 0 limits profiling to the sampled requests
+    cpu_profile_slow_ms: float = 1000.0
+    cpu_profiler: CpuProfiler = CpuProfiler.AUTO
+    cpu_profile_dir: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles")
+    # Oldest profiles beyond this count are deleted
+    cpu_profile_max_files: int = 100
+
+    # Worker threads running API calculations (see cancellation.py)
+    calculation_threads: int = 4
+    # Run representative calculations on a calculation thread before serving (see warmup.py)
+    warmup_on_startup: bool = True
+    # Include the SciPy min-growth solve in the warm-up (imports SciPy before serving)
+    warmup_min_growth_solve: bool = False
+
+    # Admission control for the calculation endpoints (see api/admission.py)
+    admission_control: bool = True
+    # Calculations admitted at the same time over all endpoints
+    admission_capacity: int = 4
+    # Slots of admission_capacity that only interactive requests may use
+    admission_reserved_interactive: int = 1
+    # Requests waiting per endpoint; beyond this the endpoint answers 503 immediately
+    admission_queue_size: int = 16
+    # Longest time a request waits for a slot before it gets a 503
+    admission_queue_timeout_ms: float = 10000.0
+    # Retry-After (seconds) sent with 503 responses
+    admission_retry_after_s: int = 2
+    # Concurrency limit and priority class per route template (JSON objects in the environment)
+    admission_limits: Dict[str, int] = DEFAULT_ADMISSION_LIMITS
+    admission_classes: Dict[str, PriorityClass] = DEFAULT_ADMISSION_CLASSES
+
+    # Node results kept by the memoized scenario graph (/api/scenarios/*)
+    scenario_cache_size: int = 256
+    # Life-insurance premium vectors kept per (table, age, coverage, balance profile), see life_insurance.py
+    insurance_premium_cache_size: int = 1024
+
+    # Background jobs (/api/jobs, see jobs.py)
+    job_dir: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), "jobs")
+    # Worker processes running jobs
+    job_workers: int = 2
+    # Finished jobs and their results are deleted after this many hours
+    job_retention_hours: float = 24.0
+    # Jobs waiting for a worker; further submissions get a 503
+    job_queue_size: int = 100
+    # Inputs accepted in a single job
+    job_max_items: int = 1000
+
+    # Strategies x modes evaluated by one /api/prepayment-strategies request
+    prepayment_max_strategies: int = 20000
+    # Rate scenarios evaluated by one /api/variable-rate-loan request
+    variable_rate_max_scenarios: int = 10000
+    # Products x grid points evaluated per round by one /api/optimize-own-contribution request
+    optimizer_max_candidates: int = 5000
+    # Monthly index returns (CSV: month, return or index) used by /api/backtest requests without returns;
+    # empty: such requests need syntheticReturns (the bundled demonstration series)
+    backtest_returns_path: str = ""
+
+    # Live WebSocket sessions wait this long after a patch for further patches before recalculating
+    live_debounce_ms: float = 50.0
+    # Default number of points per downsampled series pushed to live sessions
+    live_series_points: int = 120
+
+    @classmethod
+    def from_env(cls, environ=None):
+        environ = os.environ if environ is None else environ
+        values = {}
+        for name in cls.model_fields:
+            key = ENV_PREFIX + name.upper()
+            if key in environ:
+                values[name] = environ[key]
+                if typing.get_origin(cls.model_fields[name].annotation) is dict:
+                    values[name] = json.loads(environ[key])
+        return cls(**values)
+
+
+settings = Settings.from_env()
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+Own-contribution optimizer: how much of the available capital goes into the purchase
+and how much is invested, optionally across loan products (type, term, rate).
+
+Every candidate is a loan with principal ``aankoopprijs - eigen_inbreng`` that invests
+``start_kapitaal - eigen_inbreng`` plus its monthly saving against a reference loan, as
+in ``simuleer_met_investering``. The search is a coarse-to-fine grid: a round evaluates
+``rasterpunten`` contributions for every product in one ``vergelijk_alternatieven``
+call, then the next round zooms in on the interval around each product's best feasible
+point. A candidate is feasible when its highest monthly payment stays within
+``max_schuldratio`` percent of the monthly income.
+"""
+import numpy as np
+
+from compare_many import start_investering, vergelijk_alternatieven
+from multi_client_calculation import DEBT_RATIO_MODERATE
+
+NETTO_VERMOGEN = "netto_vermogen"  # maximize net worth at the end of the term
+TOTALE_KOSTEN = "totale_kosten"  # minimize interest + insurance
+DOELEN = (NETTO_VERMOGEN, TOTALE_KOSTEN)
+
+
+def optimaliseer_eigen_inbreng(
+    referentie,
+    producten,
+    aankoopprijs,
+    start_kapitaal,
+    inbreng_min=0.0,
+    inbreng_max=None,
+    maandgroei=None,
+    doel=NETTO_VERMOGEN,
+    maandinkomen=None,
+    max_schuldratio=DEBT_RATIO_MODERATE,
+    rasterpunten=21,
+    verfijningen=3,
+    tolerantie=100.0,
+):
+    """
+    Search the own contribution per product and return every evaluated candidate.
+
+    ``referentie`` is a loan dict (keyword arguments of ``simuleer_leningen_batch``),
+    ``producten`` are loan dicts without ``hoofdsom``. The contribution ranges over
+    ``[inbreng_min, inbreng_max]`` (default: the start capital, at most the purchase
+    price). Refinement stops after ``verfijningen`` rounds or once the grid step is below
+    ``tolerantie``. Returns ``evaluaties`` (per candidate arrays: ``product``, ``ronde``,
+    ``eigen_inbreng``, ``hoofdsom``, ``start_investering``, ``totale_kosten``,
+    ``max_betaling``, ``schuldratio``, ``haalbaar`` and with investment ``netto_vermogen``
+    and ``min_groei``), ``beste`` (index of the best feasible candidate per product, -1
+    when none) and ``optimum`` (overall best index, -1 when nothing is feasible).
+    """
+    if doel not in DOELEN:
+        raise ValueError(f"Onbekend doel '{doel}'; gebruik {DOELEN}.")
+    if doel == NETTO_VERMOGEN and maandgroei is None:
+        raise ValueError("Optimaliseren op netto vermogen vereist een groeivoet.")
+    if not producten:
+        raise ValueError("Geen producten om te optimaliseren.")
+    if rasterpunten < 2:
+        raise ValueError("Minstens twee rasterpunten nodig.")
+    if inbreng_max is None:
+        inbreng_max = start_kapitaal
+    inbreng_max = min(inbreng_max, aankoopprijs)
+    if inbreng_min > inbreng_max:
+        raise ValueError("Minimale eigen inbreng is groter dan de maximale.")
+
+    onder = np.full(len(producten), float(inbreng_min))
+    boven = np.full(len(producten), float(inbreng_max))
+    actief = np.ones(len(producten), dtype=bool)
+    delen = []
+    for ronde in range(verfijningen + 1):
+        indices = np.flatnonzero(actief)
+        rasters = np.linspace(onder[indices], boven[indices], rasterpunten, axis=1)  # products x points
+        product = np.repeat(indices, rasterpunten)
+        inbreng = rasters.ravel()
+        hoofdsom = np.maximum(aankoopprijs - inbreng, 0.0)
+        alternatieven = [dict(producten[p], hoofdsom=h) for p, h in zip(product, hoofdsom)]
+        starten = np.array([start_investering(start_kapitaal, e) for e in inbreng])
+        resultaat = vergelijk_alternatieven(
+            referentie,
+            alternatieven,
+            maandgroei=maandgroei,
+            start_alternatieven=starten,
+            doelbedragen=hoofdsom,
+        )
+        max_betaling = resultaat["alternatieven"]["totalMonthlyPayment"].max(axis=1)
+        schuldratio = max_betaling / maandinkomen * 100 if maandinkomen else np.full(len(inbreng), np.nan)
+        deel = {
+            "product": product,
+            "ronde": np.full(len(inbreng), ronde),
+            "eigen_inbreng": inbreng,
+            "hoofdsom": hoofdsom,
+            "start_investering": starten,
+            "totale_kosten": resultaat["totale_kosten"],
+            "max_betaling": max_betaling,
+            "schuldratio": schuldratio,
+            "haalbaar": schuldratio <= max_schuldratio if maandinkomen else np.ones(len(inbreng), dtype=bool),
+        }
+        if maandgroei is not None:
+            deel["netto_vermogen"] = resultaat["netto_vermogen"]
+            deel["min_groei"] = resultaat["min_groei"]
+        delen.append(deel)
+
+        # Zoom in on one grid step around the best feasible point of every product
+        score = _score(deel, doel).reshape(len(indices), rasterpunten)
+        stap = (boven[indices] - onder[indices]) / (rasterpunten - 1)
+        for j, p in enumerate(indices):
+            if not np.isfinite(score[j]).any() or stap[j] < tolerantie:
+                actief[p] = False
+                continue
+            midden = rasters[j, int(np.nanargmax(score[j]))]
+            onder[p] = max(midden - stap[j], inbreng_min)
+            boven[p] = min(midden + stap[j], inbreng_max)
+        if not actief.any():
+            break
+
+    evaluaties = {naam: np.concatenate([deel[naam] for deel in delen]) for naam in delen[0]}
+    score = _score(evaluaties, doel)
+    beste = np.full(len(producten), -1)
+    for p in range(len(producten)):
+        kandidaten = np.flatnonzero((evaluaties["product"] == p) & np.isfinite(score))
+        if len(kandidaten):
+            beste[p] = kandidaten[np.argmax(score[kandidaten])]
+    gevonden = beste[beste >= 0]
+    optimum = int(gevonden[np.argmax(score[gevonden])]) if len(gevonden) else -1
+    return {"evaluaties": evaluaties, "beste": beste, "optimum": optimum}
+
+
+def _score(evaluaties, doel):
+    """Higher is better; infeasible candidates score NaN."""
+    score = evaluaties[NETTO_VERMOGEN] if doel == NETTO_VERMOGEN else -evaluaties[TOTALE_KOSTEN]
+    return np.where(evaluaties["haalbaar"], score, np.nan)
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+Generate ``index_returns.csv``, the series ``/api/backtest`` replays with ``syntheticReturns``.
+
+The series is synthetic, so it can be shipped with the code: seeded monthly total
+returns of a broad equity index (15% volatility) with three drawdowns at the months of
+the dot-com crash, the 2008 financial crisis and the 2020 sell-off. The other months
+are shifted so that the whole series, drawdowns included, returns exactly 7% a year.
+It is meant for demonstrations and tests, never as the default. For advice, point
+``LOANLOGIC_BACKTEST_RETURNS_PATH`` at licensed index data in the same format
+(``month``, ``return`` as a decimal).
+
+Usage (from the python/ directory):
+
+    python data/generate_index_returns.py
+    python data/generate_index_returns.py --first-month 1980-01 --last-month 2024-12 --seed 7
+"""
+import argparse
+import csv
+import os
+
+import numpy as np
+
+OUTPUT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "index_returns.csv")
+
+ANNUAL_RETURN = 0.07
+ANNUAL_VOLATILITY = 0.15
+# (first month, months, total decline) of each drawdown
+DRAWDOWNS = (("2000-09", 25, 0.45), ("2007-11", 16, 0.50), ("2020-02", 2, 0.30))
+
+
+def month_index(month):
+    year, number = (int(part) for part in month.split("-"))
+    return year * 12 + number - 1
+
+
+def month_label(index):
+    return f"{index // 12}-{index % 12 + 1:02d}"
+
+
+def generate(first_month="1980-01", last_month="2024-12", seed=7):
+    """Months (``YYYY-MM``) and monthly returns of the synthetic index."""
+    start, end = month_index(first_month), month_index(last_month)
+    months = [month_label(index) for index in range(start, end + 1)]
+    rng = np.random.default_rng(seed)
+    monthly_volatility = ANNUAL_VOLATILITY / np.sqrt(12)
+    drift = np.log1p(ANNUAL_RETURN) / 12
+    log_returns = rng.normal(drift, monthly_volatility, len(months))
+    normal = np.ones(len(months), dtype=bool)
+    for first, length, decline in DRAWDOWNS:
+        offset = month_index(first) - start
+        if 0 <= offset < len(months):
+            # The drift of the drawdown months is replaced by an even share of the decline
+            window = slice(offset, offset + length)
+            log_returns[window] += np.log1p(-decline) / length - drift
+            normal[window] = False
+    log_returns[normal] += (drift * len(months) - log_returns.sum()) / normal.sum()
+    return months, np.expm1(log_returns)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--first-month", default="1980-01")
+    parser.add_argument("--last-month", default="2024-12")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", default=OUTPUT)
+    args = parser.parse_args(argv)
+
+    months, returns = generate(args.first_month, args.last_month, args.seed)
+    with open(args.output, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["month", "return"])
+        writer.writerows((month, f"{value:.6f}") for month, value in zip(months, returns))
+    annualized = np.prod(1 + returns) ** (12 / len(returns)) - 1
+    print(f"{len(months)} months ({months[0]} .. {months[-1]}), {annualized * 100:.1f}% a year -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,368 @@
+# -*- coding: utf-8 -*-
+"""
+Local job queue for calculations that take longer than an HTTP request should.
+
+A job is a list of calculation inputs of one kind. Submitted jobs wait in an
+in-process queue and are handed to a ``ProcessPoolExecutor`` (``job_workers``
+processes), so they neither block the event loop nor compete with the
+calculation threads for the GIL. Each job is stored in ``job_dir`` as
+``<id>.json`` (status) and, once finished, ``<id>.result.json`` (one entry per
+input). Finished jobs are deleted after ``job_retention_hours``, checked every
+``PURGE_INTERVAL`` seconds and on every submission and status or list call.
+
+Workers report progress after every input over a multiprocessing queue. A
+running job is cancelled through a ``<id>.cancel`` marker file that the worker's
+cancellation token polls at the engine's ``checkpoint()`` calls.
+"""
+import importlib
+import json
+import multiprocessing
+import os
+import re
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+from cancellation import CancellationToken, ComputationCancelled, cancellation_scope
+from metrics import JOB_DURATION, JOBS_FINISHED, JOBS_QUEUED, JOBS_RUNNING, JOBS_SUBMITTED
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = (COMPLETED, FAILED, CANCELLED)
+
+_JOB_ID_PATTERN = re.compile(r"^[0-9]+-[0-9a-f]{8}$")
+# Seconds between checks of the cancel marker from inside a running calculation
+CANCEL_POLL_INTERVAL = 0.2
+# Seconds between purges of expired jobs while the server is idle
+PURGE_INTERVAL = 600.0
+
+# Set in worker processes by _init_worker
+_progress_queue = None
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if hasattr(value, "model_dump"):
+        return value.model_dump(mode="json")
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _write_json(path, data):
+    # Write to a temporary file first so readers never see a partial file
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, default=_json_default)
+    os.replace(tmp_path, path)
+
+
+def resolve_target(target):
+    """Import the function named by ``"module:function"``."""
+    module_name, function_name = target.split(":")
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+class _MarkerToken(CancellationToken):
+    """Cancellation token that is set when the job's cancel marker file appears."""
+
+    def __init__(self, marker_path):
+        super().__init__()
+        self.marker_path = marker_path
+        self._next_poll = 0.0
+
+    @property
+    def cancelled(self):
+        now = time.monotonic()
+        if not self._event.is_set() and now >= self._next_poll:
+            self._next_poll = now + CANCEL_POLL_INTERVAL
+            if os.path.exists(self.marker_path):
+                self.cancel("job cancelled")
+        return self._event.is_set()
+
+    def raise_if_cancelled(self):
+        if self.cancelled:
+            raise ComputationCancelled(self.reason)
+
+
+def _init_worker(progress_queue):
+    global _progress_queue
+    _progress_queue = progress_queue
+
+
+def run_job(job_id, target, items, result_path, marker_path):
+    """
+    Worker-process entry point: run ``target(*args)`` for every argument tuple in ``items``.
+
+    Errors of a single input (e.g. validation errors raised as ``HTTPException``) are
+    stored in its result entry and do not stop the job. Returns the number of failed inputs.
+    """
+    fn = resolve_target(target)
+    token = _MarkerToken(marker_path)
+    results = []
+    failed = 0
+    with cancellation_scope(token):
+        for args in items:
+            token.raise_if_cancelled()
+            try:
+                results.append({"result": fn(*args)})
+            except Exception as e:
+                failed += 1
+                results.append({"error": {"statusCode": getattr(e, "status_code", 500),
+                                          "detail": getattr(e, "detail", str(e))}})
+            if _progress_queue is not None:
+                _progress_queue.put((job_id, len(results)))
+    _write_json(result_path, results)
+    return failed
+
+
+class JobStore:
+    """Directory of job status files (``<id>.json``) and results (``<id>.result.json``)."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def new_id(self):
+        return f"{int(time.time() * 1000)}-{uuid.uuid4().hex[:8]}"
+
+    def path(self, job_id, suffix="json"):
+        if not _JOB_ID_PATTERN.match(job_id):
+            raise ValueError(f"Invalid job id: {job_id}")
+        return os.path.join(self.directory, f"{job_id}.{suffix}")
+
+    def save(self, record):
+        _write_json(self.path(record["id"]), record)
+
+    def load(self, job_id):
+        try:
+            with open(self.path(job_id)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def load_result(self, job_id):
+        try:
+            with open(self.path(job_id, "result.json")) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def delete(self, job_id):
+        for suffix in ("json", "result.json", "cancel"):
+            try:
+                os.remove(self.path(job_id, suffix))
+            except FileNotFoundError:
+                pass
+
+    def ids(self):
+        return sorted(name[:-5] for name in os.listdir(self.directory)
+                      if name.endswith(".json") and _JOB_ID_PATTERN.match(name[:-5]))
+
+
+class JobManager:
+    """
+    Queue of jobs in front of a process pool.
+
+    Job records live in memory and are written to the store on every state change
+    (progress only in memory). The pool and its helper thread are started on the
+    first submission. Jobs that were queued or running when the server stopped are
+    marked failed when the manager is created. A daemon thread purges expired jobs
+    every ``purge_interval`` seconds, so they also go on an idle server.
+    """
+
+    def __init__(self, store, workers=2, retention_seconds=86400.0, max_queued=100, mp_context="spawn",
+                 purge_interval=PURGE_INTERVAL):
+        self.store = store
+        self.workers = workers
+        self.retention_seconds = retention_seconds
+        self.max_queued = max_queued
+        self.mp_context = mp_context
+        self._lock = threading.Lock()
+        self._records = {}
+        self._pending = deque()
+        self._items = {}
+        self._running = 0
+        self._pool = None
+        self._progress_queue = None
+        self._stopped = threading.Event()
+        self._recover()
+        self.purge()
+        if purge_interval:
+            threading.Thread(target=self._purge_periodically, args=(purge_interval,),
+                             name="loanlogic-job-purge", daemon=True).start()
+
+    def _recover(self):
+        for job_id in self.store.ids():
+            record = self.store.load(job_id)
+            if record is None:
+                continue
+            if record["state"] not in FINISHED_STATES:
+                record.update(state=FAILED, error="Server stopped before the job finished", finishedAt=time.time())
+                self.store.save(record)
+            self._records[job_id] = record
+
+    def _ensure_pool(self):
+        if self._pool is not None:
+            return
+        context = multiprocessing.get_context(self.mp_context)
+        if self._progress_queue is None:
+            self._progress_queue = context.Queue()
+            threading.Thread(target=self._listen_progress, name="loanlogic-job-progress", daemon=True).start()
+        self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context,
+                                         initializer=_init_worker, initargs=(self._progress_queue,))
+
+    def _purge_periodically(self, interval):
+        while not self._stopped.wait(interval):
+            self.purge()
+
+    def _listen_progress(self):
+        while True:
+            job_id, completed = self._progress_queue.get()
+            with self._lock:
+                record = self._records.get(job_id)
+                if record is not None and record["state"] == RUNNING:
+                    record["completed"] = max(record["completed"], completed)
+
+    def submit(self, kind, target, items):
+        """Queue ``target(*args)`` for every tuple in ``items``; returns the job record."""
+        self.purge()
+        with self._lock:
+            if len(self._pending) >= self.max_queued:
+                raise JobQueueFull(f"{len(self._pending)} jobs are already queued")
+            self._ensure_pool()
+            record = {
+                "id": self.store.new_id(),
+                "kind": kind,
+                "state": QUEUED,
+                "total": len(items),
+                "completed": 0,
+                "failedItems": 0,
+                "error": None,
+                "createdAt": time.time(),
+                "startedAt": None,
+                "finishedAt": None,
+            }
+            self._records[record["id"]] = record
+            self._items[record["id"]] = (target, list(items))
+            self._pending.append(record["id"])
+            self.store.save(record)
+            JOBS_SUBMITTED.inc(kind=kind)
+            self._dispatch()
+            return dict(record)
+
+    def _dispatch(self):
+        # Called with the lock held
+        while self._pending and self._running < self.workers:
+            job_id = self._pending.popleft()
+            self._ensure_pool()
+            target, items = self._items.pop(job_id)
+            record = self._records[job_id]
+            record.update(state=RUNNING, startedAt=time.time())
+            self.store.save(record)
+            self._running += 1
+            future = self._pool.submit(run_job, job_id, target, items,
+                                       self.store.path(job_id, "result.json"), self.store.path(job_id, "cancel"))
+            future.add_done_callback(lambda f, job_id=job_id: self._finish(job_id, f))
+        JOBS_QUEUED.set(len(self._pending))
+        JOBS_RUNNING.set(self._running)
+
+    def _finish(self, job_id, future):
+        broken = False
+        try:
+            failed_items, error = future.result(), None
+            state = COMPLETED
+        except ComputationCancelled:
+            failed_items, error, state = 0, None, CANCELLED
+        except Exception as e:
+            failed_items, error, state = 0, f"{type(e).__name__}: {e}", FAILED
+            broken = isinstance(e, BrokenProcessPool)
+        with self._lock:
+            if broken and self._pool is not None:
+                # A worker died (e.g. killed by the OOM killer); the pool cannot be used any more
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+            self._running -= 1
+            record = self._records.get(job_id)
+            if record is not None:
+                record.update(state=state, failedItems=failed_items, error=error, finishedAt=time.time())
+                if state == COMPLETED:
+                    record["completed"] = record["total"]
+                self.store.save(record)
+                JOBS_FINISHED.inc(kind=record["kind"], state=state)
+                JOB_DURATION.observe(record["finishedAt"] - record["startedAt"], kind=record["kind"])
+            self._dispatch()
+        self.purge()
+
+    def get(self, job_id):
+        self.purge()
+        with self._lock:
+            record = self._records.get(job_id)
+            return dict(record) if record is not None else None
+
+    def list(self):
+        """Job records, newest first."""
+        self.purge()
+        with self._lock:
+            return [dict(self._records[job_id]) for job_id in sorted(self._records, reverse=True)]
+
+    def result(self, job_id):
+        return self.store.load_result(job_id)
+
+    def cancel(self, job_id):
+        """Cancel a queued or running job; returns the updated record or None for unknown jobs."""
+        with self._lock:
+            record = self._records.get(job_id)
+            if record is None:
+                return None
+            if record["state"] == QUEUED:
+                self._pending.remove(job_id)
+                self._items.pop(job_id, None)
+                record.update(state=CANCELLED, finishedAt=time.time())
+                self.store.save(record)
+                JOBS_FINISHED.inc(kind=record["kind"], state=CANCELLED)
+                JOBS_QUEUED.set(len(self._pending))
+            elif record["state"] == RUNNING:
+                # Picked up by the worker at its next checkpoint; _finish records the outcome
+                open(self.store.path(job_id, "cancel"), "w").close()
+            return dict(record)
+
+    def delete(self, job_id):
+        """Remove a finished job and its result; returns False if it is still queued or running."""
+        with self._lock:
+            record = self._records.get(job_id)
+            if record is not None and record["state"] not in FINISHED_STATES:
+                return False
+            self._records.pop(job_id, None)
+        self.store.delete(job_id)
+        return True
+
+    def purge(self):
+        """Delete finished jobs older than the retention period."""
+        cutoff = time.time() - self.retention_seconds
+        with self._lock:
+            expired = [job_id for job_id, record in self._records.items()
+                       if record["state"] in FINISHED_STATES and (record["finishedAt"] or 0) < cutoff]
+            for job_id in expired:
+                del self._records[job_id]
+        for job_id in expired:
+            self.store.delete(job_id)
+        return expired
+
+    def shutdown(self, wait=True):
+        self._stopped.set()
+        if self._pool is not None:
+            self._pool.shutdown(wait=wait, cancel_futures=True)
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+Life-insurance (schuldsaldo) premiums from insurance simulation parameters.
+
+``schat_schuldsaldo_premie`` estimates one premium per calendar year for the whole
+loan; this module prices a simulation for one insured client instead. Mortality follows
+a parametric Gompertz-Makeham table, ``mu(x) = A + B * c**x``, so the probability of
+dying within a year of age ``x`` is ``1 - exp(-(A + B * c**x * (c - 1) / ln c))``. The
+client's risk factors (smoker, gender, BMI; as in the front-end's ``lifeInsurance.ts``)
+scale that probability.
+
+Every month the insured capital is the coverage times the outstanding balance at the
+start of the month (or the initial principal when the cover does not follow the
+remaining capital). ``DISTRIBUTED`` pays the monthly risk premium (capital x monthly
+death probability, plus a cost loading); ``LUMP_SUM`` pays once, in the first month,
+the present value of those premiums weighted by survival at the technical rate.
+
+Premium vectors are cached per (table, age, risk factor, coverage, payment type,
+outstanding-balance profile), so quoting the same client on the same loan again only
+costs a hash of the balance profile.
+"""
+import hashlib
+import math
+
+import numpy as np
+
+from config import settings
+from metrics import CACHE_REQUESTS
+from scenario_graph import NodeCache
+
+# Gompertz-Makeham parameters per table: A (age-independent), B and c (ageing)
+STERFTETABELLEN = {
+    "gompertz-makeham": {"A": 0.0005, "B": 0.00003, "c": 1.1},
+}
+STANDAARD_TABEL = "gompertz-makeham"
+MAXIMALE_LEEFTIJD = 120
+TECHNISCHE_RENTE = 0.01  # annual discount rate of the single (LUMP_SUM) premium
+KOSTENOPSLAG = 0.15  # loading on the risk premium for the insurer's costs
+
+GESPREID = "DISTRIBUTED"
+KOOPSOM = "LUMP_SUM"
+BETAALWIJZEN = (GESPREID, KOOPSOM)
+
+_premie_cache = NodeCache(settings.insurance_premium_cache_size)
+
+
+def sterftekansen(tabel=STANDAARD_TABEL, leeftijden=None):
+    """Probability of dying within the year, per age (default: every age up to ``MAXIMALE_LEEFTIJD``)."""
+    if tabel not in STERFTETABELLEN:
+        raise ValueError(f"Onbekende sterftetafel '{tabel}'; gebruik {list(STERFTETABELLEN)}.")
+    p = STERFTETABELLEN[tabel]
+    x = np.arange(MAXIMALE_LEEFTIJD + 1, dtype=float) if leeftijden is None else np.asarray(leeftijden, dtype=float)
+    intensiteit = p["A"] + p["B"] * p["c"] ** x * (p["c"] - 1) / math.log(p["c"])
+    return 1 - np.exp(-intensiteit)
+
+
+def risicofactor(roker=False, geslacht=None, lengte=None, gewicht=None):
+    """Multiplier on the table's death probabilities for the client's risk profile."""
+    factor = 1.7 if roker else 1.0
+    if geslacht == "male":
+        factor *= 1.1
+    if lengte and gewicht:
+        bmi = gewicht / (lengte / 100) ** 2
+        if bmi < 18.5:
+            factor *= 1.2
+        elif bmi < 25:
+            pass
+        elif bmi < 30:
+            factor *= 1.1
+        elif bmi < 35:
+            factor *= 1.3
+        elif bmi < 40:
+            factor *= 1.6
+        else:
+            factor *= 2.0
+    return factor
+
+
+def maandelijkse_sterftekansen(tabel, leeftijd, maanden, factor=1.0):
+    """Probability of dying in each month of the term for a client of ``leeftijd`` at the start."""
+    leeftijden = np.minimum(leeftijd + np.arange(maanden) // 12, MAXIMALE_LEEFTIJD)
+    jaarkans = np.minimum(sterftekansen(tabel, leeftijden) * factor, 1.0)
+    return 1 - (1 - jaarkans) ** (1 / 12)
+
+
+def premie_vector(saldi, leeftijd, dekking=1.0, betaalwijze=GESPREID, factor=1.0, tabel=STANDAARD_TABEL):
+    """
+    Premium per month of the term.
+
+    ``saldi`` is the insured balance per month (the outstanding balance at the start of
+    each month); ``dekking`` the covered fraction of it.
+    """
+    if betaalwijze not in BETAALWIJZEN:
+        raise ValueError(f"Onbekende betaalwijze '{betaalwijze}'; gebruik {BETAALWIJZEN}.")
+    saldi = np.ascontiguousarray(saldi, dtype=float)
+    sleutel = (tabel, int(leeftijd), float(factor), float(dekking), betaalwijze,
+               hashlib.sha256(saldi.tobytes()).hexdigest())
+    hit, premies = _premie_cache.get(sleutel)
+    CACHE_REQUESTS.inc(cache="life_insurance", result="hit" if hit else "miss")
+    if hit:
+        return premies
+
+    kansen = maandelijkse_sterftekansen(tabel, int(leeftijd), len(saldi), factor)
+    risicopremies = dekking * saldi * kansen * (1 + KOSTENOPSLAG)
+    if betaalwijze == GESPREID:
+        premies = risicopremies
+    else:
+        # Premium of month m is due when the client is alive at its start, discounted to month 1
+        overleving = np.concatenate([[1.0], np.cumprod(1 - kansen)[:-1]])
+        disconto = (1 + TECHNISCHE_RENTE) ** (-np.arange(len(saldi)) / 12)
+        premies = np.zeros(len(saldi))
+        premies[0] = float(np.sum(risicopremies * overleving * disconto))
+    premies.setflags(write=False)
+    _premie_cache.put(sleutel, premies)
+    return premies
+
+
+def verzekerde_saldi(df_lening, hoofdsom, volgt_restschuld=True):
+    """Insured balance per month of a loan schedule: the balance at the start of each month."""
+    maanden = len(df_lening)
+    if not volgt_restschuld:
+        return np.full(maanden, float(hoofdsom))
+    restschuld = df_lening["remainingPrincipal"].to_numpy(dtype=float)
+    return np.concatenate([[float(hoofdsom)], restschuld[:-1]])
+
+
+def pas_premies_toe(df_lening, premies):
+    """Loan schedule with ``premies`` (per month) as its insurance premium."""
+    df = df_lening.copy()
+    df["insurancePremium"] = premies
+    df["totalMonthlyPayment"] = df["paymentExcludingInsurance"] + df["insurancePremium"]
+    df["cumulativeInsurancePaid"] = df["insurancePremium"].cumsum()
+    return df
+
+
+def simulatie_premies(simulaties, df_lening, hoofdsom):
+    """
+    Premiums (simulations x months) of the loan schedule ``df_lening`` for insurance
+    simulations in their API shape: ``{"id", "client": {"age", "smoker", "gender",
+    "height", "weight"}, "parameters": {"coveragePercentage", "paymentType",
+    "basedOnRemainingCapital", "mortalityTable"}}``.
+    """
+    premies = np.empty((len(simulaties), len(df_lening)))
+    for i, simulatie in enumerate(simulaties):
+        klant = simulatie.get("client")
+        if not klant:
+            raise ValueError(f"Verzekeringssimulatie {simulatie.get('id')} heeft de leeftijd van de verzekerde nodig.")
+        parameters = simulatie.get("parameters") or {}
+        saldi = verzekerde_saldi(df_lening, hoofdsom, parameters.get("basedOnRemainingCapital", True))
+        premies[i] = premie_vector(
+            saldi,
+            klant["age"],
+            dekking=parameters.get("coveragePercentage", 1.0),
+            betaalwijze=parameters.get("paymentType", GESPREID),
+            factor=risicofactor(klant.get("smoker"), klant.get("gender"), klant.get("height"), klant.get("weight")),
+            tabel=parameters.get("mortalityTable") or STANDAARD_TABEL,
+        )
+    return premies
@@ -0,0 +1,377 @@
+# -*- coding: utf-8 -*-
+"""
+Minimal, dependency-free metrics registry that renders the Prometheus text
+exposition format (version 0.0.4).
+
+The API exposes the registry on ``GET /metrics``. The calculation engine records
+solver statistics here as well, which is why this module lives next to
+``calculation_functions.py`` and does not depend on FastAPI.
+
+Every uvicorn worker process keeps its own registry; scrape each worker (or run
+a single worker) when exact totals matter.
+"""
+import math
+import os
+import resource
+import threading
+import time
+
+CONTENT_TYPE_LATEST = "text/plain; version=0.0.4; charset=utf-8"
+
+# Default latency buckets in seconds (calculation requests range from ~5ms to several seconds)
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Payload sizes in bytes: a 40-year comparison response is several hundred KB
+PAYLOAD_SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+LOAN_TERM_BUCKETS = (5, 10, 15, 20, 25, 30, 35, 40, 50)
+SOLVER_ITERATION_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+JOB_DURATION_BUCKETS = (1.0, 5.0, 15.0, 60.0, 300.0, 900.0, 3600.0)
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        if math.isnan(value):
+            return "NaN"
+        if math.isinf(value):
+            return "+Inf" if value > 0 else "-Inf"
+        return repr(value)
+    return str(value)
+
+
+def _escape_label_value(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(label_names, label_values, extra=None):
+    pairs = list(zip(label_names, label_values))
+    if extra:
+        pairs.extend(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape_label_value(value)}"' for name, value in pairs) + "}"
+
+
+class _Metric:
+    """Base class: a named metric family with a fixed set of label names."""
+    metric_type = "untyped"
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def samples(self):
+        """Return a list of (suffix, label_values, extra_labels, value) tuples."""
+        with self._lock:
+            return [("", key, None, value) for key, value in sorted(self._values.items())]
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.metric_type}",
+        ]
+        for suffix, key, extra, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(self.labelnames, key, extra)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    """Monotonically increasing counter."""
+    metric_type = "counter"
+
+    def inc(self, amount=1, **labels):
+        if amount < 0:
+            raise ValueError("Counters can only be incremented")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def set_total(self, value, **labels):
+        """Mirror a total that is tracked elsewhere (e.g. process CPU time read at scrape time)."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    """Value that can go up and down."""
+    metric_type = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+
+class Histogram(_Metric):
+    """Cumulative histogram with fixed upper bounds."""
+    metric_type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_LATENCY_BUCKETS, registry=None):
+        if "le" in labelnames:
+            raise ValueError("'le' is reserved for histogram buckets")
+        self.buckets = tuple(sorted(float(b) for b in buckets)) + (math.inf,)
+        super().__init__(name, documentation, labelnames, registry)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state["counts"][i] += 1
+                    break
+            state["sum"] += value
+            state["count"] += 1
+
+    def snapshot(self, **labels):
+        """Return ``{"count": n, "sum": s}`` for one label combination."""
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            if state is None:
+                return {"count": 0, "sum": 0.0}
+            return {"count": state["count"], "sum": state["sum"]}
+
+    def samples(self):
+        result = []
+        with self._lock:
+            items = sorted((key, dict(state, counts=list(state["counts"]))) for key, state in self._values.items())
+        for key, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, state["counts"]):
+                cumulative += count
+                result.append(("_bucket", key, [("le", _format_value(bound))], cumulative))
+            result.append(("_sum", key, None, state["sum"]))
+            result.append(("_count", key, None, state["count"]))
+        return result
+
+
+class Registry:
+    """Collection of metrics plus optional callbacks that refresh gauges at scrape time."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} already registered")
+            self._metrics[metric.name] = metric
+
+    def add_collector(self, callback):
+        """Register a callable that is invoked right before every render."""
+        with self._lock:
+            self._collectors.append(callback)
+
+    def get(self, name):
+        return self._metrics.get(name)
+
+    def render(self):
+        with self._lock:
+            collectors = list(self._collectors)
+            metrics = list(self._metrics.values())
+        for callback in collectors:
+            callback()
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# --- HTTP layer ---
+HTTP_REQUEST_DURATION = Histogram(
+    "loanlogic_http_request_duration_seconds",
+    "HTTP request latency in seconds per route.",
+    ["method", "route", "status"],
+)
+HTTP_REQUESTS_IN_PROGRESS = Gauge(
+    "loanlogic_http_requests_in_progress",
+    "Number of HTTP requests currently being processed.",
+    ["method", "route"],
+)
+HTTP_REQUEST_SIZE = Histogram(
+    "loanlogic_http_request_size_bytes",
+    "Size of HTTP request bodies in bytes.",
+    ["method", "route"],
+    buckets=PAYLOAD_SIZE_BUCKETS,
+)
+HTTP_RESPONSE_SIZE = Histogram(
+    "loanlogic_http_response_size_bytes",
+    "Size of HTTP response bodies in bytes.",
+    ["method", "route"],
+    buckets=PAYLOAD_SIZE_BUCKETS,
+)
+
+# --- Calculation engine ---
+LOANS_CALCULATED = Counter(
+    "loanlogic_loans_calculated_total",
+    "Number of loan simulations calculated, per loan type.",
+    ["loan_type"],
+)
+LOAN_TERM_YEARS = Histogram(
+    "loanlogic_loan_term_years",
+    "Distribution of requested loan terms in years, per loan type.",
+    ["loan_type"],
+    buckets=LOAN_TERM_BUCKETS,
+)
+MIN_GROWTH_SOLVER_ITERATIONS = Histogram(
+    "loanlogic_min_growth_solver_iterations",
+    "Iterations used by the minimum-growth root solve, per method.",
+    ["method"],
+    buckets=SOLVER_ITERATION_BUCKETS,
+)
+MIN_GROWTH_SOLVER_FAILURES = Counter(
+    "loanlogic_min_growth_solver_failures_total",
+    "Minimum-growth solves that did not converge, per method.",
+    ["method"],
+)
+COMPUTATIONS_ABORTED = Counter(
+    "loanlogic_computations_aborted_total",
+    "Calculations cancelled before completion, per endpoint and reason.",
+    ["endpoint", "reason"],
+)
+CACHE_REQUESTS = Counter(
+    "loanlogic_cache_requests_total",
+    "Cache lookups per cache and result (hit/miss).",
+    ["cache", "result"],
+)
+
+# --- Admission control ---
+ADMISSION_LIMIT = Gauge(
+    "loanlogic_admission_limit",
+    "Configured concurrency limit per admission-controlled route.",
+    ["route", "priority"],
+)
+ADMISSION_IN_FLIGHT = Gauge(
+    "loanlogic_admission_in_flight",
+    "Admitted requests currently running, per route.",
+    ["route"],
+)
+ADMISSION_QUEUE_DEPTH = Gauge(
+    "loanlogic_admission_queue_depth",
+    "Requests waiting for admission, per route.",
+    ["route"],
+)
+ADMISSION_WAIT = Histogram(
+    "loanlogic_admission_wait_seconds",
+    "Time admitted requests spent waiting in the admission queue, per route.",
+    ["route"],
+)
+ADMISSION_REJECTED = Counter(
+    "loanlogic_admission_rejected_total",
+    "Requests rejected with 503 by admission control, per route and reason (queue_full/timeout).",
+    ["route", "reason"],
+)
+
+# --- Background jobs ---
+JOBS_SUBMITTED = Counter(
+    "loanlogic_jobs_submitted_total",
+    "Jobs submitted to the background job queue, per kind.",
+    ["kind"],
+)
+JOBS_FINISHED = Counter(
+    "loanlogic_jobs_finished_total",
+    "Finished background jobs, per kind and final state (completed/failed/cancelled).",
+    ["kind", "state"],
+)
+JOBS_QUEUED = Gauge(
+    "loanlogic_jobs_queued",
+    "Background jobs waiting for a worker process.",
+)
+JOBS_RUNNING = Gauge(
+    "loanlogic_jobs_running",
+    "Background jobs currently running in a worker process.",
+)
+JOB_DURATION = Histogram(
+    "loanlogic_job_duration_seconds",
+    "Run time of background jobs in a worker process, per kind.",
+    ["kind"],
+    buckets=JOB_DURATION_BUCKETS,
+)
+
+# --- Live sessions ---
+LIVE_SESSIONS = Gauge(
+    "loanlogic_live_sessions",
+    "Number of open live-recalculation WebSocket sessions.",
+)
+LIVE_RECALCULATIONS = Counter(
+    "loanlogic_live_recalculations_total",
+    "Live-session recalculations, per outcome (sent/superseded/error).",
+    ["result"],
+)
+LIVE_PATCHES = Counter(
+    "loanlogic_live_patches_total",
+    "Parameter patches received on live sessions.",
+)
+
+# --- Process ---
+PROCESS_RESIDENT_MEMORY = Gauge("process_resident_memory_bytes", "Resident memory size in bytes.")
+PROCESS_MAX_RESIDENT_MEMORY = Gauge("process_max_resident_memory_bytes", "Peak resident memory size in bytes.")
+PROCESS_CPU_SECONDS = Counter("process_cpu_seconds_total", "Total user and system CPU time spent in seconds.")
+PROCESS_START_TIME = Gauge("process_start_time_seconds", "Start time of the process since unix epoch in seconds.")
+PROCESS_START_TIME.set(time.time())
+
+
+def read_rss_bytes(pid="self"):
+    """Current resident set size of a process in bytes (Linux ``/proc``), or None if unavailable."""
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _collect_process_metrics():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    PROCESS_CPU_SECONDS.set_total(usage.ru_utime + usage.ru_stime)
+    # ru_maxrss is reported in kilobytes on Linux
+    PROCESS_MAX_RESIDENT_MEMORY.set(usage.ru_maxrss * 1024)
+    rss = read_rss_bytes()
+    PROCESS_RESIDENT_MEMORY.set(rss if rss is not None else usage.ru_maxrss * 1024)
+
+
+REGISTRY.add_collector(_collect_process_metrics)
+
+
+def record_loan(loan_type, term_years):
+    """Record loan-type and term distribution for one calculated loan."""
+    LOANS_CALCULATED.inc(loan_type=loan_type)
+    LOAN_TERM_YEARS.observe(term_years, loan_type=loan_type)
+
+
+def render_latest():
+    """Render all registered metrics in Prometheus text format."""
+    return REGISTRY.render()
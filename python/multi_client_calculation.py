@@ -1,5 +1,5 @@
 # -*- coding: utf-8 -*-
-import pandas as pd
+import numpy as np
 from calculation_functions import (
     simuleer_klassieke_lening as orig_simuleer_klassieke_lening,
     simuleer_modulaire_lening as orig_simuleer_modulaire_lening,
@@ -10,6 +10,165 @@ from calculation_functions import (
 # Re-export the original aggregeer_jaarlijks function
 aggregeer_jaarlijks = aggregeer_jaarlijks
 
+# Debt ratio thresholds (percent of monthly income) used for the assessments
+DEBT_RATIO_GOOD = 33
+DEBT_RATIO_MODERATE = 43
+
+
+def beoordeel_schuldratio(debt_ratio):
+    """Classify a debt ratio (percent) as good / moderate / high."""
+    if debt_ratio <= DEBT_RATIO_GOOD:
+        return "good"
+    elif debt_ratio <= DEBT_RATIO_MODERATE:
+        return "moderate"
+    return "high"
+
+
+def _client_vectors(client_count, schuldsaldo_dekking_pct, monthly_income,
+                    dekking_per_client=None, inkomen_per_client=None, aandeel_per_client=None):
+    """
+    Build per-client coverage, income and payment-share vectors (length = number of clients).
+
+    Defaults reproduce the single-summary behaviour: every client is insured at
+    ``schuldsaldo_dekking_pct`` and the household income is split evenly.
+    Payment shares default to income shares (equal shares when no income is known).
+    """
+    if dekking_per_client is not None:
+        n = len(dekking_per_client)
+    elif inkomen_per_client is not None:
+        n = len(inkomen_per_client)
+    else:
+        n = max(int(client_count), 1)
+
+    dekking = (np.full(n, float(schuldsaldo_dekking_pct)) if dekking_per_client is None
+               else np.asarray(dekking_per_client, dtype=float))
+    inkomen = (np.full(n, float(monthly_income) / n) if inkomen_per_client is None
+               else np.asarray(inkomen_per_client, dtype=float))
+    if dekking.shape != (n,) or inkomen.shape != (n,):
+        raise ValueError("Coverage and income must be given for every client")
+
+    if aandeel_per_client is not None:
+        aandeel = np.asarray(aandeel_per_client, dtype=float)
+    elif inkomen.sum() > 0:
+        aandeel = inkomen
+    else:
+        aandeel = np.ones(n)
+    if aandeel.shape != (n,) or aandeel.sum() <= 0:
+        raise ValueError("Payment shares must be given for every client and sum to a positive value")
+    return dekking, inkomen, aandeel / aandeel.sum()
+
+
+def verdeel_lening_over_clients(df_lening_100pct, dekking_per_client, inkomen_per_client, aandeel_per_client,
+                                premies_per_client=None):
+    """
+    Split a loan schedule over clients in one vectorized pass.
+
+    ``df_lening_100pct`` must be simulated with 100% insurance coverage so that its
+    ``insurancePremium`` column is the premium per unit of coverage. Returns the
+    household-level DataFrame (premiums summed over clients, cumulative insurance
+    and a per-month ``debtRatio`` column) and a dict of (clients x months) matrices:
+    ``insurancePremium``, ``paymentShare``, ``totalPayment``,
+    ``cumulativeInsurancePaid`` and ``debtRatio`` (NaN where a client has no income).
+    ``premies_per_client`` (clients x months) replaces coverage x ``insurancePremium``
+    when the premiums are priced per insured client (``life_insurance``).
+    """
+    dekking = np.asarray(dekking_per_client, dtype=float)
+    inkomen = np.asarray(inkomen_per_client, dtype=float)
+    aandeel = np.asarray(aandeel_per_client, dtype=float)
+
+    premie_100pct = df_lening_100pct["insurancePremium"].to_numpy(dtype=float)
+    betaling_excl = df_lening_100pct["paymentExcludingInsurance"].to_numpy(dtype=float)
+
+    if premies_per_client is None:
+        premies = dekking[:, None] * premie_100pct[None, :]
+    else:
+        premies = np.asarray(premies_per_client, dtype=float)
+    aandeel_betaling = aandeel[:, None] * betaling_excl[None, :]
+    totaal_per_client = aandeel_betaling + premies
+    cumulatieve_premies = np.cumsum(premies, axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        schuldratio_per_client = np.where(
+            inkomen[:, None] > 0, totaal_per_client / inkomen[:, None] * 100, np.nan
+        )
+
+    totaal_premie = premies.sum(axis=0)
+    totaal_betaling = betaling_excl + totaal_premie
+    totaal_inkomen = inkomen.sum()
+
+    result_df = df_lening_100pct.copy()
+    result_df["insurancePremium"] = totaal_premie
+    result_df["totalMonthlyPayment"] = totaal_betaling
+    result_df["cumulativeInsurancePaid"] = cumulatieve_premies.sum(axis=0)
+    if totaal_inkomen > 0:
+        result_df["debtRatio"] = totaal_betaling / totaal_inkomen * 100
+
+    matrices = {
+        "coveragePct": dekking,
+        "monthlyIncome": inkomen,
+        "paymentSharePct": aandeel,
+        "insurancePremium": premies,
+        "paymentShare": aandeel_betaling,
+        "totalPayment": totaal_per_client,
+        "cumulativeInsurancePaid": cumulatieve_premies,
+        "debtRatio": schuldratio_per_client,
+    }
+    return result_df, matrices
+
+
+def simuleer_lening_multi_client(
+    eigen_inbreng,
+    jaarlijkse_rentevoet,
+    looptijd_jaren,
+    aankoopprijs,
+    loan_type='annuity',
+    aflossings_schema=None,
+    uitstel_maanden=0,
+    start_jaar_kalender=2025,
+    schuldsaldo_dekking_pct=1.0,
+    monthly_income=0,
+    client_count=1,
+    dekking_per_client=None,
+    inkomen_per_client=None,
+    aandeel_per_client=None
+):
+    """
+    Simulate a loan shared by several clients.
+
+    The schedule is simulated once at 100% coverage and then split over the clients
+    with ``verdeel_lening_over_clients``. Returns ``(result_df, matrices)``; both are
+    empty when no loan is needed.
+    """
+    dekking, inkomen, aandeel = _client_vectors(
+        client_count, schuldsaldo_dekking_pct, monthly_income,
+        dekking_per_client, inkomen_per_client, aandeel_per_client
+    )
+    if loan_type == 'annuity':
+        df_100pct = orig_simuleer_klassieke_lening(
+            eigen_inbreng=eigen_inbreng,
+            jaarlijkse_rentevoet=jaarlijkse_rentevoet,
+            looptijd_jaren=looptijd_jaren,
+            aankoopprijs=aankoopprijs,
+            uitstel_maanden=uitstel_maanden,
+            start_jaar_kalender=start_jaar_kalender,
+            schuldsaldo_dekking_pct=1.0,
+            loan_type=loan_type
+        )
+    else:
+        df_100pct = orig_simuleer_modulaire_lening(
+            eigen_inbreng=eigen_inbreng,
+            jaarlijkse_rentevoet=jaarlijkse_rentevoet,
+            looptijd_jaren=looptijd_jaren,
+            aflossings_schema=aflossings_schema or [],
+            aankoopprijs=aankoopprijs,
+            start_jaar_kalender=start_jaar_kalender,
+            schuldsaldo_dekking_pct=1.0,
+            loan_type=loan_type
+        )
+    if df_100pct.empty:
+        return df_100pct, {}
+    return verdeel_lening_over_clients(df_100pct, dekking, inkomen, aandeel)
+
+
 def simuleer_klassieke_lening_multi_client(
     eigen_inbreng,
     jaarlijkse_rentevoet,
@@ -20,44 +179,25 @@ def simuleer_klassieke_lening_multi_client(
     schuldsaldo_dekking_pct=1.0,
     loan_type='annuity',
     monthly_income=0,
-    client_count=1
+    client_count=1,
+    dekking_per_client=None,
+    inkomen_per_client=None
 ):
     """Extended version of simuleer_klassieke_lening that supports multi-client calculations"""
-    # Call the original function with the same parameters
-    result_df = orig_simuleer_klassieke_lening(
-        eigen_inbreng=eigen_inbreng,
-        jaarlijkse_rentevoet=jaarlijkse_rentevoet,
-        looptijd_jaren=looptijd_jaren,
-        aankoopprijs=aankoopprijs,
+    result_df, _ = simuleer_lening_multi_client(
+        eigen_inbreng, jaarlijkse_rentevoet, looptijd_jaren, aankoopprijs,
+        loan_type=loan_type,
         uitstel_maanden=uitstel_maanden,
         start_jaar_kalender=start_jaar_kalender,
         schuldsaldo_dekking_pct=schuldsaldo_dekking_pct,
-        loan_type=loan_type
+        monthly_income=monthly_income,
+        client_count=client_count,
+        dekking_per_client=dekking_per_client,
+        inkomen_per_client=inkomen_per_client
     )
-    
-    # If client count > 1, adjust the insurance premium (divided among clients)
-    if client_count > 1 and not result_df.empty and "insurancePremium" in result_df.columns:
-        # Divide insurance premium by the number of clients
-        result_df["insurancePremium"] = result_df["insurancePremium"] * client_count
-        
-        # Recalculate total monthly payment and cumulative insurance paid
-        result_df["totalMonthlyPayment"] = result_df["paymentExcludingInsurance"] + result_df["insurancePremium"]
-        
-        # Recalculate cumulative insurance paid
-        insurance_premiums = result_df["insurancePremium"].values
-        cumulative_insurance = [insurance_premiums[0]]
-        for i in range(1, len(insurance_premiums)):
-            cumulative_insurance.append(cumulative_insurance[i-1] + insurance_premiums[i])
-        result_df["cumulativeInsurancePaid"] = cumulative_insurance
-    
-    # Calculate debt ratio if monthly income is provided
-    if monthly_income > 0 and not result_df.empty:
-        # Add a debt ratio column
-        first_payment = result_df.iloc[0]["totalMonthlyPayment"]
-        result_df["debtRatio"] = (first_payment / monthly_income) * 100
-    
     return result_df
 
+
 def simuleer_modulaire_lening_multi_client(
     eigen_inbreng,
     jaarlijkse_rentevoet,
@@ -68,84 +208,93 @@ def simuleer_modulaire_lening_multi_client(
     schuldsaldo_dekking_pct=1.0,
     loan_type='bullet',
     monthly_income=0,
-    client_count=1
+    client_count=1,
+    dekking_per_client=None,
+    inkomen_per_client=None
 ):
     """Extended version of simuleer_modulaire_lening that supports multi-client calculations"""
-    # Call the original function with the same parameters
-    result_df = orig_simuleer_modulaire_lening(
-        eigen_inbreng=eigen_inbreng,
-        jaarlijkse_rentevoet=jaarlijkse_rentevoet,
-        looptijd_jaren=looptijd_jaren,
+    result_df, _ = simuleer_lening_multi_client(
+        eigen_inbreng, jaarlijkse_rentevoet, looptijd_jaren, aankoopprijs,
+        loan_type=loan_type,
         aflossings_schema=aflossings_schema,
-        aankoopprijs=aankoopprijs,
         start_jaar_kalender=start_jaar_kalender,
         schuldsaldo_dekking_pct=schuldsaldo_dekking_pct,
-        loan_type=loan_type
+        monthly_income=monthly_income,
+        client_count=client_count,
+        dekking_per_client=dekking_per_client,
+        inkomen_per_client=inkomen_per_client
     )
-    
-    # If client count > 1, adjust the insurance premium (divided among clients)
-    if client_count > 1 and not result_df.empty and "insurancePremium" in result_df.columns:
-        # Divide insurance premium by the number of clients
-        result_df["insurancePremium"] = result_df["insurancePremium"] * client_count
-        
-        # Recalculate total monthly payment and cumulative insurance paid
-        result_df["totalMonthlyPayment"] = result_df["paymentExcludingInsurance"] + result_df["insurancePremium"]
-        
-        # Recalculate cumulative insurance paid
-        insurance_premiums = result_df["insurancePremium"].values
-        cumulative_insurance = [insurance_premiums[0]]
-        for i in range(1, len(insurance_premiums)):
-            cumulative_insurance.append(cumulative_insurance[i-1] + insurance_premiums[i])
-        result_df["cumulativeInsurancePaid"] = cumulative_insurance
-    
-    # Calculate debt ratio if monthly income is provided
-    if monthly_income > 0 and not result_df.empty:
-        # Add a debt ratio column
-        first_payment = result_df.iloc[0]["totalMonthlyPayment"]
-        result_df["debtRatio"] = (first_payment / monthly_income) * 100
-    
     return result_df
 
-def bereken_statistieken_multi_client(df_lening, hoofdsom=0, monthly_income=0, client_count=1):
+
+def bereken_statistieken_per_client(matrices, client_ids=None):
+    """Per-client totals from the (clients x months) matrices of ``verdeel_lening_over_clients``."""
+    if not matrices:
+        return []
+    n = len(matrices["coveragePct"])
+    client_ids = list(client_ids) if client_ids is not None and len(client_ids) == n else [None] * n
+    totale_premie = matrices["cumulativeInsurancePaid"][:, -1]
+    totale_betaling = matrices["totalPayment"].sum(axis=1)
+    eerste_schuldratio = matrices["debtRatio"][:, 0]
+    # fmax ignores NaN (clients without income) without warning about all-NaN rows
+    max_schuldratio = np.fmax.reduce(matrices["debtRatio"], axis=1)
+
+    per_client = []
+    for i in range(n):
+        stats = {
+            "clientId": client_ids[i],
+            "coveragePct": float(matrices["coveragePct"][i]),
+            "monthlyIncome": float(matrices["monthlyIncome"][i]),
+            "paymentSharePct": round(float(matrices["paymentSharePct"][i]) * 100, 2),
+            "insurancePaid": round(float(totale_premie[i]), 2),
+            "totalPaid": round(float(totale_betaling[i]), 2),
+            "firstMonthlyPayment": round(float(matrices["totalPayment"][i, 0]), 2),
+        }
+        if not np.isnan(eerste_schuldratio[i]):
+            stats["debtRatio"] = round(float(eerste_schuldratio[i]), 2)
+            stats["maxDebtRatio"] = round(float(max_schuldratio[i]), 2)
+            stats["debtRatioAssessment"] = beoordeel_schuldratio(eerste_schuldratio[i])
+        per_client.append(stats)
+    return per_client
+
+
+def bereken_statistieken_multi_client(df_lening, hoofdsom=0, monthly_income=0, client_count=1, matrices=None, client_ids=None):
     """Extended version of bereken_statistieken that supports multi-client statistics"""
     # Get standard statistics
     stats = bereken_statistieken(df_lening, hoofdsom=hoofdsom)
-    
+
     # Add multi-client specific statistics
     if monthly_income > 0 and not df_lening.empty:
-        first_payment = df_lening.iloc[0]["totalMonthlyPayment"]
-        debt_ratio = (first_payment / monthly_income) * 100
-        stats["debtRatio"] = round(debt_ratio, 2)
-        
-        # Add debt ratio assessment
-        if debt_ratio <= 33:
-            stats["debtRatioAssessment"] = "good"
-        elif debt_ratio <= 43:
-            stats["debtRatioAssessment"] = "moderate"
+        if "debtRatio" in df_lening.columns:
+            debt_ratios = df_lening["debtRatio"].to_numpy()
         else:
-            stats["debtRatioAssessment"] = "high"
-    
+            debt_ratios = df_lening["totalMonthlyPayment"].to_numpy() / monthly_income * 100
+        debt_ratio = debt_ratios[0]
+        stats["debtRatio"] = round(float(debt_ratio), 2)
+        stats["maxDebtRatio"] = round(float(debt_ratios.max()), 2)
+
+        # Add debt ratio assessment
+        stats["debtRatioAssessment"] = beoordeel_schuldratio(debt_ratio)
+
     # Add client count
     stats["clientCount"] = client_count
-    
+
     # Calculate per-client statistics
     if client_count > 1:
         # Calculate insurance paid per client
         stats["perClientInsurancePaid"] = round(stats["totalInsurancePaid"] / client_count, 2)
-        
+
         # Calculate debt ratio per client (if monthly income is available)
         if monthly_income > 0:
             monthly_payment_per_client = stats["medianMonthlyPayment"] / client_count
             per_client_income_share = monthly_income / client_count
             per_client_debt_ratio = (monthly_payment_per_client / per_client_income_share) * 100
             stats["perClientDebtRatio"] = round(per_client_debt_ratio, 2)
-            
+
             # Add per-client debt ratio assessment
-            if per_client_debt_ratio <= 33:
-                stats["perClientDebtRatioAssessment"] = "good"
-            elif per_client_debt_ratio <= 43:
-                stats["perClientDebtRatioAssessment"] = "moderate"
-            else:
-                stats["perClientDebtRatioAssessment"] = "high"
-    
+            stats["perClientDebtRatioAssessment"] = beoordeel_schuldratio(per_client_debt_ratio)
+
+    if matrices:
+        stats["perClient"] = bereken_statistieken_per_client(matrices, client_ids)
+
     return stats
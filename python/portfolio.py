@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+Multi-asset investment engine: the investment side of ``simuleer_met_investering``
+as a mix of assets (e.g. equities, bonds, savings) with their own returns, costs and
+taxes, batched over scenarios.
+
+Holdings are (scenarios x assets) and every month:
+
+1. each asset earns its return, minus the tax on a positive return and the running
+   cost (both per asset);
+2. a positive contribution is invested at the target weights; a negative one is
+   withdrawn from the assets in ``opname_volgorde`` until it is covered, and what the
+   holdings cannot cover is a shortfall (the balance stays at zero, as the single
+   balance of ``simuleer_met_investering`` is clamped at zero);
+3. every ``herbalanceer_maanden`` months the holdings are reset to the target weights.
+
+Without withdrawals, rebalancing or total losses the assets are independent linear
+recurrences and the whole (scenarios x assets x months) block is computed at once from
+cumulative growth products; otherwise the months are a loop over (scenarios x assets) arrays.
+With one asset, no costs or taxes, the result equals ``investeringspaden``.
+"""
+import numpy as np
+
+from cancellation import checkpoint
+
+
+def netto_rendementen(rendementen, kosten=None, belasting=None):
+    """
+    Monthly returns after tax and costs, shape (scenarios or 1) x assets x months.
+
+    ``rendementen`` is (assets,), (assets x months) or (scenarios x assets x months);
+    ``kosten`` (annual cost rate) and ``belasting`` (tax rate on positive returns) are one
+    value per asset.
+    """
+    r = np.asarray(rendementen, dtype=float)
+    if r.ndim == 1:
+        r = r[:, None]
+    if r.ndim == 2:
+        r = r[None, :, :]
+    if belasting is not None:
+        r = r - np.asarray(belasting, dtype=float)[None, :, None] * np.maximum(r, 0.0)
+    if kosten is not None:
+        kosten_maand = 1 - (1 - np.asarray(kosten, dtype=float)) ** (1 / 12)
+        r = (1 + r) * (1 - kosten_maand[None, :, None]) - 1
+    return r
+
+
+def simuleer_portefeuille(
+    start_bedragen,
+    bijdragen,
+    rendementen,
+    gewichten,
+    kosten=None,
+    belasting=None,
+    herbalanceer_maanden=12,
+    opname_volgorde=None,
+):
+    """
+    Holdings per scenario, asset and month.
+
+    ``start_bedragen`` is one amount per scenario (split at the target weights),
+    ``bijdragen`` (scenarios x months) the monthly contribution, ``gewichten`` the target
+    weights per asset (normalized to 1). ``rendementen``, ``kosten`` and ``belasting`` as in
+    ``netto_rendementen``. ``herbalanceer_maanden`` of 0 never rebalances;
+    ``opname_volgorde`` lists asset indices in withdrawal order (default: as given).
+    Returns ``posities`` (scenarios x assets x months, after each month), ``saldo`` (their
+    total) and ``tekort`` (scenarios x months, withdrawals the holdings could not cover).
+    """
+    bijdragen = np.atleast_2d(np.asarray(bijdragen, dtype=float))
+    s, maanden = bijdragen.shape
+    gewichten = np.asarray(gewichten, dtype=float)
+    if (gewichten < 0).any() or gewichten.sum() <= 0:
+        raise ValueError("Gewichten moeten positief zijn.")
+    gewichten = gewichten / gewichten.sum()
+    a = len(gewichten)
+    r = netto_rendementen(rendementen, kosten, belasting)
+    if r.shape[1] != a:
+        raise ValueError("Eén rendement per activum nodig.")
+    groei = np.broadcast_to(1 + r, (s, a, r.shape[2]))
+    start = np.broadcast_to(np.asarray(start_bedragen, dtype=float), (s,))[:, None] * gewichten[None, :]
+
+    if herbalanceer_maanden == 0 and (bijdragen >= 0).all() and (groei > 0).all():
+        return _zonder_opnames(start, bijdragen, groei, gewichten, maanden)
+
+    volgorde = list(range(a)) if opname_volgorde is None else list(opname_volgorde)
+    if sorted(volgorde) != list(range(a)):
+        raise ValueError("De opnamevolgorde moet elk activum precies één keer bevatten.")
+    posities = np.empty((s, a, maanden))
+    tekort = np.zeros((s, maanden))
+    positie = start.copy()
+    for m in range(maanden):
+        if m % 12 == 0:
+            checkpoint()
+        positie = positie * groei[:, :, min(m, groei.shape[2] - 1)]
+        bijdrage = bijdragen[:, m]
+        positie += np.maximum(bijdrage, 0.0)[:, None] * gewichten[None, :]
+        nodig = np.maximum(-bijdrage, 0.0)
+        for activum in volgorde:
+            opname = np.minimum(nodig, positie[:, activum])
+            positie[:, activum] -= opname
+            nodig = nodig - opname
+        tekort[:, m] = nodig
+        if herbalanceer_maanden and (m + 1) % herbalanceer_maanden == 0:
+            positie = positie.sum(axis=1, keepdims=True) * gewichten[None, :]
+        posities[:, :, m] = positie
+    return {"posities": posities, "saldo": posities.sum(axis=1), "tekort": tekort}
+
+
+def _zonder_opnames(start, bijdragen, groei, gewichten, maanden):
+    # B[m] = G[m] * (B0 + sum_{k<=m} w c[k] / G[k]) with G the cumulative growth up to month m
+    # As in the loop, a shorter return series carries its last month forward and a longer one is cut off
+    groei = groei[:, :, np.minimum(np.arange(maanden), groei.shape[2] - 1)]
+    cumulatief = np.cumprod(groei, axis=2)
+    inleg = bijdragen[:, None, :] * gewichten[None, :, None]
+    posities = cumulatief * (start[:, :, None] + np.cumsum(inleg / cumulatief, axis=2))
+    return {"posities": posities, "saldo": posities.sum(axis=1), "tekort": np.zeros(bijdragen.shape)}
@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+"""
+Extra repayments (prepayments) on annuity, bullet and modular loans, for many strategies at once.
+
+A strategy is one row of a (strategies x months) matrix of extra payments, so
+families such as every lump-sum month x amount are a single call. The loan is
+rolled forward month by month on vectors over all strategies:
+
+* ``looptijd`` (term reduction): the monthly payment stays the same and the loan
+  is repaid earlier;
+* ``herberekening`` (recast): after every extra payment the annuity is
+  recomputed over the remaining months, or the remaining scheduled repayments of a
+  bullet/modular loan are scaled down with the balance.
+
+Extra payments above the yearly penalty-free allowance cost ``boete_maanden``
+months of interest on the excess (the Belgian reinvestment fee is 3 months).
+``vergelijk_met_beleggen`` puts every strategy against investing the same cash
+instead, with the investment rule of ``simuleer_met_investering``.
+"""
+import numpy as np
+
+from batch_engine import premie_schema
+from break_even import los_min_groei_batch
+from calculation_functions import START_JAAR_KALENDER
+from cancellation import checkpoint
+from compare_many import investeringspaden
+
+LOOPTIJD = "looptijd"
+HERBEREKENING = "herberekening"
+MODI = (LOOPTIJD, HERBEREKENING)
+BOETE_MAANDEN_RENTE = 3
+
+
+def _annuiteit(saldo, maandrente, maanden):
+    maanden = np.maximum(maanden, 1)
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        groei = (1 + maandrente) ** maanden
+        return np.where(maandrente > 0, saldo * maandrente * groei / (groei - 1), saldo / maanden)
+
+
+def extra_betalingen_raster(totaal_maanden, maanden=(), bedragen=(), periodiek=None):
+    """
+    (strategies x months) matrix of extra payments for every lump-sum month x amount.
+
+    ``periodiek`` (``{"bedrag", "start_maand", "eind_maand", "interval"}``) adds a
+    recurring extra payment to every strategy. Without lump sums there is a single
+    strategy with only the recurring payment. Also returns the (month, amount) of
+    every row.
+    """
+    combinaties = [(int(m), float(b)) for m in maanden for b in bedragen] or [(None, 0.0)]
+    extra = np.zeros((len(combinaties), totaal_maanden))
+    for i, (maand, bedrag) in enumerate(combinaties):
+        if maand is not None and 1 <= maand <= totaal_maanden:
+            extra[i, maand - 1] += bedrag
+    if periodiek and periodiek.get("bedrag"):
+        start = max(int(periodiek.get("start_maand") or 1), 1)
+        eind = min(int(periodiek.get("eind_maand") or totaal_maanden), totaal_maanden)
+        interval = max(int(periodiek.get("interval") or 1), 1)
+        extra[:, start - 1:eind:interval] += float(periodiek["bedrag"])
+    return extra, combinaties
+
+
+def simuleer_vervroegde_aflossingen(
+    hoofdsom,
+    jaarlijkse_rentevoet,
+    looptijd_jaren,
+    extra_betalingen,
+    modus=LOOPTIJD,
+    loan_type="annuity",
+    aflossings_schema=None,
+    uitstel_maanden=0,
+    start_jaar_kalender=START_JAAR_KALENDER,
+    schuldsaldo_dekking_pct=1.0,
+    boete_maanden=BOETE_MAANDEN_RENTE,
+    boetevrij_pct_per_jaar=0.0,
+):
+    """
+    Roll one loan forward under every row of ``extra_betalingen`` (strategies x months).
+
+    Extra payments are made after the regular payment of their month and capped at the
+    remaining balance. ``boetevrij_pct_per_jaar`` is the share of the original principal
+    that may be prepaid per loan year without penalty. Insurance premiums stop once the
+    loan is repaid. Returns (strategies x months) arrays with the column names of the
+    batch engine plus ``extraPayment`` and ``penalty``, and per strategy
+    ``aflossingsmaand`` (month of the last payment, 1-based).
+    """
+    if modus not in MODI:
+        raise ValueError(f"Onbekende modus '{modus}'; gebruik {MODI}.")
+    totaal_maanden = looptijd_jaren * 12
+    if totaal_maanden <= 0:
+        raise ValueError("Looptijd moet minstens één jaar zijn.")
+    extra_betalingen = np.atleast_2d(np.asarray(extra_betalingen, dtype=float))
+    if extra_betalingen.shape[1] != totaal_maanden:
+        raise ValueError("Extra betalingen moeten één kolom per maand van de looptijd hebben.")
+    if (extra_betalingen < 0).any():
+        raise ValueError("Extra betalingen kunnen niet negatief zijn.")
+    if loan_type == "annuity":
+        if totaal_maanden - uitstel_maanden <= 0:
+            raise ValueError("Looptijd moet langer zijn dan de uitstelperiode.")
+        schema = None
+    else:
+        if loan_type == "modular" and aflossings_schema is None:
+            raise ValueError("Modular loans need a repayment schedule")
+        uitstel_maanden = 0
+        schema = np.zeros(totaal_maanden)
+        if aflossings_schema is None:
+            schema[-1] = hoofdsom
+        else:
+            for maand, bedrag in aflossings_schema:
+                if 1 <= maand <= totaal_maanden:
+                    schema[maand - 1] += bedrag
+
+    n = extra_betalingen.shape[0]
+    maandrente = jaarlijkse_rentevoet / 12
+    premies = premie_schema(looptijd_jaren, start_jaar_kalender, loan_type, schuldsaldo_dekking_pct)
+    saldo = np.full(n, float(hoofdsom))
+    betaling = _annuiteit(saldo, maandrente, totaal_maanden - uitstel_maanden)
+    schaal = np.ones(n)
+    boetevrij = np.zeros(n)
+    kolommen = ("interest", "principalPayment", "insurancePremium", "extraPayment", "penalty", "remainingPrincipal")
+    uit = {kolom: np.zeros((n, totaal_maanden)) for kolom in kolommen}
+
+    for m in range(totaal_maanden):
+        if m % 12 == 0:
+            checkpoint()
+            boetevrij[:] = boetevrij_pct_per_jaar * hoofdsom
+        lopend = saldo > 0
+        rente = saldo * maandrente
+        if schema is None:
+            kapitaal = np.where(m < uitstel_maanden, 0.0, np.minimum(betaling - rente, saldo))
+        else:
+            kapitaal = np.minimum(schema[m] * schaal, saldo)
+        if m == totaal_maanden - 1:
+            # Whatever is left (rounding residue, a schedule short of the principal) is repaid at the end
+            kapitaal = saldo.copy()
+        saldo = saldo - kapitaal
+
+        extra = np.minimum(extra_betalingen[:, m], saldo)
+        vrij = np.minimum(extra, boetevrij)
+        boetevrij -= vrij
+        boete = (extra - vrij) * maandrente * boete_maanden
+        voor_extra = saldo
+        saldo = saldo - extra
+        saldo[saldo < 0.01] = 0
+
+        if modus == HERBEREKENING:
+            herberekend = (extra > 0) & (saldo > 0)
+            if schema is None:
+                resterend = totaal_maanden - max(m + 1, uitstel_maanden)
+                betaling = np.where(herberekend, _annuiteit(saldo, maandrente, resterend), betaling)
+            else:
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    schaal = np.where(herberekend, schaal * saldo / voor_extra, schaal)
+
+        uit["interest"][:, m] = rente
+        uit["principalPayment"][:, m] = kapitaal
+        uit["insurancePremium"][:, m] = np.where(lopend, premies[m], 0.0)
+        uit["extraPayment"][:, m] = extra
+        uit["penalty"][:, m] = boete
+        uit["remainingPrincipal"][:, m] = saldo
+
+    uit["paymentExcludingInsurance"] = uit["interest"] + uit["principalPayment"]
+    uit["totalMonthlyPayment"] = uit["paymentExcludingInsurance"] + uit["insurancePremium"]
+    # Everything the borrower pays in a month, including prepayments and penalties
+    uit["totalOutflow"] = uit["totalMonthlyPayment"] + uit["extraPayment"] + uit["penalty"]
+    betaald = uit["paymentExcludingInsurance"] + uit["extraPayment"] > 0
+    uit["aflossingsmaand"] = totaal_maanden - np.argmax(betaald[:, ::-1], axis=1)
+    return uit
+
+
+def vergelijk_met_beleggen(basis, strategieen, maandgroei):
+    """
+    Compare every prepayment strategy with paying the loan as agreed and investing the same cash.
+
+    ``basis`` is the result without extra payments (one row), ``strategieen`` the result
+    of the strategies. The investor pays the regular schedule and invests the difference
+    in monthly outflow with the strategy (withdrawing it once the strategy's payments are
+    lower), as the alternative in ``simuleer_met_investering`` but without the floor at
+    zero: when the investment runs out, the negative balance is the cash the investor is
+    short. Both are debt-free at the end of the term, so prepaying is worth minus the
+    investor's end balance. Returns the
+    investment paths, ``vermogenseffect`` per strategy and ``break_even_groei``: the
+    annual return above which investing wins (the strategy's effective yield).
+    """
+    bijdragen = strategieen["totalOutflow"] - basis["totalOutflow"][:1]
+    totaal_maanden = bijdragen.shape[1]
+    paden = investeringspaden(np.zeros(len(bijdragen)), bijdragen, maandgroei, ondergrens=None)
+    oplossing = los_min_groei_batch(0.0, bijdragen, totaal_maanden, 0.0)
+    zonder_extra = strategieen["extraPayment"].sum(axis=1) == 0
+    return {
+        "bijdragen": bijdragen,
+        "investering": paden,
+        "vermogenseffect": 0.0 - paden[:, -1],
+        "break_even_groei": np.where(zonder_extra, np.nan, oplossing["annualRate"]),
+    }
@@ -0,0 +1,448 @@
+# -*- coding: utf-8 -*-
+"""
+Opt-in per-request memory and CPU profiling.
+
+Memory profiling is based on ``tracemalloc``.
+
+Calculation code marks its stages with ``stage("name")``. Outside a profiled
+request this is a no-op costing one context-variable lookup. Inside a profiled
+request (see ``profile_memory``) every stage records the peak traced memory it
+caused, the memory it still holds at the end of the stage, and the source lines
+responsible for the largest allocations.
+
+``tracemalloc`` traces the whole process, so allocations of concurrent requests
+are attributed to whichever stage is open at that moment. Calculations run in
+the threads of the calculation pool (``cancellation.CALCULATION_EXECUTOR``); with
+more than one calculation thread, stages of concurrent requests can interleave,
+so profile on an otherwise idle worker for exact per-stage numbers.
+
+CPU profiles (cProfile, or pyinstrument when installed) only see the thread
+that started the profiler. A request's ``CpuProfileSession`` therefore starts one
+more profiler around every calculation it submits to the pool (see
+``run_cancellable``). The profiles are written to a rotating directory by
+``CpuProfileStore`` and can be converted to flamegraph-ready collapsed stacks.
+"""
+import contextvars
+import cProfile
+import io
+import itertools
+import json
+import os
+import pstats
+import re
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import deque
+from contextlib import contextmanager
+
+_active_profile = contextvars.ContextVar("loanlogic_memory_profile", default=None)
+_active_cpu_profile = contextvars.ContextVar("loanlogic_cpu_profile", default=None)
+
+_tracing_lock = threading.Lock()
+_tracing_sessions = 0
+_started_tracing = False
+
+# Allocations made by the profiler itself are excluded from the reports
+_IGNORED_FILES = (tracemalloc.__file__, __file__)
+
+
+class MemoryProfile:
+    """Memory profile of one request: a list of stage records plus the overall peak."""
+
+    def __init__(self, name, top_n=10):
+        self.id = uuid.uuid4().hex[:12]
+        self.name = name
+        self.top_n = top_n
+        self.started_at = time.time()
+        self.duration_ms = None
+        self.peak_bytes = 0
+        self.stages = []
+        self.metadata = {}
+        self._stack = []
+        self._max_peak = 0
+        self._order = itertools.count()
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "name": self.name,
+            "startedAt": self.started_at,
+            "durationMs": self.duration_ms,
+            "peakBytes": self.peak_bytes,
+            "stages": sorted(self.stages, key=lambda s: s["order"]),
+            **self.metadata,
+        }
+
+    def summary(self):
+        """Short per-stage text used for log lines."""
+        parts = [f"{s['stage']}={s['peakBytes'] / 2**20:.1f}MB" for s in sorted(self.stages, key=lambda s: s["order"])]
+        return f"peak={self.peak_bytes / 2**20:.1f}MB " + " ".join(parts)
+
+
+class ProfileHistory:
+    """Thread-safe ring buffer of the most recent profiles."""
+
+    def __init__(self, maxlen):
+        self._items = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+
+    def resize(self, maxlen):
+        with self._lock:
+            self._items = deque(self._items, maxlen=maxlen)
+
+    def add(self, profile):
+        with self._lock:
+            self._items.append(profile)
+
+    def list(self):
+        with self._lock:
+            return list(reversed(self._items))
+
+    def get(self, profile_id):
+        with self._lock:
+            for profile in self._items:
+                if profile.id == profile_id:
+                    return profile
+        return None
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+MEMORY_PROFILES = ProfileHistory(maxlen=50)
+
+
+def _start_tracing(frames):
+    global _tracing_sessions, _started_tracing
+    with _tracing_lock:
+        if _tracing_sessions == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+            _started_tracing = True
+        _tracing_sessions += 1
+
+
+def _stop_tracing():
+    global _tracing_sessions, _started_tracing
+    with _tracing_lock:
+        _tracing_sessions -= 1
+        if _tracing_sessions == 0 and _started_tracing:
+            tracemalloc.stop()
+            _started_tracing = False
+
+
+def _top_allocations(before, after, top_n):
+    filters = [tracemalloc.Filter(False, filename) for filename in _IGNORED_FILES]
+    diff = after.filter_traces(filters).compare_to(before.filter_traces(filters), "lineno")
+    result = []
+    for stat in diff[:top_n]:
+        if stat.size_diff <= 0:
+            break
+        frame = stat.traceback[0]
+        result.append({
+            "site": f"{frame.filename}:{frame.lineno}",
+            "sizeDiffBytes": stat.size_diff,
+            "countDiff": stat.count_diff,
+        })
+    return result
+
+
+@contextmanager
+def profile_memory(name, top_n=10, frames=1, history=MEMORY_PROFILES):
+    """Trace allocations for everything executed inside the block (including nested ``stage`` blocks)."""
+    profile = MemoryProfile(name, top_n=top_n)
+    _start_tracing(frames)
+    token = _active_profile.set(profile)
+    tracemalloc.reset_peak()
+    baseline, profile._max_peak = tracemalloc.get_traced_memory()
+    start = time.perf_counter()
+    try:
+        yield profile
+    finally:
+        _, peak = tracemalloc.get_traced_memory()
+        profile.peak_bytes = max(profile._max_peak, peak) - baseline
+        profile.duration_ms = (time.perf_counter() - start) * 1000
+        _active_profile.reset(token)
+        _stop_tracing()
+        if history is not None:
+            history.add(profile)
+
+
+@contextmanager
+def stage(name):
+    """Mark a calculation stage; records memory usage when the current request is being profiled."""
+    profile = _active_profile.get()
+    if profile is None or not tracemalloc.is_tracing():
+        yield
+        return
+
+    # A stage resets the peak counter, so hand the peak seen so far to the enclosing frames first
+    _, peak_so_far = tracemalloc.get_traced_memory()
+    for frame in profile._stack:
+        frame["peak"] = max(frame["peak"], peak_so_far)
+    profile._max_peak = max(profile._max_peak, peak_so_far)
+
+    order = next(profile._order)
+    snapshot_before = tracemalloc.take_snapshot()
+    tracemalloc.reset_peak()
+    base, _ = tracemalloc.get_traced_memory()
+    frame = {"base": base, "peak": base}
+    profile._stack.append(frame)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        current, peak = tracemalloc.get_traced_memory()
+        duration_ms = (time.perf_counter() - start) * 1000
+        profile._stack.pop()
+        peak = max(peak, frame["peak"])
+        for outer in profile._stack:
+            outer["peak"] = max(outer["peak"], peak)
+        profile._max_peak = max(profile._max_peak, peak)
+        snapshot_after = tracemalloc.take_snapshot()
+        profile.stages.append({
+            "order": order,
+            "stage": name,
+            "depth": len(profile._stack),
+            "durationMs": duration_ms,
+            "peakBytes": peak - base,
+            "retainedBytes": current - base,
+            "topAllocations": _top_allocations(snapshot_before, snapshot_after, profile.top_n),
+        })
+
+
+# --- CPU profiling ---
+
+_PROFILE_ID_PATTERN = re.compile(r"^[0-9]+-[0-9a-f]{8}$")
+
+
+def _frame_label(func):
+    filename, lineno, name = func
+    label = f"{name} ({os.path.basename(filename)}:{lineno})" if lineno else name
+    # ';' separates frames and ' ' separates the count in the collapsed format
+    return label.replace(";", ":").replace(" ", "_")
+
+
+def pstats_to_collapsed(stats, max_depth=64, min_seconds=1e-6):
+    """
+    Convert ``pstats.Stats`` into flamegraph-ready collapsed stacks (``a;b;c <microseconds>``).
+
+    cProfile only records caller/callee pairs, not full stacks, so time is split
+    across call paths in proportion to the cumulative time of each edge.
+    """
+    raw = stats.stats
+    callees = {}
+    for func, (_, _, _, _, callers) in raw.items():
+        for caller, caller_stats in callers.items():
+            callees.setdefault(caller, []).append((func, caller_stats[3]))
+
+    totals = {}
+
+    def walk(func, stack, weight):
+        _, _, tottime, cumtime, _ = raw[func]
+        stack = stack + [_frame_label(func)]
+        self_time = tottime * weight
+        if self_time >= min_seconds:
+            key = ";".join(stack)
+            totals[key] = totals.get(key, 0.0) + self_time
+        if len(stack) >= max_depth:
+            return
+        for callee, edge_cumtime in callees.get(func, ()):
+            if callee not in raw or _frame_label(callee) in stack:
+                continue
+            callee_cumtime = raw[callee][3]
+            if callee_cumtime <= 0:
+                continue
+            child_weight = weight * edge_cumtime / callee_cumtime
+            if child_weight * callee_cumtime >= min_seconds:
+                walk(callee, stack, child_weight)
+
+    roots = [func for func, (_, _, _, _, callers) in raw.items() if not callers]
+    for root in roots:
+        walk(root, [], 1.0)
+    return "\n".join(f"{stack} {max(1, int(round(seconds * 1e6)))}" for stack, seconds in sorted(totals.items())) + "\n"
+
+
+def pyinstrument_to_collapsed(session):
+    """Collapsed stacks (microseconds of self time) from a pyinstrument session."""
+    lines = []
+
+    def walk(frame, stack):
+        label = f"{frame.function} ({os.path.basename(frame.file_path or '')}:{frame.line_no})"
+        stack = stack + [label.replace(";", ":").replace(" ", "_")]
+        child_time = sum(child.time for child in frame.children)
+        self_time = max(frame.time - child_time, 0.0)
+        if self_time > 0:
+            lines.append(f"{';'.join(stack)} {max(1, int(round(self_time * 1e6)))}")
+        for child in frame.children:
+            walk(child, stack)
+
+    root = session.root_frame()
+    if root is not None:
+        walk(root, [])
+    return "\n".join(lines) + "\n"
+
+
+class CpuProfileSession:
+    """
+    CPU profiles of one request, one per thread that ran part of it.
+
+    ``start_profiler()`` starts a profiler in the calling thread and returns
+    ``(name, profiler)``. ``run`` profiles a calculation in the thread it runs in;
+    the middleware adds the profile of the event-loop thread itself.
+    """
+
+    def __init__(self, start_profiler):
+        self.start_profiler = start_profiler
+        self.profiles = []
+        self._lock = threading.Lock()
+
+    def add(self, profiler_name, profile):
+        with self._lock:
+            self.profiles.append((profiler_name, profile))
+
+    def run(self, fn, *args, **kwargs):
+        profiler_name, profiler = self.start_profiler()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            self.add(profiler_name, stop_cpu_profiler(profiler_name, profiler))
+
+
+def stop_cpu_profiler(profiler_name, profiler):
+    """Stop a profiler started by a ``CpuProfileSession``; returns the cProfile profiler or the pyinstrument session."""
+    if profiler_name == "cprofile":
+        profiler.disable()
+        return profiler
+    return profiler.stop()
+
+
+@contextmanager
+def cpu_profile_session(session):
+    """Make ``session`` the one ``active_cpu_profile()`` returns in this context."""
+    token = _active_cpu_profile.set(session)
+    try:
+        yield session
+    finally:
+        _active_cpu_profile.reset(token)
+
+
+def active_cpu_profile():
+    """The ``CpuProfileSession`` of the current request, or None."""
+    return _active_cpu_profile.get()
+
+
+def load_sampling_profiler():
+    """Return the pyinstrument ``Profiler`` class if installed, else None."""
+    try:
+        from pyinstrument import Profiler
+    except ImportError:
+        return None
+    return Profiler
+
+
+class CpuProfileStore:
+    """
+    Directory of CPU profiles with rotation.
+
+    Each profile is stored as ``<id>.json`` (metadata) next to ``<id>.prof``
+    (cProfile / pstats) or ``<id>.collapsed`` (sampling profiler output).
+    """
+
+    def __init__(self, directory, max_files=100):
+        self.directory = directory
+        self.max_files = max_files
+        self._lock = threading.Lock()
+        self._last_stamp = 0
+
+    def new_id(self):
+        # Ids sort by creation (rotation relies on it), also within one millisecond
+        with self._lock:
+            self._last_stamp = max(int(time.time() * 1000), self._last_stamp + 1)
+            stamp = self._last_stamp
+        return f"{stamp}-{uuid.uuid4().hex[:8]}"
+
+    def _path(self, profile_id, extension):
+        if not _PROFILE_ID_PATTERN.match(profile_id):
+            raise ValueError(f"Invalid profile id: {profile_id}")
+        return os.path.join(self.directory, f"{profile_id}.{extension}")
+
+    def save_cprofile(self, profilers, metadata):
+        """Store one or more cProfile profilers (e.g. of several threads) as a single merged profile."""
+        profile_id = self.new_id()
+        os.makedirs(self.directory, exist_ok=True)
+        if isinstance(profilers, cProfile.Profile):
+            profilers = [profilers]
+        pstats.Stats(*profilers).dump_stats(self._path(profile_id, "prof"))
+        self._write_metadata(profile_id, dict(metadata, profiler="cprofile", formats=["pstats", "collapsed", "text"]))
+        return profile_id
+
+    def save_collapsed(self, collapsed, metadata, profiler_name):
+        profile_id = self.new_id()
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self._path(profile_id, "collapsed"), "w") as f:
+            f.write(collapsed)
+        self._write_metadata(profile_id, dict(metadata, profiler=profiler_name, formats=["collapsed"]))
+        return profile_id
+
+    def _write_metadata(self, profile_id, metadata):
+        with open(self._path(profile_id, "json"), "w") as f:
+            json.dump(dict(metadata, id=profile_id), f)
+        self.rotate()
+
+    def rotate(self):
+        """Delete the oldest profiles beyond ``max_files``."""
+        with self._lock:
+            ids = sorted(self._ids())
+            for profile_id in ids[:max(0, len(ids) - self.max_files)]:
+                for extension in ("json", "prof", "collapsed"):
+                    try:
+                        os.remove(self._path(profile_id, extension))
+                    except FileNotFoundError:
+                        pass
+
+    def _ids(self):
+        if not os.path.isdir(self.directory):
+            return []
+        return [name[:-5] for name in os.listdir(self.directory)
+                if name.endswith(".json") and _PROFILE_ID_PATTERN.match(name[:-5])]
+
+    def list(self):
+        """Metadata of stored profiles, newest first."""
+        result = []
+        for profile_id in sorted(self._ids(), reverse=True):
+            metadata = self.metadata(profile_id)
+            if metadata is not None:
+                result.append(metadata)
+        return result
+
+    def metadata(self, profile_id):
+        try:
+            with open(self._path(profile_id, "json")) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def pstats_path(self, profile_id):
+        path = self._path(profile_id, "prof")
+        return path if os.path.exists(path) else None
+
+    def collapsed(self, profile_id):
+        path = self._path(profile_id, "collapsed")
+        if os.path.exists(path):
+            with open(path) as f:
+                return f.read()
+        stats_path = self.pstats_path(profile_id)
+        if stats_path is None:
+            return None
+        return pstats_to_collapsed(pstats.Stats(stats_path))
+
+    def text(self, profile_id, limit=60):
+        stats_path = self.pstats_path(profile_id)
+        if stats_path is None:
+            return None
+        buffer = io.StringIO()
+        pstats.Stats(stats_path, stream=buffer).sort_stats("cumulative").print_stats(limit)
+        return buffer.getvalue()
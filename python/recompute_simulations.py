@@ -0,0 +1,346 @@
+# -*- coding: utf-8 -*-
+"""
+Offline recompute of stored loan and investment simulations.
+
+Reads a JSONL or CSV export of the ``LoanSimulation`` table (optionally with
+``ModularScheduleItem`` and ``InvestmentSimulation`` exports), recalculates every
+simulation with the current engine and writes one output row per simulation as
+JSONL or Parquet. Loan rows carry the fields the app stores on ``LoanSimulation``
+(``monthlyPayment``, ``totalInterest``, ``totalPayment`` and the
+``calculationResult`` JSON string, i.e. the ``/api/calculate-loan`` response);
+investment rows carry the ``/api/compare-loans`` response.
+
+Records are streamed in chunks to a process pool with a bounded number of chunks
+in flight, so memory use does not grow with the size of the export. Only the
+schedule items (grouped per loan) and, when investments are recomputed, the file
+offset of every loan record are kept in memory.
+
+Usage (from the python/ directory):
+
+    python recompute_simulations.py --loans loans.jsonl --schedule-items items.csv \\
+        --investments investments.jsonl --output recomputed.jsonl --workers 4
+
+CSV files need a header row; records may not contain line breaks. A loan record
+may also embed its schedule as ``modularSchedule: [{"month", "amount"}, ...]``
+(Prisma ``include`` export), in which case ``--schedule-items`` is not needed.
+Parquet output requires ``pyarrow``.
+"""
+import argparse
+import csv
+import itertools
+import json
+import os
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+
+from api.main import (
+    ComparisonRequest,
+    InvestmentParameters,
+    LoanParameters,
+    ModularLoanSchedule,
+    calculate_loan_result,
+    compare_loans_result,
+)
+
+DEFAULT_CHUNK_SIZE = 100
+PROGRESS_INTERVAL = 5.0  # seconds between progress lines
+LOAN_FIELDS = tuple(LoanParameters.model_fields)
+INVESTMENT_FIELDS = tuple(InvestmentParameters.model_fields)
+OUTPUT_COLUMNS = ("id", "kind", "monthlyPayment", "totalInterest", "totalPayment",
+                  "minimumRequiredGrowthRate", "calculationResult", "error")
+
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def iter_records(path):
+    """Yield ``(offset, record)`` for every record of a JSONL or CSV file; CSV empty fields become None."""
+    is_csv = path.lower().endswith(".csv")
+    with open(path, "rb") as f:
+        header = next(csv.reader([f.readline().decode("utf-8-sig")])) if is_csv else None
+        while True:
+            offset = f.tell()
+            line = f.readline()
+            if not line:
+                return
+            text = line.decode("utf-8").strip()
+            if text:
+                yield offset, parse_line(text, header)
+
+
+def parse_line(text, header=None):
+    if header is None:
+        return json.loads(text)
+    values = next(csv.reader([text]))
+    return {name: (value if value != "" else None) for name, value in zip(header, values)}
+
+
+def read_record_at(f, offset, header=None):
+    f.seek(offset)
+    return parse_line(f.readline().decode("utf-8").strip(), header)
+
+
+def csv_header(path):
+    if not path.lower().endswith(".csv"):
+        return None
+    with open(path, encoding="utf-8-sig") as f:
+        return next(csv.reader([f.readline()]))
+
+
+def load_schedule_index(path):
+    """``loanSimulationId -> [(month, amount), ...]`` sorted by month."""
+    schedules = defaultdict(list)
+    for _, item in iter_records(path):
+        schedules[item["loanSimulationId"]].append((int(item["month"]), float(item["amount"])))
+    for items in schedules.values():
+        items.sort()
+    return schedules
+
+
+def schedule_of(record, schedules):
+    embedded = record.get("modularSchedule")
+    if embedded:
+        return sorted((int(item["month"]), float(item["amount"])) for item in embedded)
+    return schedules.get(record["id"], []) if schedules else []
+
+
+def loan_parameters(record):
+    return LoanParameters(**{name: record[name] for name in LOAN_FIELDS
+                             if record.get(name) is not None and name != "insuranceSimulationIds"})
+
+
+def modular_schedule(schedule):
+    if not schedule:
+        return None
+    return ModularLoanSchedule(schedule=[{"month": month, "amount": amount} for month, amount in schedule])
+
+
+def _error_detail(e):
+    return str(getattr(e, "detail", None) or e)
+
+
+def recompute_loan(record, schedule):
+    row = {"id": record["id"], "kind": "loan"}
+    try:
+        result = calculate_loan_result(loan_parameters(record), modular_schedule(schedule))
+    except Exception as e:
+        return dict(row, error=_error_detail(e))
+    statistics = result["statistics"]
+    # Same derived columns as app/api/loans/route.ts
+    return dict(
+        row,
+        monthlyPayment=statistics["medianMonthlyPayment"],
+        totalInterest=statistics["totalInterestPaid"],
+        totalPayment=statistics["totalPrincipalPaid"] + statistics["totalInterestPaid"],
+        calculationResult=json.dumps(result, default=_json_default),
+    )
+
+
+def recompute_investment(record, reference, alternative, alternative_schedule):
+    row = {"id": record["id"], "kind": "investment"}
+    try:
+        reference_loan = loan_parameters(reference)
+        alternative_loan = loan_parameters(alternative)
+        result = compare_loans_result(ComparisonRequest(
+            referenceLoan=reference_loan,
+            alternativeLoan=alternative_loan,
+            referenceOwnContribution=reference_loan.ownContribution,
+            alternativeOwnContribution=alternative_loan.ownContribution,
+            investmentParams=InvestmentParameters(**{name: record[name] for name in INVESTMENT_FIELDS
+                                                     if record.get(name) is not None}),
+            modularSchedule=modular_schedule(alternative_schedule),
+        ))
+    except Exception as e:
+        return dict(row, error=_error_detail(e))
+    return dict(
+        row,
+        minimumRequiredGrowthRate=result.get("minimumRequiredGrowthRate"),
+        calculationResult=json.dumps(result, default=_json_default),
+    )
+
+
+def _quiet_worker():
+    # The engine prints diagnostics per simulation; at 100k simulations that is the bottleneck
+    sys.stdout = open(os.devnull, "w")
+
+
+def recompute_chunk(tasks):
+    """Worker entry point: ``tasks`` is a list of ``("loan", record, schedule)`` / ``("investment", ...)``."""
+    rows = []
+    for kind, *args in tasks:
+        rows.append(recompute_loan(*args) if kind == "loan" else recompute_investment(*args))
+    return rows
+
+
+def loan_tasks(loans_path, schedules, loan_offsets):
+    for offset, record in iter_records(loans_path):
+        if loan_offsets is not None:
+            loan_offsets[record["id"]] = offset
+        # Only ship the calculation inputs to the workers, not e.g. the stale calculationResult
+        inputs = {name: record.get(name) for name in ("id",) + LOAN_FIELDS}
+        yield "loan", inputs, schedule_of(record, schedules)
+
+
+def investment_tasks(investments_path, loans_path, schedules, loan_offsets):
+    header = csv_header(loans_path)
+    with open(loans_path, "rb") as loans_file:
+        for _, record in iter_records(investments_path):
+            loans = []
+            for key in ("referenceLoanId", "alternativeLoanId"):
+                offset = loan_offsets.get(record[key])
+                loans.append(read_record_at(loans_file, offset, header) if offset is not None else None)
+            if None in loans:
+                yield "missing", record
+                continue
+            inputs = {name: record.get(name) for name in ("id",) + INVESTMENT_FIELDS}
+            loan_inputs = [{name: loan.get(name) for name in LOAN_FIELDS} for loan in loans]
+            yield "investment", inputs, loan_inputs[0], loan_inputs[1], schedule_of(loans[1], schedules)
+
+
+class JsonlWriter:
+    def __init__(self, path):
+        self.file = open(path, "w")
+
+    def write(self, rows):
+        for row in rows:
+            self.file.write(json.dumps({column: row.get(column) for column in OUTPUT_COLUMNS}) + "\n")
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetWriter:
+    def __init__(self, path):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit("Parquet output requires pyarrow (pip install pyarrow); use --format jsonl otherwise")
+        self.pa = pa
+        self.schema = pa.schema([
+            ("id", pa.string()), ("kind", pa.string()), ("monthlyPayment", pa.float64()),
+            ("totalInterest", pa.float64()), ("totalPayment", pa.float64()),
+            ("minimumRequiredGrowthRate", pa.float64()), ("calculationResult", pa.string()), ("error", pa.string()),
+        ])
+        self.writer = pq.ParquetWriter(path, self.schema)
+
+    def write(self, rows):
+        if rows:
+            columns = {column: [row.get(column) for row in rows] for column in OUTPUT_COLUMNS}
+            self.writer.write_table(self.pa.Table.from_pydict(columns, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+class Progress:
+    def __init__(self, stream=sys.stderr, interval=PROGRESS_INTERVAL):
+        self.stream = stream
+        self.interval = interval
+        self.start = time.perf_counter()
+        self.last_report = self.start
+        self.done = 0
+        self.errors = 0
+
+    def update(self, rows):
+        self.done += len(rows)
+        self.errors += sum(1 for row in rows if row.get("error"))
+        now = time.perf_counter()
+        if now - self.last_report >= self.interval:
+            self.last_report = now
+            self.report()
+
+    def report(self, final=False):
+        elapsed = time.perf_counter() - self.start
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        label = "done" if final else "progress"
+        print(f"{label}: {self.done} simulations, {self.errors} errors, {elapsed:.1f} s, {rate:.1f}/s",
+              file=self.stream, flush=True)
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def run_pipeline(tasks, writer, progress, workers=None, chunk_size=DEFAULT_CHUNK_SIZE, max_pending=None):
+    """Distribute ``tasks`` over a process pool in chunks, keeping at most ``max_pending`` chunks in flight."""
+    workers = workers or os.cpu_count() or 1
+    max_pending = max_pending or workers * 2
+    with ProcessPoolExecutor(max_workers=workers, initializer=_quiet_worker) as executor:
+        pending = set()
+        for chunk in chunked(tasks, chunk_size):
+            missing = [task for task in chunk if task[0] == "missing"]
+            if missing:
+                rows = [{"id": task[1]["id"], "kind": "investment", "error": "Referenced loan not found"}
+                        for task in missing]
+                writer.write(rows)
+                progress.update(rows)
+                chunk = [task for task in chunk if task[0] != "missing"]
+            if chunk:
+                pending.add(executor.submit(recompute_chunk, chunk))
+            while len(pending) >= max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                _collect(done, writer, progress)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            _collect(done, writer, progress)
+
+
+def _collect(futures, writer, progress):
+    for future in futures:
+        rows = future.result()
+        writer.write(rows)
+        progress.update(rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recompute stored loan and investment simulations")
+    parser.add_argument("--loans", required=True, help="LoanSimulation export (.jsonl or .csv)")
+    parser.add_argument("--schedule-items", default=None, help="ModularScheduleItem export (.jsonl or .csv)")
+    parser.add_argument("--investments", default=None, help="InvestmentSimulation export (.jsonl or .csv)")
+    parser.add_argument("--output", required=True, help="Output file")
+    parser.add_argument("--format", choices=("jsonl", "parquet"), default=None,
+                        help="Output format (default: from the output file extension)")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Simulations per work unit")
+    parser.add_argument("--skip-loans", action="store_true", help="Only recompute investment simulations")
+    args = parser.parse_args(argv)
+
+    output_format = args.format or ("parquet" if args.output.endswith(".parquet") else "jsonl")
+    writer = ParquetWriter(args.output) if output_format == "parquet" else JsonlWriter(args.output)
+    schedules = load_schedule_index(args.schedule_items) if args.schedule_items else None
+    progress = Progress()
+    try:
+        loan_offsets = {} if args.investments else None
+        if args.skip_loans:
+            # Still index the loans so investments can find their reference and alternative loan
+            for _ in loan_tasks(args.loans, schedules, loan_offsets):
+                pass
+        else:
+            run_pipeline(loan_tasks(args.loans, schedules, loan_offsets), writer, progress,
+                         workers=args.workers, chunk_size=args.chunk_size)
+        if args.investments:
+            run_pipeline(investment_tasks(args.investments, args.loans, schedules, loan_offsets), writer, progress,
+                         workers=args.workers, chunk_size=args.chunk_size)
+    finally:
+        writer.close()
+    progress.report(final=True)
+    return 1 if progress.errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,13 +1,23 @@
+import argparse
+
 import uvicorn
 
 if __name__ == "__main__":
-    # Use the --reload flag for development
+    parser = argparse.ArgumentParser(description="Run the LoanLogic API")
+    # Auto-reload watches the source tree and restarts on changes; for development only,
+    # it slows down start-up and cannot be combined with several workers
+    parser.add_argument("--reload", action="store_true", help="restart the server when the code changes")
+    parser.add_argument("--workers", type=int, default=1, help="worker processes (ignored with --reload)")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+
     # The --timeout-keep-alive parameter helps with long-running calculations
     # Setting host to 0.0.0.0 makes the server accessible from other devices on the network
     uvicorn.run(
-        "api.main:app", 
-        host="0.0.0.0", 
-        port=8000, 
-        reload=True,
+        "api.main:app",
+        host="0.0.0.0",
+        port=args.port,
+        reload=args.reload,
+        workers=None if args.reload else args.workers,
         timeout_keep_alive=120
     )
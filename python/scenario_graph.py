@@ -0,0 +1,310 @@
+# -*- coding: utf-8 -*-
+"""
+Memoized dependency graph for case scenarios.
+
+A scenario (reference loan + alternative loan + investment) is computed as a
+chain of nodes: amortization -> premiums -> totals -> loan result, and both
+loans -> investment path -> min-growth solve -> statistics. Every node is cached
+under a key that hashes its own inputs together with the keys of the nodes it
+depends on, so moving one slider only recomputes the nodes downstream of the
+inputs that actually changed: a new growth rate reuses both loan schedules, a
+new insurance coverage reuses the amortization and recomputes from the premiums on.
+Life-insurance simulations are priced on the amortization's balance profile by a
+separate node and replace the table premiums in the totals.
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+from batch_engine import premie_schema
+from calculation_functions import (
+    simuleer_klassieke_lening,
+    simuleer_modulaire_lening,
+    aggregeer_jaarlijks,
+    bereken_statistieken,
+    simuleer_met_investering,
+    bereken_min_groei_voor_betaling,
+)
+from cancellation import checkpoint
+from metrics import CACHE_REQUESTS, record_loan
+from profiling import stage
+
+DEFAULT_CACHE_SIZE = 256
+
+
+def input_hash(value):
+    """Stable hash of JSON-like input values (dict key order does not matter)."""
+    payload = json.dumps(value, sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class Node:
+    """A graph node: ``select(inputs)`` picks the node's own inputs, ``compute(own_inputs, deps)`` its value."""
+
+    def __init__(self, name, select, compute, deps=()):
+        self.name = name
+        self.select = select
+        self.compute = compute
+        self.deps = tuple(deps)
+
+
+class NodeCache:
+    """Thread-safe LRU cache of node values by node key."""
+
+    def __init__(self, max_entries=DEFAULT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._entries:
+                return False, None
+            self._entries.move_to_end(key)
+            return True, self._entries[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class ScenarioResult:
+    def __init__(self):
+        self.values = {}
+        self.keys = {}
+        self.recomputed = []
+        self.reused = []
+
+    def __getitem__(self, name):
+        return self.values[name]
+
+
+class ScenarioGraph:
+    """Nodes are added in dependency order; ``evaluate`` only recomputes nodes whose key is not cached."""
+
+    def __init__(self, name, cache_size=DEFAULT_CACHE_SIZE):
+        self.name = name
+        self.nodes = OrderedDict()
+        self.cache = NodeCache(cache_size)
+
+    def add(self, name, select, compute, deps=()):
+        for dep in deps:
+            if dep not in self.nodes:
+                raise ValueError(f"Node {name} depends on unknown node {dep}")
+        self.nodes[name] = Node(name, select, compute, deps)
+
+    def _needed(self, targets):
+        if targets is None:
+            return list(self.nodes)
+        needed = set()
+        pending = list(targets)
+        while pending:
+            name = pending.pop()
+            if name not in needed:
+                needed.add(name)
+                pending.extend(self.nodes[name].deps)
+        return [name for name in self.nodes if name in needed]
+
+    def evaluate(self, inputs, targets=None):
+        result = ScenarioResult()
+        for name in self._needed(targets):
+            checkpoint()
+            node = self.nodes[name]
+            own_inputs = node.select(inputs)
+            key = input_hash([name, own_inputs, [result.keys[dep] for dep in node.deps]])
+            result.keys[name] = key
+
+            hit, value = self.cache.get(key)
+            CACHE_REQUESTS.inc(cache=self.name, result="hit" if hit else "miss")
+            if hit:
+                result.reused.append(name)
+            else:
+                with stage(name):
+                    value = node.compute(own_inputs, {dep: result.values[dep] for dep in node.deps})
+                self.cache.put(key, value)
+                result.recomputed.append(name)
+            result.values[name] = value
+        return result
+
+
+# --- Loan comparison graph ---
+
+def _amortization_inputs(loan):
+    # Everything except the insurance inputs, which only affect the premium columns
+    return {k: v for k, v in loan.items() if k not in ("insuranceCoveragePct", "lifeInsurance")}
+
+
+def _premium_inputs(loan):
+    return {k: loan[k] for k in ("loanType", "termYears", "startYear", "insuranceCoveragePct")}
+
+
+def bereken_aflossing_zonder_premie(loan, _deps=None):
+    """Amortization schedule without insurance (coverage 0); premiums are added by the totals node."""
+    loan_type = loan["loanType"]
+    record_loan(loan_type, loan["termYears"])
+    if loan_type == "annuity":
+        return simuleer_klassieke_lening(
+            eigen_inbreng=loan["ownContribution"],
+            jaarlijkse_rentevoet=loan["interestRate"] / 100,
+            looptijd_jaren=loan["termYears"],
+            aankoopprijs=loan["purchasePrice"],
+            uitstel_maanden=loan["delayMonths"],
+            start_jaar_kalender=loan["startYear"],
+            schuldsaldo_dekking_pct=0,
+            loan_type=loan_type,
+        )
+    schedule = loan.get("schedule") or []
+    if not schedule:
+        if loan_type != "bullet":
+            raise ValueError("Modular loan schedule required for modular loans")
+        schedule = [(loan["termYears"] * 12, loan["principal"])]
+    return simuleer_modulaire_lening(
+        eigen_inbreng=loan["ownContribution"],
+        jaarlijkse_rentevoet=loan["interestRate"] / 100,
+        looptijd_jaren=loan["termYears"],
+        aflossings_schema=[tuple(item) for item in schedule],
+        aankoopprijs=loan["purchasePrice"],
+        start_jaar_kalender=loan["startYear"],
+        schuldsaldo_dekking_pct=0,
+        loan_type=loan_type,
+    )
+
+
+def bereken_premies(loan, _deps=None):
+    return premie_schema(loan["termYears"], loan["startYear"], loan["loanType"], loan["insuranceCoveragePct"])
+
+
+def _life_insurance_inputs(loan):
+    simulaties = loan.get("lifeInsurance")
+    if not simulaties:
+        return None
+    return {"simulations": simulaties, "principal": loan["purchasePrice"] - loan["ownContribution"]}
+
+
+def bereken_levensverzekering(inputs, deps, prefix):
+    """Premiums (simulations x months) of the loan's life-insurance simulations, or None without simulations."""
+    amortisatie = deps[f"{prefix}_amortization"]
+    if inputs is None or amortisatie.empty:
+        return None
+    # Imported here: life_insurance takes its cache class from this module
+    from life_insurance import simulatie_premies
+    return simulatie_premies(inputs["simulations"], amortisatie, inputs["principal"])
+
+
+def combineer_totalen(amortisatie, premies):
+    """Monthly schedule with the insurance premium, total payment and cumulative insurance columns filled in."""
+    if amortisatie.empty:
+        return amortisatie
+    df = amortisatie.copy()
+    premie = premies[:len(df)]
+    df["insurancePremium"] = premie
+    df["totalMonthlyPayment"] = df["paymentExcludingInsurance"] + premie
+    df["cumulativeInsurancePaid"] = premie.cumsum()
+    return df
+
+
+def _loan_nodes(graph, prefix, serialize):
+    graph.add(f"{prefix}_amortization", lambda i: _amortization_inputs(i[prefix]), bereken_aflossing_zonder_premie)
+    graph.add(f"{prefix}_premiums", lambda i: _premium_inputs(i[prefix]), bereken_premies)
+    graph.add(
+        f"{prefix}_life_insurance", lambda i: _life_insurance_inputs(i[prefix]),
+        lambda inputs, d: bereken_levensverzekering(inputs, d, prefix),
+        deps=(f"{prefix}_amortization",),
+    )
+    graph.add(
+        f"{prefix}_totals", lambda i: None,
+        lambda _, d: combineer_totalen(
+            d[f"{prefix}_amortization"],
+            d[f"{prefix}_premiums"] if d[f"{prefix}_life_insurance"] is None else d[f"{prefix}_life_insurance"].sum(axis=0),
+        ),
+        deps=(f"{prefix}_amortization", f"{prefix}_premiums", f"{prefix}_life_insurance"),
+    )
+    graph.add(
+        f"{prefix}_result", lambda i: i[prefix]["purchasePrice"] - i[prefix]["ownContribution"],
+        lambda hoofdsom, d: serialize(d[f"{prefix}_totals"], hoofdsom),
+        deps=(f"{prefix}_totals",),
+    )
+
+
+def _investment_path(params, deps):
+    df_combined, start_alt, _, _ = simuleer_met_investering(
+        df_referentie=deps["reference_totals"],
+        df_alternatief=deps["alternative_totals"],
+        eigen_inbreng_referentie=params["referenceOwnContribution"],
+        eigen_inbreng_alternatief=params["alternativeOwnContribution"],
+        start_kapitaal_totaal=params["startCapital"] or 0,
+        maandelijkse_groei_investering=(1 + (params["annualGrowthRate"] or 0) / 100) ** (1 / 12) - 1,
+        invest_kapitaal_referentie=params["refInvestCapital"] or None,
+        invest_kapitaal_alternatief=params["altInvestCapital"] or None,
+    )
+    return {"df": df_combined, "startInvestment": start_alt}
+
+
+def _min_growth(params, deps):
+    investment = deps["investment_path"]
+    return bereken_min_groei_voor_betaling(
+        df_combined=investment["df"],
+        payment_maand=params["termYears"] * 12,
+        payment_bedrag=params["principal"],
+        start_investering=investment["startInvestment"],
+    )
+
+
+def _comparison_statistics(_, deps):
+    investment_df = deps["investment_path"]["df"]
+    net_worth_end_of_term = 0
+    if not investment_df.empty and "netWorth" in investment_df.columns:
+        net_worth_end_of_term = investment_df["netWorth"].iloc[-1]
+    return {
+        "totalCostDifference": (deps["reference_result"]["statistics"]["totalLoanCosts"]
+                                - deps["alternative_result"]["statistics"]["totalLoanCosts"]),
+        "netWorthEndOfTerm": net_worth_end_of_term,
+    }
+
+
+def build_comparison_graph(serialize_loan, serialize_investment, cache_size=DEFAULT_CACHE_SIZE):
+    """
+    Graph of the loan comparison. ``serialize_loan(df, hoofdsom)`` turns a loan's monthly
+    schedule into its API result and ``serialize_investment(df)`` the investment path.
+
+    Inputs: ``reference`` and ``alternative`` (loan parameter dicts with an optional
+    ``schedule`` of ``[month, amount]`` pairs) and ``investment`` (investment parameters
+    plus both own contributions).
+    """
+    graph = ScenarioGraph("scenario_graph", cache_size)
+    _loan_nodes(graph, "reference", serialize_loan)
+    _loan_nodes(graph, "alternative", serialize_loan)
+    graph.add("investment_path", lambda i: i["investment"], _investment_path,
+              deps=("reference_totals", "alternative_totals"))
+    graph.add("investment_result", lambda i: None, lambda _, d: serialize_investment(d["investment_path"]["df"]),
+              deps=("investment_path",))
+    graph.add("min_growth", lambda i: {k: i["alternative"][k] for k in ("termYears", "principal")}, _min_growth,
+              deps=("investment_path",))
+    graph.add("statistics", lambda i: None, _comparison_statistics,
+              deps=("reference_result", "alternative_result", "investment_path"))
+    return graph
+
+
+def loan_result(df, hoofdsom, transform_monthly, transform_annual, transform_stats):
+    """API result of one loan (same shape as /api/calculate-loan)."""
+    if df.empty:
+        return {"monthlyData": [], "annualData": [],
+                "statistics": transform_stats(bereken_statistieken(pd.DataFrame(), hoofdsom=hoofdsom))}
+    return {
+        "monthlyData": transform_monthly(df),
+        "annualData": transform_annual(aggregeer_jaarlijks(df)),
+        "statistics": transform_stats(bereken_statistieken(df, hoofdsom=hoofdsom)),
+    }
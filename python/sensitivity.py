@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""
+Sensitivities of loan statistics and comparison results to the interest rate, the
+investment growth rate and the own contribution.
+
+The base point and every bumped point (``x + h`` and ``x - h`` per parameter) are
+rows of one batch: each loan goes through ``simuleer_leningen_batch`` once with a
+principal and rate per row, the investment paths through one ``investeringspaden``
+recursion with a growth rate per row, and the minimum growth rates through one
+``los_min_groei_batch`` solve. Central differences over these rows give the first
+and (diagonal) second derivatives. Interest totals and the first payment of
+annuities and plain bullets have closed forms; their first derivatives are analytic.
+"""
+import numpy as np
+
+from batch_engine import simuleer_leningen_batch
+from break_even import los_min_groei_batch
+from compare_many import investeringspaden, start_investering
+
+RENTE = "rente"  # annual interest rate (decimal), parallel for the loan and the reference
+GROEI = "groei"  # annual investment growth rate (decimal)
+EIGEN_INBRENG = "eigen_inbreng"  # own contribution of the loan (euro): lowers its principal
+PARAMETERS = (RENTE, GROEI, EIGEN_INBRENG)
+
+ANALYTISCH = "analytisch"
+CENTRALE_DIFFERENTIE = "centrale_differentie"
+
+
+def _gewone_bullet(lening):
+    """Schedule ``None`` for a bullet that repays its whole principal at the end, so the repayment follows the principal."""
+    schema = lening["aflossings_schema"]
+    if lening["loan_type"] == "bullet" and schema and len(schema) == 1:
+        maand, bedrag = schema[0]
+        if maand == lening["looptijd_jaren"] * 12 and bedrag >= lening["hoofdsom"]:
+            return None
+    return schema
+
+
+def _simuleer(lening, hoofdsom, rentevoet):
+    return simuleer_leningen_batch(
+        hoofdsom,
+        rentevoet,
+        lening["looptijd_jaren"],
+        loan_type=lening["loan_type"],
+        aflossings_schema=_gewone_bullet(lening),
+        uitstel_maanden=lening["uitstel_maanden"],
+        start_jaar_kalender=lening["start_jaar_kalender"],
+        schuldsaldo_dekking_pct=lening["schuldsaldo_dekking_pct"],
+    )
+
+
+def _annuiteitsfactor(maandrente, maanden):
+    """Payment per euro of an annuity over ``maanden`` and its derivative to the monthly rate."""
+    if maandrente == 0:
+        return 1 / maanden, (maanden + 1) / (2 * maanden)
+    groei = (1 + maandrente) ** maanden
+    factor = maandrente * groei / (groei - 1)
+    afgeleide = (groei * (groei - 1) - maandrente * maanden * groei / (1 + maandrente)) / (groei - 1) ** 2
+    return factor, afgeleide
+
+
+def analytische_afgeleiden(lening):
+    """
+    First derivatives of ``totalInterestPaid``, ``totalLoanCosts`` and ``firstMonthlyPayment``
+    to the annual rate and the principal, for annuities and plain bullets (``None`` otherwise).
+
+    An annuity with ``u`` interest-only months and ``m`` amortizing months pays
+    ``I = u P i + m P a(i) - P`` interest. A plain bullet pays ``P i n``. Premiums do not
+    depend on the rate or the principal, so the loan costs move with the interest.
+    """
+    p = lening["hoofdsom"]
+    i = lening["jaarlijkse_rentevoet"] / 12
+    n = lening["looptijd_jaren"] * 12
+    if lening["loan_type"] == "annuity":
+        u = lening["uitstel_maanden"] or 0
+        a, da = _annuiteitsfactor(i, n - u)
+        rente = {RENTE: (u * p + (n - u) * p * da) / 12, "hoofdsom": u * i + (n - u) * a - 1}
+        eerste = {RENTE: p / 12, "hoofdsom": i} if u > 0 else {RENTE: p * da / 12, "hoofdsom": a}
+    elif lening["loan_type"] == "bullet" and _gewone_bullet(lening) is None:
+        rente = {RENTE: p * n / 12, "hoofdsom": i * n}
+        eerste = {RENTE: p / 12, "hoofdsom": i}
+    else:
+        return None
+    return {"totalInterestPaid": rente, "totalLoanCosts": rente, "firstMonthlyPayment": eerste}
+
+
+def _kengetallen(resultaat):
+    rente = resultaat["cumulativeInterestPaid"][:, -1]
+    premie = resultaat["cumulativeInsurancePaid"][:, -1]
+    return {
+        "totalInterestPaid": rente,
+        "totalInsurancePaid": premie,
+        "totalLoanCosts": rente + premie,
+        "firstMonthlyPayment": resultaat["totalMonthlyPayment"][:, 0],
+        "medianMonthlyPayment": np.median(resultaat["totalMonthlyPayment"], axis=1),
+    }
+
+
+def bereken_gevoeligheden(lening, stappen, referentie=None, investering=None, tweede_orde=False):
+    """
+    Base values and derivatives of the statistics of ``lening`` and, with ``referentie``,
+    of the comparison results.
+
+    ``lening`` and ``referentie`` hold the keyword arguments of ``simuleer_leningen_batch``
+    (``hoofdsom``, ``jaarlijkse_rentevoet``, ...). ``stappen`` maps the parameters in
+    ``PARAMETERS`` to their bump ``h`` (decimal rates, euro). ``investering``
+    (``jaarlijkse_groei``, ``start_kapitaal``, ``eigen_inbreng``, ``invest_kapitaal``,
+    ``doelbedrag``) follows ``/api/compare-loans``: the loan invests its start capital
+    plus its monthly saving against the reference. Returns ``basis`` (metric -> value),
+    ``eerste_orde`` and ``tweede_orde`` (parameter -> metric -> derivative per unit) and
+    ``methode`` (parameter -> metric -> ``ANALYTISCH`` or ``CENTRALE_DIFFERENTIE``).
+    """
+    onbekend = [parameter for parameter in stappen if parameter not in PARAMETERS]
+    if onbekend:
+        raise ValueError(f"Onbekende parameters {onbekend}; gebruik {PARAMETERS}.")
+    if any(stap <= 0 for stap in stappen.values()):
+        raise ValueError("Stappen moeten positief zijn.")
+    if GROEI in stappen and investering is None:
+        raise ValueError("Gevoeligheid voor de groei vereist een investering.")
+    if investering is not None and referentie is None:
+        raise ValueError("Een investering vergelijkt met een referentielening.")
+    if RENTE in stappen:
+        laagste = min(lening["jaarlijkse_rentevoet"], referentie["jaarlijkse_rentevoet"] if referentie else np.inf)
+        if stappen[RENTE] >= laagste:
+            raise ValueError("De rentestap moet kleiner zijn dan de rentevoet.")
+
+    # Row 0 is the base point, then x + h and x - h per parameter
+    verschuivingen = {parameter: np.zeros(1 + 2 * len(stappen)) for parameter in PARAMETERS}
+    for k, (parameter, stap) in enumerate(stappen.items()):
+        verschuivingen[parameter][1 + 2 * k] = stap
+        verschuivingen[parameter][2 + 2 * k] = -stap
+    d_rente, d_groei, d_inbreng = (verschuivingen[parameter] for parameter in PARAMETERS)
+
+    hoofdsom = np.maximum(lening["hoofdsom"] - d_inbreng, 0)
+    resultaat = _simuleer(lening, hoofdsom, lening["jaarlijkse_rentevoet"] + d_rente)
+    waarden = _kengetallen(resultaat)
+    if referentie is not None:
+        ref_resultaat = _simuleer(referentie, referentie["hoofdsom"], referentie["jaarlijkse_rentevoet"] + d_rente)
+        ref_kosten = _kengetallen(ref_resultaat)["totalLoanCosts"]
+        waarden["totalCostDifference"] = ref_kosten - waarden["totalLoanCosts"]
+
+    if investering is not None:
+        maanden = resultaat["totalMonthlyPayment"].shape[1]
+        ref_betaling = ref_resultaat["totalMonthlyPayment"]
+        if ref_betaling.shape[1] < maanden:
+            ref_betaling = np.pad(ref_betaling, ((0, 0), (0, maanden - ref_betaling.shape[1])))
+        bijdragen = ref_betaling[:, :maanden] - resultaat["totalMonthlyPayment"]
+        start = np.array([
+            start_investering(investering["start_kapitaal"], investering["eigen_inbreng"] + delta,
+                              investering.get("invest_kapitaal"))
+            for delta in d_inbreng
+        ])
+        maandgroei = (1 + investering["jaarlijkse_groei"] + d_groei) ** (1 / 12) - 1
+        paden = investeringspaden(start, bijdragen, maandgroei)
+        waarden["endInvestmentBalance"] = paden[:, -1]
+        waarden["netWorthEndOfTerm"] = paden[:, -1] - resultaat["remainingPrincipal"][:, -1]
+        waarden["minimumRequiredGrowthRate"] = los_min_groei_batch(
+            start, bijdragen, maanden, investering["doelbedrag"] - d_inbreng)["annualRate"]
+
+    analytisch = analytische_afgeleiden(lening)
+    ref_analytisch = analytische_afgeleiden(referentie) if referentie is not None else None
+    eerste, tweede, methode = {}, {}, {}
+    for k, (parameter, stap) in enumerate(stappen.items()):
+        eerste[parameter], tweede[parameter], methode[parameter] = {}, {}, {}
+        for naam, rij in waarden.items():
+            boven, onder = rij[1 + 2 * k], rij[2 + 2 * k]
+            eerste[parameter][naam] = (boven - onder) / (2 * stap)
+            methode[parameter][naam] = CENTRALE_DIFFERENTIE
+            if tweede_orde:
+                tweede[parameter][naam] = (boven - 2 * rij[0] + onder) / stap ** 2
+        if analytisch is None or parameter == GROEI:
+            continue
+        for naam, afgeleiden in analytisch.items():
+            # d/d own contribution = -d/d principal
+            eerste[parameter][naam] = afgeleiden[RENTE] if parameter == RENTE else -afgeleiden["hoofdsom"]
+            methode[parameter][naam] = ANALYTISCH
+        if referentie is not None and (parameter == EIGEN_INBRENG or ref_analytisch is not None):
+            ref_afgeleide = ref_analytisch["totalLoanCosts"][RENTE] if parameter == RENTE else 0.0
+            eerste[parameter]["totalCostDifference"] = ref_afgeleide - eerste[parameter]["totalLoanCosts"]
+            methode[parameter]["totalCostDifference"] = ANALYTISCH
+
+    return {
+        "basis": {naam: rij[0] for naam, rij in waarden.items()},
+        "eerste_orde": eerste,
+        "tweede_orde": tweede if tweede_orde else None,
+        "methode": methode,
+        "scenarios": 1 + 2 * len(stappen),
+    }
@@ -0,0 +1,330 @@
+# -*- coding: utf-8 -*-
+"""
+Rate-shock stress test of the loan book: which households cross the debt-ratio
+threshold when variable and revisable loans are re-priced at higher rates.
+
+Reads a JSONL or CSV export of the loan book (``LoanSimulation`` fields plus
+``caseId`` and, for variable loans, ``revisionFormula`` such as ``10/5/5`` and
+optional ``capUp`` / ``capDown`` in percentage points) and the client incomes
+(``caseId``, ``monthlyIncome``; several rows per case are added up). Loans without
+a revision formula are fixed and only count towards the household payment.
+
+Every scenario is a path of index changes (percentage points per calendar year from
+``--as-of`` on): parallel shocks from ``--shocks`` and named paths from ``--paths``
+(a JSON object ``{"name": [change year 0, change year 1, ...]}``; the last change
+carries forward). Resets from the as-of year on are re-priced through the loan's
+revision formula, caps and the legal doubling limit; earlier segments keep the
+contract rate.
+
+Cases are sent in chunks to a process pool. Within a chunk all loans x scenarios
+that share a term, revision formula and schedule are one call of the vectorized
+variable-rate engine; household payments are summed per case on a calendar-month
+window of ``--horizon-years`` from January of the as-of year. The output holds one
+row per case with the worst payment increase and debt ratio per scenario and whether
+it crosses ``--threshold`` (default: the 43% ``DEBT_RATIO_MODERATE`` of the
+multi-client statistics); a summary with breach counts per scenario is printed.
+
+Usage (from the python/ directory):
+
+    python stress_test.py --loans loans.jsonl --incomes incomes.csv --shocks 1,2,3 \\
+        --paths historical.json --as-of 2026 --output stress.jsonl --workers 4
+"""
+import argparse
+import datetime
+import json
+import os
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+
+from batch_engine import lening_invoer, premie_schema
+from cancellation import checkpoint
+from multi_client_calculation import DEBT_RATIO_MODERATE
+from recompute_simulations import (
+    _error_detail,
+    chunked,
+    iter_records,
+    load_schedule_index,
+    loan_parameters,
+    schedule_of,
+)
+from variable_rate import MAX_VERMENIGVULDIGING, herzieningsdata, reset_maanden, simuleer_variabele_leningen
+
+BASE_SCENARIO = "base"
+DEFAULT_CHUNK_SIZE = 500  # cases per work unit
+DEFAULT_HORIZON_YEARS = 10
+
+
+def _optional_float(value):
+    # Missing caps mean no limit
+    return np.nan if value in (None, "") else float(value)
+
+
+def _groep_sleutel(invoer, formule):
+    # The premium does not depend on the rate or the principal, so the start year and
+    # coverage stay out of the key and loans of every vintage share one engine call
+    schema = invoer["aflossings_schema"]
+    if schema and len(schema) == 1 and schema[0][0] == invoer["looptijd_jaren"] * 12 and schema[0][1] >= invoer["hoofdsom"]:
+        # A plain bullet: the engine repays the whole principal at the end without a schedule
+        schema = None
+    return (
+        formule,
+        invoer["looptijd_jaren"],
+        invoer["loan_type"],
+        tuple(schema) if schema else None,
+        int(invoer["uitstel_maanden"] or 0),
+    )
+
+
+def _index_paden(scenario_paden, start_jaren, as_of_jaar, looptijd_jaren):
+    """
+    (loans x scenarios x loan years + 1) index paths: the scenario change of the calendar
+    year of every loan year, zero before the as-of year (and at signing).
+    """
+    jaren = np.arange(looptijd_jaren + 1)
+    # Position of each loan year on the scenario paths (negative: before the as-of year)
+    positie = start_jaren[:, None] + jaren[None, :] - as_of_jaar
+    paden = scenario_paden[:, np.clip(positie, 0, scenario_paden.shape[1] - 1)]  # scenarios x loans x years
+    paden = np.where(positie[None, :, :] >= 0, paden, 0.0)
+    paden[:, :, 0] = 0.0
+    return paden.transpose(1, 0, 2)
+
+
+def stress_cases(cases, scenarios, as_of_jaar, horizon_maanden, drempel=DEBT_RATIO_MODERATE, schedules=None):
+    """
+    Stress one batch of cases.
+
+    ``cases`` is a list of ``{"caseId", "monthlyIncome", "loans": [loan record, ...]}``,
+    ``scenarios`` maps scenario names to annual index changes (decimal, from the as-of
+    year on); the first scenario is the baseline. Returns one row per case.
+    """
+    namen = list(scenarios)
+    lengte = max(len(pad) for pad in scenarios.values())
+    scenario_paden = np.array([list(pad) + list(pad[-1:]) * (lengte - len(pad)) for pad in scenarios.values()])
+    s = len(namen)
+
+    betalingen = np.zeros((len(cases), s, horizon_maanden))
+    fouten = defaultdict(list)
+    aantal_variabel = np.zeros(len(cases), dtype=int)
+    groepen = defaultdict(list)
+    for c, case in enumerate(cases):
+        for record in case["loans"]:
+            try:
+                invoer = lening_invoer(loan_parameters(record).model_dump(), schedule_of(record, schedules))
+                formule = record.get("revisionFormula") or None
+                segmenten = reset_maanden(formule or invoer["looptijd_jaren"], invoer["looptijd_jaren"])
+            except Exception as e:
+                fouten[c].append(f"{record.get('id')}: {_error_detail(e)}")
+                continue
+            aantal_variabel[c] += formule is not None
+            groepen[_groep_sleutel(invoer, formule)].append((c, invoer, record, segmenten))
+
+    premies = {}
+    venster = np.arange(horizon_maanden)
+    for (formule, looptijd_jaren, loan_type, schema, uitstel_maanden), leden in groepen.items():
+        checkpoint()
+        segmenten = leden[0][3]
+        totaal_maanden = looptijd_jaren * 12
+        n = len(leden)
+        # Fixed loans pay the same under every scenario: simulate them once
+        s_groep = s if formule is not None else 1
+        start_jaren = np.array([invoer["start_jaar_kalender"] for _, invoer, _, _ in leden])
+        index = _index_paden(scenario_paden[:s_groep], start_jaren, as_of_jaar, looptijd_jaren)
+        renten = herzieningsdata(
+            np.repeat([invoer["jaarlijkse_rentevoet"] for _, invoer, _, _ in leden], s_groep),
+            segmenten,
+            index.reshape(n * s_groep, -1),
+            plafond_stijging=np.repeat([_optional_float(record.get("capUp")) for _, _, record, _ in leden], s_groep) / 100,
+            plafond_daling=np.repeat([_optional_float(record.get("capDown")) for _, _, record, _ in leden], s_groep) / 100,
+            max_vermenigvuldiging=MAX_VERMENIGVULDIGING,
+        )
+        resultaat = simuleer_variabele_leningen(
+            np.repeat([invoer["hoofdsom"] for _, invoer, _, _ in leden], s_groep),
+            renten,
+            looptijd_jaren,
+            segmenten,
+            loan_type=loan_type,
+            aflossings_schema=list(schema) if schema else None,
+            uitstel_maanden=uitstel_maanden,
+        )
+        premie = []
+        for _, invoer, _, _ in leden:
+            sleutel = (looptijd_jaren, invoer["start_jaar_kalender"], loan_type, invoer["schuldsaldo_dekking_pct"])
+            if sleutel not in premies:
+                premies[sleutel] = premie_schema(*sleutel)
+            premie.append(premies[sleutel])
+        betaling = resultaat["paymentExcludingInsurance"].reshape(n, s_groep, totaal_maanden) + np.array(premie)[:, None, :]
+        # Loan months that fall in the window (January of the as-of year on)
+        kolommen = (as_of_jaar - start_jaren)[:, None] * 12 + venster[None, :]
+        geldig = (kolommen >= 0) & (kolommen < totaal_maanden)
+        in_venster = np.take_along_axis(betaling, np.clip(kolommen, 0, totaal_maanden - 1)[:, None, :], axis=2)
+        in_venster = np.where(geldig[:, None, :], in_venster, 0.0)
+        np.add.at(betalingen, np.array([c for c, _, _, _ in leden]), in_venster)
+
+    inkomens = np.array([case.get("monthlyIncome") or np.nan for case in cases], dtype=float)
+    max_betaling = betalingen.max(axis=2)
+    max_toename = (betalingen - betalingen[:, :1]).max(axis=2)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = betalingen / inkomens[:, None, None] * 100
+    boven = ratio > drempel
+    doorbraak = boven.any(axis=2)
+    eerste = np.argmax(boven, axis=2)
+    max_ratio = ratio.max(axis=2)
+
+    rijen = []
+    for c, case in enumerate(cases):
+        inkomen = case.get("monthlyIncome") or None
+        fout = fouten[c] + ([] if inkomen else ["No income"])
+        resultaten = {}
+        for j, naam in enumerate(namen):
+            resultaten[naam] = {
+                "maxPayment": round(float(max_betaling[c, j]), 2),
+                "maxIncrease": round(float(max_toename[c, j]), 2),
+                "maxDebtRatio": round(float(max_ratio[c, j]), 2) if inkomen else None,
+                "breach": bool(doorbraak[c, j]) if inkomen else None,
+                "newBreach": bool(doorbraak[c, j] and not doorbraak[c, 0]) if inkomen else None,
+                "firstBreach": {"calendarYear": as_of_jaar + int(eerste[c, j]) // 12,
+                                "calendarMonth": int(eerste[c, j]) % 12 + 1} if doorbraak[c, j] else None,
+            }
+        rijen.append({
+            "caseId": case["caseId"],
+            "monthlyIncome": inkomen,
+            "loans": len(case["loans"]),
+            "variableLoans": int(aantal_variabel[c]),
+            "currentPayment": round(float(betalingen[c, 0, 0]), 2),
+            "scenarios": resultaten,
+            "error": "; ".join(fout) or None,
+        })
+    return rijen
+
+
+def load_cases(loans_path, incomes_path):
+    """Group the loan book per case and attach the summed monthly income."""
+    cases = {}
+    for _, record in iter_records(loans_path):
+        case_id = record.get("caseId")
+        if case_id is None:
+            continue
+        cases.setdefault(case_id, {"caseId": case_id, "monthlyIncome": None, "loans": []})["loans"].append(record)
+    for _, record in iter_records(incomes_path):
+        case = cases.get(record.get("caseId"))
+        if case is not None and record.get("monthlyIncome") not in (None, ""):
+            case["monthlyIncome"] = (case["monthlyIncome"] or 0) + float(record["monthlyIncome"])
+    return list(cases.values())
+
+
+def parse_scenarios(shocks=None, paths_file=None):
+    """Baseline, parallel shocks (``"1,2,3"`` in percentage points) and named paths from a JSON file, as decimals."""
+    scenarios = {BASE_SCENARIO: [0.0]}
+    for shock in filter(None, (shocks or "").split(",")):
+        scenarios[f"{float(shock):+g}"] = [float(shock) / 100]
+    if paths_file:
+        with open(paths_file) as f:
+            for name, path in json.load(f).items():
+                if not path:
+                    raise SystemExit(f"Scenario path '{name}' is empty")
+                scenarios[name] = [float(change) / 100 for change in path]
+    return scenarios
+
+
+class Summary:
+    def __init__(self, scenarios, stream=sys.stderr):
+        self.stream = stream
+        self.start = time.perf_counter()
+        self.cases = 0
+        self.loans = 0
+        self.errors = 0
+        self.scenarios = {name: {"breaches": 0, "newBreaches": 0, "maxIncrease": 0.0, "worstCase": None}
+                          for name in scenarios}
+
+    def update(self, rows):
+        for row in rows:
+            self.cases += 1
+            self.loans += row["loans"]
+            self.errors += bool(row["error"])
+            for name, result in row["scenarios"].items():
+                totals = self.scenarios[name]
+                totals["breaches"] += bool(result["breach"])
+                totals["newBreaches"] += bool(result["newBreach"])
+                if result["maxIncrease"] > totals["maxIncrease"]:
+                    totals["maxIncrease"] = result["maxIncrease"]
+                    totals["worstCase"] = row["caseId"]
+
+    def report(self):
+        elapsed = time.perf_counter() - self.start
+        print(f"done: {self.cases} cases, {self.loans} loans, {self.errors} errors, {elapsed:.1f} s",
+              file=self.stream, flush=True)
+        return {"cases": self.cases, "loans": self.loans, "errors": self.errors,
+                "seconds": round(elapsed, 2), "scenarios": self.scenarios}
+
+
+def chunk_schedules(chunk, schedules):
+    """The part of the schedule index that the loans of ``chunk`` use, so workers are not sent all of it."""
+    if not schedules:
+        return None
+    return {record["id"]: schedules[record["id"]]
+            for case in chunk for record in case["loans"] if record.get("id") in schedules}
+
+
+def run_pipeline(cases, scenarios, as_of_year, horizon_months, threshold, writer, summary,
+                 schedules=None, workers=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    workers = workers or os.cpu_count() or 1
+    max_pending = workers * 2
+
+    def collect(futures):
+        for future in futures:
+            rows = future.result()
+            for row in rows:
+                writer.write(json.dumps(row) + "\n")
+            summary.update(rows)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+        for chunk in chunked(cases, chunk_size):
+            pending.add(executor.submit(stress_cases, chunk, scenarios, as_of_year, horizon_months, threshold,
+                                        chunk_schedules(chunk, schedules)))
+            while len(pending) >= max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            collect(done)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rate-shock stress test of the loan book")
+    parser.add_argument("--loans", required=True, help="Loan book export with caseId (.jsonl or .csv)")
+    parser.add_argument("--incomes", required=True, help="Client incomes with caseId and monthlyIncome (.jsonl or .csv)")
+    parser.add_argument("--schedule-items", default=None, help="ModularScheduleItem export (.jsonl or .csv)")
+    parser.add_argument("--shocks", default="1,2,3", help="Parallel rate shocks in percentage points")
+    parser.add_argument("--paths", default=None, help='JSON file of named index paths {"name": [pp per year]}')
+    parser.add_argument("--as-of", type=int, default=datetime.date.today().year, help="Calendar year of the stress date")
+    parser.add_argument("--horizon-years", type=int, default=DEFAULT_HORIZON_YEARS, help="Years of payments checked")
+    parser.add_argument("--threshold", type=float, default=DEBT_RATIO_MODERATE, help="Debt ratio (percent) that counts as a breach")
+    parser.add_argument("--output", required=True, help="Per-case results (.jsonl)")
+    parser.add_argument("--summary", default=None, help="Write the summary JSON here instead of stdout")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Cases per work unit")
+    args = parser.parse_args(argv)
+
+    scenarios = parse_scenarios(args.shocks, args.paths)
+    schedules = load_schedule_index(args.schedule_items) if args.schedule_items else None
+    cases = load_cases(args.loans, args.incomes)
+    summary = Summary(scenarios)
+    with open(args.output, "w") as writer:
+        run_pipeline(cases, scenarios, args.as_of, args.horizon_years * 12, args.threshold, writer, summary,
+                     schedules=schedules, workers=args.workers, chunk_size=args.chunk_size)
+    result = summary.report()
+    if args.summary:
+        with open(args.summary, "w") as f:
+            json.dump(result, f, indent=2)
+    else:
+        print(json.dumps(result, indent=2))
+    return 1 if summary.errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
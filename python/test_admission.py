@@ -0,0 +1,84 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from api.admission import AdmissionController, AdmissionRejected
+from api.main import app
+from config import PriorityClass
+from metrics import ADMISSION_REJECTED
+
+LIMITS = {"/api/calculate-loan": 2, "/api/compare-loans": 2, "/api/break-even-surface": 1}
+CLASSES = {
+    "/api/calculate-loan": PriorityClass.INTERACTIVE,
+    "/api/compare-loans": PriorityClass.STANDARD,
+    "/api/break-even-surface": PriorityClass.BATCH,
+}
+
+
+def test_limits_queue_and_priority_order():
+    """Route limits hold, interactive slots stay reserved and waiters are admitted by priority"""
+    async def scenario():
+        controller = AdmissionController(LIMITS, CLASSES, capacity=3, reserved_interactive=1,
+                                         queue_size=2, queue_timeout=5)
+        await controller.acquire("/api/compare-loans")
+        await controller.acquire("/api/compare-loans")
+        assert controller.total_in_flight == 2
+
+        # The remaining slot is reserved: batch work queues, interactive work starts
+        order = []
+
+        async def request(route):
+            await controller.acquire(route)
+            order.append(route)
+
+        batch = asyncio.ensure_future(request("/api/break-even-surface"))
+        await asyncio.sleep(0)
+        assert not batch.done()
+        await controller.acquire("/api/calculate-loan")
+
+        standard = asyncio.ensure_future(request("/api/compare-loans"))
+        await asyncio.sleep(0)
+        controller.release("/api/calculate-loan")
+        controller.release("/api/compare-loans")
+        await asyncio.sleep(0.01)
+        # The standard waiter arrived later but outranks the batch waiter
+        assert order == ["/api/compare-loans"]
+        controller.release("/api/compare-loans")
+        controller.release("/api/compare-loans")
+        await asyncio.gather(batch, standard)
+        assert order == ["/api/compare-loans", "/api/break-even-surface"]
+        assert controller.in_flight["/api/break-even-surface"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_full_queue_and_timeout_are_rejected():
+    async def scenario():
+        controller = AdmissionController(LIMITS, CLASSES, capacity=4, queue_size=1, queue_timeout=0.05)
+        await controller.acquire("/api/break-even-surface")
+        waiting = asyncio.ensure_future(controller.acquire("/api/break-even-surface"))
+        await asyncio.sleep(0)
+        reasons = []
+        for attempt in (controller.acquire("/api/break-even-surface"), waiting):
+            try:
+                await attempt
+            except AdmissionRejected as e:
+                reasons.append(e.reason)
+        assert reasons == ["queue_full", "timeout"]
+        assert controller._waiters == []
+        assert controller.in_flight["/api/break-even-surface"] == 1
+
+    before = ADMISSION_REJECTED.value(route="/api/break-even-surface", reason="queue_full")
+    asyncio.run(scenario())
+    assert ADMISSION_REJECTED.value(route="/api/break-even-surface", reason="queue_full") == before + 1
+
+
+def test_busy_endpoint_answers_503_with_retry_after(monkeypatch):
+    from api import admission as admission_module
+
+    busy = AdmissionController({"/api/calculate-loan": 0}, CLASSES, capacity=1, queue_size=0)
+    monkeypatch.setattr(admission_module, "admission", busy)
+    client = TestClient(app)
+    response = client.post("/api/calculate-loan", json={})
+    assert response.status_code == 503
+    assert "Retry-After" in response.headers
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+from fastapi import HTTPException
+
+from api.main import ComparisonRequest, compare_loans_result
+from api.backtest import BacktestRequest, backtest_result
+from backtest import SYNTHETISCHE_RENDEMENTEN, laad_rendementen, rollende_vensters
+from config import settings
+
+REFERENCE = {"loanType": "annuity", "principal": 300000, "interestRate": 3.5, "termYears": 25,
+             "ownContribution": 50000, "purchasePrice": 350000}
+BULLET = dict(REFERENCE, loanType="bullet", interestRate=3.0, termYears=20)
+INVESTMENT = {"startCapital": 100000, "annualGrowthRate": 6}
+BODY = dict(referenceLoan=REFERENCE, alternativeLoan=BULLET, referenceOwnContribution=50000,
+            alternativeOwnContribution=50000, investmentParams=INVESTMENT)
+
+
+def test_constant_returns_match_comparison():
+    returns = np.full(250, 1.06 ** (1 / 12) - 1)
+    windows = rollende_vensters(returns, 240)
+    assert windows.shape == (11, 240) and np.shares_memory(windows, returns)
+
+    result = backtest_result(BacktestRequest(**BODY, returns=list(returns * 100), firstMonth="2000-01"))
+    pairwise = compare_loans_result(ComparisonRequest(**BODY))
+    assert result["windows"] == 11
+    assert abs(result["netWorthEndOfTerm"]["min"] - pairwise["comparisonStats"]["netWorthEndOfTerm"]) < 0.05
+    assert result["worstWindow"]["end"] == "2019-12"
+    assert result["coverageRate"] == 1.0
+
+
+def test_crash_window_from_csv(tmp_path, monkeypatch):
+    levels = 100 * np.cumprod(np.full(301, 1.005))
+    levels[270:] *= 0.3  # a crash in month 270
+    path = tmp_path / "index.csv"
+    path.write_text("month,index\n" + "".join(f"{2000 + m // 12}-{m % 12 + 1:02d},{level}\n"
+                                              for m, level in enumerate(levels)))
+    months, returns = laad_rendementen(str(path))
+    assert months[0] == "2000-02" and np.isclose(returns[0], 0.005)
+
+    monkeypatch.setattr(settings, "backtest_returns_path", str(path))
+    result = backtest_result(BacktestRequest(**BODY, includeWindows=True))
+    assert result["source"] == "index.csv" and not result["synthetic"] and result["windows"] == 61
+    # Windows ending right after the crash cannot repay the bullet; earlier ones can
+    worst = result["worstWindow"]
+    assert worst["end"] == "2022-07" and not worst["coveredRepayment"] and worst["shortfall"] > 0
+    assert result["windowResults"][0]["coveredRepayment"]
+    assert 0 < result["coverageRate"] < 1
+
+
+def test_synthetic_series_is_opt_in(monkeypatch):
+    """Without returns or a configured series the request needs syntheticReturns, and is flagged"""
+    monkeypatch.setattr(settings, "backtest_returns_path", "")
+    with pytest.raises(HTTPException) as excinfo:
+        backtest_result(BacktestRequest(**BODY))
+    assert excinfo.value.status_code == 400
+
+    months, returns = laad_rendementen(SYNTHETISCHE_RENDEMENTEN)
+    result = backtest_result(BacktestRequest(**BODY, syntheticReturns=True))
+    assert result["source"] == "index_returns.csv" and result["synthetic"] and "not historical" in result["warning"]
+    assert result["windows"] == len(returns) - 240 + 1
+    assert result["worstWindow"]["start"] >= months[0] and result["bestWindow"]["end"] <= months[-1]
+    assert not backtest_result(BacktestRequest(**BODY, returns=[0.5] * 240))["synthetic"]
@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+from fastapi.testclient import TestClient
+
+from api.main import app
+from affordability import bereken_max_lening
+from batch_engine import simuleer_leningen_batch, batch_naar_dataframe
+from break_even import los_min_groei_batch
+from calculation_functions import simuleer_klassieke_lening, simuleer_modulaire_lening, bereken_min_groei_voor_betaling
+
+client = TestClient(app)
+
+
+def test_batch_matches_scalar_engine():
+    """Each loan of a batch has the same schedule as the month-by-month simulation"""
+    batch = simuleer_leningen_batch([300000, 500000], [0.035, 0.0], 25, uitstel_maanden=6)
+    for i, (principal, rate) in enumerate([(300000, 0.035), (500000, 0.0)]):
+        expected = simuleer_klassieke_lening(0, rate, 25, aankoopprijs=principal, uitstel_maanden=6)
+        actual = batch_naar_dataframe(batch, i)[expected.columns]
+        assert np.allclose(actual.to_numpy(), expected.to_numpy(), atol=1e-6)
+
+    schedule = [(12, 10000), (120, 50000), (300, 400000)]
+    batch = simuleer_leningen_batch(300000, 0.04, 25, "modular", schedule)
+    expected = simuleer_modulaire_lening(0, 0.04, 25, schedule, aankoopprijs=300000, loan_type="modular")
+    actual = batch_naar_dataframe(batch, 0)[expected.columns]
+    assert np.allclose(actual.to_numpy(), expected.to_numpy(), atol=1e-6)
+
+
+def test_max_affordable_loan_hits_target_debt_ratio():
+    """The maximum principal puts the debt ratio exactly on the target, for every income/rate pair"""
+    for loan_type in ("annuity", "bullet"):
+        result = bereken_max_lening([3000, 6000], [0.02, 0.05], 20, loan_type=loan_type, doel_schuldratio=40)
+        assert result["maxPrincipal"].shape == (2, 2)
+        assert np.allclose(result["debtRatio"], 40, atol=1e-3)
+        # More income buys more loan, a higher rate buys less
+        assert np.all(result["maxPrincipal"][1] > result["maxPrincipal"][0])
+        assert np.all(result["maxPrincipal"][:, 0] > result["maxPrincipal"][:, 1])
+
+
+def test_max_affordable_loan_endpoint():
+    """/api/max-affordable-loan returns one row per income and one cell per rate"""
+    response = client.post("/api/max-affordable-loan", json={
+        "loanType": "annuity",
+        "interestRates": [2.5, 3.5, 4.5],
+        "termYears": 25,
+        "monthlyIncomes": [0, 4000],
+        "ownContribution": 50000,
+    })
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [len(row) for row in results] == [3, 3]
+    assert results[0][0]["maxPrincipal"] == 0 and results[0][0]["maxPurchasePrice"] is None
+    cell = results[1][1]
+    assert cell["maxPurchasePrice"] == round(cell["maxPrincipal"] + 50000, 2)
+    assert cell["debtRatio"] == 33.0
+
+
+def test_batch_min_growth_matches_scalar_solver():
+    """Every problem of the batched solver has the same root as bereken_min_groei_voor_betaling"""
+    rng = np.random.default_rng(7)
+    contributions = rng.normal(300, 200, (20, 360))
+    start = rng.uniform(0, 100000, 20)
+    payment_months = rng.integers(120, 361, 20)
+    targets = rng.uniform(200000, 800000, 20)
+
+    result = los_min_groei_batch(start, contributions, payment_months, targets)
+    assert result["converged"].all()
+    for i in range(20):
+        df = pd.DataFrame({"month": np.arange(1, 361), "monthlyContribution": contributions[i]})
+        expected = bereken_min_groei_voor_betaling(df, int(payment_months[i]), targets[i], start[i])
+        assert abs(result["annualRate"][i] - expected) < 1e-4
@@ -0,0 +1,70 @@
+import pandas as pd
+from fastapi.testclient import TestClient
+
+from api.main import app, ComparisonRequest, compare_loans_result
+from batch_engine import simuleer_leningen_batch
+from calculation_functions import bereken_min_groei_voor_betaling
+
+client = TestClient(app)
+
+REFERENCE = {"loanType": "annuity", "principal": 300000, "interestRate": 3.5, "termYears": 25,
+             "ownContribution": 50000, "purchasePrice": 350000}
+REFERENCE_SCHEDULE = [(12 * year, 20000) for year in range(1, 21)]
+ALTERNATIVE_SCHEDULE = [(12, 10000), (240, 390000)]
+BODY = {
+    "referenceLoan": {"loanType": "modular", "principal": 400000, "interestRate": 3.2, "termYears": 20,
+                      "ownContribution": 80000, "purchasePrice": 480000},
+    "referenceSchedule": {"schedule": [{"month": m, "amount": a} for m, a in REFERENCE_SCHEDULE]},
+    "alternativeLoanType": "modular",
+    "alternativeInterestRates": [3.0, 3.4],
+    "alternativeTermYears": [20],
+    "alternativeOwnContributions": [80000],
+    "modularSchedule": {"schedule": [{"month": m, "amount": a} for m, a in ALTERNATIVE_SCHEDULE]},
+    "startCapital": 150000,
+}
+
+
+def test_matches_compare_loans():
+    body = {"referenceLoan": REFERENCE, "alternativeLoanType": "bullet", "alternativeInterestRates": [3.0, 3.8],
+            "alternativeTermYears": [10, 20], "alternativeOwnContributions": [50000, 80000], "startCapital": 100000}
+    surface = client.post("/api/break-even-surface", json=body).json()
+    assert surface["solvedCount"] == surface["problemCount"] == 8
+
+    for i, rate in enumerate(body["alternativeInterestRates"]):
+        for j, years in enumerate(body["alternativeTermYears"]):
+            for k, contribution in enumerate(body["alternativeOwnContributions"]):
+                alternative = dict(REFERENCE, loanType="bullet", interestRate=rate, termYears=years,
+                                   principal=350000 - contribution, ownContribution=contribution)
+                pairwise = compare_loans_result(ComparisonRequest(
+                    referenceLoan=REFERENCE, alternativeLoan=alternative, referenceOwnContribution=50000,
+                    alternativeOwnContribution=contribution, investmentParams={"startCapital": 100000},
+                ))
+                assert abs(surface["minimumRequiredGrowthRate"][i][j][k] - pairwise["minimumRequiredGrowthRate"]) < 1e-2
+
+
+def min_growth(reference_type, reference_schedule, rate):
+    """Break-even return (percent) of one grid point of BODY, solved by the single-comparison solver."""
+    reference = simuleer_leningen_batch(400000, 0.032, 20, reference_type, reference_schedule)
+    alternative = simuleer_leningen_batch(400000, rate / 100, 20, "modular", ALTERNATIVE_SCHEDULE)
+    contributions = reference["totalMonthlyPayment"][0] - alternative["totalMonthlyPayment"][0]
+    investment = pd.DataFrame({"month": range(1, 241), "monthlyContribution": contributions})
+    return bereken_min_groei_voor_betaling(investment, 240, 400000, 150000 - 80000) * 100
+
+
+def test_reference_uses_its_own_schedule():
+    result = client.post("/api/break-even-surface", json=BODY).json()
+    assert result["solvedCount"] == 2
+    for i, rate in enumerate(BODY["alternativeInterestRates"]):
+        assert abs(result["minimumRequiredGrowthRate"][i][0][0] - min_growth("modular", REFERENCE_SCHEDULE, rate)) < 1e-2
+
+    # A bullet reference repays at the end of its term, whatever the alternative's schedule
+    bullet = dict(BODY, referenceLoan=dict(BODY["referenceLoan"], loanType="bullet"), referenceSchedule=None)
+    result = client.post("/api/break-even-surface", json=bullet).json()
+    for i, rate in enumerate(BODY["alternativeInterestRates"]):
+        assert abs(result["minimumRequiredGrowthRate"][i][0][0] - min_growth("bullet", None, rate)) < 1e-2
+
+
+def test_modular_reference_needs_its_own_schedule():
+    response = client.post("/api/break-even-surface", json=dict(BODY, referenceSchedule=None))
+    assert response.status_code == 400
+    assert "referenceSchedule" in response.json()["detail"]
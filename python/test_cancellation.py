@@ -0,0 +1,52 @@
+import asyncio
+import time
+
+import pandas as pd
+
+from calculation_functions import simuleer_klassieke_lening, bereken_min_groei_voor_betaling
+from cancellation import CancellationToken, ComputationCancelled, cancellation_scope, run_cancellable
+from metrics import COMPUTATIONS_ABORTED
+
+
+def test_checkpoints_stop_engine_and_solver():
+    """A cancelled token stops the simulation loop and is not swallowed by the solver's fallbacks"""
+    token = CancellationToken()
+    token.cancel()
+    with cancellation_scope(token):
+        for calculation in (
+            lambda: simuleer_klassieke_lening(100000, 0.035, 30, aankoopprijs=600000),
+            lambda: bereken_min_groei_voor_betaling(
+                pd.DataFrame({"month": range(1, 13), "monthlyContribution": [100.0] * 12}), 12, 5000, 1000),
+        ):
+            try:
+                calculation()
+            except ComputationCancelled:
+                pass
+            else:
+                raise AssertionError("Expected ComputationCancelled")
+
+
+class DisconnectedRequest:
+    async def receive(self):
+        return {"type": "http.disconnect"}
+
+
+def test_run_cancellable_aborts_on_disconnect():
+    """The worker is cancelled at its next checkpoint and the abort is counted"""
+    before = COMPUTATIONS_ABORTED.value(endpoint="slow_test", reason="client_disconnected")
+    finished = []
+
+    def slow():
+        time.sleep(0.2)
+        simuleer_klassieke_lening(100000, 0.035, 30, aankoopprijs=600000)
+        finished.append(True)
+
+    try:
+        asyncio.run(run_cancellable(DisconnectedRequest(), slow, endpoint="slow_test"))
+    except ComputationCancelled:
+        pass
+    else:
+        raise AssertionError("Expected ComputationCancelled")
+    time.sleep(0.4)
+    assert finished == []
+    assert COMPUTATIONS_ABORTED.value(endpoint="slow_test", reason="client_disconnected") == before + 1
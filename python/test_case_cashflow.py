@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+from fastapi import HTTPException
+
+from api.main import batch_loan_inputs  # loads the routers before api.case_cashflow
+from api.case_cashflow import CaseCashflowLoan, loan_inputs
+from calculation_functions import simuleer_klassieke_lening, simuleer_modulaire_lening
+from case_cashflow import bereken_case_kasstroom
+
+
+def test_loans_are_aligned_on_calendar_months():
+    leningen = [
+        {"hoofdsom": 300000, "jaarlijkse_rentevoet": 0.035, "looptijd_jaren": 20, "start_jaar_kalender": 2025},
+        {"hoofdsom": 200000, "jaarlijkse_rentevoet": 0.04, "looptijd_jaren": 10, "start_jaar_kalender": 2030},
+        {"hoofdsom": 100000, "jaarlijkse_rentevoet": 0.03, "looptijd_jaren": 15, "start_jaar_kalender": 2027,
+         "loan_type": "modular", "aflossings_schema": [(60, 40000), (180, 60000)]},
+    ]
+    result = bereken_case_kasstroom(
+        leningen,
+        klant_aandelen=[{"x": 50, "y": 50}, {"x": 100}, None],
+        case_ids=["c1", "c1", "c2"],
+    )
+
+    # Reference: the scalar engine per loan, shifted by its start year
+    expected = np.zeros(len(result["kasstroom"]["kalender_jaar"]))
+    for lening in leningen:
+        kwargs = dict(eigen_inbreng=0, jaarlijkse_rentevoet=lening["jaarlijkse_rentevoet"],
+                      looptijd_jaren=lening["looptijd_jaren"], aankoopprijs=lening["hoofdsom"],
+                      start_jaar_kalender=lening["start_jaar_kalender"])
+        if "aflossings_schema" in lening:
+            df = simuleer_modulaire_lening(aflossings_schema=lening["aflossings_schema"], loan_type="modular", **kwargs)
+        else:
+            df = simuleer_klassieke_lening(**kwargs)
+        offset = (lening["start_jaar_kalender"] - 2025) * 12
+        expected[offset:offset + len(df)] += df["totalMonthlyPayment"].to_numpy()
+
+    total = result["totaal"]["totalMonthlyPayment"]
+    np.testing.assert_allclose(total, expected, atol=0.05)
+    assert result["kasstroom"]["kalender_jaar"][0] == 2025 and len(total) == 20 * 12
+    # The final modular repayment (month 180 from January 2027)
+    assert result["piek"]["kalender_jaar"] == 2041 and result["piek"]["kalender_maand"] == 12
+    assert result["actieve_leningen"][result["piek"]["index"]] == 2
+    # The unassigned loan is split evenly; client and case series add up to the household
+    np.testing.assert_allclose(result["klanten"]["reeksen"]["totalMonthlyPayment"].sum(axis=0), total)
+    np.testing.assert_allclose(result["cases"]["reeksen"]["totalMonthlyPayment"].sum(axis=0), total)
+    assert result["jaarlijks"]["remainingPrincipal"][-1] == 0
+
+
+def test_loan_inputs_match_compare_many():
+    params = {"loanType": "bullet", "principal": 250000, "interestRate": 3.2, "termYears": 20,
+              "ownContribution": 50000, "purchasePrice": 300000, "startYear": 2027}
+    loan = CaseCashflowLoan(id="l1", params=params)
+    assert loan_inputs(loan) == batch_loan_inputs(loan.params)
+    assert loan_inputs(loan)["aflossings_schema"] == [(240, 250000)]
+
+    with pytest.raises(HTTPException) as error:
+        loan_inputs(CaseCashflowLoan(id="l2", params=dict(params, loanType="modular")))
+    assert error.value.status_code == 400 and error.value.detail.startswith("Loan l2: ")
@@ -0,0 +1,67 @@
+import numpy as np
+
+from api.main import ComparisonRequest, compare_loans_result
+from api.compare_many import CompareManyRequest, compare_many_result
+from batch_engine import batch_naar_dataframe, simuleer_leningen_gegroepeerd
+from calculation_functions import aggregeer_jaarlijks, vergelijk_jaarlijks
+from compare_many import jaarlijkse_verschillen
+
+REFERENCE = {"loanType": "annuity", "principal": 300000, "interestRate": 3.5, "termYears": 25,
+             "ownContribution": 50000, "purchasePrice": 350000}
+INVESTMENT = {"startCapital": 100000, "annualGrowthRate": 6}
+
+
+def test_matches_pairwise_comparison():
+    alternatives = [
+        dict(REFERENCE, loanType="bullet", interestRate=3.0, termYears=20),
+        dict(REFERENCE, loanType="bullet", interestRate=3.8, termYears=10),
+        dict(REFERENCE, interestRate=3.2, termYears=30),
+    ]
+    result = compare_many_result(CompareManyRequest(
+        referenceLoan=REFERENCE,
+        referenceOwnContribution=50000,
+        alternatives=[{"id": f"alt{i}", "loan": loan} for i, loan in enumerate(alternatives)],
+        investmentParams=INVESTMENT,
+        includeDetail=True,
+    ))
+
+    by_id = {row["id"]: row for row in result["ranking"]}
+    for i, loan in enumerate(alternatives):
+        pairwise = compare_loans_result(ComparisonRequest(
+            referenceLoan=REFERENCE, alternativeLoan=loan, referenceOwnContribution=50000,
+            alternativeOwnContribution=50000, investmentParams=INVESTMENT,
+        ))
+        row = by_id[f"alt{i}"]
+        assert abs(row["totalCostDifference"] - pairwise["comparisonStats"]["totalCostDifference"]) < 0.05
+        assert abs(row["netWorthEndOfTerm"] - pairwise["comparisonStats"]["netWorthEndOfTerm"]) < 0.05
+        assert abs(row["minimumRequiredGrowthRate"] - pairwise["minimumRequiredGrowthRate"]) < 1e-3
+
+    net_worth = [row["netWorthEndOfTerm"] for row in result["ranking"]]
+    assert result["rankBy"] == "netWorthEndOfTerm" and net_worth == sorted(net_worth, reverse=True)
+    assert [row["rank"] for row in result["ranking"]] == [1, 2, 3]
+    detail = result["alternatives"][1]
+    assert len(detail["monthlyData"]["investmentBalance"]) == 120 and len(detail["annualDifferences"]) == 30
+
+
+def test_annual_differences_match_vergelijk_jaarlijks():
+    referentie = {"hoofdsom": 300000, "jaarlijkse_rentevoet": 0.035, "looptijd_jaren": 20}
+    alternatief = {"hoofdsom": 300000, "jaarlijkse_rentevoet": 0.03, "looptijd_jaren": 15, "loan_type": "bullet"}
+    ref = simuleer_leningen_gegroepeerd([referentie])
+    alt = simuleer_leningen_gegroepeerd([alternatief])
+
+    verschillen = jaarlijkse_verschillen(ref, alt, 20)
+    expected = vergelijk_jaarlijks(
+        aggregeer_jaarlijks(batch_naar_dataframe(_batch(ref, 240), 0)),
+        aggregeer_jaarlijks(batch_naar_dataframe(_batch(alt, 180), 0)),
+        "ref", "alt",
+    )
+    assert expected["year"].tolist() == list(range(1, 21))
+    for kolom, waarden in verschillen.items():
+        np.testing.assert_allclose(waarden[0], expected[f"Verschil_{kolom}"], atol=1e-6)
+
+
+def _batch(gegroepeerd, maanden):
+    batch = {kolom: reeks[:, :maanden] for kolom, reeks in gegroepeerd.items() if kolom != "maanden"}
+    batch["month"] = np.arange(1, maanden + 1)
+    batch["year"] = (batch["month"] - 1) // 12 + 1
+    return batch
@@ -0,0 +1,40 @@
+from api.main import ComparisonRequest, compare_loans_result
+from api.contribution_optimizer import OwnContributionRequest, optimize_own_contribution_result
+
+LOAN = {"loanType": "annuity", "principal": 300000, "interestRate": 3.5, "termYears": 25,
+        "ownContribution": 50000, "purchasePrice": 350000}
+INVESTMENT = {"startCapital": 150000, "annualGrowthRate": 6}
+
+
+def test_optimum_respects_debt_ratio_and_matches_comparison():
+    result = optimize_own_contribution_result(OwnContributionRequest(
+        loan=LOAN,
+        products=[{"loanType": "annuity", "termYears": 20, "interestRate": 3.3},
+                  {"loanType": "bullet", "termYears": 20, "interestRate": 3.8}],
+        investmentParams=INVESTMENT,
+        monthlyIncome=4500,
+    ))
+    annuity, bullet = result["bestPerProduct"]
+    # Investing beats paying down at 6%, so the contribution stops where the payment hits 43% of income
+    assert annuity["feasible"] and 42.5 < annuity["debtRatio"] <= 43
+    assert result["optimum"] == annuity
+    assert bullet == {"product": "bullet-20", "feasible": False}
+    assert all(point["debtRatio"] <= 43 for point in result["frontier"] if point["feasible"])
+    assert not all(point["feasible"] for point in result["frontier"])
+
+    pairwise = compare_loans_result(ComparisonRequest(
+        referenceLoan=LOAN,
+        alternativeLoan=dict(LOAN, termYears=20, interestRate=3.3, principal=annuity["principal"],
+                             ownContribution=annuity["ownContribution"]),
+        referenceOwnContribution=50000, alternativeOwnContribution=annuity["ownContribution"],
+        investmentParams=INVESTMENT,
+    ))
+    assert abs(annuity["netWorthEndOfTerm"] - pairwise["comparisonStats"]["netWorthEndOfTerm"]) < 0.05
+
+
+def test_cost_objective_puts_everything_down():
+    result = optimize_own_contribution_result(OwnContributionRequest(loan=LOAN, maxOwnContribution=80000,
+                                                                     includeFrontier=False))
+    assert result["objective"] == "totalLoanCosts"
+    assert result["optimum"]["ownContribution"] == 80000
+    assert "frontier" not in result
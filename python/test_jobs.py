@@ -0,0 +1,68 @@
+import time
+
+from api.main import LoanParameters, LoanType
+from jobs import CANCELLED, COMPLETED, FAILED, QUEUED, JobManager, JobStore
+
+LOAN = LoanParameters(loanType=LoanType.ANNUITY, principal=300000, interestRate=3.5, termYears=25,
+                      ownContribution=50000)
+
+
+def wait_until_finished(manager, job_id, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        record = manager.get(job_id)
+        if record["state"] not in (QUEUED, "running"):
+            return record
+        time.sleep(0.05)
+    raise AssertionError(f"Job {job_id} did not finish")
+
+
+def test_job_runs_in_worker_process_and_persists_result(tmp_path):
+    manager = JobManager(JobStore(str(tmp_path)), workers=1)
+    try:
+        record = manager.submit("calculate-loan", "api.main:calculate_loan_result", [(LOAN, None), (LOAN, None)])
+        queued = manager.submit("calculate-loan", "api.main:calculate_loan_result", [(LOAN, None)])
+        assert manager.cancel(queued["id"])["state"] == CANCELLED
+
+        finished = wait_until_finished(manager, record["id"])
+        assert finished["state"] == COMPLETED
+        assert finished["completed"] == finished["total"] == 2
+        results = manager.result(record["id"])
+        assert len(results) == 2
+        assert results[0]["result"]["statistics"] == results[1]["result"]["statistics"]
+    finally:
+        manager.shutdown()
+
+    # A new manager sees the finished jobs on disk
+    reloaded = JobManager(JobStore(str(tmp_path)))
+    assert reloaded.get(record["id"])["state"] == COMPLETED
+    assert reloaded.get(queued["id"])["state"] == CANCELLED
+
+
+def test_interrupted_jobs_fail_and_old_jobs_are_purged(tmp_path):
+    store = JobStore(str(tmp_path))
+    store.save({"id": "1000-0000000a", "kind": "compare-loans", "state": "running", "total": 3, "completed": 1,
+                "failedItems": 0, "error": None, "createdAt": time.time(), "startedAt": time.time(), "finishedAt": None})
+    store.save({"id": "1000-0000000b", "kind": "compare-loans", "state": COMPLETED, "total": 1, "completed": 1,
+                "failedItems": 0, "error": None, "createdAt": 0, "startedAt": 0, "finishedAt": 1})
+
+    manager = JobManager(store, retention_seconds=3600)
+    interrupted = manager.get("1000-0000000a")
+    assert interrupted["state"] == FAILED and interrupted["error"]
+    assert manager.get("1000-0000000b") is None
+    assert store.ids() == ["1000-0000000a"]
+
+
+def test_expired_jobs_are_purged_while_idle(tmp_path):
+    store = JobStore(str(tmp_path))
+    store.save({"id": "1000-0000000c", "kind": "compare-loans", "state": COMPLETED, "total": 1, "completed": 1,
+                "failedItems": 0, "error": None, "createdAt": time.time(), "startedAt": time.time(),
+                "finishedAt": time.time()})
+    manager = JobManager(store, retention_seconds=0.2, purge_interval=0.05)
+    assert store.ids() == ["1000-0000000c"]
+    # No API call: the purge thread removes the job once it expires
+    deadline = time.monotonic() + 5
+    while store.ids() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert store.ids() == [] and manager.list() == []
+    manager.shutdown()
@@ -0,0 +1,113 @@
+import numpy as np
+import pytest
+from fastapi import HTTPException
+
+from api.main import ComparisonRequest, LoanParameters, calculate_loan_result, compare_loans_result
+from api.compare_many import CompareManyRequest, compare_many_result
+from api.multi_client_loan import MultiClientLoanRequest, calculate_multi_client_loan_result
+from api.scenarios import compare_loans_incremental_result
+from life_insurance import GESPREID, KOOPSOM, maandelijkse_sterftekansen, premie_vector
+
+LOAN = {"id": "loan-1", "loanType": "annuity", "principal": 300000, "interestRate": 3.5, "termYears": 25,
+        "ownContribution": 50000, "purchasePrice": 350000}
+SIMULATIONS = [
+    {"id": "sim-a", "clientId": "a", "client": {"age": 35},
+     "parameters": {"coveragePercentage": 0.6, "paymentType": "DISTRIBUTED", "basedOnRemainingCapital": True}},
+    {"id": "sim-b", "clientId": "b", "client": {"age": 50, "smoker": True},
+     "parameters": {"coveragePercentage": 0.4, "paymentType": "LUMP_SUM", "basedOnRemainingCapital": False}},
+    {"id": "sim-other", "clientId": "a", "client": {"age": 35},
+     "parameters": {"coveragePercentage": 1.0, "loanId": "another-loan"}},
+]
+
+
+def test_premiums_follow_mortality_and_balance():
+    balances = np.linspace(300000, 1000, 240)
+    premiums = premie_vector(balances, 40, dekking=0.5)
+    rates = maandelijkse_sterftekansen("gompertz-makeham", 40, 240)
+    assert np.allclose(premiums / (0.5 * balances * rates), premiums[0] / (0.5 * balances[0] * rates[0]))
+    # Same client, coverage and balance profile: served from the cache
+    assert premie_vector(balances.copy(), 40, dekking=0.5) is premiums
+    assert premie_vector(balances, 55, dekking=0.5).sum() > premiums.sum()
+
+    single = premie_vector(balances, 40, dekking=0.5, betaalwijze=KOOPSOM)
+    assert single[0] > 0 and not single[1:].any()
+    # Survival and discounting make the single premium cheaper than the sum of the monthly ones
+    assert single[0] < premie_vector(balances, 40, dekking=0.5, betaalwijze=GESPREID).sum()
+
+
+def test_calculate_loan_applies_simulations():
+    table = calculate_loan_result(LoanParameters(**LOAN))
+    result = calculate_loan_result(LoanParameters(**LOAN, insuranceSimulations=SIMULATIONS))
+
+    monthly = result["monthlyData"]
+    premiums = np.array([month["insurancePremium"] for month in monthly])
+    insurance = result["insurance"]
+    # The simulation for another loan does not apply
+    assert [row["id"] for row in insurance["simulations"]] == ["sim-a", "sim-b"]
+    assert np.isclose(premiums.sum(), sum(row["totalPremium"] for row in insurance["simulations"]))
+    assert np.isclose(result["statistics"]["totalInsurancePaid"], premiums.sum())
+    assert all(np.isclose(m["totalMonthlyPayment"], m["paymentExcludingInsurance"] + m["insurancePremium"]) for m in monthly)
+    assert result["statistics"]["totalInterestPaid"] == table["statistics"]["totalInterestPaid"]
+
+    selected = calculate_loan_result(LoanParameters(**LOAN, insuranceSimulations=SIMULATIONS,
+                                                    insuranceSimulationIds=["sim-a"]))
+    assert set(selected["insurance"]["perClient"]) == {"a"}
+    with pytest.raises(HTTPException) as error:
+        calculate_loan_result(LoanParameters(**LOAN, insuranceSimulations=SIMULATIONS, insuranceSimulationIds=["nope"]))
+    assert error.value.status_code == 400
+
+
+def test_multi_client_split():
+    request = dict(
+        clientIds=["a", "b", "c"],
+        clientSummary={"totalCurrentCapital": 0, "totalCurrentDebt": 0, "totalMonthlyIncome": 9000,
+                       "netWorth": 0, "clientCount": 3, "individualCount": 3, "companyCount": 0},
+        includeClientSeries=True,
+    )
+    table = calculate_multi_client_loan_result(MultiClientLoanRequest(params=LOAN, **request))
+    result = calculate_multi_client_loan_result(MultiClientLoanRequest(
+        params=dict(LOAN, insuranceSimulations=SIMULATIONS[:2]), **request))
+
+    series = np.array(result["clientSeries"]["insurancePremium"])
+    by_client = result["insurance"]["perClient"]
+    assert np.isclose(series[0].sum(), by_client["a"]) and np.isclose(series[1].sum(), by_client["b"])
+    # Client c has no simulation and keeps the table premium
+    assert np.allclose(series[2], table["clientSeries"]["insurancePremium"][2])
+    assert np.isclose(result["statistics"]["totalInsurancePaid"], series.sum())
+
+
+def test_scenario_graph_matches_compare_loans():
+    smoker = {"id": "sim-smoker", "clientId": "a", "client": {"age": 60, "smoker": True},
+              "parameters": {"coveragePercentage": 1.0}}
+    body = dict(
+        referenceLoan=LOAN,
+        alternativeLoan=dict(LOAN, id="loan-2", loanType="bullet", interestRate=3.8),
+        referenceOwnContribution=50000,
+        alternativeOwnContribution=50000,
+        investmentParams={"startCapital": 100000, "annualGrowthRate": 6},
+        insuranceSimulations=SIMULATIONS[:2] + [smoker],
+        altInsuranceSimulationIds=["sim-smoker"],
+    )
+    direct = compare_loans_result(ComparisonRequest(**body))
+    graph = compare_loans_incremental_result(ComparisonRequest(**body))
+
+    for loan in ("referenceLoan", "alternativeLoan"):
+        assert graph[loan]["statistics"] == direct[loan]["statistics"]
+        assert graph[loan]["insurance"] == direct[loan]["insurance"]
+    assert [row["id"] for row in graph["alternativeLoan"]["insurance"]["simulations"]] == ["sim-smoker"]
+    assert graph["comparisonStats"] == direct["comparisonStats"]
+    # The table premium would have been far lower than the smoker's
+    table = compare_loans_incremental_result(ComparisonRequest(**dict(body, insuranceSimulations=None,
+                                                                       altInsuranceSimulationIds=None)))
+    assert (graph["alternativeLoan"]["statistics"]["totalInsurancePaid"]
+            > table["alternativeLoan"]["statistics"]["totalInsurancePaid"])
+
+
+def test_batch_endpoints_reject_simulations():
+    with pytest.raises(HTTPException) as error:
+        compare_many_result(CompareManyRequest(
+            referenceLoan=dict(LOAN, insuranceSimulations=SIMULATIONS[:1]),
+            referenceOwnContribution=50000,
+            alternatives=[{"loan": LOAN}],
+        ))
+    assert error.value.status_code == 400 and "insuranceSimulations" in error.value.detail
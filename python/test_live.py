@@ -0,0 +1,79 @@
+import threading
+import time
+
+from fastapi.testclient import TestClient
+
+from api.main import app
+from api.live import LiveSession
+from cancellation import ComputationCancelled, checkpoint
+
+client = TestClient(app)
+
+LOAN_REQUEST = {"params": {"loanType": "annuity", "principal": 500000, "interestRate": 3.5, "termYears": 25,
+                           "ownContribution": 100000, "purchasePrice": 600000}}
+
+
+def test_live_session_pushes_only_changed_statistics():
+    """A burst of patches yields one result for the latest version with only the changed statistics"""
+    with client.websocket_connect("/api/live") as websocket:
+        websocket.send_json({"type": "init", "mode": "loan", "request": LOAN_REQUEST, "series": {"maxPoints": 5}})
+        first = websocket.receive_json()
+        assert first["type"] == "result" and first["version"] == 0
+        assert len(first["series"]["monthlyData"]["month"]) == 5
+
+        for rate in (3.6, 3.7, 3.8):
+            websocket.send_json({"type": "patch", "patch": {"params": {"interestRate": rate}}})
+        update = websocket.receive_json()
+        while update["version"] < 3:
+            update = websocket.receive_json()
+        changed = update["statistics"]["statistics"]
+        assert "totalInterestPaid" in changed
+        # Principal and insurance do not depend on the interest rate
+        assert "totalPrincipalPaid" not in changed and "totalInsurancePaid" not in changed
+        assert "reference_premiums" not in update["recomputed"]
+        websocket.send_json({"type": "close"})
+
+
+def test_patch_cancels_running_calculation(monkeypatch):
+    calculate = LiveSession.calculate
+    started, cancelled = threading.Event(), threading.Event()
+
+    def slow_first_calculation(self, request):
+        if self.version == 0:
+            started.set()
+            try:
+                deadline = time.monotonic() + 5
+                while time.monotonic() < deadline:
+                    checkpoint()
+                    time.sleep(0.01)
+            except ComputationCancelled:
+                cancelled.set()
+                raise
+        return calculate(self, request)
+
+    monkeypatch.setattr(LiveSession, "calculate", slow_first_calculation)
+    with client.websocket_connect("/api/live") as websocket:
+        websocket.send_json({"type": "init", "mode": "loan", "request": LOAN_REQUEST})
+        assert started.wait(5)
+        websocket.send_json({"type": "patch", "patch": {"params": {"interestRate": 3.6}}})
+        assert websocket.receive_json()["version"] == 1
+        assert cancelled.wait(5)
+
+        # A re-init continues the version sequence, so its results cannot be mistaken for older ones
+        websocket.send_json({"type": "init", "mode": "loan", "request": LOAN_REQUEST})
+        assert websocket.receive_json()["version"] == 2
+        websocket.send_json({"type": "close"})
+
+
+def test_invalid_messages_get_an_error():
+    with client.websocket_connect("/api/live") as websocket:
+        websocket.send_text("{not json")
+        error = websocket.receive_json()
+        assert error["type"] == "error" and "Invalid JSON" in error["detail"]
+        websocket.send_text("[1, 2]")
+        assert websocket.receive_json()["type"] == "error"
+
+        # The session keeps working after a bad frame
+        websocket.send_json({"type": "init", "mode": "loan", "request": LOAN_REQUEST})
+        assert websocket.receive_json()["type"] == "result"
+        websocket.send_json({"type": "close"})
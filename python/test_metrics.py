@@ -0,0 +1,53 @@
+from fastapi.testclient import TestClient
+
+from api.main import app
+from metrics import Counter, Histogram, Registry
+
+client = TestClient(app)
+
+
+def test_histogram_renders_cumulative_buckets():
+    """Histogram buckets are cumulative and end with +Inf, _sum and _count"""
+    registry = Registry()
+    histogram = Histogram("test_latency_seconds", "Test histogram.", ["route"], buckets=(0.1, 1.0), registry=registry)
+    histogram.observe(0.05, route="/a")
+    histogram.observe(0.5, route="/a")
+    histogram.observe(5.0, route="/a")
+
+    text = registry.render()
+    assert 'test_latency_seconds_bucket{route="/a",le="0.1"} 1' in text
+    assert 'test_latency_seconds_bucket{route="/a",le="1.0"} 2' in text
+    assert 'test_latency_seconds_bucket{route="/a",le="+Inf"} 3' in text
+    assert 'test_latency_seconds_count{route="/a"} 3' in text
+
+
+def test_counter_rejects_unknown_labels():
+    """Label names are fixed when the metric is declared"""
+    counter = Counter("test_total", "Test counter.", ["kind"], registry=Registry())
+    try:
+        counter.inc(other="x")
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("Expected ValueError for unknown label")
+
+
+def test_metrics_endpoint_reports_route_and_loan_type():
+    """/metrics exposes per-route latency and loan-type distribution in Prometheus format"""
+    payload = {
+        "loanType": "annuity",
+        "principal": 500000,
+        "interestRate": 3.5,
+        "termYears": 25,
+        "ownContribution": 100000,
+    }
+    response = client.post("/api/calculate-loan", json={"params": payload})
+    assert response.status_code == 200
+
+    metrics = client.get("/metrics")
+    assert metrics.status_code == 200
+    assert metrics.headers["content-type"].startswith("text/plain; version=0.0.4")
+    text = metrics.text
+    assert 'loanlogic_http_request_duration_seconds_count{method="POST",route="/api/calculate-loan",status="200"}' in text
+    assert 'loanlogic_loans_calculated_total{loan_type="annuity"}' in text
+    assert "process_resident_memory_bytes" in text
@@ -0,0 +1,52 @@
+import numpy as np
+from fastapi.testclient import TestClient
+
+from api.main import app
+
+client = TestClient(app)
+
+LOAN = {"loanType": "annuity", "principal": 300000, "interestRate": 3.5, "termYears": 25,
+        "ownContribution": 50000, "purchasePrice": 350000, "insuranceCoveragePct": 1.0}
+BODY = {
+    "params": LOAN,
+    "clientIds": ["a", "b"],
+    "clientSummary": {"totalCurrentCapital": 0, "totalCurrentDebt": 0, "totalMonthlyIncome": 9000,
+                      "netWorth": 0, "clientCount": 2, "individualCount": 2, "companyCount": 0},
+    "includeClientSeries": True,
+}
+
+
+def post(**changes):
+    response = client.post("/api/calculate-multi-client-loan", json=dict(BODY, **changes))
+    return response.status_code, response.json()
+
+
+def test_per_client_splits_match_scalar_result():
+    _, scalar = post()
+    # Equal incomes without coverage or shares reproduce the summary-only request
+    _, even = post(clients=[{"clientId": "a", "monthlyIncome": 4500}, {"clientId": "b", "monthlyIncome": 4500}])
+    assert even["monthlyData"] == scalar["monthlyData"]
+    assert even["statistics"] == scalar["statistics"]
+
+    _, split = post(clients=[
+        {"clientId": "a", "monthlyIncome": 6000, "insuranceCoveragePct": 0.6, "paymentSharePct": 70},
+        {"clientId": "b", "monthlyIncome": 3000, "insuranceCoveragePct": 0.4, "paymentSharePct": 30},
+    ])
+    payment = np.array([month["paymentExcludingInsurance"] for month in scalar["monthlyData"]])
+    # Every client of the scalar request is insured at 100%, so each row is the premium per unit of coverage
+    premium = np.array(scalar["clientSeries"]["insurancePremium"][0])
+    assert np.allclose(scalar["clientSeries"]["paymentShare"], [0.5 * payment, 0.5 * payment])
+
+    series = split["clientSeries"]
+    assert np.allclose(series["paymentShare"], [0.7 * payment, 0.3 * payment])
+    assert np.allclose(series["insurancePremium"], [0.6 * premium, 0.4 * premium])
+    total = np.array(series["totalPayment"])
+    assert np.allclose(series["debtRatio"], total / np.array([[6000], [3000]]) * 100)
+    assert np.allclose([m["totalMonthlyPayment"] for m in split["monthlyData"]], payment + premium)
+
+
+def test_payment_shares_must_be_complete():
+    status, body = post(clients=[{"clientId": "a", "paymentSharePct": 70}, {"clientId": "b"}])
+    assert status == 400 and "every client" in body["detail"]
+    status, body = post(clients=[{"clientId": "a", "paymentSharePct": 60}, {"clientId": "b", "paymentSharePct": 30}])
+    assert status == 400 and "add up to 100" in body["detail"]
@@ -0,0 +1,73 @@
+import numpy as np
+
+import api.main  # noqa: F401  (loads the routers before api.compare_many)
+from api.compare_many import CompareManyRequest, compare_many_result
+from compare_many import investeringspaden
+from portfolio import simuleer_portefeuille
+
+REFERENCE = {"loanType": "annuity", "principal": 300000, "interestRate": 3.5, "termYears": 25,
+             "ownContribution": 50000, "purchasePrice": 350000}
+INVESTMENT = {"startCapital": 100000, "annualGrowthRate": 6}
+
+
+def test_single_asset_portfolio_matches_compare_many():
+    alternatives = [
+        dict(REFERENCE, loanType="bullet", interestRate=3.0, termYears=20),
+        dict(REFERENCE, interestRate=3.2, termYears=30),
+    ]
+    request = dict(
+        referenceLoan=REFERENCE,
+        referenceOwnContribution=50000,
+        alternatives=[{"id": f"alt{i}", "loan": loan} for i, loan in enumerate(alternatives)],
+        investmentParams=INVESTMENT,
+        includeDetail=True,
+    )
+    plain = compare_many_result(CompareManyRequest(**request))
+    portfolio = compare_many_result(CompareManyRequest(
+        **request, portfolio={"assets": [{"name": "equities", "annualReturn": 6, "weight": 1}]},
+    ))
+
+    for row, portfolio_row in zip(plain["ranking"], portfolio["ranking"]):
+        assert abs(row["netWorthEndOfTerm"] - portfolio_row["netWorthEndOfTerm"]) < 0.01
+        assert portfolio_row["assetBalancesEndOfTerm"]["equities"] is not None
+    for detail, portfolio_detail in zip(plain["alternatives"], portfolio["alternatives"]):
+        assert np.allclose(detail["monthlyData"]["investmentBalance"],
+                           portfolio_detail["monthlyData"]["investmentBalance"], atol=0.01)
+
+
+def test_rebalancing_costs_and_withdrawal_order():
+    rng = np.random.default_rng(1)
+    contributions = np.abs(rng.normal(300, 100, (4, 120)))
+    returns = [0.005, 0.002]
+
+    # Without withdrawals or rebalancing every asset grows on its own, as a single-asset path
+    paths = simuleer_portefeuille(np.full(4, 10000.0), contributions, returns, [0.75, 0.25], herbalanceer_maanden=0)
+    for a, weight in enumerate([0.75, 0.25]):
+        expected = investeringspaden(np.full(4, 10000.0 * weight), contributions * weight, returns[a])
+        assert np.allclose(paths["posities"][:, a, :], expected)
+
+    # Rebalancing restores the target weights; costs lower the balance
+    rebalanced = simuleer_portefeuille(10000.0, contributions[:1], returns, [0.75, 0.25], herbalanceer_maanden=12)
+    assert np.allclose(rebalanced["posities"][0, :, 11] / rebalanced["saldo"][0, 11], [0.75, 0.25])
+    costly = simuleer_portefeuille(10000.0, contributions[:1], returns, [0.75, 0.25], kosten=[0.01, 0.0],
+                                   herbalanceer_maanden=12)
+    assert costly["saldo"][0, -1] < rebalanced["saldo"][0, -1]
+
+    # Withdrawals sell the second asset first and record what the holdings cannot cover
+    withdrawals = np.full((1, 3), -4000.0)
+    sold = simuleer_portefeuille(10000.0, withdrawals, [0.0, 0.0], [0.5, 0.5], herbalanceer_maanden=0,
+                                 opname_volgorde=[1, 0])
+    assert np.allclose(sold["posities"][0, :, 0], [5000, 1000])
+    assert np.allclose(sold["posities"][0, :, 1], [2000, 0])
+    assert np.allclose(sold["saldo"][0, 2], 0) and np.allclose(sold["tekort"][0], [0, 0, 2000])
+
+
+def test_return_series_of_another_length():
+    contributions = np.full((2, 24), 500.0)
+    for months in (12, 36):
+        returns = np.linspace(0.002, 0.01, 2 * months).reshape(2, months)
+        closed_form = simuleer_portefeuille(1000.0, contributions, returns, [0.6, 0.4], herbalanceer_maanden=0)
+        # A rebalancing period past the horizon takes the month loop without ever rebalancing
+        loop = simuleer_portefeuille(1000.0, contributions, returns, [0.6, 0.4], herbalanceer_maanden=100)
+        assert closed_form["posities"].shape == (2, 2, 24)
+        np.testing.assert_allclose(closed_form["posities"], loop["posities"])
@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+
+from batch_engine import simuleer_leningen_batch
+from calculation_functions import simuleer_met_investering
+from prepayment import (
+    HERBEREKENING,
+    LOOPTIJD,
+    extra_betalingen_raster,
+    simuleer_vervroegde_aflossingen,
+    vergelijk_met_beleggen,
+)
+
+
+def test_without_extra_payments_matches_batch_engine():
+    for loan_type, schema, aflossingsmaand in (("annuity", None, 240), ("bullet", None, 240),
+                                               ("modular", [(60, 50000), (180, 150000)], 180)):
+        result = simuleer_vervroegde_aflossingen(200000, 0.035, 20, np.zeros((1, 240)),
+                                                 loan_type=loan_type, aflossings_schema=schema)
+        batch = simuleer_leningen_batch(200000, 0.035, 20, loan_type=loan_type, aflossings_schema=schema)
+        for kolom in ("interest", "principalPayment", "paymentExcludingInsurance", "remainingPrincipal"):
+            np.testing.assert_allclose(result[kolom], batch[kolom], atol=1e-6)
+        assert result["aflossingsmaand"][0] == aflossingsmaand and result["penalty"].sum() == 0
+    # The modular loan is repaid in month 180: no insurance premium after that
+    assert result["insurancePremium"][0, 180:].sum() == 0 and result["insurancePremium"][0, 179] > 0
+
+
+def test_term_reduction_and_recast():
+    extra, combinaties = extra_betalingen_raster(240, maanden=[12, 60], bedragen=[20000, 50000])
+    assert extra.shape == (4, 240) and combinaties[1] == (12, 50000.0)
+    opties = dict(boete_maanden=3, boetevrij_pct_per_jaar=0.10)
+    korter = simuleer_vervroegde_aflossingen(200000, 0.036, 20, extra, modus=LOOPTIJD, **opties)
+    lager = simuleer_vervroegde_aflossingen(200000, 0.036, 20, extra, modus=HERBEREKENING, **opties)
+
+    # Term reduction keeps the payment and ends early; recast keeps the term and lowers the payment
+    assert (korter["aflossingsmaand"] < 240).all() and (lager["aflossingsmaand"] == 240).all()
+    np.testing.assert_allclose(korter["paymentExcludingInsurance"][1, 12], korter["paymentExcludingInsurance"][1, 0])
+    assert lager["paymentExcludingInsurance"][1, 12] < lager["paymentExcludingInsurance"][1, 0]
+    assert korter["interest"].sum(axis=1)[1] < lager["interest"].sum(axis=1)[1]
+    # 10% of the principal is free; the remaining 30000 costs 3 months of interest
+    assert korter["penalty"][0].sum() == 0
+    np.testing.assert_allclose(korter["penalty"][1].sum(), 30000 * 0.003 * 3)
+
+
+def test_investing_the_same_cash_matches_simuleer_met_investering():
+    extra, _ = extra_betalingen_raster(240, maanden=[24], bedragen=[30000])
+    basis = simuleer_vervroegde_aflossingen(200000, 0.03, 20, np.zeros((1, 240)))
+    strategie = simuleer_vervroegde_aflossingen(200000, 0.03, 20, extra)
+    maandgroei = 1.07 ** (1 / 12) - 1
+    vergelijking = vergelijk_met_beleggen(basis, strategie, maandgroei)
+
+    def frame(resultaat):
+        return pd.DataFrame({"month": np.arange(1, 241), "totalMonthlyPayment": resultaat["totalOutflow"][0],
+                             "remainingPrincipal": resultaat["remainingPrincipal"][0]})
+
+    # The investor pays the base schedule and invests the difference with the prepaying borrower
+    combined, _, _, _ = simuleer_met_investering(frame(strategie), frame(basis), 0, 0, start_kapitaal_totaal=0,
+                                                 maandelijkse_groei_investering=maandgroei)
+    np.testing.assert_allclose(vergelijking["investering"][0], combined["investmentBalance"], atol=1e-6)
+    # Investing at 7% beats prepaying a 3% loan
+    assert vergelijking["vermogenseffect"][0] < 0 and 0.03 < vergelijking["break_even_groei"][0] < 0.07
@@ -0,0 +1,120 @@
+import cProfile
+import os
+import pstats
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import api.main
+from api import debug
+from config import settings, CpuProfiler, MemoryProfilingMode, Settings
+from profiling import CpuProfileStore, pstats_to_collapsed, pyinstrument_to_collapsed
+
+LOAN = {"loanType": "annuity", "principal": 300000, "interestRate": 3.5, "termYears": 25,
+        "ownContribution": 50000, "purchasePrice": 350000}
+
+
+@pytest.fixture
+def profiled_client(monkeypatch, tmp_path):
+    """The calculate-loan endpoint behind the CPU profiling middleware, profiling every request."""
+    monkeypatch.setattr(settings, "cpu_profiler", CpuProfiler.CPROFILE)
+    monkeypatch.setattr(settings, "cpu_profile_sample_rate", 1.0)
+    store = CpuProfileStore(str(tmp_path), max_files=2)
+    monkeypatch.setattr(debug, "cpu_profile_store", store)
+    app = FastAPI()
+    app.middleware("http")(debug.cpu_profile_middleware)
+    app.post("/api/calculate-loan")(api.main.calculate_loan)
+    app.include_router(debug.router, prefix="/debug")
+    return TestClient(app), store
+
+
+def test_cpu_profile_includes_calculation_thread(profiled_client):
+    client, store = profiled_client
+    response = client.post("/api/calculate-loan", json={"params": LOAN})
+    profile_id = response.headers["X-Cpu-Profile-Id"]
+
+    # The engine runs in the calculation pool, not on the event loop
+    assert "simuleer_klassieke_lening" in store.collapsed(profile_id)
+    assert "simuleer_klassieke_lening" in store.text(profile_id)
+    assert store.metadata(profile_id)["path"] == "/api/calculate-loan"
+
+
+def test_memory_profiling_is_opt_in(monkeypatch):
+    defaults = Settings()
+    assert not defaults.debug_endpoints and defaults.memory_profiling == MemoryProfilingMode.OFF
+    assert not any(route.path.startswith("/debug") for route in api.main.app.routes)
+    # Off adds no middleware layer to every request
+    installed = [middleware.kwargs.get("dispatch") for middleware in api.main.app.user_middleware]
+    assert debug.memory_profile_middleware not in installed and debug.cpu_profile_middleware not in installed
+
+    monkeypatch.setattr(settings, "memory_profiling", MemoryProfilingMode.HEADER)
+    app = FastAPI()
+    app.middleware("http")(debug.memory_profile_middleware)
+    app.post("/api/calculate-loan")(api.main.calculate_loan)
+    app.include_router(debug.router, prefix="/debug")
+    client = TestClient(app)
+    assert "X-Memory-Profile-Id" not in client.post("/api/calculate-loan", json={"params": LOAN}).headers
+
+    response = client.post("/api/calculate-loan", json={"params": LOAN}, headers={"X-Memory-Profile": "1"})
+    profile_id = response.headers["X-Memory-Profile-Id"]
+    report = client.get(f"/debug/memory-profiles/{profile_id}").json()
+    # Stages are recorded in the calculation thread, in the order they ran
+    stages = [entry["stage"] for entry in report["stages"]]
+    assert stages[:2] == ["amortization", "annual_aggregation"] and "serialization" in stages
+    assert all(entry["peakBytes"] >= 0 and "topAllocations" in entry for entry in report["stages"])
+    assert report["peakBytes"] == int(response.headers["X-Memory-Peak-Bytes"]) > 0
+    listed = client.get("/debug/memory-profiles").json()[0]
+    assert listed["id"] == profile_id and "topAllocations" not in listed["stages"][0]
+
+
+def test_cpu_profile_middleware_keeps_only_slow_requests(profiled_client, monkeypatch):
+    client, store = profiled_client
+    monkeypatch.setattr(settings, "cpu_profile_sample_rate", 0.0)
+    monkeypatch.setattr(settings, "cpu_profile_slow_ms", 60_000)
+    assert "X-Cpu-Profile-Id" not in client.post("/api/calculate-loan", json={"params": LOAN}).headers
+    assert store.list() == []
+
+    monkeypatch.setattr(settings, "cpu_profile_slow_ms", 0.001)
+    profile_id = client.post("/api/calculate-loan", json={"params": LOAN}).headers["X-Cpu-Profile-Id"]
+    assert store.metadata(profile_id)["reason"] == "slow"
+    # Profiling the profile downloads would rotate the profiles away
+    assert "X-Cpu-Profile-Id" not in client.get("/debug/cpu-profiles").headers
+
+
+def test_cpu_profile_store_rotates(tmp_path):
+    store = CpuProfileStore(str(tmp_path), max_files=2)
+    profiler = cProfile.Profile()
+    profiler.runcall(sum, range(10))
+    ids = [store.save_cprofile(profiler, {"path": f"/api/{i}"}) for i in range(3)]
+    ids.append(store.save_collapsed("main;work 10\n", {"path": "/api/3"}, "pyinstrument"))
+
+    assert [meta["id"] for meta in store.list()] == sorted(ids[2:], reverse=True)
+    assert sorted(os.listdir(tmp_path)) == sorted([f"{ids[2]}.json", f"{ids[2]}.prof",
+                                                   f"{ids[3]}.json", f"{ids[3]}.collapsed"])
+    assert store.collapsed(ids[3]) == "main;work 10\n" and store.text(ids[3]) is None
+
+
+def outer():
+    return sum(inner() for _ in range(200))
+
+
+def inner():
+    return sum(range(500))
+
+
+def test_collapsed_stacks():
+    profiler = cProfile.Profile()
+    profiler.runcall(outer)
+    stacks = dict(line.rsplit(" ", 1) for line in pstats_to_collapsed(pstats.Stats(profiler)).splitlines())
+    nested = [stack for stack in stacks if stack.split(";")[-1].startswith("inner_(")]
+    assert nested and all(any(frame.startswith("outer_(") for frame in stack.split(";")[:-1]) for stack in nested)
+    assert all(int(weight) >= 1 and " " not in stack for stack, weight in stacks.items())
+
+    # pyinstrument frames: self time is the frame's time minus its children's
+    leaf = SimpleNamespace(function="inner", file_path="/x/engine.py", line_no=3, time=0.25, children=[])
+    root = SimpleNamespace(function="outer", file_path="/x/engine.py", line_no=1, time=1.0, children=[leaf])
+    session = SimpleNamespace(root_frame=lambda: root)
+    assert pyinstrument_to_collapsed(session) == (
+        "outer_(engine.py:1) 750000\nouter_(engine.py:1);inner_(engine.py:3) 250000\n")
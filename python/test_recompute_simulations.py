@@ -0,0 +1,34 @@
+import json
+
+from recompute_simulations import main
+
+
+def test_recompute_loans_and_investments(tmp_path):
+    loan = {"name": "x", "principal": 300000, "interestRate": 3.5, "termYears": 20, "ownContribution": 50000,
+            "purchasePrice": 350000, "startYear": 2025, "delayMonths": 0, "calculationResult": "{}"}
+    with open(tmp_path / "loans.jsonl", "w") as f:
+        f.write(json.dumps(dict(loan, id="ref", loanType="annuity")) + "\n")
+        f.write(json.dumps(dict(loan, id="alt", loanType="modular")) + "\n")
+    # Schedule items as a CSV export, deliberately out of month order
+    (tmp_path / "items.csv").write_text("id,month,amount,loanSimulationId\nb,240,200000,alt\na,120,100000,alt\n")
+    with open(tmp_path / "investments.jsonl", "w") as f:
+        f.write(json.dumps({"id": "inv", "startCapital": 100000, "annualGrowthRate": 5, "refInvestCapital": 50000,
+                            "altInvestCapital": 50000, "referenceLoanId": "ref", "alternativeLoanId": "alt"}) + "\n")
+        f.write(json.dumps({"id": "orphan", "referenceLoanId": "ref", "alternativeLoanId": "missing"}) + "\n")
+
+    output = tmp_path / "out.jsonl"
+    status = main(["--loans", str(tmp_path / "loans.jsonl"), "--schedule-items", str(tmp_path / "items.csv"),
+                   "--investments", str(tmp_path / "investments.jsonl"), "--output", str(output),
+                   "--workers", "1", "--chunk-size", "1"])
+
+    rows = {row["id"]: row for row in map(json.loads, output.read_text().splitlines())}
+    assert status == 1  # the orphaned investment
+    assert set(rows) == {"ref", "alt", "inv", "orphan"}
+    assert rows["orphan"]["error"]
+    for loan_id in ("ref", "alt"):
+        result = json.loads(rows[loan_id]["calculationResult"])
+        assert rows[loan_id]["error"] is None
+        assert rows[loan_id]["totalInterest"] == result["statistics"]["totalInterestPaid"]
+    # The modular schedule repays the whole principal
+    assert json.loads(rows["alt"]["calculationResult"])["statistics"]["totalPrincipalPaid"] == 300000
+    assert rows["inv"]["minimumRequiredGrowthRate"] is not None
@@ -0,0 +1,46 @@
+import copy
+
+from fastapi.testclient import TestClient
+
+from api.main import app
+
+client = TestClient(app)
+
+BODY = {
+    "referenceLoan": {"loanType": "annuity", "principal": 600000, "interestRate": 3.1, "termYears": 20,
+                      "ownContribution": 90000, "purchasePrice": 690000},
+    "alternativeLoan": {"loanType": "bullet", "principal": 600000, "interestRate": 3.4, "termYears": 20,
+                        "ownContribution": 90000, "purchasePrice": 690000},
+    "referenceOwnContribution": 90000,
+    "alternativeOwnContribution": 90000,
+    "investmentParams": {"startCapital": 150000, "annualGrowthRate": 5},
+}
+
+
+def incremental(body):
+    """Response of the scenario graph, checked against /api/compare-loans for the same body"""
+    result = client.post("/api/scenarios/compare-loans", json=body).json()
+    graph = result.pop("graph")
+    assert result == client.post("/api/compare-loans", json=body).json()
+    return graph
+
+
+def test_changing_growth_rate_reuses_loan_schedules():
+    """Only the investment chain is recomputed when the growth rate changes"""
+    assert "reference_amortization" in incremental(BODY)["recomputed"]
+
+    body = copy.deepcopy(BODY)
+    body["investmentParams"]["annualGrowthRate"] = 5.5
+    graph = incremental(body)
+    assert set(graph["recomputed"]) == {"investment_path", "investment_result", "min_growth", "statistics"}
+
+
+def test_changing_coverage_recomputes_from_premiums():
+    """A new insurance coverage keeps the amortization and recomputes its premiums onward"""
+    incremental(BODY)
+    body = copy.deepcopy(BODY)
+    body["referenceLoan"]["insuranceCoveragePct"] = 0.6
+    graph = incremental(body)
+    assert "reference_amortization" in graph["reused"]
+    assert "alternative_totals" in graph["reused"]
+    assert {"reference_premiums", "reference_totals", "investment_path"} <= set(graph["recomputed"])
@@ -0,0 +1,59 @@
+import numpy as np
+
+from api.main import ComparisonRequest, compare_loans_result
+from api.sensitivity import SensitivityRequest, sensitivity_result
+from batch_engine import simuleer_leningen_batch
+from sensitivity import EIGEN_INBRENG, RENTE, bereken_gevoeligheden
+
+REFERENCE = {"loanType": "annuity", "principal": 300000, "interestRate": 3.5, "termYears": 25,
+             "ownContribution": 50000, "purchasePrice": 350000}
+INVESTMENT = {"startCapital": 100000, "annualGrowthRate": 6}
+
+
+def test_analytic_derivatives_match_central_differences():
+    loan = {"hoofdsom": 250000.0, "jaarlijkse_rentevoet": 0.03, "looptijd_jaren": 20, "loan_type": "annuity",
+            "aflossings_schema": None, "uitstel_maanden": 12, "start_jaar_kalender": 2025,
+            "schuldsaldo_dekking_pct": 1.0}
+    bullet = dict(loan, loan_type="bullet", aflossings_schema=[(240, 250000.0)], uitstel_maanden=0)
+    for variant in (loan, bullet):
+        result = bereken_gevoeligheden(variant, {RENTE: 1e-3, EIGEN_INBRENG: 1000.0})
+        assert result["methode"][RENTE]["totalInterestPaid"] == "analytisch"
+        assert result["methode"][RENTE]["medianMonthlyPayment"] == "centrale_differentie"
+
+        def interest(principal, rate):
+            batch = simuleer_leningen_batch(principal, rate, 20, variant["loan_type"], None, variant["uitstel_maanden"])
+            return batch["cumulativeInterestPaid"][0, -1]
+
+        h = 1e-6
+        by_rate = (interest(250000.0, 0.03 + h) - interest(250000.0, 0.03 - h)) / (2 * h)
+        by_contribution = (interest(250000.0 - 1, 0.03) - interest(250000.0 + 1, 0.03)) / 2
+        np.testing.assert_allclose(result["eerste_orde"][RENTE]["totalInterestPaid"], by_rate, rtol=1e-5)
+        np.testing.assert_allclose(result["eerste_orde"][EIGEN_INBRENG]["totalInterestPaid"], by_contribution, rtol=1e-5)
+
+
+def test_sensitivity_endpoint_matches_bumped_comparisons():
+    loan = dict(REFERENCE, loanType="bullet", interestRate=3.0, termYears=20)
+    result = sensitivity_result(SensitivityRequest(
+        loan=loan, referenceLoan=REFERENCE, investmentParams=INVESTMENT, secondOrder=True,
+    ))
+    assert result["scenarioCount"] == 7
+
+    def compare(**changes):
+        return compare_loans_result(ComparisonRequest(
+            referenceLoan=dict(REFERENCE, interestRate=REFERENCE["interestRate"] + changes.get("rate", 0)),
+            alternativeLoan=dict(loan, interestRate=loan["interestRate"] + changes.get("rate", 0)),
+            referenceOwnContribution=50000, alternativeOwnContribution=50000,
+            investmentParams=dict(INVESTMENT, annualGrowthRate=6 + changes.get("growth", 0)),
+        ))["comparisonStats"]
+
+    base = compare()
+    assert abs(result["base"]["netWorthEndOfTerm"] - base["netWorthEndOfTerm"]) < 0.05
+    assert abs(result["base"]["totalCostDifference"] - base["totalCostDifference"]) < 0.05
+    for name, change in (("interestRate", {"rate": 0.1}), ("growthRate", {"growth": 0.1})):
+        up, down = compare(**change), compare(**{k: -v for k, v in change.items()})
+        expected = (up["netWorthEndOfTerm"] - down["netWorthEndOfTerm"]) / 2
+        assert abs(result["sensitivities"][name]["netWorthEndOfTerm"]["perBump"] - expected) < 0.05
+    # Growth compounds: net worth is convex in the growth rate
+    assert result["sensitivities"]["growthRate"]["netWorthEndOfTerm"]["secondOrder"] > 0
+    assert result["sensitivities"]["interestRate"]["totalCostDifference"]["method"] == "analytic"
+    assert result["sensitivities"]["ownContribution"]["totalInterestPaid"]["perUnit"] < 0
@@ -0,0 +1,35 @@
+import os
+
+from fastapi.testclient import TestClient
+
+import api.main
+from benchmarks.startup import OWN_IMPORT_BUDGET_MS, measure_dependencies, measure_import, measure_warmup
+from config import settings
+
+OWN_BUDGET_MS = float(os.environ.get("LOANLOGIC_TEST_OWN_IMPORT_BUDGET_MS", OWN_IMPORT_BUDGET_MS))
+
+
+def test_api_import_keeps_heavy_modules_lazy():
+    runs = [measure_import("api.main") for _ in range(2)]
+    assert all(run["lazy_modules_loaded"] == [] for run in runs)
+    # Relative to fastapi + pandas in the same run, so a slow machine slows both sides
+    own_ms = min(run["import_ms"] for run in runs) - min(measure_dependencies() for _ in range(2))
+    assert own_ms <= OWN_BUDGET_MS, f"api.main adds {own_ms:.0f} ms to its dependencies, budget {OWN_BUDGET_MS:.0f} ms"
+
+
+def test_startup_runs_warm_up(monkeypatch):
+    calls = []
+    monkeypatch.setattr(api.main, "warm_up", lambda solve: calls.append(solve) or {"annuity": 0.0})
+    with TestClient(api.main.app):
+        pass
+    assert calls == [False]
+
+    monkeypatch.setattr(settings, "warmup_on_startup", False)
+    with TestClient(api.main.app):
+        pass
+    assert calls == [False]
+
+
+def test_warm_up_leaves_scipy_lazy():
+    steps, lazy_modules = measure_warmup()
+    assert lazy_modules == [] and "min_growth_solve" not in steps
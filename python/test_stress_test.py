@@ -0,0 +1,76 @@
+import json
+
+import numpy as np
+
+from stress_test import chunk_schedules, main, stress_cases
+from variable_rate import reset_maanden, simuleer_variabele_leningen
+
+
+def _loan(**fields):
+    loan = {"id": "x", "caseId": "c", "principal": 250000, "purchasePrice": 250000, "ownContribution": 0,
+            "interestRate": 3.0, "termYears": 20, "startYear": 2020, "loanType": "annuity"}
+    loan.update(fields)
+    return loan
+
+
+def test_shocks_reprice_variable_loans_only():
+    variable = _loan(id="v", revisionFormula="5/5/5", capUp=2)
+    fixed = _loan(id="f", principal=100000, purchasePrice=100000)
+    case = {"caseId": "c", "monthlyIncome": 5000, "loans": [variable, fixed]}
+    row = stress_cases([case], {"base": [0.0], "+3": [0.03]}, 2024, 120)[0]
+
+    # The 2025 reset moves to 3% + the 2 pp cap; the fixed loan keeps its payment
+    starts = reset_maanden("5/5/5", 20)
+    base = simuleer_variabele_leningen([250000, 100000], [[0.03] * 4, [0.03] * 4], 20, starts,
+                                       start_jaar_kalender=2020)
+    shocked = simuleer_variabele_leningen(250000, [[0.03, 0.05, 0.05, 0.05]], 20, starts, start_jaar_kalender=2020)
+    window = slice(48, 168)
+    expected = shocked["totalMonthlyPayment"][0, window] + base["totalMonthlyPayment"][1, window]
+    assert row["scenarios"]["+3"]["maxPayment"] == round(expected.max(), 2)
+    increase = expected - base["totalMonthlyPayment"][:, window].sum(axis=0)
+    assert row["scenarios"]["+3"]["maxIncrease"] == round(increase.max(), 2)
+    assert row["scenarios"]["base"]["maxIncrease"] == 0.0
+    assert row["variableLoans"] == 1
+
+    # The shock pushes the household over 43% from the first revised month on
+    assert row["scenarios"]["base"]["breach"] is False
+    assert row["scenarios"]["+3"]["newBreach"] is True
+    assert row["scenarios"]["+3"]["firstBreach"] == {"calendarYear": 2025, "calendarMonth": 1}
+    assert np.isclose(row["scenarios"]["+3"]["maxDebtRatio"], expected.max() / 5000 * 100, atol=0.01)
+
+
+def test_stress_test_cli(tmp_path):
+    with open(tmp_path / "loans.jsonl", "w") as f:
+        f.write(json.dumps(_loan(id="a", caseId="c1", revisionFormula="1/1/1")) + "\n")
+        f.write(json.dumps(_loan(id="b", caseId="c2", loanType="bullet", revisionFormula="3/3/3")) + "\n")
+        f.write(json.dumps(_loan(id="bad", caseId="c2", termYears=0)) + "\n")
+    (tmp_path / "incomes.csv").write_text("caseId,monthlyIncome\nc1,2000\nc1,1500\nc2,9000\n")
+    (tmp_path / "paths.json").write_text(json.dumps({"2022": [0, 1.5, 3]}))
+
+    output = tmp_path / "out.jsonl"
+    summary = tmp_path / "summary.json"
+    status = main(["--loans", str(tmp_path / "loans.jsonl"), "--incomes", str(tmp_path / "incomes.csv"),
+                   "--paths", str(tmp_path / "paths.json"), "--as-of", "2024", "--output", str(output),
+                   "--summary", str(summary), "--workers", "1", "--chunk-size", "1"])
+
+    rows = {row["caseId"]: row for row in map(json.loads, output.read_text().splitlines())}
+    totals = json.loads(summary.read_text())
+    assert status == 1  # the invalid loan
+    assert rows["c1"]["monthlyIncome"] == 3500
+    assert rows["c2"]["error"].startswith("bad:")
+    assert list(totals["scenarios"]) == ["base", "+1", "+2", "+3", "2022"]
+    assert totals["cases"] == 2 and totals["loans"] == 3
+    # A bullet only pays interest: +1 pp on 250000 is 208.33 a month after the 2026 reset
+    assert rows["c2"]["scenarios"]["+1"]["maxIncrease"] == 208.33
+    assert totals["scenarios"]["+3"]["maxIncrease"] >= totals["scenarios"]["+1"]["maxIncrease"] > 0
+
+
+def test_workers_get_only_their_schedules():
+    schedules = {"m": [(12, 50000.0), (240, 200000.0)], "other": [(1, 1.0)]}
+    case = {"caseId": "c", "monthlyIncome": 5000, "loans": [_loan(id="m", loanType="modular"), _loan(id="a")]}
+    assert chunk_schedules([case], schedules) == {"m": schedules["m"]}
+    assert chunk_schedules([case], None) is None
+
+    scenarios = {"base": [0.0], "+1": [0.01]}
+    row = stress_cases([case], scenarios, 2024, 120, schedules=chunk_schedules([case], schedules))[0]
+    assert not row["error"] and row == stress_cases([case], scenarios, 2024, 120, schedules=schedules)[0]
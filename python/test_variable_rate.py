@@ -0,0 +1,55 @@
+import numpy as np
+
+from api.main import LoanType
+from api.variable_rate import VariableRateLoanRequest, variable_rate_loan_result
+from batch_engine import simuleer_leningen_batch
+from variable_rate import herzieningsdata, reset_maanden, simuleer_variabele_leningen
+
+
+def test_reset_months_of_revision_formulas():
+    assert reset_maanden("10/5/5", 25).tolist() == [0, 120, 180, 240]
+    assert reset_maanden("1/1/1", 3).tolist() == [0, 12, 24]
+    assert reset_maanden("5", 20).tolist() == [0, 60, 120, 180]
+
+
+def test_segments_match_month_by_month_reset():
+    starten = reset_maanden("5/5/5", 20)
+    renten = [0.03, 0.045, 0.05, 0.02]
+    result = simuleer_variabele_leningen(200000, [renten], 20, starten, uitstel_maanden=6)
+
+    # Reference: re-derive the annuity at every reset and at the end of the deferral
+    saldo, saldi = 200000.0, []
+    for maand in range(240):
+        r = renten[np.searchsorted(starten, maand, side="right") - 1] / 12
+        if maand in starten or maand == 6:
+            betaling = saldo * r / (1 - (1 + r) ** -(240 - max(maand, 6)))
+        saldo -= 0 if maand < 6 else betaling - saldo * r
+        saldi.append(saldo)
+    np.testing.assert_allclose(result["remainingPrincipal"][0, :-1], saldi[:-1], atol=1e-6)
+    assert result["remainingPrincipal"][0, -1] == 0
+
+    # A constant rate path is the fixed-rate loan
+    vast = simuleer_variabele_leningen(200000, [[0.03] * 4], 20, starten, uitstel_maanden=6)
+    batch = simuleer_leningen_batch(200000, 0.03, 20, uitstel_maanden=6)
+    np.testing.assert_allclose(vast["totalMonthlyPayment"], batch["totalMonthlyPayment"], atol=1e-6)
+
+
+def test_caps_and_index_scenarios():
+    starten = reset_maanden("5/5/5", 20)
+    index = [[0.02, 0.02, 0.02, 0.02, 0.02, 0.06], [0.02, 0.02, 0.02, 0.02, 0.02, 0.0]]
+    renten = herzieningsdata(0.03, starten, index, plafond_stijging=0.02, plafond_daling=0.01)
+    np.testing.assert_allclose(renten, [[0.03, 0.05, 0.05, 0.05], [0.03, 0.02, 0.02, 0.02]])
+    # The legal cap: never more than double the initial rate
+    assert herzieningsdata(0.01, starten, index)[0, 1] == 0.02
+
+    result = variable_rate_loan_result(VariableRateLoanRequest(
+        params={"loanType": LoanType.ANNUITY, "principal": 200000, "interestRate": 3, "termYears": 20,
+                "ownContribution": 0, "purchasePrice": 200000},
+        revision={"formula": "5/5/5", "capUp": 2, "capDown": 1},
+        indexPaths=[[2, 2, 2, 2, 2, 6], [2, 2, 2, 2, 2, 0]],
+    ))
+    rising, falling = result["scenarios"]
+    assert rising["segmentRates"] == [3, 5, 5, 5] and falling["segmentRates"] == [3, 2, 2, 2]
+    assert rising["firstMonthlyPayment"] == falling["firstMonthlyPayment"]
+    assert rising["totalInterestPaid"] > falling["totalInterestPaid"]
+    assert result["resetMonths"] == [1, 61, 121, 181] and len(result["annualPaymentBands"]) == 20
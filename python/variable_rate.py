@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+"""
+Variable-rate loans: the interest rate is revised at reset months and the annuity
+is re-derived from the remaining balance and term at every reset.
+
+Between two resets the rate is fixed, so the balance of every segment has the
+closed form of ``batch_engine``; segments are computed as whole (scenarios x
+segment months) blocks and stitched together through their end balance. The cost
+grows with the number of resets, not with the number of months. All scenarios
+(e.g. a set of reference index paths) share the reset months and go through one
+call.
+
+``herzieningsdata`` turns a Belgian revision formula such as ``"10/5/5"`` (10 years
+fixed, then revised after 5 more years, then every 5 years) and index paths into
+per-segment rates, with caps and floors relative to the initial rate.
+"""
+import numpy as np
+
+from batch_engine import premie_schema
+from calculation_functions import START_JAAR_KALENDER
+from cancellation import checkpoint
+
+# The legal maximum: a revised rate is never more than double the initial rate
+MAX_VERMENIGVULDIGING = 2.0
+
+
+def reset_maanden(formule, looptijd_jaren):
+    """
+    Start month (0-based) of every fixed-rate segment for a revision formula ``"a/b/c"``:
+    fixed for ``a`` years, then for ``b`` years, then every ``c`` years. ``"a/b"`` means
+    every ``b`` years after the first ``a``.
+    """
+    try:
+        perioden = [int(deel) for deel in str(formule).split("/")]
+    except ValueError:
+        raise ValueError(f"Ongeldige herzieningsformule '{formule}'; gebruik bv. '10/5/5'.")
+    if not perioden or len(perioden) > 3 or min(perioden) <= 0:
+        raise ValueError(f"Ongeldige herzieningsformule '{formule}'; gebruik bv. '10/5/5'.")
+    starten = [0]
+    jaar = perioden[0]
+    for periode in perioden[1:] + [perioden[-1]] * looptijd_jaren:
+        if jaar >= looptijd_jaren:
+            break
+        starten.append(jaar * 12)
+        jaar += periode
+    return np.array(starten)
+
+
+def herzieningsdata(
+    initiele_rente,
+    segment_starten,
+    index_paden,
+    plafond_stijging=None,
+    plafond_daling=None,
+    max_vermenigvuldiging=MAX_VERMENIGVULDIGING,
+):
+    """
+    (scenarios x segments) matrix of annual rates from reference index paths.
+
+    ``index_paden`` holds per scenario the reference index per loan year (entry 0 at
+    signing; the last value carries forward). At a reset in year ``j`` the rate becomes
+    the initial rate plus the index change since signing, capped at
+    ``plafond_stijging`` above and ``plafond_daling`` below the initial rate, at
+    ``max_vermenigvuldiging`` times the initial rate and at 0. The initial rate and the
+    limits are scalars or one value per scenario.
+    """
+    index_paden = np.atleast_2d(np.asarray(index_paden, dtype=float))
+    jaren = np.asarray(segment_starten) // 12
+    kolommen = np.minimum(jaren, index_paden.shape[1] - 1)
+
+    def per_scenario(waarde):
+        # Scalars or one value per scenario; None and NaN mean no limit
+        waarde = np.asarray(np.nan if waarde is None else waarde, dtype=float)
+        return np.broadcast_to(waarde, (len(index_paden),))[:, None]
+
+    initiele_rente = per_scenario(initiele_rente)
+    rente = initiele_rente + index_paden[:, kolommen] - index_paden[:, :1]
+    bovengrens = np.fmin(initiele_rente * per_scenario(max_vermenigvuldiging),
+                         initiele_rente + per_scenario(plafond_stijging))
+    ondergrens = np.fmax(initiele_rente - per_scenario(plafond_daling), 0.0)
+    rente = np.fmax(np.fmin(rente, bovengrens), ondergrens)
+    # The first segment is the fixed period at the contract rate
+    rente[:, 0] = initiele_rente[:, 0]
+    return rente
+
+
+def _segment_saldi(saldo_start, maandrente, resterende_maanden, segment_maanden):
+    """Balance after each month of a segment in which an annuity over ``resterende_maanden`` is paid."""
+    r = maandrente[:, None]
+    b = saldo_start[:, None]
+    k = np.arange(1, segment_maanden + 1)[None, :]
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        groei_n = (1 + r) ** resterende_maanden
+        betaling = np.where(r > 0, b * r * groei_n / (groei_n - 1), b / resterende_maanden)
+        groei_k = (1 + r) ** k
+        saldo = np.where(r > 0, b * groei_k - betaling * (groei_k - 1) / r, b - betaling * k)
+    return np.clip(saldo, 0, None)
+
+
+def simuleer_variabele_leningen(
+    hoofdsom,
+    segment_renten,
+    looptijd_jaren,
+    segment_starten,
+    loan_type="annuity",
+    aflossings_schema=None,
+    uitstel_maanden=0,
+    start_jaar_kalender=START_JAAR_KALENDER,
+    schuldsaldo_dekking_pct=1.0,
+):
+    """
+    Simulate a loan under every row of ``segment_renten`` (scenarios x segments, annual rates).
+
+    ``segment_starten`` are the 0-based start months of the fixed-rate segments (the first
+    is 0). Annuities pay interest only during ``uitstel_maanden`` and re-derive the payment
+    at every reset from the remaining balance over the remaining months; bullet and modular
+    loans follow ``aflossings_schema`` and only their interest changes. ``hoofdsom`` is a
+    scalar or one principal per scenario, so rows can also be different loans that share
+    the term, reset months and schedule. Returns a dict of (scenarios x months) arrays
+    with the columns of ``simuleer_leningen_batch`` plus ``interestRate`` (annual rate
+    per month).
+    """
+    totaal_maanden = looptijd_jaren * 12
+    if totaal_maanden <= 0:
+        raise ValueError("Looptijd moet minstens één jaar zijn.")
+    segment_renten = np.atleast_2d(np.asarray(segment_renten, dtype=float))
+    segment_starten = np.asarray(segment_starten, dtype=int)
+    if len(segment_starten) != segment_renten.shape[1] or segment_starten[0] != 0:
+        raise ValueError("Eén rentevoet per segment nodig; het eerste segment start in maand 0.")
+    if (np.diff(segment_starten) <= 0).any() or segment_starten[-1] >= totaal_maanden:
+        raise ValueError("Segmenten moeten oplopend binnen de looptijd starten.")
+    n = segment_renten.shape[0]
+    hoofdsom = np.broadcast_to(np.asarray(hoofdsom, dtype=float), (n,))
+
+    grenzen = list(segment_starten)
+    renten = list(segment_renten.T)
+    if loan_type == "annuity":
+        if totaal_maanden - uitstel_maanden <= 0:
+            raise ValueError("Looptijd moet langer zijn dan de uitstelperiode.")
+        if 0 < uitstel_maanden and uitstel_maanden not in grenzen:
+            # Split the segment in which the deferral ends: amortization starts there
+            positie = int(np.searchsorted(grenzen, uitstel_maanden))
+            grenzen.insert(positie, uitstel_maanden)
+            renten.insert(positie, renten[positie - 1])
+    grenzen.append(totaal_maanden)
+
+    maandrente = np.repeat(np.stack(renten, axis=1), np.diff(grenzen), axis=1) / 12
+    if loan_type == "annuity":
+        saldo_na = np.empty((n, totaal_maanden))
+        saldo = hoofdsom.copy()
+        for i in range(len(renten)):
+            checkpoint()
+            begin, einde = grenzen[i], grenzen[i + 1]
+            if einde <= uitstel_maanden:
+                saldo_na[:, begin:einde] = saldo[:, None]
+            else:
+                saldo_na[:, begin:einde] = _segment_saldi(saldo, renten[i] / 12, totaal_maanden - begin, einde - begin)
+            saldo = saldo_na[:, einde - 1]
+        # Rounding residue of the last payment is repaid in the last month
+        saldo_na[:, -1] = 0
+    else:
+        if loan_type == "modular" and aflossings_schema is None:
+            raise ValueError("Modular loans need a repayment schedule")
+        if aflossings_schema is None:
+            saldo_na = np.repeat(hoofdsom[:, None], totaal_maanden, axis=1)
+            saldo_na[:, -1] = 0
+        else:
+            aflossingen = np.zeros(totaal_maanden)
+            for maand, bedrag in aflossings_schema:
+                if 1 <= maand <= totaal_maanden:
+                    aflossingen[maand - 1] += bedrag
+            saldo_na = np.clip(hoofdsom[:, None] - np.cumsum(aflossingen)[None, :], 0, None)
+    saldo_na[saldo_na < 0.01] = 0
+
+    saldo_voor = np.concatenate([hoofdsom[:, None], saldo_na[:, :-1]], axis=1)
+    rente = saldo_voor * maandrente
+    kapitaal = saldo_voor - saldo_na
+    betaling_excl = rente + kapitaal
+    premie = np.broadcast_to(
+        premie_schema(looptijd_jaren, start_jaar_kalender, loan_type, schuldsaldo_dekking_pct)[None, :],
+        saldo_na.shape,
+    )
+    maanden = np.arange(1, totaal_maanden + 1)
+    return {
+        "month": maanden,
+        "year": (maanden - 1) // 12 + 1,
+        "interestRate": maandrente * 12,
+        "paymentExcludingInsurance": betaling_excl,
+        "interest": rente,
+        "principalPayment": kapitaal,
+        "insurancePremium": premie,
+        "totalMonthlyPayment": betaling_excl + premie,
+        "remainingPrincipal": saldo_na,
+        "cumulativePrincipalPaid": np.cumsum(kapitaal, axis=1),
+        "cumulativeInterestPaid": np.cumsum(rente, axis=1),
+        "cumulativeInsurancePaid": np.cumsum(premie, axis=1),
+    }
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""
+Start-up warm-up of the calculation engine.
+
+A fresh worker would otherwise pay for the first-call costs of pandas and NumPy
+(allocator pools, ufunc dispatch, DataFrame construction paths) inside its first
+real request. ``warm_up`` runs one small, representative calculation of each kind
+before the worker accepts traffic: the per-loan simulations and statistics, the
+investment comparison and a batch comparison on the vectorized engine.
+
+SciPy's root finders stay lazy: importing SciPy would take most of the warm-up, and
+most workers never need it. (numpy_financial, the other lazy import, is loaded by the
+annuity step; it costs under a millisecond once NumPy is loaded.)
+``min_growth_solve=True`` (``LOANLOGIC_WARMUP_MIN_GROWTH_SOLVE``) adds the
+single-comparison min-growth solve, and with it the SciPy import.
+"""
+import time
+
+from calculation_functions import (
+    AANKOOPPRIJS_WONING,
+    aggregeer_jaarlijks,
+    bereken_min_groei_voor_betaling,
+    bereken_statistieken,
+    simuleer_klassieke_lening,
+    simuleer_met_investering,
+    simuleer_modulaire_lening,
+)
+from compare_many import vergelijk_alternatieven
+
+EIGEN_INBRENG = 100000
+LOOPTIJD_JAREN = 25
+HOOFDSOM = AANKOOPPRIJS_WONING - EIGEN_INBRENG
+
+
+def warm_up(min_growth_solve=False):
+    """Run the representative calculations once; returns the seconds spent per step."""
+    duur = {}
+
+    def stap(naam, fn, *args, **kwargs):
+        begin = time.perf_counter()
+        resultaat = fn(*args, **kwargs)
+        duur[naam] = time.perf_counter() - begin
+        return resultaat
+
+    annuiteit = stap("annuity", simuleer_klassieke_lening, EIGEN_INBRENG, 0.035, LOOPTIJD_JAREN)
+    bullet = stap("bullet", simuleer_modulaire_lening, EIGEN_INBRENG, 0.03, LOOPTIJD_JAREN,
+                  [(LOOPTIJD_JAREN * 12, HOOFDSOM)])
+    stap("annual_aggregation", aggregeer_jaarlijks, annuiteit)
+    stap("statistics", bereken_statistieken, annuiteit, hoofdsom=HOOFDSOM)
+    investering, start_investering, _, _ = stap(
+        "investment_simulation", simuleer_met_investering, annuiteit, bullet, EIGEN_INBRENG, EIGEN_INBRENG,
+    )
+    if min_growth_solve:
+        stap("min_growth_solve", bereken_min_groei_voor_betaling, investering, LOOPTIJD_JAREN * 12, HOOFDSOM,
+             start_investering)
+
+    lening = {"hoofdsom": HOOFDSOM, "jaarlijkse_rentevoet": 0.035, "looptijd_jaren": LOOPTIJD_JAREN}
+    stap("batch_comparison", vergelijk_alternatieven, lening,
+         [dict(lening, loan_type="bullet", aflossings_schema=[(LOOPTIJD_JAREN * 12, HOOFDSOM)]),
+          dict(lening, jaarlijkse_rentevoet=0.03)],
+         maandgroei=0.005, start_alternatieven=[20000.0, 20000.0])
+    return duur